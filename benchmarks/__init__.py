@@ -0,0 +1,10 @@
+"""
+Pacchetto benchmarks - Misure di prestazioni della pipeline di elaborazione UnLook.
+Gli script sono eseguibili senza hardware, ad esempio:
+
+    python -m benchmarks.bench_correspondence
+    python -m benchmarks.bench_pipeline
+
+bench_pipeline usa le scene sintetiche di synthetic_scene per misurare anche
+l'accuratezza rispetto alla geometria di riferimento.
+"""
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark del motore di corrispondenza vettorizzato per pattern progressivi.
+Misura il tempo per singolo pattern a 640x480 e 1280x720 e, opzionalmente,
+lo confronta con la ricerca pixel per pixel originale stimata su poche righe.
+Riporta anche i due livelli della decodifica coarse-to-fine: il pattern
+ridotto a 1/PYRAMID_SCALE e la ricerca a piena risoluzione limitata
+all'intervallo di disparità stimato al livello ridotto.
+
+Con ``--workers`` misura anche la scalabilità del backend a processi su uno
+stack di pattern 1280x720 al variare del numero di processi.
+
+Uso:
+    python -m benchmarks.bench_correspondence [--repeat N] [--legacy-rows N] [--workers 1,2,4,8]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from client.processing.correspondence import ScanlineCorrespondenceEngine
+from client.processing.process_backend import ProcessTriangulationBackend
+from client.processing.pyramid import (
+    DEFAULT_REFINE_MARGIN, PYRAMID_SCALE, coarse_max_disparity, downsample, refinement_range
+)
+
+RESOLUTIONS = [(640, 480), (1280, 720)]
+
+
+def make_pattern_pair(width, height, disparity=40, seed=0):
+    """
+    Genera una coppia di pattern sintetici con disparità nota.
+
+    Returns:
+        Tupla (pattern_l, pattern_r, shadow_mask_l, shadow_mask_r)
+    """
+    rng = np.random.default_rng(seed)
+    stripes = ((np.arange(width + disparity) // 8) % 2) * 200 + 30
+    noise = rng.integers(0, 10, size=(height, width + disparity))
+    scene = np.clip(stripes[None, :] + noise, 0, 255).astype(np.uint8)
+
+    pattern_l = np.ascontiguousarray(scene[:, disparity:])
+    pattern_r = np.ascontiguousarray(scene[:, :width])
+
+    shadow_mask_l = np.ones((height, width), dtype=np.uint8)
+    shadow_mask_r = np.ones((height, width), dtype=np.uint8)
+    shadow_mask_l[:, :width // 10] = 0
+    return pattern_l, pattern_r, shadow_mask_l, shadow_mask_r
+
+
+def legacy_update(pattern_l, pattern_r, shadow_mask_l, shadow_mask_r,
+                  disparity_map, confidence_map, pattern_weight, rows):
+    """Ricerca pixel per pixel dell'implementazione originale, limitata a ``rows`` righe."""
+    width = pattern_l.shape[1]
+    for y in range(rows):
+        for x in range(width):
+            if shadow_mask_l[y, x] == 0:
+                continue
+            val_l = int(pattern_l[y, x])
+            best_match_x = -1
+            best_match_diff = 255
+            for x_r in range(max(0, x - 200), x):
+                if shadow_mask_r[y, x_r] == 0:
+                    continue
+                diff = abs(val_l - int(pattern_r[y, x_r]))
+                if diff < best_match_diff:
+                    best_match_diff = diff
+                    best_match_x = x_r
+            if best_match_x >= 0 and best_match_diff < 50:
+                disparity_map[y, x] += (x - best_match_x) * pattern_weight
+                confidence_map[y, x] += pattern_weight
+
+
+def best_time(fn, repeat):
+    """Tempo minimo (s) di ``fn`` su ``repeat`` esecuzioni, dopo un riscaldamento."""
+    fn()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run_benchmark(repeat=5, legacy_rows=0, disparity=40):
+    """Esegue il benchmark e stampa i risultati."""
+    engine = ScanlineCorrespondenceEngine()
+    coarse_engine = ScanlineCorrespondenceEngine(max_disparity=coarse_max_disparity(engine.max_disparity))
+
+    print(f"{'Risoluzione':<12} {'ms/pattern':>12} {'Mpx/s':>10} {'ms 1/' + str(PYRAMID_SCALE):>10} "
+          f"{'ms limitata':>12} {'legacy s/pattern (stima)':>26}")
+    for width, height in RESOLUTIONS:
+        pattern_l, pattern_r, mask_l, mask_r = make_pattern_pair(width, height, disparity)
+        disparity_map = np.zeros((height, width), dtype=np.float32)
+        confidence_map = np.zeros((height, width), dtype=np.float32)
+
+        best = best_time(lambda: engine.update_disparity(pattern_l, pattern_r, mask_l, mask_r,
+                                                         disparity_map, confidence_map, 1.0), repeat)
+
+        # Livello ridotto (riduzione inclusa) e piena risoluzione limitata all'intervallo
+        # ottenuto da una disparità ridotta esatta: margine di DEFAULT_REFINE_MARGIN pixel
+        coarse = [downsample(image) for image in (pattern_l, pattern_r, mask_l, mask_r)]
+        coarse_disparity = np.zeros(coarse[0].shape, dtype=np.float32)
+        coarse_confidence = np.zeros(coarse[0].shape, dtype=np.float32)
+        coarse_time = best_time(lambda: coarse_engine.update_disparity(
+            downsample(pattern_l), downsample(pattern_r), coarse[2], coarse[3],
+            coarse_disparity, coarse_confidence, 1.0), repeat)
+
+        search_range = refinement_range(np.full(coarse[0].shape, disparity / PYRAMID_SCALE, dtype=np.float32),
+                                        (height, width), margin=DEFAULT_REFINE_MARGIN)
+        refine_time = best_time(lambda: engine.update_disparity(pattern_l, pattern_r, mask_l, mask_r,
+                                                                disparity_map, confidence_map, 1.0,
+                                                                search_range=search_range), repeat)
+
+        mpx_per_s = width * height / best / 1e6
+
+        legacy_estimate = "-"
+        if legacy_rows > 0:
+            start = time.perf_counter()
+            legacy_update(pattern_l, pattern_r, mask_l, mask_r,
+                          np.zeros_like(disparity_map), np.zeros_like(confidence_map),
+                          1.0, legacy_rows)
+            elapsed = time.perf_counter() - start
+            legacy_estimate = f"{elapsed / legacy_rows * height:.1f}"
+
+        print(f"{width}x{height:<8} {best * 1000:>12.1f} {mpx_per_s:>10.2f} {coarse_time * 1000:>10.1f} "
+              f"{refine_time * 1000:>12.1f} {legacy_estimate:>26}")
+
+
+def run_backend_benchmark(worker_counts, num_patterns=8, repeat=3):
+    """
+    Misura il tempo dello stack di pattern con il backend a processi.
+    Lo speedup è relativo alla prima configurazione di ``worker_counts``.
+    """
+    width, height = RESOLUTIONS[-1]
+    pairs = [make_pattern_pair(width, height, seed=i) for i in range(num_patterns)]
+    weights = [2 ** (i // 2) for i in range(num_patterns)]
+
+    print(f"\nBackend a processi, {num_patterns} pattern {width}x{height}")
+    print(f"{'Processi':<10} {'s/stack':>10} {'speedup':>10}")
+    baseline = None
+    for workers in worker_counts:
+        backend = ProcessTriangulationBackend(num_workers=workers)
+        try:
+            stack_l, stack_r, mask_l, mask_r = backend.prepare(num_patterns, height, width)
+            for i, (pattern_l, pattern_r, _, _) in enumerate(pairs):
+                stack_l[i] = pattern_l
+                stack_r[i] = pattern_r
+            mask_l[:] = pairs[0][2]
+            mask_r[:] = pairs[0][3]
+
+            # Riscaldamento: avvio dei processi e import nei worker
+            backend.compute_disparity(weights)
+
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                backend.compute_disparity(weights)
+                timings.append(time.perf_counter() - start)
+        finally:
+            backend.shutdown()
+
+        best = min(timings)
+        baseline = baseline or best
+        print(f"{workers:<10} {best:>10.2f} {baseline / best:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del motore di corrispondenza")
+    parser.add_argument("--repeat", type=int, default=5, help="Ripetizioni per risoluzione")
+    parser.add_argument("--legacy-rows", type=int, default=0,
+                        help="Righe su cui stimare il tempo della ricerca originale (0 = disabilitato)")
+    parser.add_argument("--workers", type=str, default="",
+                        help="Numeri di processi da provare, separati da virgola (es. 1,2,4,8)")
+    args = parser.parse_args()
+    run_benchmark(repeat=args.repeat, legacy_rows=args.legacy_rows)
+
+    if args.workers:
+        run_backend_benchmark([int(w) for w in args.workers.split(",")])
+
+
+if __name__ == "__main__":
+    main()
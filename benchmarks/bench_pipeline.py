@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark end-to-end della pipeline su scansioni sintetiche con geometria nota.
+Per ogni scena e tipo di pattern genera la sequenza vista dalla coppia stereo
+virtuale, la elabora con ScanProcessor (scansione salvata come bundle) e, per i
+pattern progressivi, con RealTimeTriangulator; riporta i tempi per fase, i punti
+al secondo, l'errore RMS di profondità e la completezza rispetto al riferimento.
+
+Non richiede hardware né display: adatto a seguire le regressioni di
+prestazioni e accuratezza tra una modifica e l'altra (``--json`` salva i
+risultati in un file confrontabile).
+
+Uso:
+    python -m benchmarks.bench_pipeline [--scenes plane,sphere,steps]
+        [--patterns gray,binary,phase,progressive] [--width W] [--height H] [--json FILE]
+"""
+
+import argparse
+import functools
+import json
+import logging
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.synthetic_scene import PATTERN_TYPES, SCENES, StereoRig, SyntheticScan, evaluate_depth, make_scene
+from client.processing.scan_frame_processor import RealTimeTriangulator
+from client.processing.triangulation import ScanProcessor
+from common.scan_bundle import SCAN_BUNDLE_NAME, ScanBundleWriter, calibration_digest
+
+
+class StageTimer:
+    """
+    Misura il tempo cumulativo dei metodi di un oggetto, sostituendoli sull'istanza.
+    I tempi sono esclusivi: una fase chiamata dentro un'altra (ad esempio
+    l'esportazione durante la riproiezione) non viene contata due volte.
+    """
+
+    def __init__(self):
+        self.times = defaultdict(float)
+        self._active = []
+
+    def wrap(self, obj, method_name, stage):
+        """Cronometra ``obj.method_name`` sotto il nome ``stage``."""
+        method = getattr(obj, method_name)
+
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            return self.measure(stage, method, *args, **kwargs)
+
+        setattr(obj, method_name, timed)
+
+    def measure(self, stage, fn, *args, **kwargs):
+        """Esegue ``fn`` cronometrandola sotto il nome ``stage``."""
+        self._active.append(stage)
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            self._active.pop()
+            self.times[stage] += elapsed
+            if self._active:
+                self.times[self._active[-1]] -= elapsed
+
+
+def write_scan(scan, scan_dir):
+    """Salva la scansione sintetica come bundle con la sua calibrazione."""
+    scan_dir.mkdir(parents=True, exist_ok=True)
+    np.savez(scan_dir / "calibration.npz", **scan.calibration)
+
+    writer = ScanBundleWriter(scan_dir / SCAN_BUNDLE_NAME, scan.frames[0][2].shape,
+                              scan_config=scan.scan_config,
+                              calibration_hash=calibration_digest(scan.calibration))
+    try:
+        for index, name, left, right in scan.frames:
+            writer.append(index, name, left, right)
+    finally:
+        writer.close()
+
+
+def run_scan_processor(scan, work_dir):
+    """
+    Elabora la scansione con ScanProcessor.
+
+    Returns:
+        Tupla (tempi per fase, nuvola organizzata o None)
+    """
+    scan_dir = work_dir / f"scan_{scan.scene.name}_{scan.pattern_type}"
+    write_scan(scan, scan_dir)
+
+    timer = StageTimer()
+    processor = ScanProcessor(output_dir=str(work_dir / "processor"))
+    timer.wrap(processor, "_rectified_pair", "rectify")
+    timer.wrap(processor, "_decode_sequence", "decode")
+    timer.wrap(processor, "_update_disparity_from_pattern", "correspond")
+    timer.wrap(processor, "_reproject_to_3d", "reproject")
+    timer.wrap(processor, "save_point_cloud", "export")
+
+    start = time.perf_counter()
+    if not timer.measure("load", processor.load_local_scan, str(scan_dir)):
+        return None, None
+    success = processor.process_scan(use_threading=False)
+    timer.times["total"] = time.perf_counter() - start
+
+    return timer.times, processor.organized_pointcloud if success else None
+
+
+def run_realtime(scan, work_dir):
+    """
+    Elabora la sequenza progressiva con RealTimeTriangulator (triangolazione completa).
+
+    Returns:
+        Tupla (tempi per fase, nuvola organizzata o None)
+    """
+    output_dir = work_dir / "realtime"
+    output_dir.mkdir(parents=True, exist_ok=True)
+    np.savez(output_dir / "calibration.npz", **scan.calibration)
+
+    timer = StageTimer()
+    triangulator = RealTimeTriangulator(output_dir=output_dir)
+    timer.wrap(triangulator, "_fold_pattern_pairs", "correspond")
+    timer.wrap(triangulator, "_reproject_to_3d", "reproject")
+
+    pairs = scan.frame_pairs()
+    try:
+        start = time.perf_counter()
+        timer.measure("load", triangulator.initialize, pairs[0][1], pairs[0][2], pairs[1][1], pairs[1][2])
+        result = triangulator.triangulate_frames(pairs)
+        timer.times["total"] = time.perf_counter() - start
+    finally:
+        triangulator.shutdown()
+
+    return timer.times, triangulator.get_last_organized_pointcloud() if result is not None else None
+
+
+def summarize(scene_name, pattern_type, pipeline, times, cloud, reference):
+    """Riga di risultato con tempi e metriche di accuratezza."""
+    row = {"scene": scene_name, "pattern": pattern_type, "pipeline": pipeline,
+           "stages_ms": {stage: round(seconds * 1000.0, 1) for stage, seconds in times.items()}}
+
+    if cloud is None:
+        row.update(points=0, points_per_sec=0.0)
+        return row
+
+    points = len(cloud)
+    row.update(points=points, points_per_sec=points / times["total"] if times["total"] else 0.0)
+    row.update(evaluate_depth(cloud.depth, cloud.valid, reference))
+    return row
+
+
+def print_row(row):
+    """Stampa una riga di risultato."""
+    stages = row["stages_ms"]
+    detail = " ".join(f"{name}={ms:.0f}" for name, ms in stages.items() if name != "total")
+    if not row["points"]:
+        print(f"{row['scene']:<7} {row['pattern']:<12} {row['pipeline']:<9} "
+              f"{stages.get('total', 0):>8.0f}ms  ERRORE: nessun punto  [{detail}]")
+        return
+    print(f"{row['scene']:<7} {row['pattern']:<12} {row['pipeline']:<9} {stages['total']:>8.0f}ms "
+          f"{row['points']:>8} pts {row['points_per_sec'] / 1e6:>6.2f} Mpts/s "
+          f"rms={row['rms_mm']:>7.2f}mm inl={row['inlier_rms_mm']:>5.2f}mm "
+          f"compl={row['completeness'] * 100:>5.1f}% out={row['outlier_ratio'] * 100:>5.1f}%  [{detail}]")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark della pipeline su scansioni sintetiche")
+    parser.add_argument("--scenes", default=",".join(SCENES))
+    parser.add_argument("--patterns", default=",".join(PATTERN_TYPES))
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--noise", type=float, default=1.5, help="Rumore del sensore (livelli di grigio)")
+    parser.add_argument("--json", help="Salva i risultati in questo file")
+    parser.add_argument("--verbose", action="store_true", help="Mostra i log della pipeline")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.ERROR)
+
+    rig = StereoRig(width=args.width, height=args.height, noise=args.noise,
+                    focal=800.0 * args.width / 640)
+    results = []
+
+    with tempfile.TemporaryDirectory(prefix="unlook_bench_") as tmp:
+        work_dir = Path(tmp)
+        for scene_name in args.scenes.split(","):
+            scene = make_scene(scene_name)
+            for pattern_type in args.patterns.split(","):
+                start = time.perf_counter()
+                scan = SyntheticScan(scene, pattern_type, rig)
+                render_ms = (time.perf_counter() - start) * 1000.0
+                print(f"# {scene_name}/{pattern_type}: {len(scan.frames)} frame generati in {render_ms:.0f}ms")
+
+                times, cloud = run_scan_processor(scan, work_dir)
+                if times is not None:
+                    results.append(summarize(scene_name, pattern_type, "offline", times, cloud, scan.depth))
+                    print_row(results[-1])
+
+                if pattern_type == "progressive":
+                    times, cloud = run_realtime(scan, work_dir)
+                    results.append(summarize(scene_name, pattern_type, "realtime", times, cloud, scan.depth))
+                    print_row(results[-1])
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"width": args.width, "height": args.height, "results": results}, f, indent=2)
+
+    sys.exit(0 if results and all(row["points"] for row in results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Scene sintetiche per i benchmark della pipeline a luce strutturata.
+Una coppia stereo virtuale calibrata osserva scene analitiche (piani, sfere,
+gradini) illuminate da un proiettore pinhole; per ogni pixel vengono tracciati
+i raggi, calcolate le coordinate del proiettore, l'ombreggiatura e le ombre
+portate. I pattern (Gray code, binario, progressivi, phase shift) sono funzioni
+delle coordinate del proiettore, quindi ogni immagine della sequenza costa solo
+una valutazione del pattern sulla geometria già tracciata.
+
+La profondità di riferimento è calcolata sulla griglia rettificata della camera
+sinistra, nello stesso sistema dei punti riproiettati con la matrice Q.
+"""
+
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import cv2
+
+# Tipi di sequenza supportati e relativo PatternType del ScanProcessor
+PATTERN_TYPES = {
+    "gray": "GRAY_CODE",
+    "binary": "BINARY_CODE",
+    "phase": "PHASE_SHIFT",
+    "progressive": "PROGRESSIVE",
+}
+
+# Parametri predefiniti delle sequenze
+DEFAULT_PHASE_FREQUENCIES = (1, 8, 64)
+DEFAULT_PHASE_STEPS = 4
+DEFAULT_PROGRESSIVE_PATTERNS = 8
+
+# Pixel della camera coperti da un pixel del proiettore (a pari distanza). Con 2, il limite
+# di Nyquist, anche il bit più fine dei codici Gray/binari resta risolvibile dalle camere
+# a qualsiasi risoluzione: il proiettore predefinito viene scalato con le camere
+CAMERA_PIXELS_PER_PROJECTOR_PIXEL = 2.0
+
+# Campo visivo del proiettore predefinito: semi-larghezza e semi-altezza del piano
+# immagine a distanza unitaria (quello di un proiettore 1024x768 con focale 1100)
+PROJECTOR_FIELD_OF_VIEW = (512.0 / 1100.0, 384.0 / 1100.0)
+
+# Tolleranza numerica per intersezioni e test di visibilità (mm)
+EPSILON = 1e-3
+
+PatternFunction = Callable[[np.ndarray, np.ndarray], np.ndarray]
+
+
+class Plane:
+    """Piano infinito per un punto con normale data."""
+
+    def __init__(self, point, normal, albedo: float = 1.0):
+        self.point = np.asarray(point, dtype=np.float64)
+        self.normal = np.asarray(normal, dtype=np.float64) / np.linalg.norm(normal)
+        self.albedo = albedo
+
+    def intersect(self, origins: np.ndarray, directions: np.ndarray) -> np.ndarray:
+        """Distanza lungo i raggi (inf dove non c'è intersezione)."""
+        denom = directions @ self.normal
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = ((self.point - origins) @ self.normal) / denom
+        return np.where((np.abs(denom) > 1e-12) & (t > EPSILON), t, np.inf)
+
+    def normals(self, points: np.ndarray) -> np.ndarray:
+        return np.broadcast_to(self.normal, points.shape)
+
+
+class Sphere:
+    """Sfera piena."""
+
+    def __init__(self, center, radius: float, albedo: float = 1.0):
+        self.center = np.asarray(center, dtype=np.float64)
+        self.radius = float(radius)
+        self.albedo = albedo
+
+    def intersect(self, origins: np.ndarray, directions: np.ndarray) -> np.ndarray:
+        offset = origins - self.center
+        a = np.einsum("ij,ij->i", directions, directions)
+        b = 2.0 * np.einsum("ij,ij->i", offset, directions)
+        c = np.einsum("ij,ij->i", offset, offset) - self.radius ** 2
+        disc = b * b - 4 * a * c
+        root = np.sqrt(np.maximum(disc, 0.0))
+        near = (-b - root) / (2 * a)
+        far = (-b + root) / (2 * a)
+        t = np.where(near > EPSILON, near, far)
+        return np.where((disc >= 0) & (t > EPSILON), t, np.inf)
+
+    def normals(self, points: np.ndarray) -> np.ndarray:
+        return (points - self.center) / self.radius
+
+
+class Box:
+    """Parallelepipedo allineato agli assi."""
+
+    def __init__(self, minimum, maximum, albedo: float = 1.0):
+        self.minimum = np.asarray(minimum, dtype=np.float64)
+        self.maximum = np.asarray(maximum, dtype=np.float64)
+        self.albedo = albedo
+
+    def intersect(self, origins: np.ndarray, directions: np.ndarray) -> np.ndarray:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            inverse = 1.0 / directions
+            t1 = (self.minimum - origins) * inverse
+            t2 = (self.maximum - origins) * inverse
+        t_near = np.nanmax(np.minimum(t1, t2), axis=1)
+        t_far = np.nanmin(np.maximum(t1, t2), axis=1)
+        t = np.where(t_near > EPSILON, t_near, t_far)
+        return np.where((t_near <= t_far) & (t > EPSILON), t, np.inf)
+
+    def normals(self, points: np.ndarray) -> np.ndarray:
+        # Faccia più vicina al punto
+        distances = np.concatenate([np.abs(points - self.minimum), np.abs(points - self.maximum)], axis=1)
+        face = np.argmin(distances, axis=1)
+        normals = np.zeros_like(points)
+        normals[np.arange(len(points)), face % 3] = np.where(face < 3, -1.0, 1.0)
+        return normals
+
+
+class Scene:
+    """Insieme di primitive nel sistema della camera sinistra (mm, Z in avanti)."""
+
+    def __init__(self, name: str, primitives: Sequence):
+        self.name = name
+        self.primitives = list(primitives)
+
+    def trace(self, origins: np.ndarray, directions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Primo impatto di ogni raggio.
+
+        Returns:
+            Tupla (t, primitive): distanza (inf se mancato) e indice della primitiva colpita
+        """
+        distances = np.stack([p.intersect(origins, directions) for p in self.primitives])
+        primitive = np.argmin(distances, axis=0)
+        return distances[primitive, np.arange(len(origins))], primitive
+
+    def surface(self, points: np.ndarray, primitive: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Normali e albedo nei punti di impatto."""
+        normals = np.zeros_like(points)
+        albedo = np.zeros(len(points))
+        for index, p in enumerate(self.primitives):
+            selected = primitive == index
+            if selected.any():
+                normals[selected] = p.normals(points[selected])
+                albedo[selected] = p.albedo
+        return normals, albedo
+
+    def visible_from(self, center: np.ndarray, points: np.ndarray) -> np.ndarray:
+        """True dove il segmento centro → punto non è occluso dalla scena."""
+        directions = points - center
+        length = np.linalg.norm(directions, axis=1)
+        directions = directions / length[:, None]
+        origins = np.broadcast_to(center, points.shape)
+        t, _ = self.trace(origins, directions)
+        return t >= length - 10 * EPSILON
+
+
+def make_scene(name: str) -> Scene:
+    """
+    Crea una delle scene predefinite.
+
+    Le profondità (370-470 mm) restano dentro il campo della pipeline: la
+    riproiezione scarta i punti oltre 500 mm e la ricerca progressiva si ferma
+    a 200 px di disparità (~300 mm con la coppia predefinita).
+
+    Args:
+        name: "plane", "sphere" o "steps"
+
+    Returns:
+        Scene
+    """
+    back = Plane((0, 0, 470), (0, 0, -1), albedo=0.8)
+    if name == "plane":
+        return Scene(name, [Plane((0, 0, 420), (0.15, -0.1, -1.0))])
+    if name == "sphere":
+        return Scene(name, [Sphere((0, 0, 390), 60, albedo=0.9), back])
+    if name == "steps":
+        return Scene(name, [
+            Box((-130, -40, 370), (-15, 140, 500), albedo=0.9),
+            Box((-15, 0, 410), (110, 140, 500), albedo=0.9),
+            back,
+        ])
+    raise ValueError(f"Scena sconosciuta: {name}")
+
+
+SCENES = ("plane", "sphere", "steps")
+
+
+def _rotation_y(degrees: float) -> np.ndarray:
+    angle = np.radians(degrees)
+    return np.array([[np.cos(angle), 0, np.sin(angle)],
+                     [0, 1, 0],
+                     [-np.sin(angle), 0, np.cos(angle)]])
+
+
+class StereoRig:
+    """
+    Coppia stereo virtuale con proiettore.
+
+    La camera sinistra è l'origine; la destra è traslata di ``baseline`` lungo X
+    e ruotata di ``toe_in`` gradi attorno a Y, così la rettifica non è banale.
+    Il proiettore sta a metà della baseline e guarda lungo Z. Se la sua
+    risoluzione non è indicata, viene scelta in base alle camere (vedi
+    CAMERA_PIXELS_PER_PROJECTOR_PIXEL) con campo visivo PROJECTOR_FIELD_OF_VIEW:
+    il numero di bit dei codici segue così la risoluzione delle camere.
+    """
+
+    def __init__(self, width: int = 640, height: int = 480, focal: float = 800.0,
+                 baseline: float = 75.0, toe_in: float = 0.5,
+                 projector_size: Optional[Tuple[int, int]] = None, projector_focal: Optional[float] = None,
+                 ambient: float = 12.0, gain: float = 210.0, noise: float = 1.5,
+                 supersampling: int = 2):
+        self.width = width
+        self.height = height
+        self.K = np.array([[focal, 0, width / 2.0], [0, focal, height / 2.0], [0, 0, 1]])
+        self.baseline = baseline
+        # Rotazione mondo (camera sinistra) → camera destra
+        self.R = _rotation_y(-toe_in)
+        self.right_center = np.array([baseline, 0.0, 0.0])
+
+        if projector_focal is None:
+            projector_focal = focal / CAMERA_PIXELS_PER_PROJECTOR_PIXEL
+        if projector_size is None:
+            projector_size = (int(round(2 * PROJECTOR_FIELD_OF_VIEW[0] * projector_focal)),
+                              int(round(2 * PROJECTOR_FIELD_OF_VIEW[1] * projector_focal)))
+
+        self.projector_size = projector_size
+        self.projector_center = np.array([baseline / 2.0, 0.0, 0.0])
+        self.projector_K = np.array([[projector_focal, 0, projector_size[0] / 2.0],
+                                     [0, projector_focal, projector_size[1] / 2.0],
+                                     [0, 0, 1]])
+
+        self.ambient = ambient
+        self.gain = gain
+        self.noise = noise
+        self.supersampling = supersampling
+
+    def calibration(self) -> Dict[str, np.ndarray]:
+        """Dati di calibrazione nel formato di calibration.npz."""
+        return {
+            "M1": self.K.copy(), "M2": self.K.copy(),
+            "d1": np.zeros(5), "d2": np.zeros(5),
+            "R": self.R.copy(),
+            "t": -self.R @ self.right_center,
+        }
+
+    def rectification(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Rotazione R1 e proiezione P1 della camera sinistra rettificata (come la pipeline)."""
+        calib = self.calibration()
+        R1, _, P1, _, _, _, _ = cv2.stereoRectify(
+            calib["M1"], calib["d1"], calib["M2"], calib["d2"], (self.width, self.height),
+            calib["R"], calib["t"].reshape(3, 1), flags=cv2.CALIB_ZERO_DISPARITY, alpha=0)
+        return R1, P1
+
+    def _pixel_rays(self, inverse_projection: np.ndarray, rotation_to_world: np.ndarray,
+                    samples: int) -> np.ndarray:
+        """Direzioni mondo dei raggi per ``samples``² campioni per pixel."""
+        offsets = (np.arange(samples) + 0.5) / samples - 0.5
+        u = np.arange(self.width)[None, :, None, None] + offsets[None, None, :, None]
+        v = np.arange(self.height)[:, None, None, None] + offsets[None, None, None, :]
+        u, v = np.broadcast_arrays(u, v)
+        pixels = np.stack([u.ravel(), v.ravel(), np.ones(u.size)], axis=1)
+        return pixels @ (rotation_to_world @ inverse_projection).T
+
+    def project_to_projector(self, points: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Coordinate (u, v) del proiettore dei punti."""
+        local = points - self.projector_center
+        projected = local @ self.projector_K.T
+        return projected[:, 0] / projected[:, 2], projected[:, 1] / projected[:, 2]
+
+
+class CameraView:
+    """
+    Geometria tracciata per una camera: coordinate del proiettore e fattore di
+    irradianza di ogni campione. Le immagini dei pattern si ottengono senza
+    ritracciare la scena.
+    """
+
+    def __init__(self, rig: StereoRig, scene: Scene, center: np.ndarray, rotation_to_world: np.ndarray):
+        samples = rig.supersampling
+        directions = rig._pixel_rays(np.linalg.inv(rig.K), rotation_to_world, samples)
+        origins = np.broadcast_to(center, directions.shape)
+
+        t, primitive = scene.trace(origins, directions)
+        hit = np.isfinite(t)
+        points = origins + directions * np.where(hit, t, 0)[:, None]
+
+        normals, albedo = scene.surface(points, primitive)
+        to_projector = rig.projector_center - points
+        to_projector /= np.maximum(np.linalg.norm(to_projector, axis=1, keepdims=True), 1e-9)
+        # Superfici a doppia faccia: conta solo l'angolo con la direzione del proiettore
+        lambert = np.abs(np.einsum("ij,ij->i", normals, to_projector))
+
+        lit = hit & scene.visible_from(rig.projector_center, points)
+        u, v = rig.project_to_projector(points)
+        inside = (u >= 0) & (u < rig.projector_size[0]) & (v >= 0) & (v < rig.projector_size[1])
+
+        shape = (rig.height, rig.width, samples * samples)
+        self.rig = rig
+        self.u = u.reshape(shape)
+        self.v = v.reshape(shape)
+        self.irradiance = (albedo * lambert * (lit & inside)).reshape(shape)
+
+    def render(self, pattern: PatternFunction, rng: np.random.Generator) -> np.ndarray:
+        """
+        Immagine uint8 della camera con il pattern proiettato.
+
+        Args:
+            pattern: Funzione (u, v) del proiettore → intensità in [0, 1]
+            rng: Generatore per il rumore del sensore
+        """
+        rig = self.rig
+        radiance = rig.ambient + rig.gain * self.irradiance * pattern(self.u, self.v)
+        image = radiance.mean(axis=2)
+        if rig.noise > 0:
+            image = image + rng.normal(0, rig.noise, image.shape)
+        return np.clip(np.rint(image), 0, 255).astype(np.uint8)
+
+
+def pattern_sequence(pattern_type: str, projector_size: Tuple[int, int],
+                     num_progressive: int = DEFAULT_PROGRESSIVE_PATTERNS,
+                     frequencies: Sequence[int] = DEFAULT_PHASE_FREQUENCIES,
+                     phase_steps: int = DEFAULT_PHASE_STEPS) -> Tuple[List[Tuple[str, PatternFunction]], Dict]:
+    """
+    Sequenza di pattern nell'ordine del server (white, black, pattern).
+
+    Args:
+        pattern_type: Uno tra PATTERN_TYPES
+        projector_size: Risoluzione (W, H) del proiettore
+        num_progressive: Pattern per direzione della sequenza progressiva
+        frequencies: Frequenze delle frange (phase shift)
+        phase_steps: Passi di fase per frequenza
+
+    Returns:
+        Tupla (sequenza, scan_config): lista di (nome, funzione) e configurazione
+        della scansione da salvare con i frame
+    """
+    if pattern_type not in PATTERN_TYPES:
+        raise ValueError(f"Tipo di pattern sconosciuto: {pattern_type}")
+
+    width = projector_size[0]
+    sequence = [("white", lambda u, v: np.ones_like(u)), ("black", lambda u, v: np.zeros_like(u))]
+    config = {"pattern_type": PATTERN_TYPES[pattern_type], "horizontal_patterns": False}
+
+    if pattern_type in ("gray", "binary"):
+        num_bits = int(np.ceil(np.log2(width)))
+        gray = pattern_type == "gray"
+
+        def bit_plane(bit, inverse=False):
+            def plane(u, v):
+                columns = np.clip(u, 0, width - 1).astype(np.int64)
+                codes = columns ^ (columns >> 1) if gray else columns
+                value = ((codes >> bit) & 1).astype(np.float64)
+                return 1.0 - value if inverse else value
+            return plane
+
+        prefix = "gray_v" if gray else "binary_v"
+        bits = range(num_bits - 1, -1, -1)
+        sequence += [(f"{prefix}_{i}", bit_plane(bit)) for i, bit in enumerate(bits)]
+        if gray:
+            sequence += [(f"{prefix}_inv_{i}", bit_plane(bit, True)) for i, bit in enumerate(bits)]
+        config["num_bits"] = num_bits
+
+    elif pattern_type == "phase":
+        def fringe(frequency, step):
+            return lambda u, v: 0.5 + 0.5 * np.cos(2 * np.pi * frequency * u / width
+                                                   - 2 * np.pi * step / phase_steps)
+
+        sequence += [(f"phase_f{f}_s{n}", fringe(f, n)) for f in frequencies for n in range(phase_steps)]
+        config["phase_frequencies"] = list(frequencies)
+        config["phase_steps"] = phase_steps
+
+    else:
+        def lines(index, horizontal):
+            line_width = max(1, int(128 / (2 ** index)))
+            return lambda u, v: ((np.floor((v if horizontal else u) / line_width) % 2) == 0).astype(np.float64)
+
+        sequence += [(f"vertical_{i}", lines(i, False)) for i in range(num_progressive)]
+        sequence += [(f"horizontal_{i}", lines(i, True)) for i in range(num_progressive)]
+        config["horizontal_patterns"] = True
+
+    return sequence, config
+
+
+class SyntheticScan:
+    """
+    Scansione sintetica: frame sinistri/destri di una sequenza di pattern su una
+    scena, calibrazione e profondità di riferimento.
+    """
+
+    def __init__(self, scene: Scene, pattern_type: str, rig: Optional[StereoRig] = None, seed: int = 0,
+                 **sequence_options):
+        self.scene = scene
+        self.pattern_type = pattern_type
+        self.rig = rig or StereoRig()
+
+        rig = self.rig
+        self.left_view = CameraView(rig, scene, np.zeros(3), np.eye(3))
+        self.right_view = CameraView(rig, scene, rig.right_center, rig.R.T)
+
+        sequence, self.scan_config = pattern_sequence(pattern_type, rig.projector_size, **sequence_options)
+        rng = np.random.default_rng(seed)
+        self.frames = [(index, name, self.left_view.render(fn, rng), self.right_view.render(fn, rng))
+                       for index, (name, fn) in enumerate(sequence)]
+
+        self.depth = self._ground_truth_depth()
+
+    @property
+    def calibration(self) -> Dict[str, np.ndarray]:
+        return self.rig.calibration()
+
+    def frame_pairs(self) -> List[Tuple[int, np.ndarray, np.ndarray]]:
+        """Frame come tuple (pattern_index, left, right), formato di RealTimeTriangulator."""
+        return [(index, left, right) for index, _, left, right in self.frames]
+
+    def _ground_truth_depth(self) -> np.ndarray:
+        """
+        Profondità di riferimento sulla griglia rettificata della camera sinistra.
+
+        Returns:
+            Mappa HxW della Z rettificata, NaN dove il punto non è misurabile
+            (fuori scena, in ombra o non visibile dalla camera destra)
+        """
+        rig, scene = self.rig, self.scene
+        R1, P1 = rig.rectification()
+        directions = rig._pixel_rays(np.linalg.inv(P1[:, :3]), R1.T, 1)
+        origins = np.zeros_like(directions)
+
+        t, _ = scene.trace(origins, directions)
+        hit = np.isfinite(t)
+        points = directions * np.where(hit, t, 0)[:, None]
+
+        u, v = rig.project_to_projector(points)
+        inside = (u >= 0) & (u < rig.projector_size[0]) & (v >= 0) & (v < rig.projector_size[1])
+        measurable = (hit & inside & scene.visible_from(rig.projector_center, points)
+                      & scene.visible_from(rig.right_center, points))
+
+        depth = (points @ R1.T)[:, 2]
+        return np.where(measurable, depth, np.nan).reshape(rig.height, rig.width)
+
+
+def evaluate_depth(depth: np.ndarray, valid: np.ndarray, reference: np.ndarray,
+                   tolerance: float = 5.0) -> Dict[str, float]:
+    """
+    Confronta una mappa di profondità ricostruita con il riferimento.
+
+    Args:
+        depth: Profondità ricostruita HxW (griglia rettificata)
+        valid: Pixel ricostruiti
+        reference: Profondità di riferimento (NaN dove non misurabile)
+        tolerance: Errore oltre il quale un punto è considerato outlier (mm)
+
+    Returns:
+        Dizionario con rms_mm, inlier_rms_mm, completeness e outlier_ratio
+    """
+    measurable = np.isfinite(reference)
+    matched = valid & measurable
+    errors = depth[matched] - reference[matched]
+    inliers = np.abs(errors) <= tolerance
+
+    reconstructed = int(valid.sum())
+    return {
+        "rms_mm": float(np.sqrt(np.mean(errors ** 2))) if errors.size else float("nan"),
+        "inlier_rms_mm": float(np.sqrt(np.mean(errors[inliers] ** 2))) if inliers.any() else float("nan"),
+        "completeness": float(inliers.sum() / max(1, measurable.sum())),
+        "outlier_ratio": float((reconstructed - inliers.sum()) / max(1, reconstructed)),
+    }
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Decodifica vettorizzata dei pattern a codice (Gray code e binario) per la luce strutturata.
+I bit di ogni pixel vengono impacchettati in un unico codice intero di colonna del
+proiettore e le corrispondenze sinistra/destra vengono trovate per uguaglianza di
+codice lungo le righe rettificate, con un ordinamento per riga invece della ricerca
+esaustiva sulla distanza di Hamming.
+"""
+
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Configurazione logging
+logger = logging.getLogger(__name__)
+
+# Soglie predefinite (coerenti con il decoder OpenCV usato da ScanProcessor)
+DEFAULT_BLACK_THRESHOLD = 40
+DEFAULT_WHITE_THRESHOLD = 5
+
+# Numero massimo di bit impacchettabili in un codice uint32
+MAX_CODE_BITS = 32
+
+# Tipi di codifica supportati
+CODE_TYPES = ("gray", "binary")
+
+
+def gray_to_binary(codes: np.ndarray, num_bits: int) -> np.ndarray:
+    """
+    Converte codici Gray in codici binari naturali.
+
+    Usa lo XOR prefisso in log2(num_bits) passaggi vettorizzati invece del ciclo
+    bit per bit.
+
+    Args:
+        codes: Array di codici Gray (interi senza segno)
+        num_bits: Numero di bit significativi dei codici
+
+    Returns:
+        Array di codici binari con lo stesso dtype
+    """
+    binary = codes.copy()
+    shift = 1
+    while shift < num_bits:
+        binary ^= binary >> shift
+        shift <<= 1
+    return binary
+
+
+class CodeDecoder:
+    """
+    Decodificatore incrementale dei piani di bit per una singola camera.
+
+    I pattern vengono aggiunti uno alla volta dal bit più significativo al meno
+    significativo: ogni piano viene sogliato e impacchettato immediatamente nel
+    codice intero del pixel, senza mai costruire il cubo HxWxN dei bit.
+    """
+
+    def __init__(self, white: np.ndarray, black: np.ndarray, code_type: str = "gray",
+                 black_threshold: int = DEFAULT_BLACK_THRESHOLD,
+                 white_threshold: int = DEFAULT_WHITE_THRESHOLD):
+        """
+        Inizializza il decodificatore.
+
+        Args:
+            white: Immagine rettificata con pattern bianco
+            black: Immagine rettificata con pattern nero
+            code_type: Tipo di codifica ("gray" o "binary")
+            black_threshold: Contrasto minimo bianco/nero per considerare un pixel illuminato
+            white_threshold: Differenza minima pattern/soglia per considerare affidabile un bit
+        """
+        if code_type not in CODE_TYPES:
+            raise ValueError(f"Tipo di codifica non supportato: {code_type}")
+
+        self.code_type = code_type
+        self.white_threshold = white_threshold
+
+        white16 = white.astype(np.int16)
+        black16 = black.astype(np.int16)
+
+        # Soglia per pixel a metà tra bianco e nero
+        self._threshold = (white16 + black16) // 2
+        self.shadow_mask = white16 > black16 + black_threshold
+        self.valid_mask = self.shadow_mask.copy()
+
+        self._codes = np.zeros(white.shape[:2], dtype=np.uint32)
+        self.num_bits = 0
+
+    def add_plane(self, pattern: np.ndarray, inverse: Optional[np.ndarray] = None):
+        """
+        Aggiunge un piano di bit al codice dei pixel.
+
+        Args:
+            pattern: Immagine rettificata del pattern
+            inverse: Immagine rettificata del pattern invertito (opzionale); se
+                presente il bit è deciso dal confronto pattern/inverso, altrimenti
+                dalla soglia bianco/nero
+        """
+        if self.num_bits >= MAX_CODE_BITS:
+            raise ValueError(f"Superato il numero massimo di bit ({MAX_CODE_BITS})")
+
+        pattern16 = pattern.astype(np.int16)
+        reference = inverse.astype(np.int16) if inverse is not None else self._threshold
+
+        difference = pattern16 - reference
+        bit = (difference > 0).astype(np.uint32)
+
+        # Un bit troppo vicino alla soglia rende inaffidabile l'intero codice
+        self.valid_mask &= np.abs(difference) > self.white_threshold
+
+        self._codes <<= np.uint32(1)
+        self._codes |= bit
+        self.num_bits += 1
+
+    def codes(self) -> np.ndarray:
+        """
+        Restituisce il codice di colonna del proiettore per ogni pixel.
+
+        Returns:
+            Array uint32 HxW con i codici convertiti in binario naturale
+        """
+        if self.code_type == "gray":
+            return gray_to_binary(self._codes, self.num_bits)
+        return self._codes.copy()
+
+
+def match_codes_by_row(codes_l: np.ndarray, valid_l: np.ndarray,
+                       codes_r: np.ndarray, valid_r: np.ndarray,
+                       num_bits: int, max_disparity: Optional[int] = None) -> np.ndarray:
+    """
+    Trova le corrispondenze sinistra/destra per uguaglianza di codice sulle righe.
+
+    I pixel validi di ciascuna camera vengono ordinati per chiave (riga, codice);
+    per ogni chiave si ottiene l'intervallo di colonne [min, max] occupato dalla
+    striscia del proiettore. Ogni pixel sinistro viene poi mappato linearmente
+    nella striscia destra con lo stesso codice, ottenendo una disparità sub-pixel.
+    Il costo è O(W log W) per riga invece di O(W²·N).
+
+    Args:
+        codes_l, codes_r: Codici di colonna per pixel (HxW)
+        valid_l, valid_r: Maschere dei pixel con codice affidabile
+        num_bits: Numero di bit dei codici
+        max_disparity: Disparità massima accettata (opzionale)
+
+    Returns:
+        Mappa di disparità float32 HxW (0 dove non c'è corrispondenza)
+    """
+    height, width = codes_l.shape[:2]
+    disparity_map = np.zeros((height, width), dtype=np.float32)
+
+    keys_r, cols_r = _row_code_keys(codes_r, valid_r, num_bits)
+    keys_l, cols_l = _row_code_keys(codes_l, valid_l, num_bits)
+    if keys_r.size == 0 or keys_l.size == 0:
+        return disparity_map
+
+    unique_r, min_r, max_r = _stripe_extents(keys_r, cols_r)
+    unique_l, min_l, max_l = _stripe_extents(keys_l, cols_l)
+
+    # Estensione della striscia sinistra di appartenenza di ogni pixel sinistro
+    stripe_l = np.searchsorted(unique_l, keys_l)
+
+    # Striscia destra con lo stesso codice sulla stessa riga
+    pos_r = np.searchsorted(unique_r, keys_l)
+    pos_r_clipped = np.minimum(pos_r, unique_r.size - 1)
+    found = unique_r[pos_r_clipped] == keys_l
+
+    stripe_l = stripe_l[found]
+    pos_r = pos_r_clipped[found]
+    keys_found = keys_l[found]
+    x_l = cols_l[found].astype(np.float32)
+
+    # Posizione relativa all'interno della striscia, riportata sulla striscia destra
+    width_l = (max_l[stripe_l] - min_l[stripe_l] + 1).astype(np.float32)
+    width_r = (max_r[pos_r] - min_r[pos_r] + 1).astype(np.float32)
+    x_r = min_r[pos_r] + (x_l - min_l[stripe_l]) * (width_r / width_l)
+
+    disparity = x_l - x_r
+    accepted = disparity > 0
+    if max_disparity is not None:
+        accepted &= disparity <= max_disparity
+
+    rows = (keys_found >> np.int64(num_bits))[accepted]
+    disparity_map[rows, x_l[accepted].astype(np.intp)] = disparity[accepted]
+    return disparity_map
+
+
+def _row_code_keys(codes: np.ndarray, valid: np.ndarray, num_bits: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Costruisce le chiavi combinate (riga, codice) dei pixel validi.
+
+    Returns:
+        Tupla (keys, cols) con chiavi int64 e colonne dei pixel
+    """
+    rows, cols = np.nonzero(valid)
+    keys = (rows.astype(np.int64) << np.int64(num_bits)) | codes[rows, cols].astype(np.int64)
+    return keys, cols
+
+
+def _stripe_extents(keys: np.ndarray, cols: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Raggruppa i pixel per chiave e calcola l'intervallo di colonne di ogni gruppo.
+
+    Returns:
+        Tupla (unique_keys, min_cols, max_cols), ordinata per chiave
+    """
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    sorted_cols = cols[order]
+
+    starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+    unique_keys = sorted_keys[starts]
+    min_cols = np.minimum.reduceat(sorted_cols, starts)
+    max_cols = np.maximum.reduceat(sorted_cols, starts)
+    return unique_keys, min_cols, max_cols
+
+
+def code_sequence_layout(num_pattern_images: int, code_type: str = "gray",
+                         include_horizontal: bool = True) -> Dict[str, List[int]]:
+    """
+    Determina quali immagini della sequenza codificano le colonne del proiettore.
+
+    La sequenza segue l'ordine del server (indici dopo white/black): per il Gray
+    code prima i pattern verticali, poi i loro inversi, poi gli orizzontali e i
+    loro inversi; per il codice binario i verticali precedono gli orizzontali,
+    senza inversi. Le sequenze abbreviate senza pattern orizzontali contengono
+    solo i verticali.
+
+    Args:
+        num_pattern_images: Numero di immagini pattern (esclusi white/black)
+        code_type: Tipo di codifica
+        include_horizontal: False se la sequenza non contiene pattern orizzontali
+
+    Returns:
+        Dizionario con gli indici relativi "vertical" e "vertical_inverse"
+        (lista vuota se la sequenza non contiene inversi)
+    """
+    directions = 2 if include_horizontal else 1
+
+    if code_type == "gray" and num_pattern_images >= 2 * directions and num_pattern_images % (2 * directions) == 0:
+        num_bits = num_pattern_images // (2 * directions)
+        return {
+            "vertical": list(range(num_bits)),
+            "vertical_inverse": list(range(num_bits, 2 * num_bits))
+        }
+
+    num_bits = max(1, num_pattern_images // directions)
+    return {
+        "vertical": list(range(min(num_bits, MAX_CODE_BITS))),
+        "vertical_inverse": []
+    }
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Motore di corrispondenza vettorizzato per la triangolazione a pattern progressivi.
+Sostituisce la ricerca pixel per pixel lungo le scanline con una ricerca del minimo
+a finestra scorrevole eseguita su intere bande di righe con NumPy/OpenCV.
+"""
+
+import logging
+import threading
+from typing import Optional, Tuple
+
+import numpy as np
+import cv2
+
+# Configurazione logging
+logger = logging.getLogger(__name__)
+
+# Parametri predefiniti della ricerca (coerenti con l'implementazione originale)
+DEFAULT_MAX_DISPARITY = 200
+DEFAULT_MATCH_THRESHOLD = 50
+
+# Numero di righe elaborate per volta: mantiene i buffer temporanei nella cache
+DEFAULT_BAND_HEIGHT = 64
+
+
+class ScanlineCorrespondenceEngine:
+    """
+    Motore di corrispondenza stereo lungo le scanline rettificate.
+
+    Per ogni pixel sinistro illuminato cerca, tra i pixel destri illuminati nelle
+    ``max_disparity`` colonne alla sua sinistra, quello con la minima differenza
+    assoluta di intensità. Invece di ciclare sui pixel, il motore itera sulle
+    disparità candidate e confronta intere bande di righe tramite broadcasting,
+    mantenendo per ogni pixel il minimo corrente e la disparità corrispondente.
+
+    Il contratto di accumulo è identico a quello di ``_update_disparity_from_pattern``:
+    le corrispondenze valide sommano ``disparity * pattern_weight`` alla mappa di
+    disparità e ``pattern_weight`` alla mappa di confidenza.
+
+    Con ``search_range`` (mappe per pixel delle disparità minima e massima, ad
+    esempio stimate ad una risoluzione più bassa) ogni pixel cerca solo nel suo
+    intervallo e ogni banda visita solo le disparità coperte dai suoi intervalli.
+    """
+
+    def __init__(self, max_disparity: int = DEFAULT_MAX_DISPARITY,
+                 match_threshold: int = DEFAULT_MATCH_THRESHOLD,
+                 band_height: int = DEFAULT_BAND_HEIGHT):
+        """
+        Inizializza il motore di corrispondenza.
+
+        Args:
+            max_disparity: Massima disparità cercata (colonne a sinistra del pixel)
+            match_threshold: Differenza assoluta massima per accettare una corrispondenza
+            band_height: Numero di righe elaborate per volta
+        """
+        self.max_disparity = int(max_disparity)
+        self.match_threshold = int(match_threshold)
+        self.band_height = max(1, int(band_height))
+
+    def match_band(self, pattern_l: np.ndarray, pattern_r: np.ndarray,
+                   shadow_mask_l: np.ndarray, shadow_mask_r: np.ndarray,
+                   cancel_event: Optional[threading.Event] = None,
+                   search_range: Optional[Tuple[np.ndarray, np.ndarray]] = None
+                   ) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Calcola la migliore disparità per ogni pixel di una banda di righe.
+
+        Args:
+            pattern_l, pattern_r: Bande rettificate (uint8, stessa forma)
+            shadow_mask_l, shadow_mask_r: Maschere di ombra della banda
+            cancel_event: Evento opzionale per interrompere il calcolo
+            search_range: Tupla (min, max) di mappe della banda con l'intervallo di
+                disparità di ogni pixel sinistro; i pixel con min > max non vengono cercati
+
+        Returns:
+            Tupla (disparity, matched): disparità intera per pixel e maschera delle
+            corrispondenze accettate, oppure None se l'elaborazione è stata annullata
+        """
+        height, width = pattern_l.shape[:2]
+        left = np.ascontiguousarray(pattern_l, dtype=np.uint8)
+        right = np.ascontiguousarray(pattern_r, dtype=np.uint8)
+
+        # Penalità massima sui pixel destri in ombra: equivale a escluderli dalla ricerca
+        right_penalty = np.where(shadow_mask_r > 0, 0, 255).astype(np.uint8)
+
+        best_diff = np.full((height, width), 255, dtype=np.uint8)
+        best_disp = np.zeros((height, width), dtype=np.int32)
+        diff = np.empty((height, width), dtype=np.uint8)
+
+        max_disparity = min(self.max_disparity, width - 1)
+        min_disparity = 1
+
+        if search_range is not None:
+            range_min = np.maximum(search_range[0], min_disparity).astype(np.int32)
+            range_max = np.minimum(search_range[1], max_disparity).astype(np.int32)
+            searched = range_max >= range_min
+            if not searched.any():
+                return best_disp, np.zeros((height, width), dtype=bool)
+            min_disparity = int(range_min[searched].min())
+            max_disparity = int(range_max[searched].max())
+
+            # Intervalli stretti rispetto alla loro estensione complessiva: si scorrono gli
+            # scostamenti dal minimo di ciascun pixel invece delle disparità assolute
+            span = int((range_max - range_min)[searched].max()) + 1
+            if span < max_disparity - min_disparity + 1:
+                result = self._match_band_guided(left, right, right_penalty, range_min, range_max,
+                                                 span, cancel_event)
+                if result is None:
+                    return None
+                best_diff, best_disp = result
+                max_disparity = 0
+
+        # Le disparità vengono visitate dalla più grande alla più piccola con confronto
+        # stretto: a parità di differenza vince la colonna destra più a sinistra,
+        # come nella ricerca sequenziale originale.
+        for d in range(max_disparity, min_disparity - 1, -1):
+            if cancel_event is not None and cancel_event.is_set():
+                return None
+
+            cols = width - d
+            diff_view = diff[:, :cols]
+            cv2.absdiff(left[:, d:], right[:, :cols], dst=diff_view)
+            np.maximum(diff_view, right_penalty[:, :cols], out=diff_view)
+
+            best_view = best_diff[:, d:]
+            better = diff_view < best_view
+            if search_range is not None:
+                better &= range_min[:, d:] <= d
+                better &= range_max[:, d:] >= d
+            np.copyto(best_view, diff_view, where=better)
+            np.copyto(best_disp[:, d:], d, where=better)
+
+        matched = ((best_diff < self.match_threshold) &
+                   (best_disp > 0) &
+                   (shadow_mask_l > 0))
+        return best_disp, matched
+
+    @staticmethod
+    def _match_band_guided(left, right, right_penalty, range_min, range_max, span, cancel_event=None):
+        """
+        Ricerca negli intervalli per pixel scorrendo gli scostamenti dal minimo.
+
+        Ad ogni passo k ogni pixel sinistro x viene confrontato con il pixel destro
+        x - (range_min + k), raccolto con cv2.remap: i passi sono l'ampiezza massima
+        degli intervalli invece dell'intera estensione delle disparità. Il risultato
+        coincide con quello della ricerca per disparità assolute sugli stessi intervalli.
+
+        Returns:
+            Tupla (best_diff, best_disp) o None se l'elaborazione è stata annullata
+        """
+        height, width = left.shape[:2]
+
+        # Pixel destri in ombra (e fuori immagine) fuori scala: la differenza supera sempre 255
+        excluded = 512
+        right_masked = right.astype(np.int16)
+        right_masked[right_penalty > 0] = excluded
+        left_wide = left.astype(np.int16)
+
+        map_y = np.repeat(np.arange(height, dtype=np.float32)[:, None], width, axis=1)
+        base_x = np.arange(width, dtype=np.float32) - range_min.astype(np.float32)
+        extent = range_max - range_min
+
+        best_diff = np.full((height, width), 255, dtype=np.int16)
+        best_offset = np.full((height, width), -1, dtype=np.int32)
+        map_x = np.empty((height, width), dtype=np.float32)
+        gathered = np.empty((height, width), dtype=np.int16)
+        diff = np.empty((height, width), dtype=np.int16)
+
+        for k in range(span - 1, -1, -1):
+            if cancel_event is not None and cancel_event.is_set():
+                return None
+
+            np.subtract(base_x, np.float32(k), out=map_x)
+            cv2.remap(right_masked, map_x, map_y, cv2.INTER_NEAREST, dst=gathered,
+                      borderMode=cv2.BORDER_CONSTANT, borderValue=excluded)
+            cv2.absdiff(left_wide, gathered, dst=diff)
+
+            better = diff < best_diff
+            better &= extent >= k
+            np.copyto(best_diff, diff, where=better)
+            np.copyto(best_offset, k, where=better)
+
+        best_disp = np.where(best_offset >= 0, range_min + best_offset, 0).astype(np.int32)
+        return best_diff, best_disp
+
+    def update_disparity(self, pattern_l: np.ndarray, pattern_r: np.ndarray,
+                         shadow_mask_l: np.ndarray, shadow_mask_r: np.ndarray,
+                         disparity_map: np.ndarray, confidence_map: np.ndarray,
+                         pattern_weight: float = 1.0,
+                         y_range: Optional[Tuple[int, int]] = None,
+                         x_range: Optional[Tuple[int, int]] = None,
+                         cancel_event: Optional[threading.Event] = None,
+                         search_range: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> bool:
+        """
+        Aggiorna le mappe di disparità e confidenza con una coppia di pattern.
+
+        Con ``x_range`` la ricerca include anche le ``max_disparity`` colonne a
+        sinistra dell'intervallo, quindi il risultato nelle colonne aggiornate è
+        identico a quello dell'elaborazione dell'intera riga.
+
+        Args:
+            pattern_l, pattern_r: Pattern rettificati sinistro e destro
+            shadow_mask_l, shadow_mask_r: Maschere di ombra
+            disparity_map, confidence_map: Mappe da aggiornare (modificate in-place)
+            pattern_weight: Peso del pattern
+            y_range: Tupla (y_start, y_end) per limitare le righe elaborate
+            x_range: Tupla (x_start, x_end) per limitare le colonne aggiornate
+            cancel_event: Evento opzionale per interrompere l'elaborazione
+            search_range: Tupla (min, max) di mappe HxW con l'intervallo di disparità
+                di ogni pixel (vedi ``match_band``); None per l'intervallo completo
+
+        Returns:
+            True se l'aggiornamento è stato completato, False se annullato
+        """
+        height, width = pattern_l.shape[:2]
+        y_start, y_end = y_range if y_range else (0, height)
+        y_start, y_end = max(0, y_start), min(height, y_end)
+        x_start, x_end = x_range if x_range else (0, width)
+        x_start, x_end = max(0, x_start), min(width, x_end)
+
+        # Margine a sinistra: le corrispondenze di x_start possono cadere fino a max_disparity colonne prima
+        search_cols = slice(max(0, x_start - self.max_disparity), x_end)
+        keep = slice(x_start - search_cols.start, None)
+
+        for band_start in range(y_start, y_end, self.band_height):
+            band_end = min(y_end, band_start + self.band_height)
+            rows = slice(band_start, band_end)
+
+            band_range = None
+            if search_range is not None:
+                band_range = (search_range[0][rows, search_cols], search_range[1][rows, search_cols])
+
+            result = self.match_band(
+                pattern_l[rows, search_cols], pattern_r[rows, search_cols],
+                shadow_mask_l[rows, search_cols], shadow_mask_r[rows, search_cols],
+                cancel_event=cancel_event, search_range=band_range
+            )
+            if result is None:
+                return False
+
+            best_disp, matched = result[0][:, keep], result[1][:, keep]
+            disparity_map[rows, x_start:x_end][matched] += best_disp[matched] * pattern_weight
+            confidence_map[rows, x_start:x_end][matched] += pattern_weight
+
+        return True
+
+
+# Istanza condivisa con i parametri predefiniti (il motore è privo di stato)
+_default_engine = ScanlineCorrespondenceEngine()
+
+
+def update_disparity_from_pattern(pattern_l, pattern_r, shadow_mask_l, shadow_mask_r,
+                                  disparity_map, confidence_map, pattern_weight=1.0,
+                                  y_range=None, x_range=None, cancel_event=None,
+                                  search_range=None) -> bool:
+    """
+    Scorciatoia per aggiornare le mappe con il motore predefinito.
+
+    Vedi ``ScanlineCorrespondenceEngine.update_disparity``.
+    """
+    return _default_engine.update_disparity(
+        pattern_l, pattern_r, shadow_mask_l, shadow_mask_r,
+        disparity_map, confidence_map,
+        pattern_weight=pattern_weight,
+        y_range=y_range,
+        x_range=x_range,
+        cancel_event=cancel_event,
+        search_range=search_range
+    )
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Filtri che preservano i bordi sulla mappa di disparità.
+Lo smussamento avviene sull'immagine di disparità, prima della riproiezione
+sparsa: costa un solo filtro 2D invece di una ricerca di vicini per punto. I
+pixel non validi restano nulli e non contaminano i vicini.
+"""
+
+import logging
+import time
+from typing import Optional
+
+import numpy as np
+import cv2
+
+# Configurazione logging
+logger = logging.getLogger(__name__)
+
+# Filtri disponibili ("none" disattiva lo smussamento)
+DISPARITY_FILTERS = ("none", "bilateral", "median")
+
+
+def smooth_disparity(disparity_map: np.ndarray, mask: Optional[np.ndarray] = None,
+                     method: str = "bilateral", kernel_size: int = 5,
+                     sigma_spatial: float = 2.0, sigma_disparity: float = 1.0) -> np.ndarray:
+    """
+    Smussa una mappa di disparità preservando i bordi.
+
+    Il bilaterale pesa i vicini anche per differenza di disparità, quindi i
+    pixel non validi (disparità nulla, lontani dai valori reali) e quelli
+    oltre un salto di profondità contano ~0. Il mediano sceglie sempre un
+    valore esistente; dove il risultato è nullo resta il valore originale.
+
+    Args:
+        disparity_map: Mappa di disparità HxW (0 dove non c'è corrispondenza)
+        mask: Maschera opzionale dei pixel validi
+        method: Uno tra DISPARITY_FILTERS
+        kernel_size: Diametro del vicinato (il mediano float accetta 3 o 5)
+        sigma_spatial: Sigma spaziale del bilaterale (pixel)
+        sigma_disparity: Sigma del bilaterale nel dominio della disparità (pixel)
+
+    Returns:
+        Mappa float32 filtrata, nulla fuori dai pixel validi
+    """
+    if method not in DISPARITY_FILTERS:
+        raise ValueError(f"Filtro di disparità non supportato: {method}")
+
+    valid = disparity_map > 0
+    if mask is not None:
+        valid &= mask > 0
+    disparity = np.where(valid, disparity_map, 0).astype(np.float32)
+
+    if method == "none":
+        return disparity
+
+    if method == "bilateral":
+        filtered = cv2.bilateralFilter(disparity, d=kernel_size, sigmaColor=sigma_disparity,
+                                       sigmaSpace=sigma_spatial)
+    else:
+        filtered = cv2.medianBlur(disparity, kernel_size)
+        filtered = np.where(filtered > 0, filtered, disparity)
+
+    return np.where(valid, filtered, 0).astype(np.float32, copy=False)
+
+
+class DisparitySmoother:
+    """
+    Stadio di smussamento configurabile delle pipeline di triangolazione,
+    con misura del costo per frame.
+    """
+
+    def __init__(self, method: str = "bilateral", kernel_size: int = 5,
+                 sigma_spatial: float = 2.0, sigma_disparity: float = 1.0):
+        """
+        Inizializza lo stadio.
+
+        Args:
+            method: Uno tra DISPARITY_FILTERS
+            kernel_size: Diametro del vicinato
+            sigma_spatial: Sigma spaziale del bilaterale (pixel)
+            sigma_disparity: Sigma del bilaterale nel dominio della disparità (pixel)
+        """
+        self.configure(method, kernel_size, sigma_spatial, sigma_disparity)
+        self.last_time_ms = 0.0
+        self.total_time_ms = 0.0
+        self.frames = 0
+
+    def configure(self, method: str = "bilateral", kernel_size: int = 5,
+                  sigma_spatial: float = 2.0, sigma_disparity: float = 1.0):
+        """Cambia filtro e parametri (stessi argomenti del costruttore)."""
+        if method not in DISPARITY_FILTERS:
+            raise ValueError(f"Filtro di disparità non supportato: {method}")
+        self.method = method
+        self.kernel_size = kernel_size
+        self.sigma_spatial = sigma_spatial
+        self.sigma_disparity = sigma_disparity
+
+    @property
+    def mean_time_ms(self) -> float:
+        """Costo medio per frame in millisecondi."""
+        return self.total_time_ms / self.frames if self.frames else 0.0
+
+    def __call__(self, disparity_map: np.ndarray, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Applica il filtro configurato e ne registra il costo.
+
+        Args:
+            disparity_map: Mappa di disparità HxW
+            mask: Maschera opzionale dei pixel validi
+
+        Returns:
+            Mappa float32 filtrata
+        """
+        start = time.perf_counter()
+        filtered = smooth_disparity(disparity_map, mask, self.method, self.kernel_size,
+                                    self.sigma_spatial, self.sigma_disparity)
+
+        self.last_time_ms = (time.perf_counter() - start) * 1000.0
+        self.total_time_ms += self.last_time_ms
+        self.frames += 1
+        logger.debug(f"Filtro disparità '{self.method}': {self.last_time_ms:.1f} ms")
+        return filtered
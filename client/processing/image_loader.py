@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Caricamento anticipato delle immagini di scansione.
+Le coppie sinistra/destra vengono lette e decompresse da un pool di thread
+(cv2.imread rilascia il GIL) con una finestra di lettura anticipata limitata,
+nell'ordine in cui i decodificatori le richiederanno: mentre un pattern viene
+elaborato, i successivi sono già in caricamento.
+"""
+
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+import cv2
+
+# Configurazione logging
+logger = logging.getLogger(__name__)
+
+# Numero massimo di elementi caricati in anticipo
+DEFAULT_READ_AHEAD = 8
+
+# Thread di caricamento predefiniti: la lettura da disco attende l'I/O anche
+# con un solo core, quindi il numero non dipende dai core disponibili
+DEFAULT_NUM_WORKERS = 4
+
+
+def read_image(path, flags: int = cv2.IMREAD_GRAYSCALE) -> Optional[np.ndarray]:
+    """
+    Legge un'immagine da file; i file .npy (array grezzi salvati da
+    BackgroundSaver) vengono caricati senza decodifica.
+
+    Args:
+        path: Percorso dell'immagine
+        flags: Flag di cv2.imread (per i .npy conta solo IMREAD_GRAYSCALE)
+
+    Returns:
+        Immagine o None se il file non è leggibile
+    """
+    path = str(path)
+    if not path.endswith(".npy"):
+        return cv2.imread(path, flags)
+
+    try:
+        image = np.load(path)
+    except (OSError, ValueError) as e:
+        logger.error(f"Impossibile leggere {path}: {e}")
+        return None
+    if flags == cv2.IMREAD_GRAYSCALE and image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return image
+
+
+def load_image_pair(left_paths: Sequence[str], right_paths: Sequence[str], index: int,
+                    flags: int = cv2.IMREAD_GRAYSCALE) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+    """
+    Carica una coppia di immagini sinistra/destra.
+
+    Args:
+        left_paths, right_paths: Percorsi delle immagini delle due camere
+        index: Indice della coppia
+        flags: Flag di cv2.imread (vedi read_image)
+
+    Returns:
+        Tupla (left, right); gli elementi sono None se l'immagine non è leggibile
+    """
+    if index >= len(left_paths) or index >= len(right_paths):
+        return None, None
+    return (read_image(left_paths[index], flags),
+            read_image(right_paths[index], flags))
+
+
+class PrefetchLoader:
+    """
+    Caricatore con lettura anticipata limitata.
+
+    ``get(index)`` restituisce l'elemento richiesto e pianifica il caricamento
+    dei successivi ``read_ahead`` elementi secondo l'ordine di accesso previsto
+    (per default 0..N-1, modificabile con ``set_order``). In memoria restano al
+    massimo ``read_ahead`` elementi non ancora consumati; le richieste fuori
+    dalla finestra vengono caricate in modo sincrono.
+    """
+
+    def __init__(self, load_fn: Callable[[int], Any], num_items: int,
+                 read_ahead: int = DEFAULT_READ_AHEAD, num_workers: Optional[int] = None,
+                 order: Optional[Iterable[int]] = None):
+        """
+        Inizializza il caricatore e avvia il caricamento dei primi elementi.
+
+        Args:
+            load_fn: Funzione che carica l'elemento di un indice
+            num_items: Numero di elementi disponibili
+            read_ahead: Numero massimo di elementi caricati in anticipo
+            num_workers: Numero di thread di caricamento
+            order: Ordine di accesso previsto (default: crescente)
+        """
+        self._load_fn = load_fn
+        self.num_items = int(num_items)
+        self.read_ahead = max(1, int(read_ahead))
+        self.num_workers = num_workers or DEFAULT_NUM_WORKERS
+
+        self._executor = ThreadPoolExecutor(max_workers=self.num_workers,
+                                            thread_name_prefix="ImagePrefetch")
+        self._lock = threading.Lock()
+        self._futures: Dict[int, Future] = {}
+        self._order = []
+        self._position: Dict[int, int] = {}
+        self._cursor = 0
+        self._closed = False
+
+        self.set_order(range(self.num_items) if order is None else order)
+
+    def set_order(self, indices: Iterable[int]):
+        """
+        Imposta l'ordine in cui gli elementi verranno richiesti e riavvia la
+        lettura anticipata dall'inizio di quell'ordine.
+
+        Args:
+            indices: Indici nell'ordine di accesso previsto
+        """
+        with self._lock:
+            self._order = [int(i) for i in indices if 0 <= i < self.num_items]
+            self._position = {}
+            for position, index in enumerate(self._order):
+                self._position.setdefault(index, position)
+            self._cursor = 0
+            self._schedule()
+
+    def get(self, index: int) -> Any:
+        """
+        Restituisce l'elemento di un indice, attendendo il suo caricamento.
+
+        Args:
+            index: Indice dell'elemento
+
+        Returns:
+            Il valore restituito da load_fn per l'indice
+        """
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("PrefetchLoader chiuso")
+
+            future = self._futures.pop(index, None)
+            position = self._position.get(index)
+            if position is not None and position >= self._cursor:
+                self._cursor = position + 1
+            self._schedule()
+
+        if future is None:
+            return self._load_fn(index)
+        return future.result()
+
+    def _schedule(self):
+        """Allinea i caricamenti in corso alla finestra successiva al cursore (con lock)."""
+        window = self._order[self._cursor:self._cursor + self.read_ahead]
+
+        # Elementi rimasti indietro o fuori finestra: non servono più in anticipo
+        for index in [i for i in self._futures if i not in window]:
+            self._futures.pop(index).cancel()
+
+        for index in window:
+            if index not in self._futures:
+                self._futures[index] = self._executor.submit(self._load_fn, index)
+
+    def close(self):
+        """Annulla i caricamenti in attesa e arresta i thread."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            for future in self._futures.values():
+                future.cancel()
+            self._futures = {}
+
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Strumentazione leggera delle pipeline di triangolazione.
+Ogni fase (caricamento, rettifica, decodifica, ...) viene misurata con uno
+span nominato; le durate confluiscono in istogrammi a finestra mobile
+interrogabili con ``get_performance_stats()``. I tempi sono esclusivi: uno span
+aperto dentro un altro (anche di un'altra istanza, nello stesso thread) viene
+sottratto dal genitore, così la somma delle fasi corrisponde al tempo reale.
+
+Da disattivata, ``span()`` restituisce un context manager vuoto condiviso e il
+costo si riduce a una chiamata di funzione: può restare attiva in produzione.
+La variabile d'ambiente UNLOOK_INSTRUMENTATION=0 la disattiva per default.
+"""
+
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import nullcontext
+from typing import Dict, Optional
+
+import numpy as np
+
+# Fasi standard delle pipeline (altri nomi sono comunque accettati)
+PIPELINE_STAGES = ("load", "rectify", "decode", "match", "filter", "reproject", "export")
+
+# Campioni conservati per fase per le statistiche a finestra mobile
+DEFAULT_HISTOGRAM_WINDOW = 256
+
+# Limiti superiori (ms) dei bucket degli istogrammi, in scala logaritmica
+HISTOGRAM_BUCKETS_MS = (0.1, 0.3, 1.0, 3.0, 10.0, 30.0, 100.0, 300.0, 1000.0, 3000.0, 10000.0)
+
+# Context manager vuoto restituito quando la strumentazione è disattivata
+_NULL_SPAN = nullcontext()
+
+# Pila degli span aperti, per thread: ogni voce è [tempo dei figli]
+_local = threading.local()
+
+
+def instrumentation_enabled_by_default() -> bool:
+    """Stato iniziale delle nuove istanze (UNLOOK_INSTRUMENTATION, attiva se assente)."""
+    return os.environ.get("UNLOOK_INSTRUMENTATION", "1").lower() not in ("0", "false", "no", "off")
+
+
+class StageHistogram:
+    """Durate di una fase: totali cumulativi e istogramma degli ultimi campioni."""
+
+    def __init__(self, window: int = DEFAULT_HISTOGRAM_WINDOW):
+        self._samples = deque(maxlen=window)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, duration_ms: float):
+        """Aggiunge un campione (millisecondi)."""
+        self._samples.append(duration_ms)
+        self.count += 1
+        self.total_ms += duration_ms
+        if duration_ms > self.max_ms:
+            self.max_ms = duration_ms
+
+    def summary(self) -> Dict:
+        """
+        Statistiche della fase.
+
+        Returns:
+            Dizionario con count, total_ms e max_ms cumulativi; last_ms, mean_ms,
+            p50_ms, p90_ms, p99_ms e buckets (conteggi per limite superiore in ms)
+            calcolati sulla finestra mobile
+        """
+        samples = np.fromiter(self._samples, dtype=np.float64, count=len(self._samples))
+        stats = {"count": self.count, "total_ms": self.total_ms, "max_ms": self.max_ms}
+        if not samples.size:
+            return stats
+
+        p50, p90, p99 = np.percentile(samples, (50, 90, 99))
+        counts = np.bincount(np.searchsorted(HISTOGRAM_BUCKETS_MS, samples),
+                             minlength=len(HISTOGRAM_BUCKETS_MS) + 1)
+        labels = [f"<={limit:g}" for limit in HISTOGRAM_BUCKETS_MS] + [f">{HISTOGRAM_BUCKETS_MS[-1]:g}"]
+        stats.update(last_ms=float(samples[-1]), mean_ms=float(samples.mean()),
+                     p50_ms=float(p50), p90_ms=float(p90), p99_ms=float(p99),
+                     buckets={label: int(n) for label, n in zip(labels, counts) if n})
+        return stats
+
+
+class _Span:
+    """Misura di una fase; registra il tempo esclusivo all'uscita."""
+    __slots__ = ("_owner", "_stage", "_start", "_children")
+
+    def __init__(self, owner: "PipelineInstrumentation", stage: str):
+        self._owner = owner
+        self._stage = stage
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        stack.append(self)
+        self._children = 0.0
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self._start
+        stack = _local.stack
+        stack.pop()
+        if stack:
+            stack[-1]._children += elapsed
+        self._owner.record(self._stage, (elapsed - self._children) * 1000.0)
+        return False
+
+
+class PipelineInstrumentation:
+    """
+    Raccolta dei tempi per fase di una pipeline.
+
+    Uso:
+        with instrumentation.span("rectify"):
+            ...
+        instrumentation.get_performance_stats()
+    """
+
+    def __init__(self, enabled: Optional[bool] = None, window: int = DEFAULT_HISTOGRAM_WINDOW):
+        """
+        Inizializza la raccolta.
+
+        Args:
+            enabled: Attiva la misura (default: instrumentation_enabled_by_default())
+            window: Campioni per fase conservati per le statistiche
+        """
+        self.enabled = instrumentation_enabled_by_default() if enabled is None else enabled
+        self.window = window
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, StageHistogram] = {}
+        self._run = defaultdict(float)
+        self._run_start = time.perf_counter()
+
+    def span(self, stage: str):
+        """
+        Context manager che misura una fase.
+
+        Args:
+            stage: Nome della fase (di norma uno tra PIPELINE_STAGES)
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, stage)
+
+    def record(self, stage: str, duration_ms: float):
+        """
+        Registra una durata misurata altrove.
+
+        Args:
+            stage: Nome della fase
+            duration_ms: Durata in millisecondi
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = StageHistogram(self.window)
+            histogram.add(duration_ms)
+            self._run[stage] += duration_ms
+
+    def begin_run(self):
+        """Inizia una nuova esecuzione (scansione): azzera la ripartizione per fase."""
+        with self._lock:
+            self._run = defaultdict(float)
+            self._run_start = time.perf_counter()
+
+    def run_breakdown(self) -> Dict[str, float]:
+        """
+        Tempo esclusivo per fase dall'ultimo ``begin_run``.
+
+        Returns:
+            Dizionario fase -> millisecondi, nell'ordine di PIPELINE_STAGES, con
+            "wall" = tempo trascorso dall'inizio dell'esecuzione
+        """
+        with self._lock:
+            run = dict(self._run)
+            wall_ms = (time.perf_counter() - self._run_start) * 1000.0
+        ordered = {stage: run.pop(stage) for stage in PIPELINE_STAGES if stage in run}
+        ordered.update(sorted(run.items()))
+        ordered["wall"] = wall_ms
+        return ordered
+
+    def format_breakdown(self) -> str:
+        """Ripartizione dell'esecuzione corrente come testo per i log."""
+        return " ".join(f"{stage}={ms:.0f}ms" for stage, ms in self.run_breakdown().items())
+
+    def get_performance_stats(self) -> Dict:
+        """
+        Statistiche di tutte le fasi misurate.
+
+        Returns:
+            Dizionario con enabled, stages (fase -> StageHistogram.summary())
+            e last_run (run_breakdown())
+        """
+        with self._lock:
+            histograms = dict(self._histograms)
+            summaries = {stage: histogram.summary() for stage, histogram in histograms.items()}
+        stages = {stage: summaries.pop(stage) for stage in PIPELINE_STAGES if stage in summaries}
+        stages.update(sorted(summaries.items()))
+        return {"enabled": self.enabled, "stages": stages, "last_run": self.run_breakdown()}
+
+    def reset(self):
+        """Azzera istogrammi e ripartizione."""
+        with self._lock:
+            self._histograms.clear()
+        self.begin_run()
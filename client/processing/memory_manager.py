@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Gestione a budget della memoria dei buffer di scansione.
+I buffer grandi (slot del buffer frame, stack dei pattern rettificati) vengono
+allocati con ``MemoryManager.allocate``, che ne conosce la dimensione reale.
+Quando un'allocazione supererebbe il budget, i buffer freddi (priorità minore,
+usati meno di recente) vengono spostati in un file temporaneo mappato in
+memoria (``np.memmap``) invece di essere scartati: restano leggibili e
+scrivibili e tornano in RAM al primo accesso per cui c'è di nuovo spazio. Le
+pagine di un buffer spostato sono gestite dal sistema operativo, che le scrive
+su disco solo se la memoria serve davvero.
+
+Un buffer viene spostato o riportato in RAM solo se nessuno lo sta
+scrivendo: chi scrive (o trattiene viste per scrivere) lo blocca con
+``pin``/``pinned``. Le viste ottenute prima di uno spostamento restano valide
+in lettura.
+
+Le allocazioni non spostabili (mappe di disparità, nuvole di punti) si
+registrano con ``register_allocation``: contano nel budget e, se serve,
+fanno spostare su disco i buffer freddi.
+"""
+
+import itertools
+import logging
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+# Configurazione logging
+logger = logging.getLogger(__name__)
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Budget predefinito dei buffer di scansione (MB)
+DEFAULT_BUDGET_MB = 2048
+
+# Memoria di sistema da lasciare comunque libera (frazione del totale)
+SYSTEM_RESERVE_FRACTION = 0.1
+
+# Validità della lettura della memoria di sistema (s): evita una chiamata a psutil per accesso
+SYSTEM_MEMORY_CACHE_S = 0.5
+
+_MB = 1024 * 1024
+
+
+class ManagedBuffer:
+    """
+    Array registrato nel MemoryManager, in RAM o spostato su file mappato.
+    L'array corrente si ottiene con ``array``; non va conservato oltre l'uso
+    immediato se non si blocca il buffer con ``pin``.
+    """
+
+    def __init__(self, manager: "MemoryManager", buffer_id: str, shape: Tuple[int, ...], dtype,
+                 priority: int, allocation_type: str):
+        self.id = buffer_id
+        self.shape = tuple(int(s) for s in shape)
+        self.dtype = np.dtype(dtype)
+        self.priority = priority
+        self.allocation_type = allocation_type
+        self.last_access = time.monotonic()
+
+        self._manager = manager
+        self._array: Optional[np.ndarray] = None
+        self._spill_file = None
+        self._pins = 0
+
+    @property
+    def nbytes(self) -> int:
+        return int(np.prod(self.shape)) * self.dtype.itemsize
+
+    @property
+    def spilled(self) -> bool:
+        """True se il buffer risiede nel file temporaneo."""
+        return self._spill_file is not None
+
+    @property
+    def array(self) -> np.ndarray:
+        """Array corrente (riportato in RAM se spostato e se il budget lo consente)."""
+        return self._manager._access(self)
+
+    def pin(self) -> np.ndarray:
+        """Impedisce lo spostamento del buffer fino a ``unpin`` e restituisce l'array."""
+        with self._manager._lock:
+            array = self._manager._access(self)
+            self._pins += 1
+            return array
+
+    def unpin(self):
+        """Annulla un ``pin``."""
+        with self._manager._lock:
+            if self._pins > 0:
+                self._pins -= 1
+
+    @contextmanager
+    def pinned(self):
+        """Context manager che blocca il buffer e restituisce l'array."""
+        array = self.pin()
+        try:
+            yield array
+        finally:
+            self.unpin()
+
+    def release(self):
+        """Rilascia il buffer (le viste già ottenute restano valide)."""
+        self._manager._release(self)
+
+
+class MemoryManager:
+    """
+    Gestore della memoria dei buffer di scansione con budget fisso.
+    Sotto pressione sposta su disco i buffer freddi invece di liberarli, quindi
+    i dati della scansione in corso non vengono mai persi.
+    """
+
+    def __init__(self, max_memory_usage_mb=DEFAULT_BUDGET_MB, spill_dir=None):
+        """
+        Inizializza il memory manager.
+
+        Args:
+            max_memory_usage_mb: Budget dei buffer in MB (ridotto automaticamente se la
+                memoria libera del sistema è inferiore)
+            spill_dir: Directory dei file temporanei (default: directory temporanea di sistema)
+        """
+        self.max_memory_usage_mb = max_memory_usage_mb
+        self.spill_dir = spill_dir
+        self._lock = threading.RLock()
+
+        self._buffers: Dict[str, ManagedBuffer] = {}
+        self._allocations = {}
+        self._resident_bytes = 0
+        self._ids = itertools.count()
+
+        self._system_available = None
+        self._system_checked = 0.0
+
+        self._stats = {'spills': 0, 'page_ins': 0, 'spilled_bytes_total': 0}
+
+    def _budget_bytes(self) -> int:
+        """Budget effettivo: il minore tra quello configurato e quanto il sistema può ancora dare."""
+        budget = int(self.max_memory_usage_mb * _MB)
+        if psutil is None:
+            return budget
+
+        now = time.monotonic()
+        if self._system_available is None or now - self._system_checked > SYSTEM_MEMORY_CACHE_S:
+            mem = psutil.virtual_memory()
+            self._system_available = mem.available - int(mem.total * SYSTEM_RESERVE_FRACTION)
+            self._system_checked = now
+
+        return min(budget, self._resident_bytes + max(0, self._system_available))
+
+    def allocate(self, name: str, shape, dtype=np.uint8, priority: int = 5,
+                 allocation_type: str = 'buffer') -> ManagedBuffer:
+        """
+        Alloca un buffer gestito (contenuto non inizializzato, come np.empty).
+        Se non c'è spazio nel budget anche spostando i buffer più freddi, il
+        buffer viene creato direttamente su file.
+
+        Args:
+            name: Nome del buffer (l'ID univoco viene generato da questo)
+            shape: Forma dell'array
+            dtype: Tipo degli elementi
+            priority: Priorità (1-10, i buffer a priorità minore vengono spostati per primi)
+            allocation_type: Tipo di allocazione per le statistiche
+
+        Returns:
+            ManagedBuffer
+        """
+        with self._lock:
+            buffer = ManagedBuffer(self, f"{name}#{next(self._ids)}", shape, dtype, priority, allocation_type)
+
+            if buffer.nbytes == 0 or self._make_room(buffer.nbytes):
+                buffer._array = np.empty(buffer.shape, dtype=buffer.dtype)
+                self._resident_bytes += buffer.nbytes
+            else:
+                self._map_to_file(buffer)
+                logger.info(f"Budget di memoria esaurito: {buffer.id} "
+                            f"({buffer.nbytes / _MB:.1f}MB) allocato su file")
+
+            self._buffers[buffer.id] = buffer
+            return buffer
+
+    def _make_room(self, nbytes: int) -> bool:
+        """Sposta su file i buffer più freddi finché ``nbytes`` rientrano nel budget."""
+        excess = self._resident_bytes + nbytes - self._budget_bytes()
+        if excess <= 0:
+            return True
+
+        candidates = sorted((b for b in self._buffers.values()
+                             if not b.spilled and b._pins == 0 and b.nbytes > 0),
+                            key=lambda b: (b.priority, b.last_access))
+        for buffer in candidates:
+            self._spill(buffer)
+            excess -= buffer.nbytes
+            if excess <= 0:
+                return True
+        return False
+
+    def _map_to_file(self, buffer: ManagedBuffer) -> np.ndarray:
+        """Crea il file temporaneo mappato del buffer e lo rende l'array corrente."""
+        spill_file = tempfile.TemporaryFile(prefix="unlook_spill_", dir=self.spill_dir)
+        mapped = np.memmap(spill_file, dtype=buffer.dtype, mode="w+", shape=buffer.shape)
+        buffer._array = mapped
+        buffer._spill_file = spill_file
+        return mapped
+
+    def _spill(self, buffer: ManagedBuffer):
+        """Sposta su file un buffer in RAM (con il lock acquisito e il buffer non bloccato)."""
+        in_memory = buffer._array
+        mapped = self._map_to_file(buffer)
+        mapped[...] = in_memory
+
+        self._resident_bytes -= buffer.nbytes
+        self._stats['spills'] += 1
+        self._stats['spilled_bytes_total'] += buffer.nbytes
+        logger.info(f"Buffer {buffer.id} ({buffer.nbytes / _MB:.1f}MB) spostato su file")
+
+    def _page_in(self, buffer: ManagedBuffer):
+        """Riporta in RAM un buffer spostato, se entra nel budget senza spostarne altri."""
+        if buffer._pins or self._resident_bytes + buffer.nbytes > self._budget_bytes():
+            return
+
+        in_memory = np.empty(buffer.shape, dtype=buffer.dtype)
+        np.copyto(in_memory, buffer._array)
+        self._close_file(buffer)
+        buffer._array = in_memory
+
+        self._resident_bytes += buffer.nbytes
+        self._stats['page_ins'] += 1
+        logger.debug(f"Buffer {buffer.id} riportato in RAM")
+
+    @staticmethod
+    def _close_file(buffer: ManagedBuffer):
+        """Chiude il file temporaneo (la mappatura resta valida per le viste esistenti)."""
+        if buffer._spill_file is not None:
+            buffer._spill_file.close()
+            buffer._spill_file = None
+
+    def _access(self, buffer: ManagedBuffer) -> np.ndarray:
+        """Aggiorna l'ultimo accesso e restituisce l'array corrente del buffer."""
+        with self._lock:
+            if buffer._array is None:
+                raise RuntimeError(f"Buffer {buffer.id} già rilasciato")
+            buffer.last_access = time.monotonic()
+            if buffer.spilled:
+                self._page_in(buffer)
+            return buffer._array
+
+    def _release(self, buffer: ManagedBuffer):
+        """Rimuove un buffer dal manager."""
+        with self._lock:
+            if self._buffers.pop(buffer.id, None) is None:
+                return
+            if buffer.spilled:
+                self._close_file(buffer)
+            else:
+                self._resident_bytes -= buffer.nbytes
+            buffer._array = None
+
+    def register_allocation(self, allocation_id, size_mb, allocation_type='buffer',
+                            priority=3, cleanup_callback=None):
+        """
+        Registra un'allocazione non spostabile, sostituendo quella con lo stesso ID.
+        Se supera il budget, i buffer gestiti più freddi vengono spostati su file.
+
+        Args:
+            allocation_id: ID univoco dell'allocazione
+            size_mb: Dimensione in MB
+            allocation_type: Tipo di allocazione ('buffer', 'cache', etc.)
+            priority: Priorità (1-10, 10 è priorità massima)
+            cleanup_callback: Non più invocata (mantenuta per compatibilità): la
+                memoria viene recuperata spostando su file, mai scartando dati
+        """
+        with self._lock:
+            self.unregister_allocation(allocation_id)
+
+            size_bytes = int(size_mb * _MB)
+            self._make_room(size_bytes)
+            self._allocations[allocation_id] = {
+                'size': size_bytes,
+                'type': allocation_type,
+                'priority': priority,
+                'timestamp': time.time()
+            }
+            self._resident_bytes += size_bytes
+
+    def unregister_allocation(self, allocation_id):
+        """
+        Deregistra un'allocazione di memoria.
+
+        Args:
+            allocation_id: ID dell'allocazione da rimuovere
+        """
+        with self._lock:
+            info = self._allocations.pop(allocation_id, None)
+            if info is not None:
+                self._resident_bytes -= info['size']
+
+    def check_available_memory(self, requested_mb):
+        """
+        Verifica se una nuova allocazione può restare in RAM, eventualmente
+        spostando su file i buffer non bloccati.
+
+        Args:
+            requested_mb: Memoria richiesta in MB
+
+        Returns:
+            True se la memoria è disponibile, False altrimenti
+        """
+        with self._lock:
+            movable = sum(b.nbytes for b in self._buffers.values() if not b.spilled and b._pins == 0)
+            return self._resident_bytes - movable + requested_mb * _MB <= self._budget_bytes()
+
+    def get_stats(self):
+        """
+        Restituisce statistiche sull'utilizzo della memoria.
+
+        Returns:
+            Dizionario con memoria residente e spostata su file (MB), budget,
+            numero di allocazioni, memoria residente per tipo e contatori
+            degli spostamenti
+        """
+        with self._lock:
+            by_type = {}
+            for info in self._allocations.values():
+                by_type[info['type']] = by_type.get(info['type'], 0) + info['size']
+            for buffer in self._buffers.values():
+                if not buffer.spilled:
+                    by_type[buffer.allocation_type] = by_type.get(buffer.allocation_type, 0) + buffer.nbytes
+
+            return {
+                'current_usage_mb': self._resident_bytes / _MB,
+                'max_memory_mb': self.max_memory_usage_mb,
+                'budget_mb': self._budget_bytes() / _MB,
+                'spilled_mb': sum(b.nbytes for b in self._buffers.values() if b.spilled) / _MB,
+                'num_allocations': len(self._allocations) + len(self._buffers),
+                'allocations_by_type': {alloc_type: size / _MB for alloc_type, size in by_type.items()},
+                'spills': self._stats['spills'],
+                'page_ins': self._stats['page_ins'],
+                'spilled_total_mb': self._stats['spilled_bytes_total'] / _MB
+            }
+
+    def close(self):
+        """Rilascia tutti i buffer gestiti e i relativi file temporanei."""
+        with self._lock:
+            for buffer in list(self._buffers.values()):
+                self._release(buffer)
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Nuvola di punti organizzata sulla griglia dell'immagine rettificata.
+Ogni pixel della camera sinistra conserva il proprio punto XYZ, insieme a una
+maschera di validità e a piani opzionali di intensità e confidenza. Vicinato,
+normali, filtri sulla profondità e mesh di griglia diventano operazioni su
+immagini con accesso diretto per indice; la nuvola piatta Nx3 viene estratta
+solo quando serve.
+"""
+
+import logging
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import cv2
+
+from client.processing.reprojection import reproject_sparse
+
+# Configurazione logging
+logger = logging.getLogger(__name__)
+
+# Filtri disponibili per la mappa di profondità
+DEPTH_FILTERS = ("bilateral", "median")
+
+
+class OrganizedPointCloud:
+    """
+    Nuvola di punti HxW: piano XYZ float32, maschera dei pixel validi e piani
+    opzionali di intensità e confidenza. I pixel non validi hanno XYZ nullo.
+    """
+
+    def __init__(self, xyz: np.ndarray, valid: Optional[np.ndarray] = None,
+                 intensity: Optional[np.ndarray] = None, confidence: Optional[np.ndarray] = None):
+        """
+        Inizializza la nuvola organizzata.
+
+        Args:
+            xyz: Griglia HxWx3 delle coordinate
+            valid: Maschera HxW dei pixel validi (default: punti finiti)
+            intensity: Piano HxW di intensità (opzionale)
+            confidence: Piano HxW di confidenza (opzionale)
+        """
+        xyz = np.asarray(xyz, dtype=np.float32)
+        if xyz.ndim != 3 or xyz.shape[2] != 3:
+            raise ValueError(f"Griglia XYZ non valida: {xyz.shape}")
+
+        if valid is None:
+            valid = np.isfinite(xyz).all(axis=2)
+        valid = np.asarray(valid, dtype=bool)
+        if valid.shape != xyz.shape[:2]:
+            raise ValueError(f"Maschera {valid.shape} incompatibile con la griglia {xyz.shape[:2]}")
+
+        for name, plane in (("intensity", intensity), ("confidence", confidence)):
+            if plane is not None and plane.shape[:2] != xyz.shape[:2]:
+                raise ValueError(f"Piano {name} {plane.shape} incompatibile con la griglia {xyz.shape[:2]}")
+
+        self.xyz = xyz
+        self.valid = valid
+        self.intensity = intensity
+        self.confidence = confidence
+
+        self._pixel_indices = None
+        self._points = None
+
+    @classmethod
+    def from_disparity(cls, disparity_map: np.ndarray, Q: np.ndarray, mask: Optional[np.ndarray] = None,
+                       max_range: Optional[float] = None, intensity: Optional[np.ndarray] = None,
+                       confidence: Optional[np.ndarray] = None) -> "OrganizedPointCloud":
+        """
+        Crea la nuvola riproiettando i soli pixel validi di una mappa di disparità.
+
+        Args:
+            disparity_map: Mappa di disparità HxW
+            Q: Matrice di riproiezione 4x4
+            mask: Maschera opzionale dei pixel da riproiettare
+            max_range: Se indicato, scarta i punti con una coordinata >= max_range in valore assoluto
+            intensity: Piano HxW di intensità (opzionale)
+            confidence: Piano HxW di confidenza (opzionale)
+
+        Returns:
+            OrganizedPointCloud con la forma della mappa di disparità
+        """
+        points, pixel_indices = reproject_sparse(disparity_map, Q, mask, max_range=max_range)
+        return cls.from_points(points, pixel_indices, disparity_map.shape[:2], intensity, confidence)
+
+    @classmethod
+    def from_points(cls, points: np.ndarray, pixel_indices: np.ndarray, shape: Tuple[int, int],
+                    intensity: Optional[np.ndarray] = None,
+                    confidence: Optional[np.ndarray] = None) -> "OrganizedPointCloud":
+        """
+        Crea la nuvola da punti piatti e dagli indici lineari dei pixel di origine.
+
+        Args:
+            points: Punti Nx3
+            pixel_indices: Indici lineari (riga * W + colonna) dei punti
+            shape: Forma (H, W) della griglia
+            intensity: Piano HxW di intensità (opzionale)
+            confidence: Piano HxW di confidenza (opzionale)
+
+        Returns:
+            OrganizedPointCloud
+        """
+        height, width = shape
+        xyz = np.zeros((height * width, 3), dtype=np.float32)
+        valid = np.zeros(height * width, dtype=bool)
+        xyz[pixel_indices] = points[:, :3]
+        valid[pixel_indices] = True
+
+        cloud = cls(xyz.reshape(height, width, 3), valid.reshape(height, width), intensity, confidence)
+        cloud._pixel_indices = np.asarray(pixel_indices)
+        return cloud
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        """Forma (H, W) della griglia."""
+        return self.valid.shape
+
+    @property
+    def depth(self) -> np.ndarray:
+        """Piano HxW della coordinata Z (vista, non copia)."""
+        return self.xyz[:, :, 2]
+
+    @property
+    def pixel_indices(self) -> np.ndarray:
+        """Indici lineari dei pixel validi, in ordine di riga."""
+        if self._pixel_indices is None:
+            self._pixel_indices = np.flatnonzero(self.valid)
+        return self._pixel_indices
+
+    @property
+    def points(self) -> np.ndarray:
+        """Nuvola piatta Nx3 dei soli punti validi, estratta al primo accesso."""
+        if self._points is None:
+            self._points = self.xyz.reshape(-1, 3)[self.pixel_indices]
+        return self._points
+
+    @property
+    def nbytes(self) -> int:
+        """Memoria occupata dai piani della griglia e dalla nuvola piatta in cache."""
+        arrays = (self.xyz, self.valid, self.intensity, self.confidence, self._pixel_indices, self._points)
+        return sum(a.nbytes for a in arrays if a is not None)
+
+    def __len__(self) -> int:
+        return len(self.pixel_indices)
+
+    def invalidate(self):
+        """Scarta la nuvola piatta in cache dopo una modifica di xyz o valid."""
+        self._pixel_indices = None
+        self._points = None
+
+    def point_attributes(self) -> Dict[str, np.ndarray]:
+        """
+        Attributi per punto allineati a ``points``.
+
+        Returns:
+            Dizionario con le voci "intensity" e "confidence" disponibili
+        """
+        attributes = {}
+        for name, plane in (("intensity", self.intensity), ("confidence", self.confidence)):
+            if plane is not None:
+                attributes[name] = plane.reshape((self.valid.size,) + plane.shape[2:])[self.pixel_indices]
+        return attributes
+
+    def neighbors(self, row: int, col: int, radius: int = 1) -> np.ndarray:
+        """
+        Punti validi nella finestra (2*radius+1)^2 attorno a un pixel.
+
+        Args:
+            row, col: Pixel centrale
+            radius: Semi-ampiezza della finestra in pixel
+
+        Returns:
+            Punti Kx3 dei vicini validi (incluso il pixel centrale, se valido)
+        """
+        height, width = self.shape
+        rows = slice(max(0, row - radius), min(height, row + radius + 1))
+        cols = slice(max(0, col - radius), min(width, col + radius + 1))
+        return self.xyz[rows, cols][self.valid[rows, cols]]
+
+    def estimate_normals(self) -> np.ndarray:
+        """
+        Normali per pixel dalle differenze centrali sulla griglia.
+
+        La normale è il prodotto vettoriale delle tangenti orizzontale e
+        verticale, orientata verso la camera. Vale zero dove un vicino manca.
+
+        Returns:
+            Griglia HxWx3 float32 di normali unitarie
+        """
+        normals = np.zeros_like(self.xyz)
+        if min(self.shape) < 3:
+            return normals
+
+        xyz, valid = self.xyz, self.valid
+        tangent_u = xyz[1:-1, 2:] - xyz[1:-1, :-2]
+        tangent_v = xyz[2:, 1:-1] - xyz[:-2, 1:-1]
+        support = (valid[1:-1, 1:-1] & valid[1:-1, 2:] & valid[1:-1, :-2]
+                   & valid[2:, 1:-1] & valid[:-2, 1:-1])
+
+        inner = np.cross(tangent_u, tangent_v)
+        norm = np.linalg.norm(inner, axis=2, keepdims=True)
+        support &= norm[:, :, 0] > 0
+        inner = np.divide(inner, norm, out=np.zeros_like(inner), where=support[:, :, None])
+
+        # Orienta verso la camera (origine del sistema rettificato)
+        facing_away = np.einsum("ijk,ijk->ij", inner, xyz[1:-1, 1:-1]) > 0
+        inner[facing_away] *= -1
+
+        normals[1:-1, 1:-1] = inner
+        return normals
+
+    def filter_depth(self, method: str = "bilateral", kernel_size: int = 5,
+                     sigma_spatial: float = 2.0, sigma_depth: float = 1.0) -> "OrganizedPointCloud":
+        """
+        Filtra la mappa di profondità e sposta ogni punto lungo il proprio raggio.
+
+        I pixel non validi (profondità nulla) non entrano nel risultato: nel
+        bilaterale pesano ~0 perché lontani in profondità, nel mediano un
+        risultato nullo lascia il valore originale. La maschera non cambia.
+
+        Args:
+            method: "bilateral" o "median"
+            kernel_size: Diametro del vicinato (il mediano float accetta 3 o 5)
+            sigma_spatial: Sigma spaziale del bilaterale (pixel)
+            sigma_depth: Sigma di profondità del bilaterale (stessa unità dei punti)
+
+        Returns:
+            Nuova OrganizedPointCloud filtrata
+        """
+        if method not in DEPTH_FILTERS:
+            raise ValueError(f"Filtro di profondità non supportato: {method}")
+
+        depth = np.where(self.valid, self.depth, 0).astype(np.float32)
+
+        if method == "bilateral":
+            filtered = cv2.bilateralFilter(depth, d=kernel_size, sigmaColor=sigma_depth,
+                                           sigmaSpace=sigma_spatial)
+        else:
+            filtered = cv2.medianBlur(depth, kernel_size)
+
+        usable = self.valid & (filtered > 0) & (depth != 0)
+        scale = np.ones(self.shape, dtype=np.float32)
+        np.divide(filtered, depth, out=scale, where=usable)
+
+        # X e Y sono proporzionali a Z lungo il raggio del pixel
+        xyz = self.xyz * scale[:, :, None]
+        return OrganizedPointCloud(xyz, self.valid.copy(), self.intensity, self.confidence)
+
+    def grid_mesh(self, max_edge: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Triangola la griglia: due triangoli per ogni quadrato di pixel adiacenti.
+
+        Args:
+            max_edge: Lunghezza massima dei lati; i triangoli più lunghi (salti di
+                profondità) vengono scartati
+
+        Returns:
+            Tupla (vertices, triangles): ``vertices`` coincide con ``points`` e
+            ``triangles`` è un array Mx3 int32 di indici nei vertici
+        """
+        height, width = self.shape
+        lookup = np.full(height * width, -1, dtype=np.int64)
+        lookup[self.pixel_indices] = np.arange(len(self.pixel_indices))
+        lookup = lookup.reshape(height, width)
+
+        top_left, top_right = lookup[:-1, :-1], lookup[:-1, 1:]
+        bottom_left, bottom_right = lookup[1:, :-1], lookup[1:, 1:]
+
+        candidates = np.concatenate([
+            np.stack([top_left, bottom_left, top_right], axis=-1).reshape(-1, 3),
+            np.stack([top_right, bottom_left, bottom_right], axis=-1).reshape(-1, 3),
+        ])
+        triangles = candidates[(candidates >= 0).all(axis=1)]
+
+        vertices = self.points
+        if max_edge is not None and len(triangles):
+            a, b, c = (vertices[triangles[:, i]] for i in range(3))
+            longest = np.maximum.reduce([
+                np.linalg.norm(a - b, axis=1),
+                np.linalg.norm(b - c, axis=1),
+                np.linalg.norm(c - a, axis=1),
+            ])
+            triangles = triangles[longest <= max_edge]
+
+        return vertices, triangles.astype(np.int32)
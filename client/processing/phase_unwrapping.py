@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Srotolamento temporale multi-frequenza per la pipeline a spostamento di fase.
+Calcola la fase assoluta per ogni pixel da 2-3 insiemi di frange a frequenze
+diverse (gerarchico o eterodina), senza np.unwrap spaziale, e trova le
+corrispondenze sinistra/destra per ricerca della fase assoluta lungo le righe
+rettificate con precisione sub-pixel.
+"""
+
+import logging
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Configurazione logging
+logger = logging.getLogger(__name__)
+
+TWO_PI = 2.0 * np.pi
+
+# Frequenze predefinite (periodi sull'intera larghezza del proiettore)
+DEFAULT_FREQUENCIES = (1, 8, 64)
+
+# Modulazione minima (in livelli di grigio) per considerare affidabile la fase
+DEFAULT_MIN_MODULATION = 5.0
+
+# Distanza massima in colonne tra i due campioni destri usati per l'interpolazione
+DEFAULT_MAX_INTERPOLATION_GAP = 2.0
+
+
+def compute_wrapped_phase(images: Sequence[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Calcola la fase avvolta con l'algoritmo generale a N passi.
+
+    Le immagini seguono il modello I_n = A + B·cos(φ - 2πn/N).
+
+    Args:
+        images: Lista di N >= 3 immagini della stessa frequenza
+
+    Returns:
+        Tupla (phase, modulation): fase in [0, 2π) e ampiezza B per pixel (float32)
+    """
+    num_steps = len(images)
+    if num_steps < 3:
+        raise ValueError("Servono almeno 3 immagini per calcolare la fase")
+
+    numerator = np.zeros(images[0].shape, dtype=np.float32)
+    denominator = np.zeros(images[0].shape, dtype=np.float32)
+
+    for n, image in enumerate(images):
+        delta = TWO_PI * n / num_steps
+        image = image.astype(np.float32, copy=False)
+        numerator += image * np.float32(np.sin(delta))
+        denominator += image * np.float32(np.cos(delta))
+
+    phase = np.mod(np.arctan2(numerator, denominator), TWO_PI).astype(np.float32)
+    modulation = (2.0 / num_steps) * np.sqrt(numerator ** 2 + denominator ** 2)
+    return phase, modulation.astype(np.float32)
+
+
+def wrap_phase(phase: np.ndarray) -> np.ndarray:
+    """Riporta una fase nell'intervallo [0, 2π)."""
+    return np.mod(phase, TWO_PI)
+
+
+def unwrap_temporal(phases: Sequence[np.ndarray], frequencies: Sequence[float]) -> np.ndarray:
+    """
+    Srotolamento temporale gerarchico.
+
+    La frequenza più bassa deve coprire l'intera larghezza con un solo periodo
+    (frequenza 1), quindi la sua fase è già assoluta; ogni livello successivo
+    usa la fase assoluta del precedente, scalata per il rapporto di frequenze,
+    per scegliere l'ordine di frangia.
+
+    Args:
+        phases: Fasi avvolte ordinate per frequenza crescente
+        frequencies: Frequenze corrispondenti (la prima deve valere 1)
+
+    Returns:
+        Fase assoluta della frequenza più alta (float32)
+    """
+    if len(phases) != len(frequencies) or not phases:
+        raise ValueError("Numero di fasi e frequenze non coerente")
+    if frequencies[0] != 1:
+        raise ValueError("La frequenza più bassa deve essere 1 per lo srotolamento gerarchico")
+
+    absolute = phases[0].astype(np.float32)
+    for k in range(1, len(phases)):
+        ratio = np.float32(frequencies[k] / frequencies[k - 1])
+        order = np.round((absolute * ratio - phases[k]) / np.float32(TWO_PI))
+        absolute = phases[k] + np.float32(TWO_PI) * order
+
+    return absolute.astype(np.float32)
+
+
+def heterodyne_chain(phases: Sequence[np.ndarray],
+                     frequencies: Sequence[float]) -> Tuple[List[np.ndarray], List[float]]:
+    """
+    Costruisce la catena di fasi di battimento (metodo eterodina).
+
+    Sottraendo fasi di frequenze vicine si ottengono fasi a frequenza equivalente
+    più bassa; il processo si ripete finché resta un solo battimento, che deve
+    avere frequenza 1 (es. 64, 57, 51 -> 7, 6 -> 1).
+
+    Args:
+        phases: Fasi avvolte
+        frequencies: Frequenze corrispondenti
+
+    Returns:
+        Tupla (phases, frequencies) ordinata per frequenza crescente, adatta a
+        ``unwrap_temporal``
+    """
+    order = np.argsort(frequencies)[::-1]
+    level = [(phases[i], float(frequencies[i])) for i in order]
+
+    chain = [level[0]]
+    while len(level) > 1:
+        level = [(wrap_phase(level[i][0] - level[i + 1][0]), level[i][1] - level[i + 1][1])
+                 for i in range(len(level) - 1)]
+        chain.append(level[0])
+
+    if abs(chain[-1][1] - 1.0) > 1e-6:
+        raise ValueError(f"Le frequenze {list(frequencies)} non producono un battimento unitario")
+
+    chain.reverse()
+    return [phase for phase, _ in chain], [freq for _, freq in chain]
+
+
+def unwrap_multi_frequency(phases: Sequence[np.ndarray], frequencies: Sequence[float]) -> np.ndarray:
+    """
+    Calcola la fase assoluta da più insiemi di frequenze.
+
+    Se è presente la frequenza unitaria usa lo srotolamento gerarchico, altrimenti
+    ricava la catena con il metodo eterodina.
+
+    Args:
+        phases: Fasi avvolte, una per frequenza
+        frequencies: Frequenze corrispondenti
+
+    Returns:
+        Fase assoluta della frequenza più alta, in [0, 2π·f_max)
+    """
+    if min(frequencies) == 1:
+        order = np.argsort(frequencies)
+        return unwrap_temporal([phases[i] for i in order], [frequencies[i] for i in order])
+
+    chain_phases, chain_frequencies = heterodyne_chain(phases, frequencies)
+    return unwrap_temporal(chain_phases, chain_frequencies)
+
+
+def decode_phase_sequence(images: Sequence[np.ndarray], frequencies: Sequence[float],
+                          num_steps: int, shadow_mask: Optional[np.ndarray] = None,
+                          min_modulation: float = DEFAULT_MIN_MODULATION
+                          ) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Decodifica una sequenza di frange in fase assoluta per una camera.
+
+    Args:
+        images: Immagini rettificate, raggruppate per frequenza (num_steps ciascuna)
+        frequencies: Frequenze nell'ordine della sequenza
+        num_steps: Numero di passi di fase per frequenza
+        shadow_mask: Maschera dei pixel illuminati (opzionale)
+        min_modulation: Modulazione minima per considerare valido un pixel
+
+    Returns:
+        Tupla (absolute_phase, valid_mask)
+    """
+    if len(images) < num_steps * len(frequencies):
+        raise ValueError("Immagini insufficienti per le frequenze richieste")
+
+    phases = []
+    valid = np.ones(images[0].shape[:2], dtype=bool) if shadow_mask is None else shadow_mask > 0
+
+    for k in range(len(frequencies)):
+        group = images[k * num_steps:(k + 1) * num_steps]
+        phase, modulation = compute_wrapped_phase(group)
+        phases.append(phase)
+        valid &= modulation > min_modulation
+
+    absolute = unwrap_multi_frequency(phases, frequencies)
+
+    # Pixel con fase fuori dal dominio atteso: ordine di frangia errato
+    valid &= (absolute >= 0) & (absolute < TWO_PI * max(frequencies))
+    return absolute, valid
+
+
+def match_absolute_phase(phase_l: np.ndarray, valid_l: np.ndarray,
+                         phase_r: np.ndarray, valid_r: np.ndarray,
+                         max_disparity: Optional[float] = None,
+                         max_gap: float = DEFAULT_MAX_INTERPOLATION_GAP) -> np.ndarray:
+    """
+    Trova le corrispondenze per fase assoluta lungo le righe rettificate.
+
+    I pixel destri validi vengono ordinati per chiave (riga, fase); ogni pixel
+    sinistro cerca con una ricerca binaria i due campioni destri che racchiudono
+    la sua fase sulla stessa riga e interpola linearmente la colonna.
+
+    Args:
+        phase_l, phase_r: Fasi assolute HxW
+        valid_l, valid_r: Maschere dei pixel con fase affidabile
+        max_disparity: Disparità massima accettata (opzionale)
+        max_gap: Distanza massima in colonne tra i campioni destri interpolati
+
+    Returns:
+        Mappa di disparità float32 HxW (0 dove non c'è corrispondenza)
+    """
+    height, width = phase_l.shape[:2]
+    disparity_map = np.zeros((height, width), dtype=np.float32)
+
+    rows_r, cols_r = np.nonzero(valid_r)
+    rows_l, cols_l = np.nonzero(valid_l)
+    if rows_r.size < 2 or rows_l.size == 0:
+        return disparity_map
+
+    # Passo tra righe maggiore del dominio della fase: le chiavi non si sovrappongono
+    row_stride = float(max(np.max(phase_r[valid_r]), np.max(phase_l[valid_l]))) + 1.0
+
+    values_r = phase_r[rows_r, cols_r].astype(np.float64)
+    keys_r = rows_r * row_stride + values_r
+    order = np.argsort(keys_r, kind="stable")
+    keys_r = keys_r[order]
+    rows_r = rows_r[order]
+    cols_r = cols_r[order].astype(np.float64)
+    values_r = values_r[order]
+
+    values_l = phase_l[rows_l, cols_l].astype(np.float64)
+    keys_l = rows_l * row_stride + values_l
+
+    hi = np.searchsorted(keys_r, keys_l)
+    lo = hi - 1
+    inside = (lo >= 0) & (hi < keys_r.size)
+    lo_c = np.clip(lo, 0, keys_r.size - 1)
+    hi_c = np.clip(hi, 0, keys_r.size - 1)
+
+    same_row = inside & (rows_r[lo_c] == rows_l) & (rows_r[hi_c] == rows_l)
+    close = np.abs(cols_r[hi_c] - cols_r[lo_c]) <= max_gap
+
+    span = values_r[hi_c] - values_r[lo_c]
+    span_safe = np.where(span > 0, span, 1.0)
+    t = np.where(span > 0, (values_l - values_r[lo_c]) / span_safe, 0.0)
+    x_r = cols_r[lo_c] + t * (cols_r[hi_c] - cols_r[lo_c])
+
+    disparity = cols_l - x_r
+    accepted = same_row & close & (disparity > 0)
+    if max_disparity is not None:
+        accepted &= disparity <= max_disparity
+
+    disparity_map[rows_l[accepted], cols_l[accepted]] = disparity[accepted]
+    return disparity_map
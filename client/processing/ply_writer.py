@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Scrittura di nuvole di punti in formato PLY binario little-endian.
+I vertici vengono impacchettati a blocchi in un array strutturato e scritti
+con una sola operazione per blocco; l'ingresso può essere un generatore di
+blocchi, così nuvole molto grandi non devono mai stare in memoria per intero.
+Normali, colori e confidenza sono proprietà opzionali.
+"""
+
+import logging
+import os
+from typing import Dict, Iterable, Optional, Union
+
+import numpy as np
+
+# Configurazione logging
+logger = logging.getLogger(__name__)
+
+# Punti per blocco quando si scrive un array già in memoria
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+# Cifre del contatore dei vertici: l'header ha lunghezza fissa e il conteggio
+# può essere corretto a fine scrittura quando i blocchi arrivano da un generatore
+_COUNT_DIGITS = 12
+
+PlyChunk = Union[np.ndarray, Dict[str, np.ndarray]]
+
+
+def ply_vertex_dtype(with_normals: bool = False, with_colors: bool = False,
+                     with_confidence: bool = False) -> np.dtype:
+    """
+    Dtype little-endian del record di vertice.
+
+    Args:
+        with_normals: Include nx, ny, nz
+        with_colors: Include red, green, blue (uchar)
+        with_confidence: Include confidence (float)
+
+    Returns:
+        Dtype strutturato nell'ordine delle proprietà dell'header
+    """
+    fields = [("x", "<f4"), ("y", "<f4"), ("z", "<f4")]
+    if with_normals:
+        fields += [("nx", "<f4"), ("ny", "<f4"), ("nz", "<f4")]
+    if with_colors:
+        fields += [("red", "u1"), ("green", "u1"), ("blue", "u1")]
+    if with_confidence:
+        fields += [("confidence", "<f4")]
+    return np.dtype(fields)
+
+
+def _ply_header(vertex_dtype: np.dtype, num_points: int) -> bytes:
+    """Header PLY con contatore dei vertici a lunghezza fissa."""
+    type_names = {"<f4": "float", "|u1": "uchar"}
+    lines = [
+        "ply",
+        "format binary_little_endian 1.0",
+        f"element vertex {num_points:0{_COUNT_DIGITS}d}",
+    ]
+    lines += [f"property {type_names[vertex_dtype[name].str]} {name}" for name in vertex_dtype.names]
+    lines.append("end_header")
+    return ("\n".join(lines) + "\n").encode("ascii")
+
+
+def _color_channels(colors: np.ndarray) -> np.ndarray:
+    """Colori Nx3 in uchar; i float sono interpretati nell'intervallo [0, 1]."""
+    colors = np.asarray(colors)
+    if colors.dtype == np.uint8:
+        return colors[:, :3]
+    return np.clip(np.rint(colors[:, :3] * 255.0), 0, 255).astype(np.uint8)
+
+
+def _pack_chunk(chunk: PlyChunk, vertex_dtype: np.dtype) -> np.ndarray:
+    """Impacchetta un blocco (array di punti o dizionario) nei record di vertice."""
+    if not isinstance(chunk, dict):
+        chunk = {"points": chunk}
+
+    points = np.asarray(chunk["points"])
+    records = np.empty(len(points), dtype=vertex_dtype)
+    records["x"], records["y"], records["z"] = points[:, 0], points[:, 1], points[:, 2]
+
+    if "nx" in vertex_dtype.names:
+        normals = np.asarray(chunk["normals"])
+        records["nx"], records["ny"], records["nz"] = normals[:, 0], normals[:, 1], normals[:, 2]
+    if "red" in vertex_dtype.names:
+        colors = _color_channels(chunk["colors"])
+        records["red"], records["green"], records["blue"] = colors[:, 0], colors[:, 1], colors[:, 2]
+    if "confidence" in vertex_dtype.names:
+        records["confidence"] = np.asarray(chunk["confidence"]).reshape(-1)
+
+    return records
+
+
+def write_ply_chunks(filename: Union[str, os.PathLike], chunks: Iterable[PlyChunk],
+                     with_normals: bool = False, with_colors: bool = False,
+                     with_confidence: bool = False) -> int:
+    """
+    Scrive un file PLY binario da una sequenza di blocchi.
+
+    Ogni blocco è un array Nx3 di punti oppure un dizionario con "points" e,
+    secondo le proprietà richieste, "normals", "colors" e "confidence". Il
+    numero di vertici non deve essere noto in anticipo: viene scritto
+    nell'header a fine scrittura.
+
+    Args:
+        filename: File di destinazione
+        chunks: Iterabile (anche generatore) di blocchi
+        with_normals: Scrive le normali
+        with_colors: Scrive i colori
+        with_confidence: Scrive la confidenza
+
+    Returns:
+        Numero di vertici scritti
+    """
+    vertex_dtype = ply_vertex_dtype(with_normals, with_colors, with_confidence)
+    num_points = 0
+
+    with open(filename, "wb") as f:
+        f.write(_ply_header(vertex_dtype, 0))
+
+        for chunk in chunks:
+            records = _pack_chunk(chunk, vertex_dtype)
+            f.write(memoryview(records).cast("B"))
+            num_points += len(records)
+
+        # Corregge il contatore dei vertici (l'header ha la stessa lunghezza)
+        f.seek(0)
+        f.write(_ply_header(vertex_dtype, num_points))
+
+    return num_points
+
+
+def write_ply(filename: Union[str, os.PathLike], points: np.ndarray, normals: Optional[np.ndarray] = None,
+              colors: Optional[np.ndarray] = None, confidence: Optional[np.ndarray] = None,
+              chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    """
+    Scrive una nuvola di punti in memoria come PLY binario.
+
+    Args:
+        filename: File di destinazione
+        points: Punti Nx3
+        normals: Normali Nx3 (opzionali)
+        colors: Colori Nx3, uchar o float in [0, 1] (opzionali)
+        confidence: Confidenza per punto (opzionale)
+        chunk_size: Punti impacchettati per ogni scrittura
+
+    Returns:
+        Numero di vertici scritti
+    """
+    optional = {"normals": normals, "colors": colors, "confidence": confidence}
+
+    def chunks():
+        for start in range(0, len(points), chunk_size):
+            chunk = {"points": points[start:start + chunk_size]}
+            for name, values in optional.items():
+                if values is not None:
+                    chunk[name] = values[start:start + chunk_size]
+            yield chunk
+
+    return write_ply_chunks(filename, chunks(), with_normals=normals is not None,
+                            with_colors=colors is not None, with_confidence=confidence is not None)
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Codifica compatta delle nuvole di punti per il trasferimento e l'archiviazione.
+Le coordinate vengono quantizzate con un passo fisso rispetto al centro del
+bounding box e memorizzate come int16 (o int32 se l'estensione lo richiede),
+per colonne. Opzionalmente i valori sono codificati come differenze lungo
+l'ordine di scansione e compressi con zlib o lzma della libreria standard.
+
+L'errore di ricostruzione è al massimo ``step / 2`` per coordinata
+(``step * sqrt(3) / 2`` in distanza euclidea), a meno dell'arrotondamento
+float32 della decodifica.
+"""
+
+import logging
+import lzma
+import struct
+import zlib
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+# Configurazione logging
+logger = logging.getLogger(__name__)
+
+# Passo di quantizzazione predefinito (mm): ben sotto la precisione dello scanner
+DEFAULT_QUANTIZATION_STEP = 0.05
+
+# Compressori disponibili (None = nessuna compressione)
+COMPRESSIONS = (None, "zlib", "lzma")
+
+# Header binario: magic, versione, flag delta, compressione, dtype, conteggio, passo, origine
+_CODEC_MAGIC = b"ULPC"
+_CODEC_VERSION = 1
+_HEADER = struct.Struct("<4sBBBBQd3d")
+_COMPRESSION_CODES = {None: 0, "zlib": 1, "lzma": 2}
+_DTYPE_CODES = {"int16": 0, "int32": 1}
+
+
+@dataclass
+class EncodedPointCloud:
+    """Nuvola di punti quantizzata (coordinate intere per colonne + parametri di decodifica)."""
+    count: int
+    step: float
+    origin: np.ndarray
+    dtype: str
+    delta: bool
+    compression: Optional[str]
+    payload: bytes
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def nbytes(self) -> int:
+        """Dimensione della codifica in byte (header escluso)."""
+        return len(self.payload)
+
+    @property
+    def max_error(self) -> float:
+        """Errore massimo di ricostruzione per coordinata."""
+        return self.step / 2.0
+
+    def decode(self) -> np.ndarray:
+        """Ricostruisce la nuvola Nx3 float32."""
+        return decode_pointcloud(self)
+
+    def to_bytes(self) -> bytes:
+        """Serializza la codifica (header + payload) per disco o rete."""
+        header = _HEADER.pack(_CODEC_MAGIC, _CODEC_VERSION, int(self.delta),
+                              _COMPRESSION_CODES[self.compression], _DTYPE_CODES[self.dtype],
+                              self.count, self.step, *np.asarray(self.origin, dtype=np.float64))
+        return header + self.payload
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "EncodedPointCloud":
+        """
+        Ricostruisce una codifica serializzata con ``to_bytes``.
+
+        Args:
+            data: Byte prodotti da to_bytes
+
+        Returns:
+            EncodedPointCloud
+        """
+        magic, version, delta, compression, dtype, count, step, *origin = _HEADER.unpack_from(data)
+        if magic != _CODEC_MAGIC or version != _CODEC_VERSION:
+            raise ValueError("Dati non riconosciuti come nuvola di punti codificata")
+
+        compression_names = {code: name for name, code in _COMPRESSION_CODES.items()}
+        dtype_names = {code: name for name, code in _DTYPE_CODES.items()}
+        return cls(count=count, step=step, origin=np.array(origin), dtype=dtype_names[dtype],
+                   delta=bool(delta), compression=compression_names[compression],
+                   payload=bytes(data[_HEADER.size:]))
+
+
+def _smallest_int_dtype(values: np.ndarray) -> str:
+    """int16 se tutti i valori rientrano nel suo intervallo, altrimenti int32."""
+    if values.size == 0:
+        return "int16"
+    low, high = int(values.min()), int(values.max())
+    info = np.iinfo(np.int16)
+    if info.min <= low and high <= info.max:
+        return "int16"
+    info = np.iinfo(np.int32)
+    if info.min <= low and high <= info.max:
+        return "int32"
+    raise ValueError("Nuvola troppo estesa per il passo di quantizzazione scelto")
+
+
+def encode_pointcloud(points: np.ndarray, step: float = DEFAULT_QUANTIZATION_STEP,
+                      delta: bool = False, compression: Optional[str] = None,
+                      level: Optional[int] = None) -> EncodedPointCloud:
+    """
+    Quantizza una nuvola di punti.
+
+    Args:
+        points: Nuvola Nx3 (le colonne oltre la terza sono ignorate)
+        step: Passo di quantizzazione (stessa unità dei punti)
+        delta: Codifica le differenze tra punti consecutivi (utile con compressione
+            su nuvole ordinate per scansione)
+        compression: None, "zlib" o "lzma"
+        level: Livello di compressione (default del compressore se None)
+
+    Returns:
+        EncodedPointCloud
+    """
+    if step <= 0:
+        raise ValueError(f"Passo di quantizzazione non valido: {step}")
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Compressione non supportata: {compression}")
+
+    # Per colonne: coordinate contigue comprimono meglio di terne interlacciate
+    columns = np.asarray(points, dtype=np.float64)[:, :3].T
+    if columns.shape[1]:
+        origin = (columns.min(axis=1) + columns.max(axis=1)) / 2.0
+    else:
+        origin = np.zeros(3)
+
+    quantized = np.rint((columns - origin[:, None]) / step).astype(np.int64)
+    if delta and quantized.shape[1] > 1:
+        quantized[:, 1:] = np.diff(quantized, axis=1)
+
+    dtype = _smallest_int_dtype(quantized)
+    payload = quantized.astype(dtype).tobytes()
+
+    if compression == "zlib":
+        payload = zlib.compress(payload, 6 if level is None else level)
+    elif compression == "lzma":
+        payload = lzma.compress(payload, preset=6 if level is None else level)
+
+    return EncodedPointCloud(count=columns.shape[1], step=float(step), origin=origin, dtype=dtype,
+                             delta=delta, compression=compression, payload=payload)
+
+
+def decode_pointcloud(encoded: EncodedPointCloud) -> np.ndarray:
+    """
+    Ricostruisce una nuvola codificata.
+
+    Args:
+        encoded: Nuvola codificata con encode_pointcloud
+
+    Returns:
+        Nuvola Nx3 float32
+    """
+    payload = encoded.payload
+    if encoded.compression == "zlib":
+        payload = zlib.decompress(payload)
+    elif encoded.compression == "lzma":
+        payload = lzma.decompress(payload)
+
+    quantized = np.frombuffer(payload, dtype=encoded.dtype).reshape(3, encoded.count)
+    if encoded.delta:
+        quantized = np.cumsum(quantized, axis=1, dtype=np.int64)
+
+    points = np.empty((encoded.count, 3), dtype=np.float32)
+    points[:] = (quantized * encoded.step + np.asarray(encoded.origin)[:, None]).T
+    return points
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Filtri vettorizzati per nuvole di punti.
+Le statistiche sul vicinato si ottengono con query batch su cKDTree (su tutti i
+core, a blocchi per limitare la memoria) e operazioni su array, senza cicli
+Python per punto. Il voxel grid raggruppa i punti per chiave intera con un solo
+ordinamento e riduce punti e attributi con operazioni per gruppo.
+"""
+
+import logging
+from typing import Dict, Optional
+
+import numpy as np
+
+# Configurazione logging
+logger = logging.getLogger(__name__)
+
+try:
+    from scipy.spatial import cKDTree
+    SCIPY_AVAILABLE = True
+except ImportError:
+    cKDTree = None
+    SCIPY_AVAILABLE = False
+    logger.warning("SciPy non disponibile: i filtri per outlier sono disabilitati")
+
+# Punti interrogati per blocco: limita le matrici distanze/indici a poche decine di MB
+QUERY_CHUNK_SIZE = 65536
+
+
+def _build_tree(points: np.ndarray):
+    """Costruisce il KD-tree di una nuvola, o None se SciPy non è disponibile."""
+    if not SCIPY_AVAILABLE:
+        return None
+    return cKDTree(np.asarray(points, dtype=np.float64)[:, :3])
+
+
+def mean_neighbor_distances(points: np.ndarray, nb_neighbors: int = 20, tree=None) -> np.ndarray:
+    """
+    Distanza media di ogni punto dai suoi ``nb_neighbors`` vicini più prossimi
+    (escluso il punto stesso).
+
+    Args:
+        points: Nuvola Nx3
+        nb_neighbors: Numero di vicini
+        tree: cKDTree già costruito sulla nuvola (opzionale)
+
+    Returns:
+        Array di N distanze medie
+    """
+    tree = tree if tree is not None else _build_tree(points)
+    k = min(nb_neighbors + 1, len(points))
+    mean_dists = np.empty(len(points), dtype=np.float64)
+
+    for start in range(0, len(points), QUERY_CHUNK_SIZE):
+        chunk = points[start:start + QUERY_CHUNK_SIZE, :3]
+        dists, _ = tree.query(chunk, k=k, workers=-1)
+        # La prima colonna è il punto stesso (distanza 0)
+        mean_dists[start:start + len(chunk)] = dists.reshape(len(chunk), -1)[:, 1:].mean(axis=1)
+
+    return mean_dists
+
+
+def statistical_outlier_mask(points: np.ndarray, nb_neighbors: int = 20, std_ratio: float = 2.0) -> np.ndarray:
+    """
+    Maschera dei punti che superano il filtro statistico.
+
+    Un punto è un outlier se la distanza media dai suoi vicini supera la media
+    globale di ``std_ratio`` deviazioni standard.
+
+    Args:
+        points: Nuvola Nx3
+        nb_neighbors: Numero di vicini per l'analisi statistica
+        std_ratio: Fattore di deviazione standard
+
+    Returns:
+        Maschera booleana di N elementi (True = punto mantenuto)
+    """
+    if points is None or len(points) < nb_neighbors + 1 or not SCIPY_AVAILABLE:
+        return np.ones(0 if points is None else len(points), dtype=bool)
+
+    mean_dists = mean_neighbor_distances(points, nb_neighbors)
+    threshold = mean_dists.mean() + std_ratio * mean_dists.std()
+    return mean_dists < threshold
+
+
+def radius_outlier_mask(points: np.ndarray, radius: float, min_neighbors: int = 5) -> np.ndarray:
+    """
+    Maschera dei punti con almeno ``min_neighbors`` vicini entro ``radius``
+    (escluso il punto stesso).
+
+    Args:
+        points: Nuvola Nx3
+        radius: Raggio di ricerca (stessa unità dei punti)
+        min_neighbors: Numero minimo di vicini
+
+    Returns:
+        Maschera booleana di N elementi (True = punto mantenuto)
+    """
+    if points is None or len(points) == 0 or not SCIPY_AVAILABLE:
+        return np.ones(0 if points is None else len(points), dtype=bool)
+
+    tree = _build_tree(points)
+    counts = np.empty(len(points), dtype=np.int64)
+
+    for start in range(0, len(points), QUERY_CHUNK_SIZE):
+        chunk = points[start:start + QUERY_CHUNK_SIZE, :3]
+        counts[start:start + len(chunk)] = tree.query_ball_point(chunk, r=radius, workers=-1,
+                                                                 return_length=True)
+
+    # Il conteggio include il punto stesso
+    return counts - 1 >= min_neighbors
+
+
+def statistical_outlier_removal(points: Optional[np.ndarray], nb_neighbors: int = 20,
+                                std_ratio: float = 2.0) -> Optional[np.ndarray]:
+    """
+    Rimuove gli outlier statistici da una nuvola di punti.
+
+    Args:
+        points: Nuvola Nx3 (eventuali colonne aggiuntive vengono mantenute)
+        nb_neighbors: Numero di vicini per l'analisi statistica
+        std_ratio: Fattore di deviazione standard
+
+    Returns:
+        Nuvola filtrata
+    """
+    if points is None or len(points) < nb_neighbors + 1:
+        return points
+
+    try:
+        keep = statistical_outlier_mask(points, nb_neighbors, std_ratio)
+        filtered = points[keep]
+
+        removed = len(points) - len(filtered)
+        logger.info(f"Filtro outlier: rimossi {removed} punti ({removed / len(points) * 100:.1f}%)")
+        return filtered
+
+    except Exception as e:
+        logger.error(f"Errore nel filtro outlier: {e}")
+        return points
+
+
+def radius_outlier_removal(points: Optional[np.ndarray], radius: float,
+                           min_neighbors: int = 5) -> Optional[np.ndarray]:
+    """
+    Rimuove i punti isolati, con meno di ``min_neighbors`` vicini entro ``radius``.
+
+    Args:
+        points: Nuvola Nx3 (eventuali colonne aggiuntive vengono mantenute)
+        radius: Raggio di ricerca (stessa unità dei punti)
+        min_neighbors: Numero minimo di vicini
+
+    Returns:
+        Nuvola filtrata
+    """
+    if points is None or len(points) == 0:
+        return points
+
+    try:
+        keep = radius_outlier_mask(points, radius, min_neighbors)
+        filtered = points[keep]
+
+        removed = len(points) - len(filtered)
+        logger.info(f"Filtro outlier per raggio: rimossi {removed} punti ({removed / len(points) * 100:.1f}%)")
+        return filtered
+
+    except Exception as e:
+        logger.error(f"Errore nel filtro outlier per raggio: {e}")
+        return points
+
+
+# Rappresentanti disponibili per il voxel grid
+VOXEL_MODES = ("centroid", "first", "median")
+
+
+def voxel_keys(points: np.ndarray, voxel_size: float) -> np.ndarray:
+    """
+    Chiave intera del voxel di ogni punto.
+
+    Le coordinate intere dei voxel vengono traslate a partire da zero e
+    linearizzate in un unico int64; se la griglia non sta in 63 bit le chiavi
+    vengono compattate asse per asse.
+
+    Args:
+        points: Nuvola Nx3 (le colonne oltre la terza sono ignorate)
+        voxel_size: Lato del voxel (stessa unità dei punti)
+
+    Returns:
+        Array di N chiavi int64 (stessa chiave = stesso voxel)
+    """
+    if voxel_size <= 0:
+        raise ValueError(f"Dimensione voxel non valida: {voxel_size}")
+
+    scale = 1.0 / voxel_size
+    keys = np.zeros(len(points), dtype=np.int64)
+    span = 1
+
+    for axis in range(3):
+        # Colonne separate: le riduzioni su array contigui sono molto più rapide
+        coords = np.floor(points[:, axis] * scale).astype(np.int64)
+        coords -= coords.min()
+        extent = int(coords.max()) + 1
+
+        if span * extent >= 2 ** 63:
+            # Griglia troppo estesa: rinumera le chiavi già calcolate in modo compatto
+            _, keys = np.unique(keys, return_inverse=True)
+            span = int(keys.max()) + 1
+            if span * extent >= 2 ** 63:
+                raise ValueError("Griglia voxel troppo estesa per chiavi a 64 bit")
+
+        keys *= extent
+        keys += coords
+        span *= extent
+
+    return keys
+
+
+def _group_by_key(keys: np.ndarray):
+    """
+    Raggruppa le chiavi con un unico ordinamento.
+
+    Returns:
+        Tupla (order, boundaries): permutazione che ordina le chiavi e maschera
+        degli elementi di ``order`` che aprono un nuovo gruppo
+    """
+    order = np.argsort(keys)
+    sorted_keys = keys[order]
+
+    boundaries = np.empty(len(keys), dtype=bool)
+    boundaries[0] = True
+    np.not_equal(sorted_keys[1:], sorted_keys[:-1], out=boundaries[1:])
+    return order, boundaries
+
+
+def _reduce_groups(values: np.ndarray, mode: str, starts: np.ndarray, group_ids: np.ndarray, counts: np.ndarray, first: np.ndarray) -> np.ndarray:
+    """Riduce i valori per punto (N o NxC) a un valore per voxel."""
+    if mode == "first":
+        return values[first]
+
+    flat = values.reshape(len(values), -1)
+    num_groups = len(starts)
+    reduced = np.empty((num_groups, flat.shape[1]), dtype=np.float64)
+
+    for column in range(flat.shape[1]):
+        channel = flat[:, column]
+        if mode == "centroid":
+            reduced[:, column] = np.bincount(group_ids, weights=channel, minlength=num_groups) / counts
+        else:
+            # Mediana: un solo ordinamento sulla chiave composta voxel + valore
+            # normalizzato in [0, 0.5], poi l'elemento centrale di ogni gruppo
+            low, high = channel.min(), channel.max()
+            composite = group_ids.astype(np.float64)
+            if high > low:
+                composite += (channel - np.float64(low)) * (0.5 / (np.float64(high) - low))
+            sorted_values = channel[np.argsort(composite)]
+            lower = sorted_values[starts + (counts - 1) // 2]
+            upper = sorted_values[starts + counts // 2]
+            reduced[:, column] = (lower.astype(np.float64) + upper) * 0.5
+
+    if np.issubdtype(values.dtype, np.integer):
+        reduced = np.rint(reduced)
+    return reduced.astype(values.dtype, copy=False).reshape((num_groups,) + values.shape[1:])
+
+
+def voxel_grid_downsample(points: np.ndarray, voxel_size: float, mode: str = "centroid",
+                          attributes: Optional[Dict[str, np.ndarray]] = None):
+    """
+    Sottocampiona una nuvola mantenendo un rappresentante per voxel.
+
+    I punti vengono raggruppati per chiave di voxel con un solo ordinamento;
+    il rappresentante è il baricentro (``centroid``), il primo punto in ordine
+    di ingresso (``first``) o la mediana per coordinata (``median``). Gli
+    attributi per punto (colore, confidenza, ...) e le eventuali colonne oltre
+    la terza subiscono la stessa riduzione.
+
+    Args:
+        points: Nuvola Nx3 (o NxC con colonne aggiuntive)
+        voxel_size: Lato del voxel (stessa unità dei punti)
+        mode: Uno tra VOXEL_MODES
+        attributes: Dizionario opzionale nome -> array di N elementi per punto
+
+    Returns:
+        Nuvola sottocampionata; se ``attributes`` è indicato, tupla
+        (nuvola, attributi ridotti)
+    """
+    if mode not in VOXEL_MODES:
+        raise ValueError(f"Modalità voxel non supportata: {mode}")
+
+    if points is None or len(points) == 0:
+        return points if attributes is None else (points, attributes)
+
+    for name, values in (attributes or {}).items():
+        if len(values) != len(points):
+            raise ValueError(f"Attributo '{name}' con {len(values)} elementi per {len(points)} punti")
+
+    order, boundaries = _group_by_key(voxel_keys(points, voxel_size))
+    starts = np.flatnonzero(boundaries)
+    counts = np.diff(np.append(starts, len(points)))
+    # Indice minimo di ogni gruppo = primo punto del voxel in ordine di ingresso
+    first = np.minimum.reduceat(order, starts)
+
+    group_ids = None
+    if mode != "first":
+        # Indice di gruppo di ogni punto, nell'ordine di ingresso
+        group_ids = np.empty(len(points), dtype=np.int64)
+        group_ids[order] = np.cumsum(boundaries) - 1
+
+    downsampled = _reduce_groups(points, mode, starts, group_ids, counts, first)
+
+    if attributes is None:
+        return downsampled
+
+    reduced_attributes = {
+        name: _reduce_groups(np.asarray(values), mode, starts, group_ids, counts, first)
+        for name, values in attributes.items()
+    }
+    return downsampled, reduced_attributes
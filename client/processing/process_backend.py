@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Backend di triangolazione basato su un pool di processi.
+Gli stack dei pattern rettificati, le maschere di ombra e le mappe di disparità
+e confidenza risiedono in blocchi ``multiprocessing.shared_memory``: ai worker
+vengono inviati solo i nomi dei blocchi e l'intervallo di righe da elaborare,
+quindi nessun frame viene serializzato per task e il calcolo non è limitato dal GIL.
+"""
+
+import logging
+import math
+import multiprocessing
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import cv2
+
+from client.processing.correspondence import (
+    DEFAULT_MATCH_THRESHOLD, DEFAULT_MAX_DISPARITY, ScanlineCorrespondenceEngine
+)
+
+# Configurazione logging
+logger = logging.getLogger(__name__)
+
+# Backend di triangolazione selezionabili
+BACKENDS = ("thread", "process")
+
+# Bande per worker: più bande del numero di processi bilanciano il carico
+BANDS_PER_WORKER = 2
+
+
+class SharedArray:
+    """
+    Array NumPy allocato in un blocco di memoria condivisa.
+
+    Il descrittore ``spec`` (nome, forma, dtype) è l'unica informazione da
+    passare a un altro processo per accedere agli stessi dati.
+    """
+
+    def __init__(self, shape: Tuple[int, ...], dtype=np.uint8, name: Optional[str] = None):
+        """
+        Crea un nuovo blocco condiviso o si collega a uno esistente.
+
+        Args:
+            shape: Forma dell'array
+            dtype: Tipo degli elementi
+            name: Nome del blocco esistente (None per crearne uno nuovo)
+        """
+        self.shape = tuple(int(s) for s in shape)
+        self.dtype = np.dtype(dtype)
+        self.owner = name is None
+
+        size = max(1, int(np.prod(self.shape)) * self.dtype.itemsize)
+        if self.owner:
+            self._shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+
+        self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=self._shm.buf)
+
+        # Il proprietario rilascia il blocco anche se close() non viene chiamato
+        if self.owner:
+            self._finalizer = weakref.finalize(self, _release_shared_memory, self._shm)
+
+    @property
+    def spec(self) -> Tuple[str, Tuple[int, ...], str]:
+        """Descrittore serializzabile dell'array condiviso."""
+        return self._shm.name, self.shape, self.dtype.str
+
+    @classmethod
+    def attach(cls, spec: Tuple[str, Tuple[int, ...], str]) -> "SharedArray":
+        """Si collega a un array condiviso a partire dal suo descrittore."""
+        name, shape, dtype = spec
+        return cls(shape, dtype=dtype, name=name)
+
+    def close(self):
+        """Chiude il blocco e, se proprietario, lo rimuove dal sistema."""
+        self.array = None
+        if self.owner:
+            self._finalizer()
+        else:
+            self._shm.close()
+
+
+def _release_shared_memory(shm: shared_memory.SharedMemory):
+    """
+    Rimuove e chiude un blocco di memoria condivisa.
+    Se esistono ancora viste sul blocco la mappatura resta valida finché non
+    vengono rilasciate, ma il nome viene comunque rimosso dal sistema.
+    """
+    try:
+        shm.unlink()
+    except FileNotFoundError:
+        pass
+    try:
+        shm.close()
+    except BufferError:
+        logger.debug(f"Blocco condiviso {shm.name} ancora in uso, chiusura rimandata")
+
+
+def _init_worker():
+    """Inizializza un processo worker evitando la sovrascrizione dei core da parte di OpenCV."""
+    cv2.setNumThreads(1)
+
+
+def _triangulate_band(specs: Dict[str, tuple], slots: Sequence[int], weights: Sequence[float],
+                      y_range: Tuple[int, int], max_disparity: int, match_threshold: int) -> int:
+    """
+    Elabora un intervallo di righe per i piani indicati dello stack (eseguito nel worker).
+
+    Le bande sono disgiunte, quindi ogni worker scrive direttamente nelle mappe
+    condivise senza sincronizzazione.
+
+    Returns:
+        Numero di pattern elaborati
+    """
+    arrays = {key: SharedArray.attach(spec) for key, spec in specs.items()}
+    try:
+        engine = ScanlineCorrespondenceEngine(max_disparity=max_disparity,
+                                              match_threshold=match_threshold)
+        stack_l = arrays["stack_l"].array
+        stack_r = arrays["stack_r"].array
+        mask_l = arrays["mask_l"].array
+        mask_r = arrays["mask_r"].array
+        disparity_map = arrays["disparity"].array
+        confidence_map = arrays["confidence"].array
+
+        for slot, weight in zip(slots, weights):
+            engine.update_disparity(
+                stack_l[slot], stack_r[slot], mask_l, mask_r,
+                disparity_map, confidence_map,
+                pattern_weight=weight,
+                y_range=y_range
+            )
+        return len(weights)
+    finally:
+        for shared in arrays.values():
+            shared.close()
+
+
+class ProcessTriangulationBackend:
+    """
+    Esegue la ricerca delle corrispondenze per bande di righe in processi separati.
+
+    Il chiamante ottiene con ``prepare`` le viste condivise su cui scrivere i
+    pattern rettificati (ad esempio con ``cv2.remap(..., dst=stack_l[i])``) e le
+    maschere di ombra, poi ``compute_disparity`` distribuisce le bande ai worker.
+    I blocchi condivisi vengono riutilizzati finché le dimensioni lo consentono.
+    """
+
+    def __init__(self, num_workers: Optional[int] = None,
+                 max_disparity: int = DEFAULT_MAX_DISPARITY,
+                 match_threshold: int = DEFAULT_MATCH_THRESHOLD):
+        """
+        Inizializza il backend (il pool viene avviato al primo utilizzo).
+
+        Args:
+            num_workers: Numero di processi worker (default: CPU count)
+            max_disparity: Massima disparità cercata
+            match_threshold: Differenza massima per accettare una corrispondenza
+        """
+        self.num_workers = num_workers or multiprocessing.cpu_count()
+        self.max_disparity = max_disparity
+        self.match_threshold = match_threshold
+
+        self._executor = None
+        self._arrays: Dict[str, SharedArray] = {}
+        self._num_patterns = 0
+        self._size = (0, 0)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Restituisce il pool di processi, avviandolo se necessario."""
+        if self._executor is None:
+            # "spawn" evita di duplicare i thread Qt e di rete del processo principale
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.num_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker
+            )
+            logger.info(f"Pool di triangolazione avviato con {self.num_workers} processi")
+        return self._executor
+
+    def prepare(self, num_patterns: int, height: int, width: int
+                ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Prepara gli stack condivisi per una triangolazione.
+
+        Args:
+            num_patterns: Numero di coppie di pattern
+            height, width: Dimensioni dei frame rettificati
+
+        Returns:
+            Tupla (stack_l, stack_r, mask_l, mask_r) di viste condivise scrivibili;
+            gli stack hanno forma (num_patterns, height, width)
+        """
+        # Gli stack vengono riallocati solo se cambiano le dimensioni o servono più pattern
+        capacity = self._arrays["stack_l"].shape[0] if (height, width) == self._size else 0
+        if num_patterns > capacity:
+            self._allocate(num_patterns, height, width)
+
+        self._num_patterns = num_patterns
+        return (self._arrays["stack_l"].array[:num_patterns],
+                self._arrays["stack_r"].array[:num_patterns],
+                self._arrays["mask_l"].array,
+                self._arrays["mask_r"].array)
+
+    def _allocate(self, num_patterns: int, height: int, width: int):
+        """Alloca (o rialloca) i blocchi condivisi."""
+        self.release()
+
+        self._arrays = {
+            "stack_l": SharedArray((num_patterns, height, width), np.uint8),
+            "stack_r": SharedArray((num_patterns, height, width), np.uint8),
+            "mask_l": SharedArray((height, width), np.uint8),
+            "mask_r": SharedArray((height, width), np.uint8),
+            "disparity": SharedArray((height, width), np.float32),
+            "confidence": SharedArray((height, width), np.float32),
+        }
+        self._size = (height, width)
+
+        size_mb = sum(a.array.nbytes for a in self._arrays.values()) / (1024 * 1024)
+        logger.debug(f"Allocati {size_mb:.1f} MB di memoria condivisa per {num_patterns} pattern")
+
+    def compute_disparity(self, weights: Sequence[float],
+                          y_range: Optional[Tuple[int, int]] = None,
+                          disparity_map: Optional[np.ndarray] = None,
+                          confidence_map: Optional[np.ndarray] = None
+                          ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Calcola le mappe di disparità e confidenza sugli stack preparati.
+
+        Args:
+            weights: Peso di ciascun pattern dello stack
+            y_range: Tupla (y_start, y_end) per limitare le righe elaborate
+            disparity_map, confidence_map: Mappe iniziali da accumulare (opzionali)
+
+        Returns:
+            Tupla (disparity_map, confidence_map) con le somme pesate (copie private)
+        """
+        if not self._arrays:
+            raise RuntimeError("Stack condivisi non preparati: chiamare prepare()")
+        if len(weights) != self._num_patterns:
+            raise ValueError("Il numero di pesi non corrisponde ai pattern preparati")
+
+        specs = {key: shared.spec for key, shared in self._arrays.items()}
+        return self._run_bands(specs, list(range(len(weights))), weights,
+                               y_range, disparity_map, confidence_map)
+
+    def compute_disparity_from_stack(self, stack, pattern_indices: Sequence[int], weights: Sequence[float],
+                                     shadow_mask_l: np.ndarray, shadow_mask_r: np.ndarray,
+                                     y_range: Optional[Tuple[int, int]] = None,
+                                     disparity_map: Optional[np.ndarray] = None,
+                                     confidence_map: Optional[np.ndarray] = None
+                                     ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Calcola le mappe leggendo i pattern direttamente da un RectifiedStack condiviso,
+        senza copiarli negli stack del backend.
+
+        Args:
+            stack: RectifiedStack allocato con ``shared=True``
+            pattern_indices: Pattern dello stack da elaborare
+            weights: Peso di ciascun pattern
+            shadow_mask_l, shadow_mask_r: Maschere di ombra
+            y_range: Tupla (y_start, y_end) per limitare le righe elaborate
+            disparity_map, confidence_map: Mappe iniziali da accumulare (opzionali)
+
+        Returns:
+            Tupla (disparity_map, confidence_map) con le somme pesate (copie private)
+        """
+        height, width = stack.shape
+        if (height, width) != self._size:
+            self._allocate(0, height, width)
+
+        np.copyto(self._arrays["mask_l"].array, shadow_mask_l)
+        np.copyto(self._arrays["mask_r"].array, shadow_mask_r)
+
+        specs = {key: shared.spec for key, shared in self._arrays.items()}
+        specs["stack_l"], specs["stack_r"] = stack.shared_specs()
+        return self._run_bands(specs, stack.slots(pattern_indices), weights,
+                               y_range, disparity_map, confidence_map)
+
+    def _run_bands(self, specs: Dict[str, tuple], slots: Sequence[int], weights: Sequence[float],
+                   y_range: Optional[Tuple[int, int]], disparity_map: Optional[np.ndarray],
+                   confidence_map: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """Inizializza le mappe condivise e distribuisce le bande di righe ai worker."""
+        height, _ = self._size
+        disparity = self._arrays["disparity"].array
+        confidence = self._arrays["confidence"].array
+
+        if disparity_map is not None:
+            np.copyto(disparity, disparity_map)
+        else:
+            disparity.fill(0)
+        if confidence_map is not None:
+            np.copyto(confidence, confidence_map)
+        else:
+            confidence.fill(0)
+
+        y_start, y_end = y_range if y_range else (0, height)
+        y_start, y_end = max(0, y_start), min(height, y_end)
+
+        weights = [float(w) for w in weights]
+
+        executor = self._get_executor()
+        futures = [
+            executor.submit(_triangulate_band, specs, list(slots), weights, band,
+                            self.max_disparity, self.match_threshold)
+            for band in self._split_rows(y_start, y_end)
+        ]
+        for future in futures:
+            future.result()
+
+        return disparity.copy(), confidence.copy()
+
+    def _split_rows(self, y_start: int, y_end: int) -> List[Tuple[int, int]]:
+        """Suddivide l'intervallo di righe in bande di dimensione simile."""
+        num_bands = max(1, self.num_workers * BANDS_PER_WORKER)
+        band_height = max(1, math.ceil((y_end - y_start) / num_bands))
+        return [(y, min(y_end, y + band_height)) for y in range(y_start, y_end, band_height)]
+
+    def release(self):
+        """Rilascia i blocchi di memoria condivisa."""
+        for shared in self._arrays.values():
+            shared.close()
+        self._arrays = {}
+        self._size = (0, 0)
+        self._num_patterns = 0
+
+    def shutdown(self, wait: bool = True):
+        """
+        Arresta il pool di processi e rilascia la memoria condivisa.
+
+        Args:
+            wait: Se True, attende il completamento dei task in corso
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+        self.release()
+        logger.info("Backend di triangolazione a processi arrestato")
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Supporto alla decodifica coarse-to-fine delle corrispondenze.
+I pattern rettificati vengono ridotti (di norma a 1/4 per lato) e decodificati
+con una ricerca proporzionalmente più corta: l'anteprima costa circa 1/64
+della decodifica completa. La disparità trovata al livello ridotto delimita
+poi, pixel per pixel, l'intervallo cercato alla piena risoluzione al posto
+delle ``max_disparity`` colonne fisse.
+"""
+
+import math
+from typing import Tuple
+
+import numpy as np
+import cv2
+
+# Fattore di riduzione per lato del livello di anteprima
+PYRAMID_SCALE = 4
+
+# Margine (pixel a piena risoluzione) aggiunto all'intervallo stimato al livello ridotto
+DEFAULT_REFINE_MARGIN = 4
+
+# Raggio (pixel del livello ridotto) del vicinato da cui si prende l'intervallo. Un raggio
+# maggiore copre meglio i bordi degli oggetti, ma con disparità ridotte rumorose allarga
+# gli intervalli fin quasi all'intera ricerca: il margine basta a coprire la quantizzazione
+DEFAULT_RANGE_RADIUS = 0
+
+
+def coarse_shape(shape: Tuple[int, int], scale: int = PYRAMID_SCALE) -> Tuple[int, int]:
+    """Dimensioni (altezza, larghezza) del livello ridotto di un'immagine."""
+    return max(1, shape[0] // scale), max(1, shape[1] // scale)
+
+
+def downsample(image: np.ndarray, scale: int = PYRAMID_SCALE) -> np.ndarray:
+    """
+    Riduce un'immagine al livello di anteprima mediando i pixel (INTER_AREA).
+
+    Args:
+        image: Immagine rettificata
+        scale: Fattore di riduzione per lato
+
+    Returns:
+        Immagine ridotta, dello stesso tipo
+    """
+    height, width = coarse_shape(image.shape[:2], scale)
+    return cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+
+
+def coarse_reprojection_matrix(Q: np.ndarray, full_shape: Tuple[int, int],
+                               coarse: Tuple[int, int]) -> np.ndarray:
+    """
+    Matrice di riproiezione per le disparità del livello ridotto.
+
+    Un pixel (x, y) con disparità d del livello ridotto corrisponde al pixel
+    ((x + 0.5) * sx - 0.5, (y + 0.5) * sy - 0.5) con disparità d * sx della piena
+    risoluzione: la matrice risultante è Q composta con questo cambio di scala.
+
+    Args:
+        Q: Matrice di riproiezione 4x4 della piena risoluzione
+        full_shape: Dimensioni (altezza, larghezza) della piena risoluzione
+        coarse: Dimensioni (altezza, larghezza) del livello ridotto
+
+    Returns:
+        Matrice 4x4 da usare con le mappe del livello ridotto
+    """
+    sy = full_shape[0] / coarse[0]
+    sx = full_shape[1] / coarse[1]
+    scaling = np.array([[sx, 0.0, 0.0, (sx - 1.0) / 2.0],
+                        [0.0, sy, 0.0, (sy - 1.0) / 2.0],
+                        [0.0, 0.0, sx, 0.0],
+                        [0.0, 0.0, 0.0, 1.0]])
+    return np.asarray(Q, dtype=np.float64) @ scaling
+
+
+def coarse_max_disparity(max_disparity: int, scale: int = PYRAMID_SCALE) -> int:
+    """Massima disparità da cercare al livello ridotto."""
+    return max(1, math.ceil(max_disparity / scale))
+
+
+def refinement_range(coarse_disparity: np.ndarray, full_shape: Tuple[int, int],
+                     margin: int = DEFAULT_REFINE_MARGIN,
+                     radius: int = DEFAULT_RANGE_RADIUS) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Intervalli di disparità per pixel da cercare alla piena risoluzione.
+
+    Ogni pixel eredita il minimo e il massimo delle disparità valide nel
+    vicinato del suo pixel ridotto, riportati in scala e allargati di
+    ``margin``. I pixel senza disparità ridotte valide nel vicinato ricevono
+    un intervallo vuoto (min > max) e non vengono cercati.
+
+    Args:
+        coarse_disparity: Disparità del livello ridotto (0 dove non valida)
+        full_shape: Dimensioni (altezza, larghezza) della piena risoluzione
+        margin: Pixel aggiunti a ciascun lato dell'intervallo
+        radius: Raggio del vicinato in pixel del livello ridotto
+
+    Returns:
+        Tupla (min, max) di mappe int16 a piena risoluzione
+    """
+    height, width = full_shape
+    scale = width / coarse_disparity.shape[1]
+    valid = coarse_disparity > 0
+
+    kernel = np.ones((2 * radius + 1, 2 * radius + 1), dtype=np.uint8)
+    disparity = coarse_disparity.astype(np.float32)
+    low = cv2.erode(np.where(valid, disparity, np.float32(np.inf)), kernel)
+    high = cv2.dilate(np.where(valid, disparity, np.float32(0)), kernel)
+    searched = high > 0
+    low[~searched] = 0
+
+    range_min = np.where(searched, np.floor(low * scale) - margin, 1)
+    range_max = np.where(searched, np.ceil(high * scale) + margin, 0)
+    range_min = np.maximum(range_min, 1).astype(np.int16)
+    range_max = range_max.astype(np.int16)
+
+    return (cv2.resize(range_min, (width, height), interpolation=cv2.INTER_NEAREST),
+            cv2.resize(range_max, (width, height), interpolation=cv2.INTER_NEAREST))
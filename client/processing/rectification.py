@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Cache delle mappe di rettifica stereo.
+Le mappe vengono calcolate una sola volta per ogni combinazione di calibrazione
+e dimensione immagine, convertite in formato a virgola fissa (CV_16SC2 + tabella
+di interpolazione CV_16UC1) e salvate su disco insieme alla matrice Q. I
+caricamenti successivi usano il memory mapping e richiedono pochi millisecondi.
+Il formato a virgola fissa occupa meno memoria; il formato float32 resta
+disponibile tramite ``map_type`` per le build di OpenCV in cui cv2.remap è più
+veloce con mappe float.
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import struct
+import tempfile
+from pathlib import Path
+from typing import Optional, Tuple, Union
+
+import numpy as np
+import cv2
+
+# Configurazione logging
+logger = logging.getLogger(__name__)
+
+# Chiavi dei parametri di calibrazione usate per la rettifica
+CALIBRATION_KEYS = ("M1", "M2", "d1", "d2", "R", "t")
+
+# Versione del formato della cache: cambiarla invalida le mappe salvate
+CACHE_VERSION = 1
+
+# Formati di mappa supportati
+MAP_TYPES = (cv2.CV_16SC2, cv2.CV_32FC1)
+
+# Sottodirectory della cache nella directory di output
+RECTIFICATION_CACHE_DIR = "rectification_cache"
+
+# File salvati per ogni voce della cache
+MAP_FILES = ("map1_l", "map2_l", "map1_r", "map2_r", "Q")
+
+# Firma dei file PNG
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+class RectificationMaps:
+    """
+    Mappe di rettifica per le due camere e matrice Q.
+
+    Nel formato a virgola fissa ``map1_*`` contiene le coordinate intere
+    (CV_16SC2) e ``map2_*`` la tabella di interpolazione (CV_16UC1); nel formato
+    float32 sono le mappe x e y. In entrambi i casi la coppia si passa
+    direttamente a cv2.remap.
+    """
+
+    def __init__(self, map1_l, map2_l, map1_r, map2_r, Q, image_size, key=None):
+        self.map1_l = map1_l
+        self.map2_l = map2_l
+        self.map1_r = map1_r
+        self.map2_r = map2_r
+        self.Q = Q
+        self.image_size = tuple(image_size)
+        self.key = key
+
+    def remap_left(self, image: np.ndarray, dst: Optional[np.ndarray] = None) -> np.ndarray:
+        """Rettifica un'immagine della camera sinistra."""
+        return cv2.remap(image, self.map1_l, self.map2_l, cv2.INTER_LINEAR, dst=dst)
+
+    def remap_right(self, image: np.ndarray, dst: Optional[np.ndarray] = None) -> np.ndarray:
+        """Rettifica un'immagine della camera destra."""
+        return cv2.remap(image, self.map1_r, self.map2_r, cv2.INTER_LINEAR, dst=dst)
+
+
+def calibration_hash(calib_data, image_size: Tuple[int, int], map_type: int = cv2.CV_16SC2) -> str:
+    """
+    Calcola la chiave della cache per una calibrazione e una dimensione immagine.
+
+    Args:
+        calib_data: Dati di calibrazione (NpzFile o dizionario di array)
+        image_size: Dimensione immagine (width, height)
+        map_type: Formato delle mappe
+
+    Returns:
+        Stringa esadecimale che identifica la voce della cache
+    """
+    digest = hashlib.sha1()
+    digest.update(f"v{CACHE_VERSION}:{int(image_size[0])}x{int(image_size[1])}:{map_type}".encode())
+
+    for key in CALIBRATION_KEYS:
+        array = np.ascontiguousarray(calib_data[key], dtype=np.float64)
+        digest.update(key.encode())
+        digest.update(str(array.shape).encode())
+        digest.update(array.tobytes())
+
+    return digest.hexdigest()[:16]
+
+
+def image_size_from_header(path: Union[str, Path]) -> Optional[Tuple[int, int]]:
+    """
+    Legge la dimensione di un'immagine senza decodificarla.
+
+    Per i PNG legge solo l'intestazione IHDR e per i .npy quella dell'array;
+    per gli altri formati ricade su una decodifica completa.
+
+    Args:
+        path: Percorso dell'immagine
+
+    Returns:
+        Tupla (width, height) o None se l'immagine non è leggibile
+    """
+    try:
+        with open(path, "rb") as f:
+            header = f.read(24)
+
+        if len(header) == 24 and header[:8] == PNG_SIGNATURE and header[12:16] == b"IHDR":
+            width, height = struct.unpack(">II", header[16:24])
+            return int(width), int(height)
+
+        if str(path).endswith(".npy"):
+            shape = np.load(path, mmap_mode="r").shape
+            return int(shape[1]), int(shape[0])
+
+        image = cv2.imread(str(path), cv2.IMREAD_UNCHANGED)
+        if image is None:
+            return None
+        return image.shape[1], image.shape[0]
+
+    except (OSError, ValueError) as e:
+        logger.error(f"Impossibile leggere la dimensione di {path}: {e}")
+        return None
+
+
+def compute_rectification_maps(calib_data, image_size: Tuple[int, int],
+                               map_type: int = cv2.CV_16SC2) -> RectificationMaps:
+    """
+    Calcola le mappe di rettifica da una calibrazione.
+
+    Args:
+        calib_data: Dati di calibrazione (NpzFile o dizionario di array)
+        image_size: Dimensione immagine (width, height)
+        map_type: Formato delle mappe (cv2.CV_16SC2 o cv2.CV_32FC1)
+
+    Returns:
+        RectificationMaps con le mappe nel formato richiesto e matrice Q
+    """
+    if map_type not in MAP_TYPES:
+        raise ValueError(f"Formato di mappa non supportato: {map_type}")
+
+    M1 = np.asarray(calib_data['M1'], dtype=np.float64)
+    M2 = np.asarray(calib_data['M2'], dtype=np.float64)
+    d1 = np.asarray(calib_data['d1'], dtype=np.float64)
+    d2 = np.asarray(calib_data['d2'], dtype=np.float64)
+    R = np.asarray(calib_data['R'], dtype=np.float64)
+    # Vettore colonna: alcune versioni di OpenCV rifiutano la forma (3,)
+    t = np.asarray(calib_data['t'], dtype=np.float64).reshape(3, 1)
+
+    image_size = (int(image_size[0]), int(image_size[1]))
+
+    R1, R2, P1, P2, Q, roi1, roi2 = cv2.stereoRectify(
+        cameraMatrix1=M1,
+        cameraMatrix2=M2,
+        distCoeffs1=d1,
+        distCoeffs2=d2,
+        imageSize=image_size,
+        R=R,
+        T=t,
+        flags=cv2.CALIB_ZERO_DISPARITY,
+        alpha=0
+    )
+
+    map1_l, map2_l = cv2.initUndistortRectifyMap(M1, d1, R1, P1, image_size, map_type)
+    map1_r, map2_r = cv2.initUndistortRectifyMap(M2, d2, R2, P2, image_size, map_type)
+
+    return RectificationMaps(map1_l, map2_l, map1_r, map2_r, Q, image_size)
+
+
+def load_rectification_maps(calib_data, image_size: Tuple[int, int],
+                            cache_dir: Optional[Union[str, Path]] = None,
+                            map_type: int = cv2.CV_16SC2) -> RectificationMaps:
+    """
+    Restituisce le mappe di rettifica, usando la cache su disco se disponibile.
+
+    Args:
+        calib_data: Dati di calibrazione (NpzFile o dizionario di array)
+        image_size: Dimensione immagine (width, height)
+        cache_dir: Directory della cache (None per disabilitarla)
+        map_type: Formato delle mappe (cv2.CV_16SC2 o cv2.CV_32FC1)
+
+    Returns:
+        RectificationMaps; le mappe lette dalla cache sono memory-mapped in sola lettura
+    """
+    key = calibration_hash(calib_data, image_size, map_type)
+
+    if cache_dir is not None:
+        entry_dir = Path(cache_dir) / key
+        maps = _read_cache_entry(entry_dir, image_size, key)
+        if maps is not None:
+            logger.debug(f"Mappe di rettifica caricate dalla cache {entry_dir}")
+            return maps
+
+    maps = compute_rectification_maps(calib_data, image_size, map_type)
+    maps.key = key
+
+    if cache_dir is not None:
+        _write_cache_entry(Path(cache_dir), key, maps)
+
+    return maps
+
+
+def _read_cache_entry(entry_dir: Path, image_size, key) -> Optional[RectificationMaps]:
+    """Legge una voce della cache, o None se assente o incompleta."""
+    paths = [entry_dir / f"{name}.npy" for name in MAP_FILES]
+    if not all(path.exists() for path in paths):
+        return None
+
+    try:
+        map1_l, map2_l, map1_r, map2_r = (np.load(path, mmap_mode='r') for path in paths[:4])
+        Q = np.load(paths[4])
+        return RectificationMaps(map1_l, map2_l, map1_r, map2_r, Q, image_size, key=key)
+    except Exception as e:
+        logger.warning(f"Voce della cache di rettifica non valida ({entry_dir}): {e}")
+        return None
+
+
+def _write_cache_entry(cache_dir: Path, key: str, maps: RectificationMaps):
+    """
+    Salva una voce della cache in modo atomico: i file vengono scritti in una
+    directory temporanea che viene poi rinominata.
+    """
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_dir = Path(tempfile.mkdtemp(prefix=f".{key}-", dir=cache_dir))
+
+        arrays = (maps.map1_l, maps.map2_l, maps.map1_r, maps.map2_r, maps.Q)
+        for name, array in zip(MAP_FILES, arrays):
+            np.save(tmp_dir / f"{name}.npy", np.ascontiguousarray(array))
+
+        try:
+            os.replace(tmp_dir, cache_dir / key)
+        except OSError:
+            # Un altro processo ha già salvato la stessa voce
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        logger.info(f"Mappe di rettifica salvate nella cache {cache_dir / key}")
+
+    except Exception as e:
+        logger.warning(f"Impossibile salvare le mappe di rettifica nella cache: {e}")
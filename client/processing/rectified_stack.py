@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Stack preallocato dei pattern rettificati.
+Ogni coppia di frame viene rettificata una sola volta, direttamente in un piano
+di un buffer (N, H, W) uint8 per camera; decodificatori e worker leggono viste
+in sola lettura degli stessi piani invece di ripetere cv2.remap su array nuovi.
+"""
+
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import cv2
+
+from client.processing.memory_manager import ManagedBuffer
+from client.processing.process_backend import SharedArray
+
+# Configurazione logging
+logger = logging.getLogger(__name__)
+
+# Numero iniziale di piani allocati per camera
+DEFAULT_CAPACITY = 32
+
+
+class RectifiedStack:
+    """
+    Buffer dei pattern rettificati di una scansione, indicizzato per pattern.
+
+    I piani sono memorizzati come (N, H, W) invece di H×W×N, così ogni pattern
+    è un blocco contiguo utilizzabile come ``dst`` di cv2.remap e come input dei
+    motori di corrispondenza senza copie. Con ``shared=True`` i buffer risiedono
+    in memoria condivisa e possono essere letti dai processi worker; con un
+    MemoryManager (solo buffer locali) possono essere spostati su file quando
+    lo stack è freddo.
+    """
+
+    def __init__(self, height: int, width: int, capacity: int = DEFAULT_CAPACITY, shared: bool = False,
+                 memory_manager=None):
+        """
+        Inizializza lo stack.
+
+        Args:
+            height, width: Dimensioni dei frame rettificati
+            capacity: Numero iniziale di piani per camera (cresce se necessario)
+            shared: Se True, alloca i buffer in memoria condivisa
+            memory_manager: MemoryManager che alloca i buffer locali (opzionale)
+        """
+        self.shape = (int(height), int(width))
+        self.shared = shared
+        self._memory_manager = None if shared else memory_manager
+        self._lock = threading.RLock()
+        self._slots: Dict[int, int] = {}
+        self._buffers = None
+        self._retired: List[SharedArray] = []
+        self._allocate(max(1, int(capacity)))
+
+    def _new_buffer(self, capacity: int):
+        """Alloca un buffer (capacity, H, W), eventualmente in memoria condivisa."""
+        shape = (capacity,) + self.shape
+        if self.shared:
+            return SharedArray(shape, np.uint8)
+        if self._memory_manager is not None:
+            return self._memory_manager.allocate("rectified_stack", shape, np.uint8, priority=4,
+                                                 allocation_type='rectified_stack')
+        return np.empty(shape, dtype=np.uint8)
+
+    @staticmethod
+    def _array(buffer) -> np.ndarray:
+        """Restituisce l'array NumPy di un buffer locale, condiviso o gestito."""
+        return buffer.array if isinstance(buffer, (SharedArray, ManagedBuffer)) else buffer
+
+    @staticmethod
+    def _release(buffer):
+        """Rilascia un buffer gestito (le viste già restituite restano valide)."""
+        if isinstance(buffer, ManagedBuffer):
+            buffer.release()
+
+    def _allocate(self, capacity: int):
+        """Alloca (o ingrandisce) i buffer preservando i piani già rettificati."""
+        new_buffers = (self._new_buffer(capacity), self._new_buffer(capacity))
+
+        if self._buffers is not None:
+            used = len(self._slots)
+            for old, new in zip(self._buffers, new_buffers):
+                self._array(new)[:used] = self._array(old)[:used]
+
+            # Le viste già restituite puntano ai vecchi buffer: quelli condivisi
+            # restano aperti fino a close()
+            self._retired.extend(b for b in self._buffers if isinstance(b, SharedArray))
+            for buffer in self._buffers:
+                self._release(buffer)
+
+        self._buffers = new_buffers
+        self.capacity = capacity
+
+    def rectify_pair(self, pattern_index: int, left: np.ndarray, right: np.ndarray,
+                     maps: Sequence[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Rettifica una coppia nello stack; se il pattern è già presente non la rielabora.
+
+        Args:
+            pattern_index: Indice del pattern
+            left, right: Frame grezzi delle due camere
+            maps: Tupla (map_x_l, map_y_l, map_x_r, map_y_r) per cv2.remap
+
+        Returns:
+            Tupla (left_rect, right_rect) di viste in sola lettura
+        """
+        with self._lock:
+            if pattern_index not in self._slots:
+                if len(self._slots) >= self.capacity:
+                    self._allocate(self.capacity * 2)
+
+                slot = len(self._slots)
+                map_x_l, map_y_l, map_x_r, map_y_r = maps
+
+                # I buffer gestiti non vengono spostati su file durante la scrittura
+                with self._pinned() as (stack_l, stack_r):
+                    cv2.remap(_to_gray(left), map_x_l, map_y_l, cv2.INTER_LINEAR, dst=stack_l[slot])
+                    cv2.remap(_to_gray(right), map_x_r, map_y_r, cv2.INTER_LINEAR, dst=stack_r[slot])
+                self._slots[pattern_index] = slot
+
+            return self.get_pair(pattern_index)
+
+    def get_pair(self, pattern_index: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Restituisce la coppia rettificata di un pattern.
+
+        Returns:
+            Tupla (left_rect, right_rect) di viste in sola lettura, o None se assente
+        """
+        with self._lock:
+            slot = self._slots.get(pattern_index)
+            if slot is None:
+                return None
+
+            stack_l, stack_r = self.arrays()
+            left_view = stack_l[slot]
+            right_view = stack_r[slot]
+            left_view.flags.writeable = False
+            right_view.flags.writeable = False
+            return left_view, right_view
+
+    def slots(self, pattern_indices: Sequence[int]) -> List[int]:
+        """Restituisce i piani occupati dai pattern indicati."""
+        with self._lock:
+            return [self._slots[idx] for idx in pattern_indices]
+
+    def arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Restituisce i buffer completi (capacity, H, W) delle due camere."""
+        return self._array(self._buffers[0]), self._array(self._buffers[1])
+
+    @contextmanager
+    def _pinned(self):
+        """Blocca i buffer gestiti in posizione per una scrittura e ne restituisce gli array."""
+        managed = [b for b in self._buffers if isinstance(b, ManagedBuffer)]
+        for buffer in managed:
+            buffer.pin()
+        try:
+            yield self.arrays()
+        finally:
+            for buffer in managed:
+                buffer.unpin()
+
+    def shared_specs(self) -> Tuple[tuple, tuple]:
+        """Descrittori dei buffer condivisi, da passare ai processi worker."""
+        if not self.shared:
+            raise RuntimeError("Lo stack non è allocato in memoria condivisa")
+        return self._buffers[0].spec, self._buffers[1].spec
+
+    def pattern_indices(self) -> List[int]:
+        """Restituisce gli indici dei pattern rettificati, in ordine."""
+        with self._lock:
+            return sorted(self._slots)
+
+    def __contains__(self, pattern_index):
+        with self._lock:
+            return pattern_index in self._slots
+
+    def __len__(self):
+        with self._lock:
+            return len(self._slots)
+
+    def clear(self):
+        """Svuota lo stack mantenendo i buffer allocati."""
+        with self._lock:
+            self._slots = {}
+
+    def close(self):
+        """Rilascia i buffer (necessario per quelli in memoria condivisa)."""
+        with self._lock:
+            for buffer in list(self._buffers or ()) + self._retired:
+                if isinstance(buffer, SharedArray):
+                    buffer.close()
+                else:
+                    self._release(buffer)
+            self._buffers = None
+            self._retired = []
+            self._slots = {}
+
+
+def _to_gray(frame: np.ndarray) -> np.ndarray:
+    """Converte un frame a colori in scala di grigi (i pattern sono monocromatici)."""
+    if frame.ndim == 3 and frame.shape[2] == 3:
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    if frame.ndim == 3:
+        return frame[:, :, 0]
+    return frame
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Riproiezione sparsa di mappe di disparità in punti 3D.
+Invece di cv2.reprojectImageTo3D sull'intera immagine, raccoglie una sola volta
+gli indici dei pixel validi e applica la matrice Q solo alle terne (x, y, d)
+corrispondenti con un unico prodotto matriciale. Restituisce anche gli indici
+dei pixel, così le fasi successive conoscono la corrispondenza pixel → punto.
+"""
+
+import logging
+from typing import Optional, Tuple
+
+import numpy as np
+
+# Configurazione logging
+logger = logging.getLogger(__name__)
+
+
+def valid_pixel_indices(disparity_map: np.ndarray, mask: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Indici lineari dei pixel con disparità valida.
+
+    Args:
+        disparity_map: Mappa di disparità HxW (0 dove non c'è corrispondenza)
+        mask: Maschera opzionale dei pixel da considerare
+
+    Returns:
+        Array di indici lineari (riga * W + colonna)
+    """
+    valid = disparity_map > 0
+    if mask is not None:
+        valid &= mask > 0
+    return np.flatnonzero(valid)
+
+
+def reproject_sparse(disparity_map: np.ndarray, Q: np.ndarray, mask: Optional[np.ndarray] = None,
+                     max_range: Optional[float] = None,
+                     pixel_indices: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Riproietta in 3D solo i pixel validi di una mappa di disparità.
+
+    Equivale a cv2.reprojectImageTo3D seguito dal filtro dei punti non finiti,
+    ma lavora sui soli pixel con disparità positiva (e nella maschera).
+
+    Args:
+        disparity_map: Mappa di disparità HxW
+        Q: Matrice di riproiezione 4x4
+        mask: Maschera opzionale dei pixel da riproiettare
+        max_range: Se indicato, scarta i punti con una coordinata >= max_range in valore assoluto
+        pixel_indices: Indici lineari già calcolati (al posto di disparity_map/mask)
+
+    Returns:
+        Tupla (points, pixel_indices): punti Nx3 float32 e indici lineari dei
+        pixel da cui provengono
+    """
+    width = disparity_map.shape[1]
+    if pixel_indices is None:
+        pixel_indices = valid_pixel_indices(disparity_map, mask)
+
+    if pixel_indices.size == 0:
+        return np.empty((0, 3), dtype=np.float32), pixel_indices
+
+    rows, cols = np.divmod(pixel_indices, width)
+
+    # Coordinate omogenee (x, y, d, 1) dei soli pixel validi
+    homogeneous = np.empty((pixel_indices.size, 4), dtype=np.float32)
+    homogeneous[:, 0] = cols
+    homogeneous[:, 1] = rows
+    homogeneous[:, 2] = disparity_map.ravel()[pixel_indices]
+    homogeneous[:, 3] = 1.0
+
+    projected = homogeneous @ np.asarray(Q, dtype=np.float32).T
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        points = projected[:, :3] / projected[:, 3:4]
+
+    keep = np.isfinite(points).all(axis=1)
+    if max_range is not None:
+        keep &= (np.abs(points) < max_range).all(axis=1)
+
+    if not keep.all():
+        points = points[keep]
+        pixel_indices = pixel_indices[keep]
+
+    return np.ascontiguousarray(points), pixel_indices
@@ -12,40 +12,206 @@ import os
 import time
 import logging
 import threading
+import multiprocessing
 import cv2
-import uuid
 import numpy as np
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, Optional, Tuple, List, Set, Any, Callable
+from typing import Dict, Optional, List, Set, Any, Callable
 from collections import deque
 import queue
+import functools
+import itertools
+from concurrent.futures import CancelledError, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+
+from client.processing.correspondence import update_disparity_from_pattern
+from client.processing.phase_unwrapping import (
+    DEFAULT_FREQUENCIES, decode_phase_sequence, match_absolute_phase
+)
+from client.processing.process_backend import BACKENDS, ProcessTriangulationBackend
+from client.processing.rectification import RECTIFICATION_CACHE_DIR, load_rectification_maps
+from client.processing.rectified_stack import RectifiedStack
+from client.processing.task_executor import PRIORITY_PREVIEW, TriangulationExecutor
+from client.processing.tiling import plan_tiles
+from client.processing.disparity_filter import DisparitySmoother
+from client.processing.instrumentation import PipelineInstrumentation
+from client.processing.memory_manager import ManagedBuffer, MemoryManager
+from client.processing.organized_pointcloud import OrganizedPointCloud
+from client.processing.ply_writer import write_ply
+from client.processing.pointcloud_codec import DEFAULT_QUANTIZATION_STEP, EncodedPointCloud, encode_pointcloud
+from client.processing.pointcloud_filters import (
+    radius_outlier_removal, statistical_outlier_removal, voxel_grid_downsample
+)
+from common.scan_bundle import SCAN_BUNDLE_NAME, ScanBundleWriter, calibration_digest
 
 # Configurazione logging
 logger = logging.getLogger(__name__)
 
+# Formati di salvataggio dei frame: bundle unico, PNG o array NumPy grezzi
+STORAGE_FORMATS = ("bundle", "png", "npy")
+
+# Writer del salvataggio in background ed elementi in coda oltre i quali queue_frame attende
+DEFAULT_SAVE_WRITERS = 2
+DEFAULT_SAVE_QUEUE_SIZE = 64
+
+# Livello di compressione PNG: 0-1 costa una frazione del default (3) con file poco più grandi
+DEFAULT_PNG_COMPRESSION = 1
+
+# Attesa massima (s) di queue_frame con la coda piena prima di scartare il frame
+DEFAULT_SAVE_PUT_TIMEOUT = 2.0
+
+
+class FrameLease(tuple):
+    """
+    Tupla di viste in sola lettura su slot di CircularFrameBuffer.
+    Finché la lease è viva gli slot non vengono riciclati; si rilascia con
+    ``release()``, all'uscita da un blocco ``with`` o quando viene raccolta.
+    """
+
+    def __new__(cls, frames, release_callback):
+        lease = super().__new__(cls, frames)
+        lease._release_callback = release_callback
+        return lease
+
+    def release(self):
+        """Rilascia gli slot (idempotente)."""
+        callback, self._release_callback = self._release_callback, None
+        if callback is not None:
+            callback()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+    def __del__(self):
+        self.release()
+
 
 class CircularFrameBuffer:
     """
     Buffer circolare thread-safe per memorizzare i frame più recenti.
-    Ottimizzato per accesso rapido e basso utilizzo di memoria.
+
+    Al primo frame di ogni camera vengono preallocati ``max_size`` slot della
+    stessa forma e tipo, quindi la memoria occupata è fissa e nota in anticipo.
+    Ogni frame viene scritto una sola volta nel suo slot (copiato da
+    ``add_frame`` o scritto direttamente dal produttore con ``frame_slot``) e
+    le letture restituiscono viste in sola lettura senza copie. Gli slot letti
+    con ``get_frame_pair`` hanno un conteggio dei riferimenti e vengono
+    riciclati solo quando nessun lettore li trattiene.
+
+    Con un MemoryManager gli slot sono buffer gestiti: sotto pressione possono
+    essere spostati su file, tranne mentre vengono scritti o letti tramite lease.
     """
 
-    def __init__(self, max_size=50):
+    def __init__(self, max_size=50, memory_manager=None):
         """
         Inizializza il buffer circolare.
 
         Args:
-            max_size: Dimensione massima del buffer (numero di frame)
+            max_size: Dimensione massima del buffer (numero di pattern, slot per camera)
+            memory_manager: MemoryManager che alloca gli slot (opzionale)
         """
         self._buffer = {}  # Dizionario indicizzato per pattern_index
         self._lock = threading.RLock()  # Lock rientrante per thread-safety
         self._max_size = max_size
-        self._pattern_queue = deque(maxlen=max_size)  # Coda per mantenere l'ordine
+        self._pattern_queue = deque()  # Coda per mantenere l'ordine
+        self._memory_manager = memory_manager
+
+        # Slot preallocati per camera: array (max_size, ...) e stato di ogni slot
+        self._pools = {}
+        self._free_slots = {}
+        self._refcounts = {}
+        self._mapped = {}
+
+    @property
+    def reserved_bytes(self) -> int:
+        """Memoria riservata dagli slot di tutte le camere."""
+        with self._lock:
+            return sum(pool.nbytes for pool in self._pools.values())
+
+    def _ensure_pool(self, camera_index, shape, dtype) -> bool:
+        """Alloca gli slot della camera al primo frame (o se cambia formato a buffer vuoto)."""
+        pool = self._pools.get(camera_index)
+        if pool is not None and pool.shape[1:] == tuple(shape) and pool.dtype == dtype:
+            return True
+
+        if pool is not None and (self._mapped[camera_index].any() or self._refcounts[camera_index].any()):
+            logger.warning(f"Frame {tuple(shape)} {dtype} incompatibile con gli slot della camera "
+                           f"{camera_index} {pool.shape[1:]} {pool.dtype}")
+            return False
+
+        if isinstance(pool, ManagedBuffer):
+            pool.release()
+
+        pool_shape = (self._max_size,) + tuple(shape)
+        if self._memory_manager is not None:
+            self._pools[camera_index] = self._memory_manager.allocate(
+                f"frame_buffer_{camera_index}", pool_shape, dtype, priority=6, allocation_type='frame_buffer')
+        else:
+            self._pools[camera_index] = np.empty(pool_shape, dtype=dtype)
+        self._free_slots[camera_index] = list(range(self._max_size - 1, -1, -1))
+        self._refcounts[camera_index] = np.zeros(self._max_size, dtype=np.int32)
+        self._mapped[camera_index] = np.zeros(self._max_size, dtype=bool)
+        return True
+
+    def _pin_pool(self, camera_index) -> np.ndarray:
+        """Impedisce lo spostamento su file degli slot della camera e ne restituisce l'array."""
+        pool = self._pools[camera_index]
+        return pool.pin() if isinstance(pool, ManagedBuffer) else pool
+
+    @staticmethod
+    def _unpin_pool(pool):
+        """Annulla ``_pin_pool`` sul pool indicato."""
+        if isinstance(pool, ManagedBuffer):
+            pool.unpin()
+
+    def _unmap_slot(self, camera_index, slot):
+        """Stacca uno slot dal suo pattern; torna libero quando nessun lettore lo trattiene."""
+        self._mapped[camera_index][slot] = False
+        if self._refcounts[camera_index][slot] == 0:
+            self._free_slots[camera_index].append(slot)
+
+    def _release_slots(self, slots, pools):
+        """Decrementa i riferimenti degli slot di una lease e sblocca i pool."""
+        with self._lock:
+            for pool in pools:
+                self._unpin_pool(pool)
+            for camera_index, slot in slots:
+                refcounts = self._refcounts.get(camera_index)
+                if refcounts is None or refcounts[slot] == 0:
+                    continue
+                refcounts[slot] -= 1
+                if refcounts[slot] == 0 and not self._mapped[camera_index][slot]:
+                    self._free_slots[camera_index].append(slot)
+
+    def _drop_pattern(self, pattern_index):
+        """Rimuove un pattern e stacca i suoi slot (con il lock acquisito)."""
+        data = self._buffer.pop(pattern_index)
+        for camera_index, slot in data['slots'].items():
+            self._unmap_slot(camera_index, slot)
+
+    def _is_held(self, pattern_index) -> bool:
+        """True se un lettore trattiene uno degli slot del pattern."""
+        return any(self._refcounts[camera_index][slot] > 0
+                   for camera_index, slot in self._buffer[pattern_index]['slots'].items())
+
+    def _evict_oldest(self, keep=None) -> bool:
+        """Rimuove il pattern più vecchio (diverso da ``keep``) non trattenuto da lettori."""
+        for pattern_index in self._pattern_queue:
+            if pattern_index != keep and not self._is_held(pattern_index):
+                self._pattern_queue.remove(pattern_index)
+                self._drop_pattern(pattern_index)
+                return True
+        return False
 
     def remove_pattern(self, pattern_index):
         """
         Rimuove un pattern specifico dal buffer.
+        Gli slot trattenuti da lettori restano validi fino al loro rilascio.
 
         Args:
             pattern_index: Indice del pattern da rimuovere
@@ -55,7 +221,7 @@ class CircularFrameBuffer:
         """
         with self._lock:
             if pattern_index in self._buffer:
-                del self._buffer[pattern_index]
+                self._drop_pattern(pattern_index)
                 # Rimuovi anche dalla coda se presente
                 try:
                     self._pattern_queue.remove(pattern_index)
@@ -64,9 +230,95 @@ class CircularFrameBuffer:
                 return True
             return False
 
+    @contextmanager
+    def frame_slot(self, camera_index: int, pattern_index: int, shape, dtype=np.uint8,
+                   metadata: Optional[Dict] = None):
+        """
+        Riserva uno slot da riempire direttamente (ad esempio ricevendo i byte
+        di un frame non compresso o come ``dst`` di una funzione OpenCV).
+        Il frame diventa visibile ai lettori all'uscita dal blocco; in caso di
+        eccezione lo slot torna libero.
+
+        Uso:
+            with buffer.frame_slot(0, pattern_index, (480, 640)) as slot:
+                if slot is not None:
+                    sock.recv_into(memoryview(slot).cast("B"))
+
+        Args:
+            camera_index: Indice della camera (0=left, 1=right)
+            pattern_index: Indice del pattern
+            shape: Forma del frame
+            dtype: Tipo del frame
+            metadata: Metadati associati al frame
+
+        Yields:
+            Vista scrivibile sullo slot, o None se il buffer è pieno di slot
+            trattenuti o il formato non è compatibile
+        """
+        with self._lock:
+            slot = self._reserve_slot(camera_index, pattern_index, shape, np.dtype(dtype))
+            if slot is not None:
+                pool = self._pools[camera_index]
+                pool_array = self._pin_pool(camera_index)
+
+        if slot is None:
+            yield None
+            return
+
+        try:
+            yield pool_array[slot]
+        except BaseException:
+            with self._lock:
+                self._free_slots[camera_index].append(slot)
+            raise
+        finally:
+            self._unpin_pool(pool)
+
+        with self._lock:
+            self._commit_slot(camera_index, pattern_index, slot, metadata or {})
+
+    def _reserve_slot(self, camera_index, pattern_index, shape, dtype):
+        """Prende uno slot libero per un nuovo frame (con il lock acquisito)."""
+        if not self._ensure_pool(camera_index, shape, dtype):
+            return None
+
+        if pattern_index in self._buffer:
+            # Un frame ripetuto riusa lo slot precedente se nessuno lo sta leggendo
+            slots = self._buffer[pattern_index]['slots']
+            if camera_index in slots and self._refcounts[camera_index][slots[camera_index]] == 0:
+                self._unmap_slot(camera_index, slots.pop(camera_index))
+        elif len(self._buffer) >= self._max_size:
+            # Un nuovo pattern oltre la capacità fa posto rimuovendo il più vecchio
+            self._evict_oldest()
+
+        free_slots = self._free_slots[camera_index]
+        while not free_slots:
+            if not self._evict_oldest(keep=pattern_index):
+                logger.warning(f"Nessuno slot libero per la camera {camera_index}: "
+                               f"frame del pattern {pattern_index} scartato")
+                return None
+        return free_slots.pop()
+
+    def _commit_slot(self, camera_index, pattern_index, slot, metadata):
+        """Associa uno slot riempito al suo pattern (con il lock acquisito)."""
+        if pattern_index not in self._buffer:
+            self._buffer[pattern_index] = {
+                'slots': {},
+                'metadata': metadata,
+                'timestamp': time.time()
+            }
+            self._pattern_queue.append(pattern_index)
+
+        # Un frame ripetuto sostituisce il precedente, che resta valido per chi lo legge
+        slots = self._buffer[pattern_index]['slots']
+        if camera_index in slots:
+            self._unmap_slot(camera_index, slots[camera_index])
+        slots[camera_index] = slot
+        self._mapped[camera_index][slot] = True
+
     def add_frame(self, camera_index: int, pattern_index: int, frame: np.ndarray, metadata: Dict) -> bool:
         """
-        Aggiunge un frame al buffer.
+        Aggiunge un frame al buffer, copiandolo nel suo slot.
 
         Args:
             camera_index: Indice della camera (0=left, 1=right)
@@ -77,58 +329,67 @@ class CircularFrameBuffer:
         Returns:
             True se il frame è stato aggiunto con successo, False altrimenti
         """
-        with self._lock:
-            # Inizializza la struttura se necessario
-            if pattern_index not in self._buffer:
-                self._buffer[pattern_index] = {
-                    'frames': {},
-                    'metadata': metadata,
-                    'timestamp': time.time()
-                }
-                self._pattern_queue.append(pattern_index)
-
-            # Aggiungi il frame
-            self._buffer[pattern_index]['frames'][camera_index] = frame.copy()
+        with self.frame_slot(camera_index, pattern_index, frame.shape, frame.dtype, metadata) as slot:
+            if slot is None:
+                return False
+            np.copyto(slot, frame)
+        return True
 
-            # Se abbiamo superato la dimensione massima, rimuovi il frame più vecchio
-            if len(self._buffer) > self._max_size:
-                oldest_pattern = self._pattern_queue.popleft()
-                if oldest_pattern in self._buffer:
-                    del self._buffer[oldest_pattern]
+    def _pool_array(self, camera_index) -> np.ndarray:
+        """Array degli slot della camera (locale o gestito dal memory manager)."""
+        pool = self._pools[camera_index]
+        return pool.array if isinstance(pool, ManagedBuffer) else pool
 
-            return True
+    def _view(self, camera_index, slot, pool_array=None) -> np.ndarray:
+        """Vista in sola lettura su uno slot."""
+        if pool_array is None:
+            pool_array = self._pool_array(camera_index)
+        view = pool_array[slot].view()
+        view.flags.writeable = False
+        return view
 
     def get_frame(self, pattern_index: int, camera_index: int) -> Optional[np.ndarray]:
         """
-        Ottiene un frame specifico dal buffer.
+        Ottiene un frame specifico dal buffer, senza copie.
+        La vista non trattiene lo slot: per usarla oltre l'arrivo di nuovi frame
+        va letta con get_frame_pair.
 
         Args:
             pattern_index: Indice del pattern
             camera_index: Indice della camera
 
         Returns:
-            Frame come array NumPy o None se non disponibile
+            Vista in sola lettura del frame o None se non disponibile
         """
         with self._lock:
-            if pattern_index in self._buffer and camera_index in self._buffer[pattern_index]['frames']:
-                return self._buffer[pattern_index]['frames'][camera_index].copy()
+            if pattern_index in self._buffer and camera_index in self._buffer[pattern_index]['slots']:
+                return self._view(camera_index, self._buffer[pattern_index]['slots'][camera_index])
             return None
 
-    def get_frame_pair(self, pattern_index: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    def get_frame_pair(self, pattern_index: int) -> Optional[FrameLease]:
         """
         Ottiene una coppia di frame (left, right) per un pattern specifico.
+        Le viste restano valide finché la lease non viene rilasciata.
 
         Args:
             pattern_index: Indice del pattern
 
         Returns:
-            Tupla (left_frame, right_frame) o None se non disponibile
+            FrameLease (left_frame, right_frame) in sola lettura, o None se non disponibile
         """
         with self._lock:
             if pattern_index in self._buffer:
-                frames = self._buffer[pattern_index]['frames']
-                if 0 in frames and 1 in frames:
-                    return frames[0].copy(), frames[1].copy()
+                slots = self._buffer[pattern_index]['slots']
+                if 0 in slots and 1 in slots:
+                    held = [(0, slots[0]), (1, slots[1])]
+                    for camera_index, slot in held:
+                        self._refcounts[camera_index][slot] += 1
+
+                    # I pool restano in RAM (o su file) finché la lease non viene rilasciata
+                    pools = [self._pools[0], self._pools[1]]
+                    views = tuple(self._view(camera_index, slot, self._pin_pool(camera_index))
+                                  for camera_index, slot in held)
+                    return FrameLease(views, functools.partial(self._release_slots, held, pools))
             return None
 
     def get_patterns_with_complete_pairs(self) -> List[int]:
@@ -141,8 +402,8 @@ class CircularFrameBuffer:
         with self._lock:
             result = []
             for pattern_index, data in self._buffer.items():
-                frames = data['frames']
-                if 0 in frames and 1 in frames:
+                slots = data['slots']
+                if 0 in slots and 1 in slots:
                     result.append(pattern_index)
             return sorted(result)
 
@@ -158,8 +419,8 @@ class CircularFrameBuffer:
         """
         with self._lock:
             if pattern_index in self._buffer:
-                frames = self._buffer[pattern_index]['frames']
-                return 0 in frames and 1 in frames
+                slots = self._buffer[pattern_index]['slots']
+                return 0 in slots and 1 in slots
             return False
 
     def get_metadata(self, pattern_index: int) -> Optional[Dict]:
@@ -177,12 +438,32 @@ class CircularFrameBuffer:
                 return self._buffer[pattern_index]['metadata'].copy()
             return None
 
-    def clear(self):
-        """Pulisce il buffer."""
+    def clear(self, max_size=None):
+        """
+        Pulisce il buffer, conservando gli slot allocati.
+
+        Args:
+            max_size: Nuova capacità (opzionale); gli slot vengono riallocati al
+                prossimo frame se nessun lettore li trattiene
+        """
         with self._lock:
-            self._buffer.clear()
+            for pattern_index in list(self._buffer):
+                self._drop_pattern(pattern_index)
             self._pattern_queue.clear()
 
+            if max_size is not None and max_size != self._max_size:
+                if any(refcounts.any() for refcounts in self._refcounts.values()):
+                    logger.warning("Slot del buffer ancora in lettura: capacità invariata")
+                    return
+                self._max_size = max_size
+                for pool in self._pools.values():
+                    if isinstance(pool, ManagedBuffer):
+                        pool.release()
+                self._pools.clear()
+                self._free_slots.clear()
+                self._refcounts.clear()
+                self._mapped.clear()
+
     def __len__(self):
         """Restituisce il numero di pattern nel buffer."""
         with self._lock:
@@ -198,33 +479,137 @@ class CircularFrameBuffer:
         Restituisce statistiche sul buffer.
 
         Returns:
-            Dizionario con statistiche sul buffer
+            Dizionario con statistiche sul buffer (memory_usage_mb è la memoria
+            riservata dagli slot, fissa dopo il primo frame; spilled_mb la parte
+            spostata su file dal memory manager)
         """
         with self._lock:
+            slot_bytes = {camera_index: pool.nbytes // pool.shape[0] for camera_index, pool in self._pools.items()}
             return {
                 'total_patterns': len(self._buffer),
                 'complete_pairs': len(self.get_patterns_with_complete_pairs()),
-                'memory_usage_mb': sum(
-                    sum(frame.nbytes for frame in data['frames'].values())
-                    for data in self._buffer.values()
-                ) / (1024 * 1024)
+                'memory_usage_mb': self.reserved_bytes / (1024 * 1024),
+                'used_memory_mb': sum(
+                    slot_bytes[camera_index] * int(mapped.sum())
+                    for camera_index, mapped in self._mapped.items()
+                ) / (1024 * 1024),
+                'spilled_mb': sum(pool.nbytes for pool in self._pools.values()
+                                  if isinstance(pool, ManagedBuffer) and pool.spilled) / (1024 * 1024),
+                'slots_per_camera': self._max_size,
+                'held_slots': sum(int((refcounts > 0).sum()) for refcounts in self._refcounts.values())
             }
 
 
+def pattern_weight(pattern_index):
+    """
+    Peso di un pattern progressivo nell'accumulo della disparità.
+    Dipende solo dall'indice del pattern, quindi non cambia con l'ordine di arrivo.
+    I pattern più fini (indici maggiori) hanno peso maggiore.
+    """
+    return 2 ** ((pattern_index - 2) // 2)
+
+
+class DisparityAccumulator:
+    """
+    Mappe di disparità e confidenza accumulate per una scansione.
+    Tiene traccia dei pattern già elaborati, così ogni aggiornamento elabora
+    soltanto le coppie appena arrivate.
+    """
+
+    def __init__(self, memory_manager=None):
+        """
+        Inizializza un accumulatore vuoto.
+
+        Args:
+            memory_manager: MemoryManager in cui contabilizzare le mappe (opzionale)
+        """
+        self.disparity_sum = None
+        self.confidence_sum = None
+        self.patterns: Set[int] = set()
+        self._memory_manager = memory_manager
+        self._allocation_id = f"disparity_maps_{id(self)}"
+
+    def reset(self):
+        """Azzera le mappe e l'elenco dei pattern elaborati."""
+        self.disparity_sum = None
+        self.confidence_sum = None
+        self.patterns = set()
+        if self._memory_manager is not None:
+            self._memory_manager.unregister_allocation(self._allocation_id)
+
+    def ensure_shape(self, height, width):
+        """
+        Alloca le mappe per la dimensione dei frame; un cambio di dimensione azzera l'accumulo.
+
+        Args:
+            height, width: Dimensioni dei frame
+        """
+        if self.disparity_sum is None or self.disparity_sum.shape != (height, width):
+            if self.patterns:
+                logger.warning("Dimensione dei frame cambiata, accumulo di disparità azzerato")
+            self.disparity_sum = np.zeros((height, width), dtype=np.float32)
+            self.confidence_sum = np.zeros((height, width), dtype=np.float32)
+            self.patterns = set()
+
+            # Le mappe sono aggiornate ad ogni pattern: contano nel budget ma restano in RAM
+            if self._memory_manager is not None:
+                self._memory_manager.register_allocation(
+                    self._allocation_id, (self.disparity_sum.nbytes + self.confidence_sum.nbytes) / (1024 * 1024),
+                    allocation_type='disparity_maps')
+
+    def pending_patterns(self, pattern_indices):
+        """
+        Filtra i pattern ancora da accumulare (esclusi white e black).
+
+        Args:
+            pattern_indices: Indici dei pattern disponibili
+
+        Returns:
+            Lista ordinata degli indici non ancora accumulati
+        """
+        return sorted(idx for idx in pattern_indices if idx > 1 and idx not in self.patterns)
+
+    def disparity(self):
+        """
+        Calcola la disparità media pesata corrente.
+
+        Returns:
+            Mappa di disparità float32 (0 dove non ci sono corrispondenze)
+        """
+        disparity_map = np.zeros_like(self.disparity_sum)
+        np.divide(self.disparity_sum, self.confidence_sum, out=disparity_map,
+                  where=self.confidence_sum > 0)
+        return disparity_map
+
+
 class RealTimeTriangulator:
     """
     Componente per la triangolazione in tempo reale dei frame.
     Implementa algoritmi ottimizzati per l'elaborazione incrementale.
     """
 
-    def __init__(self, output_dir=None):
+    def __init__(self, output_dir=None, backend="thread", num_workers=None, disparity_filter="bilateral",
+                 instrumentation=None):
         """
         Inizializza il triangolatore in tempo reale.
 
         Args:
             output_dir: Directory di output per salvare risultati (opzionale)
+            backend: Backend di calcolo delle corrispondenze ("thread" o "process")
+            num_workers: Numero di processi per il backend "process", di thread per i
+                tile del backend "thread" (default: CPU count)
+            disparity_filter: Filtro della disparità prima della riproiezione
+                ("bilateral", "median" o "none")
+            instrumentation: PipelineInstrumentation condivisa (opzionale, altrimenti propria)
         """
+        if backend not in BACKENDS:
+            raise ValueError(f"Backend di triangolazione non supportato: {backend}")
+
         self.output_dir = output_dir or Path.home() / "UnLook" / "scans"
+        self.backend = backend
+        self._process_backend = ProcessTriangulationBackend(num_workers) if backend == "process" else None
+        self._tile_workers = num_workers or multiprocessing.cpu_count()
+        self._tile_executor = None
         self._lock = threading.RLock()
         self._calibration_data = None
         self._white_black_initialized = False
@@ -232,6 +617,22 @@ class RealTimeTriangulator:
         self._black_frames = {0: None, 1: None}
         self._shadow_masks = {0: None, 1: None}
         self._last_pointcloud = None
+        self._last_organized_cloud = None
+
+        # Smussamento della disparità prima della riproiezione (con costo per frame)
+        self.disparity_smoother = DisparitySmoother(disparity_filter)
+
+        # Tempi per fase (rectify, match, filter, reproject)
+        self.instrumentation = instrumentation or PipelineInstrumentation()
+
+        # Memoria dei buffer della scansione con budget e spostamento su file dei buffer freddi
+        self._memory_manager = MemoryManager()
+
+        # Accumulo incrementale delle corrispondenze della scansione corrente
+        self._accumulator = DisparityAccumulator(self._memory_manager)
+
+        # Pattern rettificati della scansione corrente (ogni coppia una sola volta)
+        self._rectified_stack = None
         self._pointcloud_lock = threading.RLock()
 
         # Eventi e flag per la sincronizzazione
@@ -244,19 +645,6 @@ class RealTimeTriangulator:
         self._progress_callback = None
         self._completion_callback = None
 
-        # Gestore memoria intelligente
-        self._memory_manager = MemoryManager()
-
-        # Registra il buffer frame principale
-        buffer_size_mb = 50  # Stima iniziale
-        self._memory_manager.register_allocation(
-            'frame_buffer',
-            buffer_size_mb,
-            allocation_type='buffer',
-            priority=8,  # Alta priorità
-            cleanup_callback=self._cleanup_old_frames
-        )
-
     def set_callbacks(self, progress_callback=None, completion_callback=None):
         """
         Imposta le callback per le notifiche.
@@ -268,47 +656,6 @@ class RealTimeTriangulator:
         self._progress_callback = progress_callback
         self._completion_callback = completion_callback
 
-    def _cleanup_old_frames(self, allocation_id):
-        """
-        Pulisce frame obsoleti dal buffer su richiesta del memory manager.
-
-        Args:
-            allocation_id: ID dell'allocazione da pulire
-        """
-        if not hasattr(self, '_frame_buffer') or not self._frame_buffer:
-            return
-
-        try:
-            # Mantieni solo white+black e ultimi 4 pattern
-            pattern_indices = self._frame_buffer.get_patterns_with_complete_pairs()
-
-            # Conserva 0, 1 (white/black) e gli ultimi N pattern
-            keep_indices = [0, 1]
-            if len(pattern_indices) > 2:  # Se ci sono pattern oltre white/black
-                # Aggiungi gli ultimi 4 pattern
-                keep_indices.extend(sorted(pattern_indices[2:])[-4:])
-
-            # Filtra il buffer
-            for idx in pattern_indices:
-                if idx not in keep_indices:
-                    self._frame_buffer.remove_pattern(idx)
-
-            # Log operazione
-            logger.info(f"Pulizia buffer frame: mantenuti pattern {keep_indices}")
-
-            # Aggiorna registrazione memoria
-            current_stats = self._frame_buffer.get_statistics()
-            self._memory_manager.unregister_allocation('frame_buffer')
-            self._memory_manager.register_allocation(
-                'frame_buffer',
-                current_stats['memory_usage_mb'],
-                allocation_type='buffer',
-                priority=8,
-                cleanup_callback=self._cleanup_old_frames
-            )
-        except Exception as e:
-            logger.error(f"Errore nella pulizia buffer frame: {e}")
-
     def initialize(self, white_left, white_right, black_left, black_right):
         """
         Inizializza il triangolatore con i frame di riferimento.
@@ -333,6 +680,11 @@ class RealTimeTriangulator:
                 # Calcola le maschere di ombra
                 self._compute_shadow_masks()
 
+                # Nuovi frame di riferimento: inizia un nuovo accumulo
+                self._accumulator.reset()
+                if self._rectified_stack is not None:
+                    self._rectified_stack.clear()
+
                 # Carica i dati di calibrazione
                 self._load_calibration_data()
 
@@ -494,14 +846,6 @@ class RealTimeTriangulator:
             return False
 
         try:
-            # Estrai parametri di calibrazione
-            M1 = self._calibration_data['M1']
-            M2 = self._calibration_data['M2']
-            d1 = self._calibration_data['d1']
-            d2 = self._calibration_data['d2']
-            R = self._calibration_data['R']
-            t = self._calibration_data['t']
-
             # Determina dimensione immagine dai frame di riferimento
             if self._white_frames[0] is not None:
                 img = self._white_frames[0]
@@ -510,28 +854,15 @@ class RealTimeTriangulator:
                 # Dimensione predefinita se non ci sono frame disponibili
                 img_size = (640, 480)
 
-            # Calcola parametri di rettifica
-            R1, R2, P1, P2, Q, roi1, roi2 = cv2.stereoRectify(
-                cameraMatrix1=M1,
-                cameraMatrix2=M2,
-                distCoeffs1=d1,
-                distCoeffs2=d2,
-                imageSize=img_size,
-                R=R,
-                T=t,
-                flags=cv2.CALIB_ZERO_DISPARITY,
-                alpha=0
-            )
-
-            # Genera mappe di rettifica
-            self.map_x_l, self.map_y_l = cv2.initUndistortRectifyMap(
-                M1, d1, R1, P1, img_size, cv2.CV_32FC1)
+            # Mappe a virgola fissa, in cache su disco per calibrazione e dimensione
+            maps = load_rectification_maps(self._calibration_data, img_size,
+                                           cache_dir=Path(self.output_dir) / RECTIFICATION_CACHE_DIR)
 
-            self.map_x_r, self.map_y_r = cv2.initUndistortRectifyMap(
-                M2, d2, R2, P2, img_size, cv2.CV_32FC1)
+            self.map_x_l, self.map_y_l = maps.map1_l, maps.map2_l
+            self.map_x_r, self.map_y_r = maps.map1_r, maps.map2_r
 
             # Memorizza matrice Q per riproiezione
-            self.Q = Q
+            self.Q = maps.Q
 
             logger.info("Mappe di rettifica generate con successo")
             return True
@@ -576,6 +907,19 @@ class RealTimeTriangulator:
             self._processing_thread.join(timeout=2.0)
             logger.info("Thread di elaborazione fermato")
 
+    def shutdown(self):
+        """Ferma l'elaborazione, rilascia lo stack rettificato e arresta il backend a processi."""
+        self.stop_processing()
+        with self._lock:
+            if self._rectified_stack is not None:
+                self._rectified_stack.close()
+                self._rectified_stack = None
+        if self._process_backend is not None:
+            self._process_backend.shutdown()
+        if self._tile_executor is not None:
+            self._tile_executor.shutdown(cancel_pending=True)
+            self._tile_executor = None
+
     def _processing_loop(self):
         """Loop principale del thread di elaborazione in tempo reale."""
         logger.info("Loop di elaborazione in tempo reale avviato")
@@ -612,8 +956,8 @@ class RealTimeTriangulator:
 
     def _process_frame_batch(self):
         """
-        Elabora un batch di frame per la triangolazione con parallelizzazione.
-        Metodo ottimizzato per l'elaborazione in-memory con multi-threading.
+        Elabora i nuovi pattern completi del buffer frame (se collegato).
+        L'elaborazione parallela avviene per tile all'interno di ``update_frames``.
         """
         # Verifica che il buffer del frame sia inizializzato
         if not hasattr(self, '_frame_buffer') or not self._frame_buffer:
@@ -624,8 +968,7 @@ class RealTimeTriangulator:
         pattern_indices = self._frame_buffer.get_patterns_with_complete_pairs()
 
         # Filtra pattern già elaborati
-        new_patterns = [idx for idx in pattern_indices
-                        if idx > 1 and idx > self._last_processed_pattern]
+        new_patterns = self.pending_patterns(pattern_indices)
 
         if not new_patterns:
             logger.debug("Nessun nuovo pattern da elaborare")
@@ -641,83 +984,31 @@ class RealTimeTriangulator:
 
         logger.info(f"Elaborazione batch con {len(pattern_indices)} pattern (nuovi: {len(new_patterns)})")
 
-        # Prepara sottotask per elaborazione parallela
-        tasks = []
-
-        # Dividi il lavoro in chunk per elaborazione parallela
-        chunk_size = max(1, len(pattern_indices) // self._thread_manager.num_workers)
-
-        for i in range(0, len(pattern_indices), chunk_size):
-            chunk_indices = pattern_indices[i:i + chunk_size]
-            if not chunk_indices:
-                continue
+        # Coppie lette dal buffer, trattenute fino alla fine dell'aggiornamento
+        leases = []
+        frame_pairs = []
+        for idx in new_patterns:
+            pair = self._frame_buffer.get_frame_pair(idx)
+            if pair:
+                leases.append(pair)
+                frame_pairs.append((idx, pair[0], pair[1]))
 
-            # Prepara coppie di frame per questo chunk
-            frame_pairs = []
-
-            # Aggiungi sempre white e black (indici 0 e 1) al primo chunk
-            if i == 0 and 0 in pattern_indices and 1 in pattern_indices:
-                white_pair = self._frame_buffer.get_frame_pair(0)
-                black_pair = self._frame_buffer.get_frame_pair(1)
-
-                if white_pair and black_pair:
-                    frame_pairs.append((0, white_pair[0], white_pair[1]))
-                    frame_pairs.append((1, black_pair[0], black_pair[1]))
-
-            # Aggiungi i pattern di questo chunk
-            for idx in chunk_indices:
-                if idx > 1:  # Ignora white e black per i chunk successivi
-                    pair = self._frame_buffer.get_frame_pair(idx)
-                    if pair:
-                        frame_pairs.append((idx, pair[0], pair[1]))
-
-            # Sottofinestra di disparità per questo chunk
-            y_start = (i // chunk_size) * (480 // self._thread_manager.num_workers)
-            y_end = min(480, ((i // chunk_size) + 1) * (480 // self._thread_manager.num_workers))
-
-            # Accoda task per elaborazione parallela
-            task_id = self._thread_manager.submit_task(
-                self._triangulate_frame_chunk,
-                frame_pairs,
-                y_range=(y_start, y_end)
-            )
-
-            tasks.append(task_id)
-
-        # Attendi completamento di tutti i task
-        partial_results = []
-
-        for task_id in tasks:
-            try:
-                result = self._thread_manager.get_result(task_id, timeout=30.0)
-                if result is not None:
-                    partial_results.append(result)
-            except Exception as e:
-                logger.error(f"Errore nel task di triangolazione: {e}")
-
-        # Combina i risultati parziali
-        if partial_results:
-            # Unisci le nuvole di punti parziali
-            combined_pointcloud = np.vstack(partial_results)
-
-            # Aggiorna la nuvola di punti
-            with self._pointcloud_lock:
-                self._last_pointcloud = combined_pointcloud
-
-            # Notifica il completamento
-            if self._completion_callback and combined_pointcloud is not None:
-                self._completion_callback(True,
-                                          f"Triangolazione completata: {len(combined_pointcloud)} punti",
-                                          combined_pointcloud)
+        try:
+            pointcloud = self.update_frames(frame_pairs)
+        finally:
+            for lease in leases:
+                lease.release()
 
+        if pointcloud is not None:
             # Aggiorna l'ultimo pattern elaborato
             self._last_processed_pattern = max(pattern_indices)
-
-            logger.info(f"Triangolazione batch completata: {len(combined_pointcloud)} punti")
+            logger.info(f"Triangolazione batch completata: {len(pointcloud)} punti")
 
     def triangulate_frames(self, frame_pairs):
         """
-        Triangola una lista di coppie di frame.
+        Triangola una lista completa di coppie di frame.
+        Le mappe vengono ricalcolate da zero e l'accumulatore incrementale
+        della scansione non viene modificato.
 
         Args:
             frame_pairs: Lista di tuple (pattern_index, left_frame, right_frame)
@@ -726,73 +1017,24 @@ class RealTimeTriangulator:
             Nuvola di punti come array NumPy (Nx3) o None in caso di errore
         """
         try:
-            if not self._white_black_initialized:
-                logger.error("Triangolatore non inizializzato, impossibile triangolare")
-                return None
-
-            if not frame_pairs:
-                logger.warning("Nessuna coppia di frame da triangolare")
-                return None
-
-            # Verifica che le mappe di rettifica siano disponibili
-            if not hasattr(self, 'map_x_l') or not hasattr(self, 'map_y_l'):
-                logger.error("Mappe di rettifica non disponibili")
+            if not self._check_ready(frame_pairs):
                 return None
 
-            # Ordina i frame per indice di pattern
-            frame_pairs.sort(key=lambda x: x[0])
-
             # Estrai le dimensioni dai frame
             height, width = frame_pairs[0][1].shape[:2]
 
-            # Inizializza le mappe di disparità e confidenza
-            disparity_map = np.zeros((height, width), dtype=np.float32)
-            confidence_map = np.zeros((height, width), dtype=np.float32)
-
-            # Applica la rettifica e l'elaborazione per ogni coppia di frame
-            for i, (pattern_idx, left_frame, right_frame) in enumerate(frame_pairs):
-                # Rettifica i frame
-                left_rect = cv2.remap(left_frame, self.map_x_l, self.map_y_l, cv2.INTER_LINEAR)
-                right_rect = cv2.remap(right_frame, self.map_x_r, self.map_y_r, cv2.INTER_LINEAR)
-
-                # Calcola il peso del pattern
-                pattern_weight = 2 ** (i // 2)  # Peso basato sulla posizione
-
-                # Aggiorna la mappa di disparità con questo pattern
-                self._update_disparity_from_pattern(
-                    left_rect, right_rect,
-                    self._shadow_masks[0], self._shadow_masks[1],
-                    disparity_map, confidence_map,
-                    pattern_weight
-                )
-
-                # Aggiorna il progresso
-                if self._progress_callback:
-                    progress = (i + 1) / len(frame_pairs) * 100
-                    self._progress_callback(progress,
-                                            f"Triangolazione pattern {pattern_idx}: {i + 1}/{len(frame_pairs)}")
-
-            # Calcola la mappa di disparità finale
-            valid_indices = confidence_map > 0
-            disparity_map_final = np.zeros_like(disparity_map)
-            disparity_map_final[valid_indices] = disparity_map[valid_indices] / confidence_map[valid_indices]
+            accumulator = DisparityAccumulator()
+            accumulator.ensure_shape(height, width)
 
-            # Applica filtro mediano per ridurre il rumore
-            kernel_size = 3
-            disparity_map_final = cv2.medianBlur(disparity_map_final.astype(np.float32), kernel_size)
-
-            # Riproietta in 3D
-            pointcloud = self._reproject_to_3d(disparity_map_final, self._shadow_masks[0])
-
-            # Memorizza la nuvola di punti
-            with self._pointcloud_lock:
-                self._last_pointcloud = pointcloud
+            stack = RectifiedStack(height, width, capacity=len(frame_pairs),
+                                   shared=self._process_backend is not None,
+                                   memory_manager=self._memory_manager)
+            try:
+                self._fold_pattern_pairs(accumulator, frame_pairs, stack)
+            finally:
+                stack.close()
 
-            # Chiama la callback di completamento
-            if self._completion_callback and pointcloud is not None:
-                self._completion_callback(True, f"Triangolazione completata: {len(pointcloud)} punti", pointcloud)
-
-            return pointcloud
+            return self._emit_pointcloud(accumulator)
 
         except Exception as e:
             logger.error(f"Errore nella triangolazione: {e}")
@@ -800,248 +1042,280 @@ class RealTimeTriangulator:
             logger.error(f"Traceback: {traceback.format_exc()}")
             return None
 
-    def _triangulate_frame_chunk(self, frame_pairs, y_range=None):
+    def update_frames(self, frame_pairs):
         """
-        Triangola un chunk di frame - ottimizzato per parallelizzazione.
+        Aggiunge all'accumulatore della scansione solo le coppie non ancora elaborate
+        e riemette la nuvola di punti. Il costo di ogni aggiornamento dipende solo
+        dal numero di nuove coppie, non da quanti pattern sono già stati ricevuti.
 
         Args:
             frame_pairs: Lista di tuple (pattern_index, left_frame, right_frame)
-            y_range: Tupla (y_start, y_end) per elaborare solo una porzione verticale
 
         Returns:
-            Nuvola di punti parziale come array NumPy
+            Nuvola di punti come array NumPy (Nx3) o None in caso di errore
         """
         try:
-            if not frame_pairs:
+            if not self._check_ready(frame_pairs):
                 return None
 
-            # Ordina frame per indice pattern
-            frame_pairs.sort(key=lambda x: x[0])
-
-            # Estrai dimensioni
             height, width = frame_pairs[0][1].shape[:2]
 
-            # Se specificato y_range, limita l'elaborazione a questa sezione verticale
-            y_start, y_end = y_range if y_range else (0, height)
-            y_start, y_end = max(0, y_start), min(height, y_end)
-
-            # Inizializza mappe di disparità e confidenza
-            disparity_map = np.zeros((height, width), dtype=np.float32)
-            confidence_map = np.zeros((height, width), dtype=np.float32)
-
-            # Rettifica e processa ogni coppia
-            for pattern_idx, left_frame, right_frame in frame_pairs:
-                # Rettifica i frame
-                left_rect = cv2.remap(left_frame, self.map_x_l, self.map_y_l, cv2.INTER_LINEAR)
-                right_rect = cv2.remap(right_frame, self.map_x_r, self.map_y_r, cv2.INTER_LINEAR)
-
-                # Calcolo peso del pattern
-                pattern_weight = 2 ** (pattern_idx // 2)
-
-                # Aggiorna mappa di disparità (solo per l'intervallo y_range)
-                self._update_disparity_chunk(
-                    left_rect, right_rect,
-                    self._shadow_masks[0], self._shadow_masks[1],
-                    disparity_map, confidence_map,
-                    pattern_weight, y_range
-                )
-
-            # Calcola mappa di disparità finale
-            valid_indices = confidence_map > 0
-            disparity_map_final = np.zeros_like(disparity_map)
-            disparity_map_final[valid_indices] = disparity_map[valid_indices] / confidence_map[valid_indices]
-
-            # Applica filtro mediano sulle righe elaborate
-            for y in range(y_start, y_end):
-                disparity_map_final[y] = cv2.medianBlur(
-                    disparity_map_final[y].reshape(1, -1), 3
-                ).reshape(-1)
+            with self._lock:
+                self._accumulator.ensure_shape(height, width)
+                pending = set(self._accumulator.pending_patterns(pair[0] for pair in frame_pairs))
+                new_pairs = [pair for pair in frame_pairs if pair[0] in pending]
 
-            # Crea maschera solo per la sezione rilevante
-            section_mask = np.zeros((height, width), dtype=np.uint8)
-            section_mask[y_start:y_end, :] = self._shadow_masks[0][y_start:y_end, :]
+                if new_pairs:
+                    stack = self._get_rectified_stack(height, width)
+                    self._fold_pattern_pairs(self._accumulator, new_pairs, stack)
+                    logger.debug(f"Accumulati {len(new_pairs)} nuovi pattern "
+                                 f"({len(self._accumulator.patterns)} totali)")
 
-            # Riproietta in 3D con ottimizzazioni per chunk
-            return self._reproject_chunk_to_3d(disparity_map_final, section_mask)
+                return self._emit_pointcloud(self._accumulator)
 
         except Exception as e:
-            logger.error(f"Errore nella triangolazione chunk: {e}")
+            logger.error(f"Errore nell'aggiornamento incrementale: {e}")
             import traceback
             logger.error(f"Traceback: {traceback.format_exc()}")
             return None
 
-    def _reproject_chunk_to_3d(self, disparity_map, mask):
+    def pending_patterns(self, pattern_indices):
         """
-        Riproietta un chunk di mappa di disparità in punti 3D.
-        Versione ottimizzata per chunk verticali.
+        Restituisce i pattern non ancora accumulati per la scansione corrente.
 
         Args:
-            disparity_map: Mappa di disparità
-            mask: Maschera per punti validi, già limitata al chunk
+            pattern_indices: Indici dei pattern disponibili
 
         Returns:
-            Array NumPy di punti 3D
+            Lista ordinata degli indici di pattern da elaborare
         """
-        try:
-            # Applica maschera alla mappa di disparità
-            masked_disparity = disparity_map.copy()
-            masked_disparity[mask == 0] = 0
-
-            # Riproietta in 3D
-            points_3d = cv2.reprojectImageTo3D(masked_disparity, self.Q)
-
-            # Filtra punti non validi
-            valid_mask = (
-                    ~np.isnan(points_3d).any(axis=2) &
-                    ~np.isinf(points_3d).any(axis=2) &
-                    (mask > 0)
-            )
+        with self._lock:
+            return self._accumulator.pending_patterns(pattern_indices)
 
-            # Estrai punti validi
-            valid_points = points_3d[valid_mask]
+    def build_pointcloud(self):
+        """
+        Riemette la nuvola di punti dalle mappe accumulate, senza elaborare nuovi frame.
 
-            # Limita punti a un range ragionevole
-            max_range = 500  # mm
-            range_mask = (
-                    (np.abs(valid_points[:, 0]) < max_range) &
-                    (np.abs(valid_points[:, 1]) < max_range) &
-                    (np.abs(valid_points[:, 2]) < max_range)
-            )
+        Returns:
+            Nuvola di punti come array NumPy (Nx3) o None se non disponibile
+        """
+        with self._lock:
+            if not self._accumulator.patterns:
+                return None
+            return self._emit_pointcloud(self._accumulator)
 
-            filtered_points = valid_points[range_mask]
+    def _check_ready(self, frame_pairs):
+        """Verifica che il triangolatore possa elaborare le coppie di frame."""
+        if not self._white_black_initialized:
+            logger.error("Triangolatore non inizializzato, impossibile triangolare")
+            return False
 
-            # Campionamento se necessario
-            if len(filtered_points) > 10000:
-                # Campionamento sistematico per chunk
-                step = len(filtered_points) // 10000 + 1
-                filtered_points = filtered_points[::step]
+        if not frame_pairs:
+            logger.warning("Nessuna coppia di frame da triangolare")
+            return False
 
-            return filtered_points
+        # Verifica che le mappe di rettifica siano disponibili
+        if not hasattr(self, 'map_x_l') or not hasattr(self, 'map_y_l'):
+            logger.error("Mappe di rettifica non disponibili")
+            return False
 
-        except Exception as e:
-            logger.error(f"Errore nella riproiezione 3D chunk: {e}")
-            return None
+        return True
 
-    def _update_disparity_chunk(self, pattern_l, pattern_r, shadow_mask_l, shadow_mask_r,
-                                disparity_map, confidence_map, pattern_weight=1.0, y_range=None):
+    def _fold_pattern_pairs(self, accumulator, frame_pairs, stack):
         """
-        Aggiorna la mappa di disparità per un chunk verticale specifico.
-        Versione ottimizzata per parallelizzazione.
+        Rettifica le coppie di pattern nello stack e le aggiunge alle mappe dell'accumulatore.
+        I frame di riferimento (indici 0 e 1) vengono ignorati.
 
         Args:
-            pattern_l, pattern_r: Pattern rettificati
-            shadow_mask_l, shadow_mask_r: Maschere di ombra
-            disparity_map, confidence_map: Mappe da aggiornare
-            pattern_weight: Peso del pattern
-            y_range: Tupla (y_start, y_end) per limiti verticali
+            accumulator: DisparityAccumulator da aggiornare
+            frame_pairs: Lista di tuple (pattern_index, left_frame, right_frame)
+            stack: RectifiedStack in cui rettificare i pattern
         """
-        height, width = pattern_l.shape[:2]
+        pattern_pairs = sorted((pair for pair in frame_pairs if pair[0] > 1), key=lambda x: x[0])
+        if not pattern_pairs:
+            return
 
-        # Limita range verticale se specificato
-        y_start, y_end = y_range if y_range else (0, height)
-        y_start, y_end = max(0, y_start), min(height, y_end)
+        maps = self._rectification_maps()
+        with self.instrumentation.span("rectify"):
+            for pattern_idx, left_frame, right_frame in pattern_pairs:
+                stack.rectify_pair(pattern_idx, left_frame, right_frame, maps)
 
-        # Ottimizzazione: pre-calcola maschere valide per questo chunk
-        chunk_mask_l = shadow_mask_l[y_start:y_end, :]
-        valid_indices = np.where(chunk_mask_l > 0)
-        valid_y = valid_indices[0] + y_start  # Aggiusta per offset y_start
-        valid_x = valid_indices[1]
+        pattern_indices = [pair[0] for pair in pattern_pairs]
+        with self.instrumentation.span("match"):
+            if self._process_backend is not None:
+                self._accumulate_disparity_process(pattern_indices, stack, accumulator)
+            else:
+                self._accumulate_disparity_thread(pattern_indices, stack, accumulator)
 
-        # Vettorizzazione per punti validi
-        for idx in range(len(valid_y)):
-            y, x = valid_y[idx], valid_x[idx]
+        accumulator.patterns.update(pattern_indices)
 
-            # Ottieni valore nel pattern sinistro
-            val_l = pattern_l[y, x]
+    def _rectification_maps(self):
+        """Restituisce le mappe di rettifica nel formato atteso da RectifiedStack."""
+        return self.map_x_l, self.map_y_l, self.map_x_r, self.map_y_r
 
-            # Range di ricerca
-            min_x = max(0, x - 200)
+    def _get_rectified_stack(self, height, width):
+        """
+        Restituisce lo stack dei pattern rettificati della scansione corrente,
+        creandolo alla prima coppia o se cambiano le dimensioni dei frame.
+        """
+        with self._lock:
+            if self._rectified_stack is None or self._rectified_stack.shape != (height, width):
+                if self._rectified_stack is not None:
+                    self._rectified_stack.close()
+                self._rectified_stack = RectifiedStack(height, width,
+                                                       shared=self._process_backend is not None,
+                                                       memory_manager=self._memory_manager)
+            return self._rectified_stack
 
-            # Estrai segmento della riga destra
-            row_segment = pattern_r[y, min_x:x]
-            row_mask = shadow_mask_r[y, min_x:x] > 0
+    def _emit_pointcloud(self, accumulator):
+        """
+        Calcola la nuvola di punti dalle mappe di un accumulatore e la notifica.
 
-            if np.any(row_mask):
-                # Calcola differenze vettorizzate
-                diffs = np.abs(row_segment - val_l).astype(np.float32)
+        Args:
+            accumulator: DisparityAccumulator con le mappe correnti
 
-                # Applica maschera (invalida pixel in ombra)
-                diffs[~row_mask] = 255
+        Returns:
+            Nuvola di punti come array NumPy (Nx3) o None in caso di errore
+        """
+        with self.instrumentation.span("filter"):
+            disparity_map_final = accumulator.disparity()
 
-                # Trova il minimo
-                min_diff_idx = np.argmin(diffs)
-                best_match_diff = diffs[min_diff_idx]
+            # Applica filtro mediano per ridurre il rumore
+            kernel_size = 3
+            disparity_map_final = cv2.medianBlur(disparity_map_final, kernel_size)
 
-                # Aggiorna disparità se abbiamo una buona corrispondenza
-                if best_match_diff < 50:
-                    best_match_x = min_x + min_diff_idx
-                    disparity = x - best_match_x
+        # Riproietta in 3D
+        pointcloud = self._reproject_to_3d(disparity_map_final, self._shadow_masks[0])
 
-                    # Aggiorna mappe con contribuzione pesata
-                    disparity_map[y, x] += disparity * pattern_weight
-                    confidence_map[y, x] += pattern_weight
+        # Memorizza la nuvola di punti
+        with self._pointcloud_lock:
+            self._last_pointcloud = pointcloud
 
-    def _update_disparity_from_pattern(self, pattern_l, pattern_r, shadow_mask_l, shadow_mask_r,
-                                       disparity_map, confidence_map, pattern_weight=1.0):
+        # Chiama la callback di completamento
+        if self._completion_callback and pointcloud is not None:
+            self._completion_callback(True, f"Triangolazione completata: {len(pointcloud)} punti", pointcloud)
+
+        return pointcloud
+
+    def _accumulate_disparity_thread(self, pattern_indices, stack, accumulator):
         """
-        Aggiorna la mappa di disparità basandosi su una coppia di pattern.
-        Versione ottimizzata per l'elaborazione in-memory con NumPy.
+        Accumula le corrispondenze dei pattern con il backend a thread.
+        Il frame viene diviso in tile (plan_tiles) in base alla risoluzione e ai
+        worker disponibili; ogni tile elabora tutti i pattern e scrive nella propria
+        porzione delle mappe dell'accumulatore.
 
         Args:
-            pattern_l: Pattern della camera sinistra (array NumPy)
-            pattern_r: Pattern della camera destra (array NumPy)
-            shadow_mask_l: Maschera di ombra per la camera sinistra
-            shadow_mask_r: Maschera di ombra per la camera destra
-            disparity_map: Mappa di disparità da aggiornare
-            confidence_map: Mappa di confidenza da aggiornare
-            pattern_weight: Peso del pattern corrente
+            pattern_indices: Indici ordinati dei pattern da accumulare
+            stack: RectifiedStack con i pattern già rettificati
+            accumulator: DisparityAccumulator da aggiornare
         """
-        height, width = pattern_l.shape[:2]
+        height, width = stack.shape
+        tiles = plan_tiles(height, width, self._tile_workers)
 
-        # Ottimizzazione: pre-calcola le aree valide per ridurre il numero di cicli
-        valid_mask_l = shadow_mask_l > 0
-        valid_rows, valid_cols = np.where(valid_mask_l)
+        # Un solo tile: elaborazione nel thread corrente, con progresso per pattern
+        if len(tiles) == 1:
+            self._match_tile(tiles[0], pattern_indices, stack, accumulator, report_progress=True)
+            return
 
-        # Per ogni pixel valido nella maschera di ombra sinistra
-        for idx in range(len(valid_rows)):
-            y, x = valid_rows[idx], valid_cols[idx]
+        executor = self._get_tile_executor()
+        futures = [executor.submit(self._match_tile, tile, pattern_indices, stack, accumulator)
+                   for tile in tiles]
+        for i, future in enumerate(futures):
+            future.result()
 
-            # Valore del pixel nel pattern sinistro
-            val_l = pattern_l[y, x]
+            # Aggiorna il progresso
+            if self._progress_callback:
+                self._progress_callback((i + 1) / len(futures) * 100,
+                                        f"Triangolazione tile {i + 1}/{len(futures)}")
 
-            # Range di ricerca (cerca solo a sinistra, con range limitato)
-            min_x = max(0, x - 200)  # Limita ricerca a 200 pixel a sinistra
+    def _match_tile(self, tile, pattern_indices, stack, accumulator, report_progress=False):
+        """
+        Accumula le corrispondenze di tutti i pattern su un tile del frame.
 
-            best_match_x = -1
-            best_match_diff = 255  # Differenza massima possibile
+        Args:
+            tile: Tile da elaborare
+            pattern_indices: Indici ordinati dei pattern da accumulare
+            stack: RectifiedStack con i pattern già rettificati
+            accumulator: DisparityAccumulator da aggiornare (solo la porzione del tile)
+            report_progress: Notifica il progresso dopo ogni pattern
+        """
+        for i, pattern_idx in enumerate(pattern_indices):
+            left_rect, right_rect = stack.get_pair(pattern_idx)
+
+            # Aggiorna la mappa di disparità con questo pattern
+            self._update_disparity_from_pattern(
+                left_rect, right_rect,
+                self._shadow_masks[0], self._shadow_masks[1],
+                accumulator.disparity_sum, accumulator.confidence_sum,
+                pattern_weight(pattern_idx),
+                y_range=tile.y_range, x_range=tile.x_range
+            )
 
-            # Ottimizzazione: utilizza vettorizzazione NumPy per la ricerca
-            # Estrai il segmento di riga da confrontare
-            row_segment = pattern_r[y, min_x:x]
-            row_mask = shadow_mask_r[y, min_x:x] > 0
+            # Aggiorna il progresso
+            if report_progress and self._progress_callback:
+                progress = (i + 1) / len(pattern_indices) * 100
+                self._progress_callback(progress,
+                                        f"Triangolazione pattern {pattern_idx}: {i + 1}/{len(pattern_indices)}")
 
-            if np.any(row_mask):  # Verifica se ci sono pixel validi nella maschera
-                # Calcola la differenza assoluta vettorizzata
-                diffs = np.abs(row_segment - val_l).astype(np.float32)
+    def _get_tile_executor(self):
+        """Restituisce il pool dei thread per i tile, avviandolo al primo utilizzo."""
+        with self._lock:
+            if self._tile_executor is None:
+                self._tile_executor = TriangulationExecutor(self._tile_workers)
+            return self._tile_executor
 
-                # Applica la maschera (invalida i pixel in ombra assegnando un valore alto)
-                diffs[~row_mask] = 255
+    def _accumulate_disparity_process(self, pattern_indices, stack, accumulator):
+        """
+        Accumula le corrispondenze con il backend a processi.
+        I worker leggono i pattern direttamente dallo stack in memoria condivisa
+        ed elaborano in parallelo bande di righe disgiunte.
 
-                # Trova il minimo
-                min_diff_idx = np.argmin(diffs)
-                best_match_diff = diffs[min_diff_idx]
+        Args:
+            pattern_indices: Indici ordinati dei pattern da accumulare
+            stack: RectifiedStack condiviso con i pattern già rettificati
+            accumulator: DisparityAccumulator da aggiornare
+        """
+        if self._progress_callback:
+            self._progress_callback(10, f"Triangolazione di {len(pattern_indices)} pattern su "
+                                        f"{self._process_backend.num_workers} processi")
+
+        accumulator.disparity_sum, accumulator.confidence_sum = self._process_backend.compute_disparity_from_stack(
+            stack, pattern_indices,
+            [pattern_weight(idx) for idx in pattern_indices],
+            self._shadow_masks[0], self._shadow_masks[1],
+            disparity_map=accumulator.disparity_sum,
+            confidence_map=accumulator.confidence_sum
+        )
 
-                # Calcola l'indice nel sistema di coordinate originale
-                if best_match_diff < 50:  # Soglia per una buona corrispondenza
-                    best_match_x = min_x + min_diff_idx
+        if self._progress_callback:
+            self._progress_callback(100, f"Triangolazione di {len(pattern_indices)} pattern completata")
 
-            # Se abbiamo trovato una buona corrispondenza, aggiorna la mappa di disparità
-            if best_match_x >= 0:
-                disparity = x - best_match_x
+    def _update_disparity_from_pattern(self, pattern_l, pattern_r, shadow_mask_l, shadow_mask_r,
+                                       disparity_map, confidence_map, pattern_weight=1.0,
+                                       y_range=None, x_range=None):
+        """
+        Aggiorna la mappa di disparità basandosi su una coppia di pattern.
+        La ricerca è delegata al motore vettorizzato ScanlineCorrespondenceEngine,
+        che elabora intere bande di righe invece dei singoli pixel.
 
-                # Aggiorna disparity e confidence maps con la contribuzione pesata
-                disparity_map[y, x] += disparity * pattern_weight
-                confidence_map[y, x] += pattern_weight
+        Args:
+            pattern_l: Pattern della camera sinistra (array NumPy)
+            pattern_r: Pattern della camera destra (array NumPy)
+            shadow_mask_l: Maschera di ombra per la camera sinistra
+            shadow_mask_r: Maschera di ombra per la camera destra
+            disparity_map: Mappa di disparità da aggiornare
+            confidence_map: Mappa di confidenza da aggiornare
+            pattern_weight: Peso del pattern corrente
+            y_range, x_range: Limiti (inizio, fine) del tile da aggiornare (default: intero frame)
+        """
+        update_disparity_from_pattern(
+            pattern_l, pattern_r,
+            shadow_mask_l, shadow_mask_r,
+            disparity_map, confidence_map,
+            pattern_weight=pattern_weight,
+            y_range=y_range,
+            x_range=x_range
+        )
 
     def _reproject_to_3d(self, disparity_map, mask):
         """
@@ -1052,67 +1326,50 @@ class RealTimeTriangulator:
             mask: Maschera di validità
 
         Returns:
-            True se la riproiezione ha avuto successo, False altrimenti
+            Array NumPy di punti 3D o None in caso di errore
         """
         try:
-            # Applica maschera alla mappa di disparità
-            masked_disparity = disparity_map.copy()
-            masked_disparity[mask == 0] = 0
-
-            # Applica filtro bilaterale alla mappa di disparità
-            bilateral_disparity = cv2.bilateralFilter(
-                masked_disparity.astype(np.float32),
-                d=5,  # Diametro vicinato
-                sigmaColor=0.1,  # Sigma nel dominio colore
-                sigmaSpace=2.0  # Sigma nel dominio spaziale
-            )
-
-            # Riproiezione in 3D
-            logger.info("Riproiezione in punti 3D")
-            points_3d = cv2.reprojectImageTo3D(bilateral_disparity, self.Q)
-
-            # Filtra punti non validi
-            valid_mask = (
-                    ~np.isnan(points_3d).any(axis=2) &
-                    ~np.isinf(points_3d).any(axis=2) &
-                    (mask > 0)
-            )
-
-            # Estrai punti validi
-            valid_points = points_3d[valid_mask]
-
-            # Filtra outlier statistici
-            filtered_points = PointCloudFilter.statistical_outlier_removal(
-                valid_points,
-                nb_neighbors=20,
-                std_ratio=2.0
-            )
-
-            # Applica voxel downsampling per regolare densità
-            if len(filtered_points) > 50000:
-                filtered_points = PointCloudFilter.voxel_downsample(
-                    filtered_points,
-                    voxel_size=0.5  # 0.5mm per alta qualità
+            # Smussa la disparità mascherata (un filtro 2D, preserva i bordi)
+            with self.instrumentation.span("filter"):
+                smoothed_disparity = self.disparity_smoother(disparity_map, mask)
+
+            # Riproiezione in 3D dei soli pixel validi
+            logger.info(f"Riproiezione in punti 3D (filtro {self.disparity_smoother.method}: "
+                        f"{self.disparity_smoother.last_time_ms:.1f} ms)")
+            with self.instrumentation.span("reproject"):
+                organized = OrganizedPointCloud.from_disparity(smoothed_disparity, self.Q, mask)
+                with self._pointcloud_lock:
+                    self._last_organized_cloud = organized
+                valid_points = organized.points
+                self._memory_manager.register_allocation('organized_pointcloud', organized.nbytes / (1024 * 1024),
+                                                         allocation_type='pointcloud')
+
+            with self.instrumentation.span("filter"):
+                # Filtra outlier statistici
+                filtered_points = PointCloudFilter.statistical_outlier_removal(
+                    valid_points,
+                    nb_neighbors=20,
+                    std_ratio=2.0
                 )
 
-            # Memorizza nella proprietà
-            self.pointcloud = filtered_points
+                # Applica voxel downsampling per regolare densità
+                if len(filtered_points) > 50000:
+                    filtered_points = PointCloudFilter.voxel_downsample(
+                        filtered_points,
+                        voxel_size=0.5  # 0.5mm per alta qualità
+                    )
 
             logger.info(f"Generata nuvola di punti con {len(filtered_points)} punti")
 
-            # Salva su file PLY
-            if self.scan_dir:
-                self.save_point_cloud(str(self.scan_dir / "pointcloud.ply"))
-
             # Aggiorna progresso
             if self._progress_callback:
                 self._progress_callback(100, f"Nuvola di punti creata con {len(filtered_points)} punti")
 
-            return True
+            return filtered_points
 
         except Exception as e:
             logger.error(f"Errore nella riproiezione 3D: {e}")
-            return False
+            return None
 
     def get_last_pointcloud(self):
         """
@@ -1126,251 +1383,377 @@ class RealTimeTriangulator:
                 return self._last_pointcloud.copy()
             return None
 
-    def _process_phase_shift(self):
+    def set_disparity_filter(self, method, **params):
+        """
+        Seleziona il filtro applicato alla disparità prima della riproiezione.
+
+        Args:
+            method: "bilateral", "median" o "none"
+            **params: kernel_size, sigma_spatial, sigma_disparity
+        """
+        self.disparity_smoother.configure(method, **params)
+        logger.info(f"Filtro disparità impostato: {method}")
+
+    def get_last_organized_pointcloud(self):
         """
-        Implementa l'algoritmo di Phase Shift per pattern sinusoidali.
-        Offre maggiore precisione per superfici continue.
+        Restituisce l'ultima nuvola organizzata sulla griglia dell'immagine,
+        prima dei filtri sulla nuvola piatta.
 
         Returns:
-            True se l'elaborazione ha avuto successo, False altrimenti
+            OrganizedPointCloud o None se non disponibile
         """
-        try:
-            logger.info("Elaborazione pattern Phase Shift")
+        with self._pointcloud_lock:
+            return self._last_organized_cloud
 
-            # Verifica che abbiamo abbastanza immagini (almeno 3 pattern per fase + white/black)
-            if len(self.left_images) < 5:
-                logger.error("Numero insufficiente di immagini per Phase Shift")
-                return False
+    def get_performance_stats(self):
+        """
+        Restituisce le statistiche dei tempi per fase della triangolazione.
 
-            # Carica le immagini di riferimento (white/black)
-            white_l = cv2.imread(self.left_images[0], cv2.IMREAD_GRAYSCALE)
-            white_r = cv2.imread(self.right_images[0], cv2.IMREAD_GRAYSCALE)
-            black_l = cv2.imread(self.left_images[1], cv2.IMREAD_GRAYSCALE)
-            black_r = cv2.imread(self.right_images[1], cv2.IMREAD_GRAYSCALE)
-
-            # Rettifica le immagini di riferimento
-            white_l_rect = cv2.remap(white_l, self.map_x_l, self.map_y_l, cv2.INTER_LINEAR)
-            white_r_rect = cv2.remap(white_r, self.map_x_r, self.map_y_r, cv2.INTER_LINEAR)
-            black_l_rect = cv2.remap(black_l, self.map_x_l, self.map_y_l, cv2.INTER_LINEAR)
-            black_r_rect = cv2.remap(black_r, self.map_x_r, self.map_y_r, cv2.INTER_LINEAR)
-
-            # Calcola maschere di ombra
-            shadow_mask_l = np.zeros_like(black_l_rect)
-            shadow_mask_r = np.zeros_like(black_r_rect)
-            black_threshold = 40
-            shadow_mask_l[white_l_rect > black_l_rect + black_threshold] = 1
-            shadow_mask_r[white_r_rect > black_r_rect + black_threshold] = 1
-
-            # Ottieni dimensioni
-            height, width = shadow_mask_l.shape[:2]
-
-            # Pattern per phase shift (normalmente 3 o 4)
-            num_phases = (len(self.left_images) - 2) // 2  # Dividiamo per le direzioni H/V
-
-            # Inizializza buffer phase shift
-            phase_shift_images_l = []
-            phase_shift_images_r = []
-
-            # Carica e rettifica i pattern phase shift
-            for i in range(num_phases):
-                img_idx = i + 2  # Salta white/black
-
-                # Carica pattern orizzontale
-                if img_idx < len(self.left_images):
-                    h_pattern_l = cv2.imread(self.left_images[img_idx], cv2.IMREAD_GRAYSCALE)
-                    h_pattern_r = cv2.imread(self.right_images[img_idx], cv2.IMREAD_GRAYSCALE)
-
-                    # Rettifica
-                    h_rect_l = cv2.remap(h_pattern_l, self.map_x_l, self.map_y_l, cv2.INTER_LINEAR)
-                    h_rect_r = cv2.remap(h_pattern_r, self.map_x_r, self.map_y_r, cv2.INTER_LINEAR)
-
-                    # Normalizza range
-                    h_rect_l = h_rect_l.astype(np.float32) / 255.0
-                    h_rect_r = h_rect_r.astype(np.float32) / 255.0
-
-                    # Aggiungi ai buffer
-                    phase_shift_images_l.append(h_rect_l)
-                    phase_shift_images_r.append(h_rect_r)
-
-                # Update progress
-                if self._progress_callback:
-                    progress = (i + 1) / (num_phases * 2) * 50  # First half for loading
-                    self._progress_callback(progress, f"Caricamento pattern: {i + 1}/{num_phases * 2}")
-
-            # Se abbiamo 3 o più pattern, possiamo calcolare lo shift di fase
-            if len(phase_shift_images_l) < 3:
-                logger.error("Numero insufficiente di pattern per Phase Shift")
-                return False
+        Returns:
+            Dizionario con gli istogrammi per fase ("stages") e la ripartizione
+            dell'esecuzione corrente ("last_run")
+        """
+        return self.instrumentation.get_performance_stats()
 
-            logger.info(f"Calcolo Phase Shift con {len(phase_shift_images_l)} pattern")
+    def _process_phase_shift(self, frame_pairs, frequencies=None, num_steps=None):
+        """
+        Implementa l'algoritmo di Phase Shift multi-frequenza per pattern sinusoidali.
+        La fase assoluta di ogni pixel viene ricavata per srotolamento temporale
+        (gerarchico o eterodina) e le corrispondenze vengono cercate per fase
+        assoluta lungo le righe rettificate, con precisione sub-pixel.
 
-            # Calcolo phase shift con formula generica a N step
-            # (normalmente usiamo 3 pattern sfasati di 2π/3)
-            if len(phase_shift_images_l) == 3:
-                # Formula a 3 step
-                phases_l = np.arctan2(
-                    np.sqrt(3) * (phase_shift_images_l[1] - phase_shift_images_l[2]),
-                    2 * phase_shift_images_l[0] - phase_shift_images_l[1] - phase_shift_images_l[2]
-                )
+        Args:
+            frame_pairs: Lista di tuple (pattern_index, left_frame, right_frame) con
+                i pattern sinusoidali verticali, raggruppati per frequenza
+            frequencies: Frequenze delle frange nell'ordine di acquisizione
+            num_steps: Numero di passi di fase per frequenza (dedotto se None)
 
-                phases_r = np.arctan2(
-                    np.sqrt(3) * (phase_shift_images_r[1] - phase_shift_images_r[2]),
-                    2 * phase_shift_images_r[0] - phase_shift_images_r[1] - phase_shift_images_r[2]
-                )
-            elif len(phase_shift_images_l) == 4:
-                # Formula a 4 step più robusta
-                phases_l = np.arctan2(
-                    phase_shift_images_l[3] - phase_shift_images_l[1],
-                    phase_shift_images_l[0] - phase_shift_images_l[2]
-                )
+        Returns:
+            Nuvola di punti come array NumPy (Nx3) o None in caso di errore
+        """
+        try:
+            logger.info("Elaborazione pattern Phase Shift multi-frequenza")
 
-                phases_r = np.arctan2(
-                    phase_shift_images_r[3] - phase_shift_images_r[1],
-                    phase_shift_images_r[0] - phase_shift_images_r[2]
-                )
-            else:
-                # Algoritmo generale per qualsiasi numero di step
-                phases_l = self._compute_phase_n_step(phase_shift_images_l)
-                phases_r = self._compute_phase_n_step(phase_shift_images_r)
+            if not self._white_black_initialized:
+                logger.error("Triangolatore non inizializzato, impossibile elaborare Phase Shift")
+                return None
+
+            frequencies = list(frequencies or DEFAULT_FREQUENCIES)
+            if num_steps is None:
+                num_steps = len(frame_pairs) // len(frequencies)
+
+            # Almeno 3 passi per frequenza
+            if num_steps < 3 or len(frame_pairs) < num_steps * len(frequencies):
+                logger.error("Numero insufficiente di pattern per Phase Shift")
+                return None
 
-            # Unwrap delle fasi per evitare discontinuità
-            phases_l_unwrapped = np.unwrap(phases_l)
-            phases_r_unwrapped = np.unwrap(phases_r)
+            frame_pairs = sorted(frame_pairs, key=lambda x: x[0])
 
-            # Calcola mappa di disparità dalle fasi
-            disparity_map = np.zeros((height, width), dtype=np.float32)
+            # Stack privato: quello della scansione può contenere piani diversi con gli stessi indici
+            height, width = frame_pairs[0][1].shape[:2]
+            stack = RectifiedStack(height, width, capacity=len(frame_pairs) + 2,
+                                   memory_manager=self._memory_manager)
+            try:
+                maps = self._rectification_maps()
+
+                # Riferimenti white/black rettificati con le stesse mappe, con indici fuori dalla sequenza
+                with self.instrumentation.span("rectify"):
+                    white_l, white_r = stack.rectify_pair(-2, self._white_frames[0], self._white_frames[1], maps)
+                    black_l, black_r = stack.rectify_pair(-1, self._black_frames[0], self._black_frames[1], maps)
+
+                # Maschere d'ombra nelle coordinate rettificate dei pattern
+                black_threshold = 40
+                shadow_mask_l = white_l.astype(np.int16) > black_l.astype(np.int16) + black_threshold
+                shadow_mask_r = white_r.astype(np.int16) > black_r.astype(np.int16) + black_threshold
+
+                images_l = []
+                images_r = []
+                for i, (pattern_idx, left_frame, right_frame) in enumerate(frame_pairs):
+                    with self.instrumentation.span("rectify"):
+                        left_rect, right_rect = stack.rectify_pair(pattern_idx, left_frame, right_frame, maps)
+                    images_l.append(left_rect)
+                    images_r.append(right_rect)
+
+                    if self._progress_callback:
+                        progress = (i + 1) / len(frame_pairs) * 50  # Prima metà per la rettifica
+                        self._progress_callback(progress, f"Rettifica pattern: {i + 1}/{len(frame_pairs)}")
+
+                logger.info(f"Calcolo Phase Shift con {num_steps} passi per {len(frequencies)} frequenze")
+
+                # Fase assoluta per pixel, senza srotolamento spaziale
+                with self.instrumentation.span("decode"):
+                    phase_l, valid_l = decode_phase_sequence(images_l, frequencies, num_steps,
+                                                             shadow_mask=shadow_mask_l)
+                    phase_r, valid_r = decode_phase_sequence(images_r, frequencies, num_steps,
+                                                             shadow_mask=shadow_mask_r)
+            finally:
+                stack.close()
 
-            # Applica maschere
-            valid_mask = (shadow_mask_l > 0) & (shadow_mask_r > 0)
+            if self._progress_callback:
+                self._progress_callback(70, "Ricerca corrispondenze per fase assoluta")
 
-            # Calcola disparità come differenza di fase
-            phase_scale = width / (2 * np.pi)  # Fattore di scala per convertire fase in pixel
-            disparity_map[valid_mask] = phases_l_unwrapped[valid_mask] - phases_r_unwrapped[valid_mask]
-            disparity_map[valid_mask] *= phase_scale
+            # Corrispondenze sub-pixel lungo le righe rettificate
+            with self.instrumentation.span("match"):
+                disparity_map = match_absolute_phase(phase_l, valid_l, phase_r, valid_r)
 
             # Filtraggio della mappa di disparità
-            disparity_filtered = cv2.medianBlur(disparity_map, 5)
-
-            # Salva mappa di disparità per visualizzazione
-            if self.scan_dir:
-                disparity_colored = cv2.applyColorMap(
-                    cv2.convertScaleAbs(disparity_filtered,
-                                        alpha=255 / np.max(disparity_filtered) if np.max(
-                                            disparity_filtered) > 0 else 0),
-                    cv2.COLORMAP_JET
-                )
-                cv2.imwrite(str(self.scan_dir / "disparity_map_phase.png"), disparity_colored)
+            with self.instrumentation.span("filter"):
+                disparity_filtered = cv2.medianBlur(disparity_map, 5)
+            valid_mask = (disparity_map > 0).astype(np.uint8)
+
+            logger.info(f"Corrispondenze per fase assoluta: {int(valid_mask.sum())} pixel")
 
             # Riproietta in 3D
-            return self._reproject_to_3d(disparity_filtered, shadow_mask_l)
+            pointcloud = self._reproject_to_3d(disparity_filtered, valid_mask)
+
+            with self._pointcloud_lock:
+                self._last_pointcloud = pointcloud
+
+            return pointcloud
 
         except Exception as e:
             logger.error(f"Errore nell'elaborazione Phase Shift: {e}")
             import traceback
             logger.error(f"Traceback: {traceback.format_exc()}")
-            return False
-
-    def _compute_phase_n_step(self, phase_images):
-        """
-        Calcola la fase da un insieme di N immagini con algoritmo generalizzato.
-
-        Args:
-            phase_images: Lista di immagini di phase shift
-
-        Returns:
-            Mappa di fase
-        """
-        n = len(phase_images)
-        numerator = np.zeros_like(phase_images[0])
-        denominator = np.zeros_like(phase_images[0])
-
-        for i in range(n):
-            angle = 2 * np.pi * i / n
-            numerator += phase_images[i] * np.sin(angle)
-            denominator += phase_images[i] * np.cos(angle)
-
-        return np.arctan2(numerator, denominator)
+            return None
 
 class BackgroundSaver:
     """
-    Thread di background per il salvataggio opzionale dei frame su disco.
-    Implementato come coda a bassa priorità per non interferire con l'elaborazione.
+    Pool di thread di background per il salvataggio opzionale dei frame su disco.
+    La coda è limitata: se i writer non tengono il passo, ``queue_frame`` attende
+    fino a ``put_timeout`` e poi scarta il frame (contato nelle statistiche)
+    invece di accumulare copie in memoria senza limite. Di un pattern scartato
+    non si salva nemmeno il frame dell'altra camera: l'indice viene registrato
+    tra i pattern mancanti della scansione (vedi get_stats).
     """
 
-    def __init__(self, output_dir):
+    def __init__(self, output_dir, storage_format="bundle", export_png=False,
+                 pointcloud_step=DEFAULT_QUANTIZATION_STEP, num_writers=DEFAULT_SAVE_WRITERS,
+                 max_queue_size=DEFAULT_SAVE_QUEUE_SIZE, png_compression=DEFAULT_PNG_COMPRESSION,
+                 put_timeout=DEFAULT_SAVE_PUT_TIMEOUT):
         """
-        Inizializza il thread di salvataggio in background.
+        Inizializza il pool di salvataggio in background.
 
         Args:
             output_dir: Directory di output per i file salvati
-        """
+            storage_format: "bundle" per il file unico memory-mappable, "png" o "npy"
+                (array grezzi, senza compressione) per i file separati
+            export_png: Con il formato bundle, salva anche i file PNG
+            pointcloud_step: Passo di quantizzazione (mm) delle nuvole in coda; None per copie float
+            num_writers: Numero di thread di scrittura
+            max_queue_size: Elementi in coda oltre i quali queue_frame attende
+            png_compression: Livello di compressione PNG (0-9; 0-1 per tenere il passo dello streaming)
+            put_timeout: Attesa massima (s) di queue_frame con la coda piena prima di scartare il frame
+        """
+        if storage_format not in STORAGE_FORMATS:
+            raise ValueError(f"Formato di salvataggio non supportato: {storage_format}")
+
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
 
-        self._queue = queue.Queue()
-        self._thread = None
-        self._stop_event = threading.Event()
+        self.storage_format = storage_format
+        self.export_png = export_png
+        self.pointcloud_step = pointcloud_step
+        self.num_writers = max(1, num_writers)
+        self.put_timeout = put_timeout
+        self._png_params = [cv2.IMWRITE_PNG_COMPRESSION, int(png_compression)]
+
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._threads = []
         self._is_saving = False
+        self._state_lock = threading.Lock()
 
-    def start(self):
-        """Avvia il thread di salvataggio in background."""
-        if self._is_saving:
-            return
+        # Impostato da stop() oltre il timeout: i writer scartano gli elementi rimasti
+        self._discard = threading.Event()
 
-        self._stop_event.clear()
-        self._is_saving = True
+        # Bundle aperti per scansione e frame in attesa della camera opposta (condivisi tra i writer)
+        self._bundle_lock = threading.Lock()
+        self._bundles = {}
+        self._bundle_headers = {}
+        self._pending_frames = {}
 
-        self._thread = threading.Thread(target=self._saving_loop)
-        self._thread.daemon = True
-        self._thread.start()
+        # Indici dei pattern scartati per scansione: le coppie incomplete non vengono salvate
+        self._missing_patterns = {}
 
-        logger.info("Thread di salvataggio in background avviato")
+        # Directory già create, per non ripetere mkdir ad ogni frame
+        self._created_dirs = set()
 
-    def stop(self):
-        """Ferma il thread di salvataggio in background."""
-        if not self._is_saving:
-            return
+        self._stats_lock = threading.Lock()
+        self._reset_stats()
 
-        self._stop_event.set()
-        self._is_saving = False
+    def _reset_stats(self):
+        """Azzera i contatori di throughput."""
+        with self._stats_lock:
+            self._stats = {'frames_saved': 0, 'bytes_saved': 0, 'pointclouds_saved': 0,
+                           'frames_dropped': 0, 'errors': 0, 'write_time': 0.0, 'max_queue_depth': 0}
+            self._stats_start = time.perf_counter()
 
-        # Attendi che il thread termini (con timeout)
-        if self._thread and self._thread.is_alive():
-            self._thread.join(timeout=5.0)
-            logger.info("Thread di salvataggio in background fermato")
+    def start(self):
+        """Avvia i thread di salvataggio in background."""
+        with self._state_lock:
+            if self._is_saving:
+                return
 
-    def _saving_loop(self):
-        """Loop principale del thread di salvataggio."""
-        logger.info("Loop di salvataggio in background avviato")
+            self._is_saving = True
+            self._reset_stats()
+            self._created_dirs.clear()
+            self._threads = [threading.Thread(target=self._saving_loop, args=(i,), daemon=True)
+                             for i in range(self.num_writers)]
+            for thread in self._threads:
+                thread.start()
 
-        try:
-            while not self._stop_event.is_set():
+        logger.info(f"Salvataggio in background avviato con {self.num_writers} writer")
+
+    def stop(self, timeout=30.0):
+        """
+        Ferma i thread di salvataggio dopo aver scritto gli elementi già in coda.
+
+        Oltre il timeout gli elementi non ancora scritti vengono scartati (e
+        contati nelle statistiche), ma si attende comunque l'uscita di tutti i
+        writer: i bundle vengono chiusi solo quando nessuno scrive più.
+
+        Args:
+            timeout: Attesa massima (s) per lo svuotamento della coda
+        """
+        with self._state_lock:
+            if not self._is_saving:
+                return
+            self._is_saving = False
+
+            # Un segnale di arresto per writer, in coda dopo gli elementi già accodati
+            deadline = time.monotonic() + timeout
+            for _ in self._threads:
                 try:
-                    # Estrai un elemento dalla coda (timeout per controllare periodicamente lo stop_event)
-                    item = self._queue.get(timeout=0.5)
+                    self._queue.put(None, timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Full:
+                    self._discard.set()
+                    self._queue.put(None)
+
+            for thread in self._threads:
+                thread.join(timeout=max(0.0, deadline - time.monotonic()))
+
+            stragglers = [thread for thread in self._threads if thread.is_alive()]
+            if stragglers:
+                logger.warning(f"Salvataggio non completato entro {timeout:g}s: "
+                               f"{self._queue.qsize()} elementi in coda scartati")
+                self._discard.set()
+                # Resta da attendere solo la scrittura in corso di ciascun writer
+                for thread in stragglers:
+                    thread.join()
+
+            self._threads = []
+            self._discard.clear()
+
+            with self._bundle_lock:
+                self._close_bundles()
+
+        stats = self.get_stats()
+        logger.info(f"Salvataggio in background fermato: {stats['frames_saved']} frame "
+                    f"({stats['frames_per_sec']:.1f} fps, {stats['mb_per_sec']:.1f} MB/s), "
+                    f"{stats['frames_dropped']} scartati")
+
+    def _saving_loop(self, writer_id):
+        """Loop di un thread di scrittura: termina al segnale di arresto in coda."""
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                if self._discard.is_set():
+                    self._discard_item(item)
+                else:
+                    self._save_item(item)
+            except Exception as e:
+                logger.error(f"Errore nel writer {writer_id}: {e}")
+                import traceback
+                logger.error(f"Traceback: {traceback.format_exc()}")
+            finally:
+                self._queue.task_done()
+
+    def _discard_item(self, item):
+        """Scarta un elemento rimasto in coda all'arresto oltre il timeout."""
+        if item['type'] == 'frame':
+            self._drop_frame(item)
+        else:
+            logger.warning(f"Nuvola di punti della scansione {item['scan_id']} non salvata")
+
+    def _drop_frame(self, item):
+        """
+        Scarta un frame non salvato e, con esso, il frame del pattern dell'altra
+        camera: quello già in attesa di accoppiamento viene rimosso, quello che
+        arriverà dopo viene ignorato da _save_frame.
+
+        Args:
+            item: Dizionario con informazioni sul frame
+        """
+        scan_id = item['scan_id']
+        pattern_index = item['pattern_index']
+
+        with self._bundle_lock:
+            self._missing_patterns.setdefault(scan_id, set()).add(pattern_index)
+            partner = self._pending_frames.pop((scan_id, pattern_index), {})
+
+        with self._stats_lock:
+            self._stats['frames_dropped'] += 1 + len(partner)
+
+    def get_stats(self):
+        """
+        Restituisce le statistiche di salvataggio dall'avvio.
 
-                    # Elabora l'elemento
-                    self._save_item(item)
+        Returns:
+            Dizionario con frame e byte salvati, frame scartati per coda piena,
+            errori, throughput (frame/s, MB/s), tempo medio di scrittura per
+            frame (ms), profondità attuale e massima della coda, numero di writer
+            e indici dei pattern mancanti per scansione
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+            elapsed = time.perf_counter() - self._stats_start
+
+        with self._bundle_lock:
+            missing = {scan_id: sorted(indices) for scan_id, indices in self._missing_patterns.items() if indices}
+
+        frames = stats['frames_saved']
+        write_time = stats.pop('write_time')
+        stats.update(frames_per_sec=frames / elapsed if elapsed > 0 else 0.0,
+                     mb_per_sec=stats['bytes_saved'] / (1024 * 1024) / elapsed if elapsed > 0 else 0.0,
+                     mean_write_ms=write_time / frames * 1000.0 if frames else 0.0,
+                     queue_depth=self._queue.qsize(), queue_size=self._queue.maxsize,
+                     num_writers=self.num_writers, missing_patterns=missing)
+        return stats
 
-                    # Marca come completato
-                    self._queue.task_done()
+    def _ensure_dir(self, path):
+        """Crea una directory una sola volta per sessione."""
+        if path not in self._created_dirs:
+            path.mkdir(parents=True, exist_ok=True)
+            self._created_dirs.add(path)
+        return path
 
-                except queue.Empty:
-                    # Timeout nella get, continua il loop
-                    continue
-                except Exception as e:
-                    logger.error(f"Errore nel loop di salvataggio: {e}")
-                    import traceback
-                    logger.error(f"Traceback: {traceback.format_exc()}")
-                    time.sleep(1.0)  # Pausa per evitare loop di errori
+    def _camera_dir(self, scan_id, camera_index):
+        """Directory dei file separati di una camera."""
+        return self._ensure_dir(self.output_dir / scan_id / ("left" if camera_index == 0 else "right"))
 
-            logger.info("Loop di salvataggio in background terminato")
+    def begin_scan(self, scan_id, scan_config=None, calibration_hash=None):
+        """
+        Registra le informazioni da scrivere nell'intestazione del bundle di una scansione.
 
-        except Exception as e:
-            logger.error(f"Errore fatale nel thread di salvataggio: {e}")
-            import traceback
-            logger.error(f"Traceback: {traceback.format_exc()}")
-            self._is_saving = False
+        Args:
+            scan_id: ID della scansione
+            scan_config: Configurazione della scansione
+            calibration_hash: Hash della calibrazione (vedi calibration_digest)
+        """
+        with self._bundle_lock:
+            self._bundle_headers[scan_id] = {
+                'scan_config': scan_config or {},
+                'calibration_hash': calibration_hash
+            }
+            self._missing_patterns.pop(scan_id, None)
+
+        # Directory della scansione create una volta sola, non ad ogni frame
+        self._ensure_dir(self.output_dir / scan_id)
+        if self.storage_format != "bundle" or self.export_png:
+            for camera_index in (0, 1):
+                self._camera_dir(scan_id, camera_index)
 
     def queue_frame(self, camera_index, pattern_index, pattern_name, scan_id, frame):
         """
@@ -1382,18 +1765,35 @@ class BackgroundSaver:
             pattern_name: Nome del pattern
             scan_id: ID della scansione
             frame: Frame da salvare
+
+        Returns:
+            True se il frame è stato accodato, False se scartato per coda piena
         """
         if not self._is_saving:
             self.start()
 
-        self._queue.put({
+        item = {
             'type': 'frame',
             'camera_index': camera_index,
             'pattern_index': pattern_index,
             'pattern_name': pattern_name,
             'scan_id': scan_id,
             'frame': frame.copy()
-        })
+        }
+
+        try:
+            self._queue.put(item, timeout=self.put_timeout)
+        except queue.Full:
+            self._drop_frame(item)
+            logger.warning(f"Coda di salvataggio piena: pattern {pattern_index} non salvato "
+                           f"(frame della camera {camera_index} scartato)")
+            return False
+
+        depth = self._queue.qsize()
+        with self._stats_lock:
+            if depth > self._stats['max_queue_depth']:
+                self._stats['max_queue_depth'] = depth
+        return True
 
     def queue_pointcloud(self, scan_id, pointcloud):
         """
@@ -1401,15 +1801,21 @@ class BackgroundSaver:
 
         Args:
             scan_id: ID della scansione
-            pointcloud: Nuvola di punti da salvare
+            pointcloud: Nuvola di punti da salvare (array o EncodedPointCloud)
         """
         if not self._is_saving:
             self.start()
 
+        # In coda resta una copia quantizzata, più piccola di quella float
+        if isinstance(pointcloud, np.ndarray) and self.pointcloud_step is not None:
+            pointcloud = encode_pointcloud(pointcloud, self.pointcloud_step)
+        elif isinstance(pointcloud, np.ndarray):
+            pointcloud = pointcloud.copy()
+
         self._queue.put({
             'type': 'pointcloud',
             'scan_id': scan_id,
-            'pointcloud': pointcloud.copy() if pointcloud is not None else None
+            'pointcloud': pointcloud
         })
 
     def _save_item(self, item):
@@ -1421,15 +1827,111 @@ class BackgroundSaver:
         """
         try:
             if item['type'] == 'frame':
-                self._save_frame(item)
+                start = time.perf_counter()
+                if not self._save_frame(item):
+                    return
+                with self._stats_lock:
+                    self._stats['frames_saved'] += 1
+                    self._stats['bytes_saved'] += item['frame'].nbytes
+                    self._stats['write_time'] += time.perf_counter() - start
             elif item['type'] == 'pointcloud':
                 self._save_pointcloud(item)
         except Exception as e:
+            with self._stats_lock:
+                self._stats['errors'] += 1
             logger.error(f"Errore nel salvataggio dell'elemento: {e}")
 
     def _save_frame(self, item):
         """
-        Salva un frame su disco.
+        Salva un frame su disco, nel bundle della scansione o come file separato.
+
+        Args:
+            item: Dizionario con informazioni sul frame
+
+        Returns:
+            True se il frame è stato salvato, False se scartato perché il
+            frame dell'altra camera dello stesso pattern è stato scartato
+        """
+        # Il bundle è un file unico: le scritture dei writer vengono serializzate
+        with self._bundle_lock:
+            if item['pattern_index'] in self._missing_patterns.get(item['scan_id'], ()):
+                with self._stats_lock:
+                    self._stats['frames_dropped'] += 1
+                return False
+
+            saved_to_bundle = False
+            if self.storage_format == "bundle":
+                saved_to_bundle = self._save_frame_to_bundle(item)
+
+        if self.storage_format == "npy":
+            self._save_frame_npy(item)
+        elif not saved_to_bundle or self.export_png:
+            self._save_frame_png(item)
+        return True
+
+    def _save_frame_to_bundle(self, item):
+        """
+        Accoda un frame al bundle della scansione. I frame arrivano separati per
+        camera: la coppia viene scritta quando sono presenti entrambi.
+
+        Args:
+            item: Dizionario con informazioni sul frame
+
+        Returns:
+            True se il frame è stato gestito dal bundle, False se va salvato in PNG
+        """
+        scan_id = item['scan_id']
+        pattern_index = item['pattern_index']
+        key = (scan_id, pattern_index)
+
+        pending = self._pending_frames.setdefault(key, {})
+        pending[item['camera_index']] = item
+        if len(pending) < 2:
+            return True
+
+        del self._pending_frames[key]
+        left_item, right_item = pending[0], pending[1]
+
+        try:
+            writer = self._bundles.get(scan_id)
+            if writer is None:
+                header = self._bundle_headers.get(scan_id, {})
+                frame = left_item['frame']
+                writer = ScanBundleWriter(self.output_dir / scan_id / SCAN_BUNDLE_NAME,
+                                          frame.shape, frame.dtype,
+                                          scan_config=header.get('scan_config'),
+                                          calibration_hash=header.get('calibration_hash'))
+                self._bundles[scan_id] = writer
+                logger.info(f"Bundle della scansione creato: {writer.path}")
+
+            writer.append(pattern_index, item['pattern_name'], left_item['frame'], right_item['frame'])
+            return True
+
+        except ValueError as e:
+            # Frame con forma o tipo diversi dai precedenti
+            logger.warning(f"Frame non scrivibile nel bundle, salvataggio in PNG: {e}")
+        except Exception as e:
+            logger.error(f"Errore nella scrittura del bundle: {e}")
+
+        # Il frame corrente viene salvato in PNG dal chiamante, qui quello della camera opposta
+        self._save_frame_png(right_item if item is left_item else left_item)
+        return False
+
+    def _close_bundles(self):
+        """Chiude i bundle aperti; i frame rimasti senza la camera opposta vengono salvati in PNG."""
+        for pending in self._pending_frames.values():
+            for item in pending.values():
+                self._save_frame_png(item)
+        self._pending_frames = {}
+
+        for scan_id, writer in self._bundles.items():
+            writer.close()
+            logger.info(f"Bundle della scansione {scan_id} chiuso: {writer.num_frames} coppie")
+        self._bundles = {}
+
+    def _save_frame_png(self, item):
+        """
+        Salva un frame su disco come file PNG.
 
         Args:
             item: Dizionario con informazioni sul frame
@@ -1441,19 +1943,12 @@ class BackgroundSaver:
             scan_id = item['scan_id']
             frame = item['frame']
 
-            # Crea directory se necessario
-            scan_dir = self.output_dir / scan_id
-            scan_dir.mkdir(parents=True, exist_ok=True)
-
-            camera_dir = scan_dir / ("left" if camera_index == 0 else "right")
-            camera_dir.mkdir(parents=True, exist_ok=True)
-
             # Componi nome file
             filename = f"{pattern_index:04d}_{pattern_name}.png"
-            output_path = camera_dir / filename
+            output_path = self._camera_dir(scan_id, camera_index) / filename
 
-            # Salva il frame
-            success = cv2.imwrite(str(output_path), frame)
+            # Salva il frame (compressione bassa: la codifica PNG è il collo di bottiglia)
+            success = cv2.imwrite(str(output_path), frame, self._png_params)
 
             if not success:
                 logger.warning(f"cv2.imwrite fallito per {output_path}")
@@ -1474,6 +1969,16 @@ class BackgroundSaver:
         except Exception as e:
             logger.error(f"Errore nel salvataggio del frame: {e}")
 
+    def _save_frame_npy(self, item):
+        """
+        Salva un frame su disco come array NumPy grezzo (nessuna codifica).
+
+        Args:
+            item: Dizionario con informazioni sul frame
+        """
+        filename = f"{item['pattern_index']:04d}_{item['pattern_name']}.npy"
+        np.save(self._camera_dir(item['scan_id'], item['camera_index']) / filename, item['frame'])
+
     def _save_pointcloud(self, item):
         """
         Salva una nuvola di punti su disco.
@@ -1484,52 +1989,24 @@ class BackgroundSaver:
         try:
             scan_id = item['scan_id']
             pointcloud = item['pointcloud']
+            if isinstance(pointcloud, EncodedPointCloud):
+                pointcloud = pointcloud.decode()
 
             if pointcloud is None or len(pointcloud) == 0:
                 logger.warning("Nessun dato valido nella nuvola di punti")
                 return
 
-            # Crea directory se necessario
-            scan_dir = self.output_dir / scan_id
-            scan_dir.mkdir(parents=True, exist_ok=True)
-
             # Componi nome file
-            output_path = scan_dir / "pointcloud.ply"
+            output_path = self._ensure_dir(self.output_dir / scan_id) / "pointcloud.ply"
 
-            # Salva la nuvola di punti
-            try:
-                # Usa Open3D se disponibile
-                import open3d as o3d
-                pcd = o3d.geometry.PointCloud()
-                pcd.points = o3d.utility.Vector3dVector(pointcloud)
+            # Rimuove gli outlier prima del salvataggio
+            pointcloud = statistical_outlier_removal(pointcloud, nb_neighbors=20, std_ratio=2.0)
 
-                # Opzionale: applica un filtro per rimuovere outlier
-                try:
-                    pcd, _ = pcd.remove_statistical_outlier(nb_neighbors=20, std_ratio=2.0)
-                except Exception as e:
-                    logger.warning(f"Errore nell'applicazione del filtro outlier: {e}")
-
-                # Salva in formato PLY
-                o3d.io.write_point_cloud(str(output_path), pcd)
-                logger.info(f"Nuvola di punti salvata con Open3D: {output_path}")
-
-            except ImportError:
-                # Fallback a salvataggio manuale PLY
-                with open(output_path, 'w') as f:
-                    # Scrivi header
-                    f.write("ply\n")
-                    f.write("format ascii 1.0\n")
-                    f.write(f"element vertex {len(pointcloud)}\n")
-                    f.write("property float x\n")
-                    f.write("property float y\n")
-                    f.write("property float z\n")
-                    f.write("end_header\n")
-
-                    # Scrivi vertici
-                    for point in pointcloud:
-                        f.write(f"{point[0]} {point[1]} {point[2]}\n")
-
-                logger.info(f"Nuvola di punti salvata manualmente: {output_path}")
+            # Salva la nuvola di punti in PLY binario
+            write_ply(output_path, pointcloud)
+            logger.info(f"Nuvola di punti salvata: {output_path} ({len(pointcloud)} punti)")
+            with self._stats_lock:
+                self._stats['pointclouds_saved'] += 1
 
         except Exception as e:
             logger.error(f"Errore nel salvataggio della nuvola di punti: {e}")
@@ -1540,12 +2017,14 @@ class ScanFrameProcessor:
     Completamente riprogettata per operare in-memory con elaborazione incrementale.
     """
 
-    def __init__(self, output_dir=None):
+    def __init__(self, output_dir=None, backend="thread", num_workers=None):
         """
         Inizializza il processore di frame di scansione.
 
         Args:
             output_dir: Directory di output per i file salvati (opzionale)
+            backend: Backend di triangolazione ("thread" o "process")
+            num_workers: Numero di processi per il backend "process" (default: CPU count)
         """
         self.output_dir = output_dir or Path.home() / "UnLook" / "scans"
         self.output_dir.mkdir(parents=True, exist_ok=True)
@@ -1556,14 +2035,21 @@ class ScanFrameProcessor:
         self.frame_counters = {0: 0, 1: 0}
         self.pattern_info = {}
 
-        # Buffer circolare per memorizzare i frame
-        self._frame_buffer = CircularFrameBuffer(max_size=100)
+        # Tempi per fase condivisi con il triangolatore
+        self.instrumentation = PipelineInstrumentation()
 
         # Componente di triangolazione real-time
-        self._triangulator = RealTimeTriangulator(output_dir=self.output_dir)
+        self._triangulator = RealTimeTriangulator(output_dir=self.output_dir,
+                                                  backend=backend, num_workers=num_workers,
+                                                  instrumentation=self.instrumentation)
+
+        # Buffer circolare su slot preallocati, registrati nel memory manager del triangolatore
+        self._frame_buffer = CircularFrameBuffer(max_size=100,
+                                                 memory_manager=self._triangulator._memory_manager)
 
-        # Thread manager per operazioni CPU-intensive
-        self._thread_manager = TriangulationThreadManager()
+        # Esecutore dei task di triangolazione: le anteprime superate vengono cancellate
+        self._executor = TriangulationExecutor(num_workers=num_workers)
+        self._preview_future = None
 
         # Thread di salvataggio in background (opzionale)
         self._saver = BackgroundSaver(output_dir=self.output_dir)
@@ -1583,8 +2069,9 @@ class ScanFrameProcessor:
         # Flag per il salvataggio su disco
         self._save_to_disk = True
 
-        # Nuvola di punti real-time
+        # Nuvola di punti real-time, conservata quantizzata
         self._realtime_pointcloud = None
+        self.pointcloud_step = DEFAULT_QUANTIZATION_STEP
         self._pointcloud_lock = threading.RLock()
 
         # Numero di coppie minimo per iniziare la triangolazione
@@ -1625,9 +2112,13 @@ class ScanFrameProcessor:
     def _on_triangulation_completed(self, success, message, result):
         """Callback per il completamento della triangolazione."""
         if success and result is not None:
-            # Memorizza la nuvola di punti
+            # Memorizza la nuvola di punti in forma compatta
+            with self.instrumentation.span("export"):
+                encoded = encode_pointcloud(result, self.pointcloud_step)
             with self._pointcloud_lock:
-                self._realtime_pointcloud = result
+                self._realtime_pointcloud = encoded
+            self._triangulator._memory_manager.register_allocation(
+                'pointcloud_snapshot', encoded.nbytes / (1024 * 1024), allocation_type='pointcloud')
 
             # Notifica la nuova nuvola di punti
             if self._frame_callback:
@@ -1640,7 +2131,7 @@ class ScanFrameProcessor:
 
             # Salva su disco se necessario
             if self._save_to_disk:
-                self._saver.queue_pointcloud(self.current_scan_id, result)
+                self._saver.queue_pointcloud(self.current_scan_id, encoded)
 
     def start_scan(self, scan_id=None, num_patterns=24, pattern_type="PROGRESSIVE"):
         """
@@ -1668,22 +2159,21 @@ class ScanFrameProcessor:
             self.frame_counters = {0: 0, 1: 0}
             self.pattern_info = {}
 
-            # Reset del buffer
-            self._frame_buffer.clear()
+            # Reset del buffer, con uno slot per pattern atteso (più margine per i frame ripetuti)
+            self._frame_buffer.clear(max_size=num_patterns + 2)
 
             # Reset della nuvola di punti
             with self._pointcloud_lock:
                 self._realtime_pointcloud = None
 
+            # Ripartizione dei tempi per fase della nuova scansione
+            self.instrumentation.begin_run()
+
             # Salva informazioni della scansione
             if self._save_to_disk:
                 scan_dir = self.output_dir / scan_id
                 scan_dir.mkdir(parents=True, exist_ok=True)
 
-                # Crea sottodirectory per ciascuna camera
-                (scan_dir / "left").mkdir(exist_ok=True)
-                (scan_dir / "right").mkdir(exist_ok=True)
-
                 # Salva configurazione
                 config = {
                     "scan_id": scan_id,
@@ -1699,6 +2189,10 @@ class ScanFrameProcessor:
                 except Exception as e:
                     logger.error(f"Errore nel salvataggio della configurazione: {e}")
 
+                # Intestazione del bundle dei frame
+                self._saver.begin_scan(scan_id, config,
+                                       calibration_digest(self._triangulator._calibration_data))
+
             # Avvia il thread di salvataggio in background se necessario
             if self._save_to_disk:
                 self._saver.start()
@@ -1747,12 +2241,12 @@ class ScanFrameProcessor:
                     if not white_black_initialized:
                         # Verifica se abbiamo i frame white (index 0) e black (index 1)
                         if self._frame_buffer.has_complete_pair(0) and self._frame_buffer.has_complete_pair(1):
-                            # Estrai i frame white e black
-                            white_left, white_right = self._frame_buffer.get_frame_pair(0)
-                            black_left, black_right = self._frame_buffer.get_frame_pair(1)
-
-                            # Inizializza il triangolatore
-                            success = self._triangulator.initialize(white_left, white_right, black_left, black_right)
+                            # Estrai i frame white e black (trattenuti fino alla copia nel triangolatore)
+                            with self._frame_buffer.get_frame_pair(0) as (white_left, white_right), \
+                                    self._frame_buffer.get_frame_pair(1) as (black_left, black_right):
+                                # Inizializza il triangolatore
+                                success = self._triangulator.initialize(white_left, white_right,
+                                                                        black_left, black_right)
 
                             if success:
                                 white_black_initialized = True
@@ -1770,44 +2264,39 @@ class ScanFrameProcessor:
                         # Ottieni tutti i pattern con coppie complete
                         pattern_indices = self._frame_buffer.get_patterns_with_complete_pairs()
 
-                        # Filtra i pattern già elaborati
-                        new_patterns = [idx for idx in pattern_indices
-                                        if idx > 1 and idx > self._last_processed_pattern]
+                        # Pattern non ancora accumulati dal triangolatore
+                        new_patterns = self._triangulator.pending_patterns(pattern_indices)
 
                         # Verifica se abbiamo abbastanza nuovi pattern per un aggiornamento
                         enough_for_update = (len(pattern_indices) >= self._min_pattern_pairs and
                                              len(new_patterns) >= 2)
 
                         if enough_for_update:
-                            # Prepara le coppie di frame per la triangolazione
+                            # Prepara solo le nuove coppie: le precedenti sono già accumulate.
+                            # Le viste sugli slot restano trattenute fino alla fine dell'aggiornamento
+                            leases = []
                             frame_pairs = []
-
-                            # Aggiungi sempre white e black (indici 0 e 1)
-                            white_pair = self._frame_buffer.get_frame_pair(0)
-                            black_pair = self._frame_buffer.get_frame_pair(1)
-
-                            if white_pair and black_pair:
-                                frame_pairs.append((0, white_pair[0], white_pair[1]))
-                                frame_pairs.append((1, black_pair[0], black_pair[1]))
-
-                                # Aggiungi i pattern
-                                for idx in pattern_indices:
-                                    if idx > 1:  # Ignora white e black
-                                        pair = self._frame_buffer.get_frame_pair(idx)
-                                        if pair:
-                                            frame_pairs.append((idx, pair[0], pair[1]))
-
-                                # Ordina per indice pattern
-                                frame_pairs.sort(key=lambda x: x[0])
-
-                                # Triangola i frame
-                                self._triangulator.triangulate_frames(frame_pairs)
-
-                                # Aggiorna l'ultimo pattern elaborato
-                                self._last_processed_pattern = max(pattern_indices)
-
-                                logger.info(
-                                    f"Triangolazione incrementale completata, ultimo pattern: {self._last_processed_pattern}")
+                            for idx in new_patterns:
+                                pair = self._frame_buffer.get_frame_pair(idx)
+                                if pair:
+                                    leases.append(pair)
+                                    frame_pairs.append((idx, pair[0], pair[1]))
+
+                            if frame_pairs:
+                                # Accumula i nuovi pattern e aggiorna la nuvola di punti in background.
+                                # Un'anteprima ancora in coda viene sostituita da questa, che ne
+                                # include i pattern (non ancora accumulati)
+                                try:
+                                    future = self._executor.submit(self._triangulator.update_frames, frame_pairs,
+                                                                   priority=PRIORITY_PREVIEW, group="preview",
+                                                                   supersede=True)
+                                except Exception:
+                                    for lease in leases:
+                                        lease.release()
+                                    raise
+                                future.add_done_callback(
+                                    functools.partial(self._on_preview_done, leases, max(new_patterns)))
+                                self._preview_future = future
 
                 except Exception as e:
                     logger.error(f"Errore nell'elaborazione real-time: {e}")
@@ -1823,6 +2312,30 @@ class ScanFrameProcessor:
             logger.error(f"Traceback: {traceback.format_exc()}")
             self._triangulation_active = False
 
+    def _on_preview_done(self, leases, last_pattern, future):
+        """
+        Completamento (o cancellazione) di un aggiornamento di anteprima.
+
+        Args:
+            leases: Coppie di frame trattenute per il task, da rilasciare
+            last_pattern: Pattern più recente incluso nel task
+            future: Future del task
+        """
+        for lease in leases:
+            lease.release()
+
+        if future.cancelled():
+            logger.debug(f"Anteprima fino al pattern {last_pattern} sostituita da una più recente")
+            return
+
+        if future.exception() is not None:
+            logger.error(f"Errore nell'aggiornamento di anteprima: {future.exception()}")
+            return
+
+        # Aggiorna l'ultimo pattern elaborato
+        self._last_processed_pattern = max(self._last_processed_pattern, last_pattern)
+        logger.info(f"Triangolazione incrementale completata, ultimo pattern: {self._last_processed_pattern}")
+
     def process_frame(self, camera_index, frame, frame_info):
         """
         Elabora un frame di scansione in tempo reale.
@@ -1859,7 +2372,8 @@ class ScanFrameProcessor:
                 }
 
             # Salva in memoria senza controlli eccessivi
-            self._frame_buffer.add_frame(camera_index, pattern_index, frame, frame_info)
+            with self.instrumentation.span("load"):
+                self._frame_buffer.add_frame(camera_index, pattern_index, frame, frame_info)
 
             # Segnala al thread di elaborazione che c'è un nuovo frame
             self._new_frame_event.set()
@@ -1902,6 +2416,17 @@ class ScanFrameProcessor:
         if self._processing_thread and self._processing_thread.is_alive():
             self._processing_thread.join(timeout=2.0)
 
+        # Attendi l'ultima anteprima (include tutti i pattern ricevuti), poi scarta quelle residue
+        if self._preview_future is not None:
+            try:
+                self._preview_future.result(timeout=2.0)
+            except (CancelledError, FutureTimeoutError):
+                pass
+            except Exception as e:
+                logger.error(f"Errore nell'ultimo aggiornamento di anteprima: {e}")
+            self._preview_future = None
+        self._executor.cancel_group("preview")
+
         # Ferma il salvataggio in background
         if self._save_to_disk:
             self._saver.stop()
@@ -1922,7 +2447,15 @@ class ScanFrameProcessor:
             if self._realtime_pointcloud is not None:
                 stats["pointcloud_points"] = len(self._realtime_pointcloud)
 
+        if self._save_to_disk:
+            stats["saver"] = self._saver.get_stats()
+
+        # Dove sono andati i secondi della scansione
+        stats["stage_times_ms"] = {stage: round(ms, 1)
+                                   for stage, ms in self.instrumentation.run_breakdown().items()}
+
         logger.info(f"Scansione {self.current_scan_id} completata con {stats['frames_total']} frame totali")
+        logger.info(f"Tempi per fase: {self.instrumentation.format_breakdown()}")
 
         # Salva statistiche
         if self._save_to_disk:
@@ -1987,96 +2520,57 @@ class ScanFrameProcessor:
             Array NumPy con la nuvola di punti o None se non disponibile
         """
         with self._pointcloud_lock:
-            if self._realtime_pointcloud is not None:
-                return self._realtime_pointcloud.copy()
-        return None
-
-class TriangulationThreadManager:
-    """
-    Gestisce thread paralleli per operazioni di triangolazione CPU-intensive.
-    Implementa pattern thread pool con coda di lavoro ottimizzata.
-    """
+            encoded = self._realtime_pointcloud
+        return encoded.decode() if encoded is not None else None
 
-    def __init__(self, num_workers=None):
+    def get_realtime_pointcloud_encoded(self):
         """
-        Inizializza il gestore thread con un numero ottimale di worker.
+        Restituisce l'ultima nuvola di punti real-time in forma quantizzata,
+        adatta al trasferimento (``to_bytes``) o all'archiviazione.
 
-        Args:
-            num_workers: Numero di thread worker (default: CPU count - 1)
+        Returns:
+            EncodedPointCloud o None se non disponibile
         """
-        if num_workers is None:
-            import multiprocessing
-            num_workers = max(1, multiprocessing.cpu_count() - 1)
+        with self._pointcloud_lock:
+            return self._realtime_pointcloud
 
-        self.num_workers = num_workers
-        self.task_queue = queue.Queue()
-        self.workers = []
-        self.results = {}
-        self._lock = threading.RLock()
-        self._stopped = threading.Event()
+    def get_performance_stats(self):
+        """
+        Restituisce le statistiche dei tempi per fase (ricezione, rettifica,
+        corrispondenze, filtri, riproiezione, codifica) della pipeline real-time.
 
-        logger.info(f"TriangulationThreadManager inizializzato con {num_workers} worker")
+        Returns:
+            Dizionario con gli istogrammi per fase ("stages"), la ripartizione
+            della scansione corrente ("last_run"), lo stato dell'esecutore ("executor"),
+            l'uso della memoria ("memory") e il throughput del salvataggio ("saver")
+        """
+        stats = self.instrumentation.get_performance_stats()
+        stats["executor"] = self._executor.get_stats()
+        stats["memory"] = self._triangulator._memory_manager.get_stats()
+        stats["saver"] = self._saver.get_stats()
+        return stats
 
-        # Avvia i worker
-        self._start_workers()
+class TriangulationThreadManager:
+    """
+    Interfaccia a ID di task sopra TriangulationExecutor, mantenuta per
+    compatibilità. Il nuovo codice usa direttamente l'esecutore e i suoi future.
+    """
 
-    def _start_workers(self):
-        """Avvia i thread worker."""
-        for i in range(self.num_workers):
-            worker = threading.Thread(
-                target=self._worker_loop,
-                args=(i,),
-                daemon=True
-            )
-            worker.start()
-            self.workers.append(worker)
+    # Risultati non ritirati conservati al massimo (i più vecchi già completati vengono scartati)
+    MAX_UNFETCHED_RESULTS = 256
 
-    def _worker_loop(self, worker_id):
+    def __init__(self, num_workers=None):
         """
-        Loop principale del worker thread.
+        Inizializza il gestore thread con un numero ottimale di worker.
 
         Args:
-            worker_id: ID del worker per log e debugging
+            num_workers: Numero di thread worker (default: CPU count - 1)
         """
-        logger.debug(f"Worker {worker_id} avviato")
-
-        while not self._stopped.is_set():
-            try:
-                # Estrai task dalla coda con timeout
-                task_id, func, args, kwargs = self.task_queue.get(timeout=0.5)
-
-                # Esegui il task
-                try:
-                    start_time = time.time()
-                    result = func(*args, **kwargs)
-                    elapsed = time.time() - start_time
-
-                    # Salva il risultato
-                    with self._lock:
-                        self.results[task_id] = {
-                            'status': 'completed',
-                            'result': result,
-                            'elapsed': elapsed
-                        }
-
-                    logger.debug(f"Worker {worker_id} completato task {task_id} in {elapsed:.3f}s")
-
-                except Exception as e:
-                    logger.error(f"Worker {worker_id} errore in task {task_id}: {e}")
-                    with self._lock:
-                        self.results[task_id] = {
-                            'status': 'error',
-                            'error': str(e)
-                        }
-
-                # Segna il task come completato
-                self.task_queue.task_done()
-
-            except queue.Empty:
-                # Timeout, controlla condizione di uscita
-                continue
-
-        logger.debug(f"Worker {worker_id} terminato")
+        self._executor = TriangulationExecutor(num_workers)
+        self.num_workers = self._executor.num_workers
+        self._futures = {}
+        self._task_ids = itertools.count()
+        self._lock = threading.RLock()
 
     def submit_task(self, func, *args, **kwargs):
         """
@@ -2089,18 +2583,15 @@ class TriangulationThreadManager:
         Returns:
             ID del task per recuperare il risultato
         """
-        if self._stopped.is_set():
-            raise RuntimeError("ThreadManager è stato arrestato")
-
-        # Genera ID task
-        task_id = str(uuid.uuid4())
-
-        # Inizializza stato risultato
+        future = self._executor.submit(func, *args, **kwargs)
         with self._lock:
-            self.results[task_id] = {'status': 'pending'}
+            task_id = next(self._task_ids)
+            self._futures[task_id] = future
 
-        # Accoda il task
-        self.task_queue.put((task_id, func, args, kwargs))
+            # Scarta i risultati completati più vecchi mai ritirati
+            if len(self._futures) > self.MAX_UNFETCHED_RESULTS:
+                for old_id in [tid for tid, f in self._futures.items() if f.done()][:len(self._futures) // 2]:
+                    del self._futures[old_id]
 
         return task_id
 
@@ -2120,33 +2611,25 @@ class TriangulationThreadManager:
             KeyError: Se task_id non esiste
             RuntimeError: Se il task è fallito
         """
-        start_time = time.time()
-
-        while True:
-            with self._lock:
-                if task_id not in self.results:
-                    raise KeyError(f"Task {task_id} non trovato")
-
-                task_result = self.results[task_id]
-
-                if task_result['status'] == 'completed':
-                    result = task_result['result']
-                    if remove:
-                        del self.results[task_id]
-                    return result
-
-                if task_result['status'] == 'error':
-                    error = task_result.get('error', 'Errore sconosciuto')
-                    if remove:
-                        del self.results[task_id]
-                    raise RuntimeError(f"Task fallito: {error}")
+        with self._lock:
+            if task_id not in self._futures:
+                raise KeyError(f"Task {task_id} non trovato")
+            future = self._futures[task_id]
 
-            # Verifica timeout
-            if timeout is not None and time.time() - start_time > timeout:
-                return None
+        try:
+            result = future.result(timeout=timeout)
+        except FutureTimeoutError:
+            return None
+        except Exception as e:
+            if remove:
+                with self._lock:
+                    self._futures.pop(task_id, None)
+            raise RuntimeError(f"Task fallito: {e}")
 
-            # Pausa breve per evitare busy waiting
-            time.sleep(0.01)
+        if remove:
+            with self._lock:
+                self._futures.pop(task_id, None)
+        return result
 
     def shutdown(self, wait=True):
         """
@@ -2155,196 +2638,9 @@ class TriangulationThreadManager:
         Args:
             wait: Se True, attende il completamento di tutti i task in coda
         """
-        if wait:
-            # Attendi il completamento delle code
-            self.task_queue.join()
-
-        # Segnala arresto ai worker
-        self._stopped.set()
-
-        # Attendi terminazione worker
-        for worker in self.workers:
-            worker.join(timeout=2.0)
-
+        self._executor.shutdown(wait=wait)
         logger.info("TriangulationThreadManager arrestato")
 
-class MemoryManager:
-    """
-    Gestore intelligente della memoria per l'elaborazione di scansioni 3D.
-    Monitorizza e ottimizza l'utilizzo della memoria durante l'elaborazione.
-    """
-
-    def __init__(self, max_memory_usage_mb=2048):
-        """
-        Inizializza il memory manager.
-
-        Args:
-            max_memory_usage_mb: Limite massimo di utilizzo memoria in MB
-        """
-        self.max_memory_usage_mb = max_memory_usage_mb
-        self._current_usage_mb = 0
-        self._allocations = {}
-        self._lock = threading.RLock()
-
-        # Avvia monitoraggio
-        self._start_monitoring()
-
-    def _start_monitoring(self):
-        """Avvia il monitoraggio della memoria di sistema."""
-        self._monitor_thread = threading.Thread(
-            target=self._monitor_loop,
-            daemon=True
-        )
-        self._monitor_thread.start()
-
-    def _monitor_loop(self):
-        """Loop di monitoraggio della memoria."""
-        import psutil
-
-        while True:
-            try:
-                # Ottieni utilizzo memoria
-                mem = psutil.virtual_memory()
-
-                # Calcola percentuale disponibile
-                available_percent = mem.available / mem.total * 100
-
-                # Logga ogni 60 secondi
-                if int(time.time()) % 60 == 0:
-                    logger.debug(f"Memoria disponibile: {available_percent:.1f}%, "
-                                 f"Allocata: {self._current_usage_mb:.1f}MB")
-
-                # Se memoria sistema è sotto 20%, applica pulizia
-                if available_percent < 20:
-                    self._apply_memory_reduction()
-
-                # Pausa
-                time.sleep(5)
-
-            except Exception as e:
-                logger.error(f"Errore nel monitor memoria: {e}")
-                time.sleep(30)  # Pausa più lunga in caso di errore
-
-    def _apply_memory_reduction(self):
-        """
-        Applica strategie di riduzione memoria quando il sistema è sotto pressione.
-        """
-        logger.warning("Memoria sistema bassa, applicando strategie di riduzione")
-
-        with self._lock:
-            # Ordina per dimensione decrescente
-            sorted_allocations = sorted(
-                self._allocations.items(),
-                key=lambda x: x[1]['size'],
-                reverse=True
-            )
-
-            # Rimuovi il 20% delle allocazioni più grandi
-            target_reduction = self._current_usage_mb * 0.2
-            reduced = 0
-
-            for alloc_id, info in sorted_allocations:
-                if info['type'] == 'buffer' and info['priority'] < 5:
-                    # Chiama callback di pulizia se disponibile
-                    if 'cleanup_callback' in info and info['cleanup_callback']:
-                        try:
-                            info['cleanup_callback'](alloc_id)
-                            reduced += info['size']
-                            logger.info(f"Liberati {info['size']:.1f}MB da {alloc_id}")
-                        except Exception as e:
-                            logger.error(f"Errore nella callback di pulizia: {e}")
-
-                # Esci se abbiamo raggiunto l'obiettivo
-                if reduced >= target_reduction:
-                    break
-
-            # Forza garbage collection
-            import gc
-            gc.collect()
-
-    def register_allocation(self, allocation_id, size_mb, allocation_type='buffer',
-                            priority=3, cleanup_callback=None):
-        """
-        Registra un'allocazione di memoria.
-
-        Args:
-            allocation_id: ID univoco dell'allocazione
-            size_mb: Dimensione in MB
-            allocation_type: Tipo di allocazione ('buffer', 'cache', etc.)
-            priority: Priorità (1-10, 10 è priorità massima)
-            cleanup_callback: Funzione da chiamare per liberare memoria
-        """
-        with self._lock:
-            self._allocations[allocation_id] = {
-                'size': size_mb,
-                'type': allocation_type,
-                'priority': priority,
-                'timestamp': time.time(),
-                'cleanup_callback': cleanup_callback
-            }
-
-            self._current_usage_mb += size_mb
-
-    def unregister_allocation(self, allocation_id):
-        """
-        Deregistra un'allocazione di memoria.
-
-        Args:
-            allocation_id: ID dell'allocazione da rimuovere
-        """
-        with self._lock:
-            if allocation_id in self._allocations:
-                size = self._allocations[allocation_id]['size']
-                del self._allocations[allocation_id]
-                self._current_usage_mb -= size
-
-    def check_available_memory(self, requested_mb):
-        """
-        Verifica se c'è sufficiente memoria disponibile.
-
-        Args:
-            requested_mb: Memoria richiesta in MB
-
-        Returns:
-            True se la memoria è disponibile, False altrimenti
-        """
-        with self._lock:
-            # Verifica limite interno
-            if self._current_usage_mb + requested_mb > self.max_memory_usage_mb:
-                return False
-
-            # Verifica sistema
-            try:
-                import psutil
-                mem = psutil.virtual_memory()
-                available_mb = mem.available / (1024 * 1024)
-
-                # Richiedi almeno 1.5x la memoria necessaria (fattore di sicurezza)
-                return available_mb >= requested_mb * 1.5
-
-            except ImportError:
-                # Fallback se psutil non è disponibile
-                return True
-
-    def get_stats(self):
-        """
-        Restituisce statistiche sull'utilizzo della memoria.
-
-        Returns:
-            Dizionario con statistiche
-        """
-        with self._lock:
-            return {
-                'current_usage_mb': self._current_usage_mb,
-                'max_memory_mb': self.max_memory_usage_mb,
-                'num_allocations': len(self._allocations),
-                'allocations_by_type': {
-                    alloc_type: sum(info['size'] for info in self._allocations.values()
-                                    if info['type'] == alloc_type)
-                    for alloc_type in set(info['type'] for info in self._allocations.values())
-                }
-            }
-
 class PointCloudFilter:
     """
     Implementa filtri avanzati per nuvole di punti in tempo reale.
@@ -2354,7 +2650,7 @@ class PointCloudFilter:
     @staticmethod
     def statistical_outlier_removal(pointcloud, nb_neighbors=20, std_ratio=2.0):
         """
-        Rimuove outlier statistici con versione veloce per tempo reale.
+        Rimuove outlier statistici con query batch sul KD-tree.
 
         Args:
             pointcloud: Nuvola di punti come array numpy
@@ -2364,158 +2660,84 @@ class PointCloudFilter:
         Returns:
             Nuvola di punti filtrata
         """
-        if pointcloud is None or len(pointcloud) < nb_neighbors + 1:
-            return pointcloud
-
-        try:
-            # Implementazione ottimizzata per evitare Open3D
-            # Costruisci KDTree per ricerca veloce del vicinato
-            from scipy.spatial import KDTree
-
-            # Limite dimensione per prestazioni
-            max_points = 100000
-            if len(pointcloud) > max_points:
-                # Campionamento per prestazioni
-                indices = np.random.choice(len(pointcloud), max_points, replace=False)
-                points_for_tree = pointcloud[indices]
-                kdtree = KDTree(points_for_tree)
-
-                # Per ogni punto originale, cerca i vicini più vicini nel subset
-                mean_dists = []
-                for point in pointcloud:
-                    _, indexes = kdtree.query(point, k=min(nb_neighbors, max_points))
-                    if isinstance(indexes, np.ndarray):
-                        neighbors = points_for_tree[indexes]
-                    else:
-                        neighbors = np.array([points_for_tree[indexes]])
-
-                    # Calcola distanza media
-                    dists = np.linalg.norm(neighbors - point, axis=1)
-                    mean_dists.append(np.mean(dists))
-            else:
-                # Caso normale con tutti i punti
-                kdtree = KDTree(pointcloud)
-
-                # Per ogni punto, cerca i vicini più vicini
-                mean_dists = []
-                for i, point in enumerate(pointcloud):
-                    _, indexes = kdtree.query(point, k=min(nb_neighbors + 1, len(pointcloud)))
-
-                    # Rimuovi il punto stesso (è sempre il primo risultato)
-                    if len(indexes) > 1:
-                        indexes = indexes[1:]
-
-                    # Calcola distanza media
-                    neighbors = pointcloud[indexes]
-                    dists = np.linalg.norm(neighbors - point, axis=1)
-                    mean_dists.append(np.mean(dists))
+        return statistical_outlier_removal(pointcloud, nb_neighbors, std_ratio)
 
-            # Converti in array
-            mean_dists = np.array(mean_dists)
-
-            # Calcola soglia statistica
-            mean = np.mean(mean_dists)
-            std = np.std(mean_dists)
-            threshold = mean + std_ratio * std
-
-            # Filtra punti
-            valid_indices = mean_dists < threshold
-            filtered_points = pointcloud[valid_indices]
-
-            # Log risultati
-            removed = len(pointcloud) - len(filtered_points)
-            removal_percent = removed / len(pointcloud) * 100
-            logger.info(f"Filtro outlier: rimossi {removed} punti ({removal_percent:.1f}%)")
+    @staticmethod
+    def radius_outlier_removal(pointcloud, radius, min_neighbors=5):
+        """
+        Rimuove i punti con meno di min_neighbors vicini entro il raggio indicato.
 
-            return filtered_points
+        Args:
+            pointcloud: Nuvola di punti come array numpy
+            radius: Raggio di ricerca in mm
+            min_neighbors: Numero minimo di vicini
 
-        except Exception as e:
-            logger.error(f"Errore nel filtro outlier: {e}")
-            return pointcloud
+        Returns:
+            Nuvola di punti filtrata
+        """
+        return radius_outlier_removal(pointcloud, radius, min_neighbors)
 
     @staticmethod
-    def voxel_downsample(pointcloud, voxel_size=1.0):
+    def voxel_downsample(pointcloud, voxel_size=1.0, mode="first", attributes=None):
         """
         Applica downsampling voxel-based per ridurre densità.
 
         Args:
             pointcloud: Nuvola di punti come array numpy
             voxel_size: Dimensione del voxel in mm
+            mode: Rappresentante del voxel ("first", "centroid" o "median")
+            attributes: Dizionario opzionale di attributi per punto da ridurre insieme ai punti
 
         Returns:
-            Nuvola di punti sottocampionata
+            Nuvola di punti sottocampionata (con gli attributi ridotti, se indicati)
         """
         if pointcloud is None or len(pointcloud) == 0:
-            return pointcloud
+            return pointcloud if attributes is None else (pointcloud, attributes)
 
         try:
-            # Calcola limiti della nuvola
-            mins = np.min(pointcloud, axis=0)
-            maxs = np.max(pointcloud, axis=0)
-
-            # Calcola dimensioni e numero di voxel
-            dims = maxs - mins
-            voxel_dims = np.ceil(dims / voxel_size).astype(int)
-
-            # Inizializza array risultato
-            voxel_grid = {}
-
-            # Assegna punti ai voxel
-            for i, point in enumerate(pointcloud):
-                # Calcola indice voxel
-                voxel_idx = tuple(np.floor((point - mins) / voxel_size).astype(int))
-
-                # Se è il primo punto nel voxel, salvalo
-                if voxel_idx not in voxel_grid:
-                    voxel_grid[voxel_idx] = i
-
-            # Estrai un punto per voxel
-            downsampled = pointcloud[[voxel_grid[idx] for idx in voxel_grid]]
+            result = voxel_grid_downsample(pointcloud, voxel_size, mode, attributes)
+            downsampled = result if attributes is None else result[0]
 
             # Log risultati
             reduction = (1 - len(downsampled) / len(pointcloud)) * 100
             logger.info(f"Voxel downsampling: riduzione {reduction:.1f}%, punti rimasti: {len(downsampled)}")
 
-            return downsampled
+            return result
 
         except Exception as e:
             logger.error(f"Errore nel voxel downsampling: {e}")
-            return pointcloud
+            return pointcloud if attributes is None else (pointcloud, attributes)
 
     @staticmethod
-    def bilateral_filter(pointcloud, depth_map, sigma_spatial=2.0, sigma_depth=0.1):
+    def bilateral_filter(pointcloud, depth_map=None, sigma_spatial=2.0, sigma_depth=0.1):
         """
         Applica filtro bilaterale per preservare bordi mentre smussa superfici.
 
+        Il filtro lavora sulla profondità di una nuvola organizzata e sposta
+        ogni punto lungo il proprio raggio; una nuvola piatta non ha la
+        corrispondenza pixel → punto e viene restituita invariata.
+
         Args:
-            pointcloud: Nuvola di punti
-            depth_map: Mappa di profondità corrispondente
+            pointcloud: Nuvola di punti (OrganizedPointCloud o array numpy)
+            depth_map: Non più usato: la profondità viene dalla nuvola organizzata
             sigma_spatial: Sigma spaziale (pixel)
             sigma_depth: Sigma di profondità (mm)
 
         Returns:
             Nuvola di punti filtrata
         """
-        if pointcloud is None or depth_map is None:
+        if pointcloud is None:
             return pointcloud
 
-        try:
-            # Applica filtro bilaterale alla mappa di profondità
-            filtered_depth = cv2.bilateralFilter(
-                depth_map.astype(np.float32),
-                d=5,  # Diametro del vicinato
-                sigmaColor=sigma_depth,
-                sigmaSpace=sigma_spatial
-            )
-
-            # Usa la mappa filtrata per riproiettare la nuvola
-            # Questo richiede una mappa di indici per mappare dalla mappa di profondità ai punti
-            # Implementazione specifica dipende dalla rappresentazione della nuvola
+        if not isinstance(pointcloud, OrganizedPointCloud):
+            logger.warning("Filtro bilaterale richiede una OrganizedPointCloud: nuvola invariata")
+            return pointcloud
 
-            # Semplificazione: restituisci la nuvola originale
-            # In un'implementazione reale, riproiettare con la mappa filtrata
+        try:
+            filtered = pointcloud.filter_depth("bilateral", kernel_size=5,
+                                               sigma_spatial=sigma_spatial, sigma_depth=sigma_depth)
             logger.info("Filtro bilaterale applicato alla mappa di profondità")
-            return pointcloud
+            return filtered
 
         except Exception as e:
             logger.error(f"Errore nel filtro bilaterale: {e}")
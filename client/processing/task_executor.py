@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Esecutore di task di triangolazione basato su future.
+I task attendono in una coda a priorità limitata: quando è piena ``submit``
+si blocca (backpressure) invece di accumulare lavoro arretrato. I task di un
+gruppo (ad esempio le anteprime live) possono sostituire quelli in attesa
+dello stesso gruppo, che vengono cancellati: con un flusso continuo di
+aggiornamenti resta in coda al massimo l'anteprima più recente e la sua
+latenza non cresce con l'arretrato.
+"""
+
+import heapq
+import itertools
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional
+
+# Configurazione logging
+logger = logging.getLogger(__name__)
+
+# Priorità dei task: valori minori vengono eseguiti prima
+PRIORITY_PREVIEW = 0
+PRIORITY_FINAL = 10
+
+# Task in attesa oltre i quali submit applica la backpressure
+DEFAULT_MAX_PENDING = 32
+
+
+class _Task:
+    """Voce della coda: ordinata per priorità e poi per ordine di sottomissione."""
+    __slots__ = ("priority", "sequence", "future", "func", "args", "kwargs", "group", "submitted")
+
+    def __init__(self, priority, sequence, future, func, args, kwargs, group):
+        self.priority = priority
+        self.sequence = sequence
+        self.future = future
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.group = group
+        self.submitted = time.perf_counter()
+
+    def __lt__(self, other):
+        return (self.priority, self.sequence) < (other.priority, other.sequence)
+
+
+class TriangulationExecutor:
+    """
+    Pool di thread con coda a priorità limitata e cancellazione dei task superati.
+    """
+
+    def __init__(self, num_workers: Optional[int] = None, max_pending: int = DEFAULT_MAX_PENDING):
+        """
+        Inizializza l'esecutore e avvia i worker.
+
+        Args:
+            num_workers: Numero di thread worker (default: CPU count - 1)
+            max_pending: Task in attesa oltre i quali submit si blocca
+        """
+        if num_workers is None:
+            num_workers = max(1, multiprocessing.cpu_count() - 1)
+
+        self.num_workers = num_workers
+        self.max_pending = max_pending
+
+        self._heap = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition(threading.RLock())
+        self._running = 0
+        self._shutdown = False
+
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0, "cancelled": 0, "superseded": 0}
+        self._wait_ms = {}
+
+        self._workers = [threading.Thread(target=self._worker_loop, args=(i,), daemon=True)
+                         for i in range(num_workers)]
+        for worker in self._workers:
+            worker.start()
+
+        logger.info(f"TriangulationExecutor inizializzato con {num_workers} worker")
+
+    def submit(self, func: Callable, *args, priority: int = PRIORITY_FINAL, group: Optional[str] = None,
+               supersede: bool = False, timeout: Optional[float] = None, **kwargs) -> Future:
+        """
+        Sottomette un task.
+
+        Args:
+            func: Funzione da eseguire
+            *args, **kwargs: Argomenti per la funzione
+            priority: Priorità (PRIORITY_PREVIEW prima di PRIORITY_FINAL)
+            group: Gruppo del task, per la sostituzione e la cancellazione
+            supersede: Cancella i task dello stesso gruppo ancora in attesa
+            timeout: Attesa massima in secondi se la coda è piena (None = indefinita)
+
+        Returns:
+            Future del task
+
+        Raises:
+            RuntimeError: Se l'esecutore è stato arrestato
+            queue.Full: Se la coda resta piena oltre il timeout
+        """
+        future = Future()
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("TriangulationExecutor è stato arrestato")
+
+            if supersede and group is not None:
+                self._stats["superseded"] += self._cancel_pending(group)
+
+            if not self._condition.wait_for(lambda: len(self._heap) < self.max_pending or self._shutdown,
+                                            timeout):
+                raise queue.Full(f"Coda dei task piena ({self.max_pending} in attesa)")
+            if self._shutdown:
+                raise RuntimeError("TriangulationExecutor è stato arrestato")
+
+            heapq.heappush(self._heap, _Task(priority, next(self._sequence), future, func, args, kwargs, group))
+            self._stats["submitted"] += 1
+            self._condition.notify_all()
+
+        return future
+
+    def _cancel_pending(self, group=None) -> int:
+        """Cancella i task in attesa (di un gruppo o tutti); va chiamato con il lock acquisito."""
+        kept = []
+        cancelled = 0
+        for task in self._heap:
+            if group is None or task.group == group:
+                task.future.cancel()
+                cancelled += 1
+            else:
+                kept.append(task)
+
+        if cancelled:
+            heapq.heapify(kept)
+            self._heap = kept
+            self._stats["cancelled"] += cancelled
+            self._condition.notify_all()
+        return cancelled
+
+    def cancel_group(self, group: str) -> int:
+        """
+        Cancella i task in attesa di un gruppo (quelli in esecuzione terminano).
+
+        Args:
+            group: Gruppo da cancellare
+
+        Returns:
+            Numero di task cancellati
+        """
+        with self._condition:
+            return self._cancel_pending(group)
+
+    def _worker_loop(self, worker_id):
+        """Loop dei worker: attende i task senza polling e li esegue in ordine di priorità."""
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._heap or self._shutdown)
+                if not self._heap:
+                    return
+                task = heapq.heappop(self._heap)
+                self._running += 1
+                self._condition.notify_all()
+
+            try:
+                if not task.future.set_running_or_notify_cancel():
+                    # Cancellato dal chiamante dopo la sottomissione
+                    with self._condition:
+                        self._stats["cancelled"] += 1
+                    continue
+
+                wait_ms = (time.perf_counter() - task.submitted) * 1000.0
+                try:
+                    result = task.func(*task.args, **task.kwargs)
+                except BaseException as e:
+                    logger.error(f"Worker {worker_id} errore nel task: {e}")
+                    task.future.set_exception(e)
+                    succeeded = False
+                else:
+                    task.future.set_result(result)
+                    succeeded = True
+
+                with self._condition:
+                    self._stats["completed" if succeeded else "failed"] += 1
+                    mean, count = self._wait_ms.get(task.priority, (0.0, 0))
+                    self._wait_ms[task.priority] = (mean + (wait_ms - mean) / (count + 1), count + 1)
+            finally:
+                with self._condition:
+                    self._running -= 1
+                    self._condition.notify_all()
+
+    @property
+    def pending(self) -> int:
+        """Task in attesa."""
+        with self._condition:
+            return len(self._heap)
+
+    def get_stats(self) -> Dict:
+        """
+        Restituisce statistiche sull'esecutore.
+
+        Returns:
+            Dizionario con contatori dei task, task in attesa ed in esecuzione e
+            attesa media in coda per priorità (ms)
+        """
+        with self._condition:
+            stats = dict(self._stats)
+            stats.update(pending=len(self._heap), running=self._running,
+                         mean_queue_wait_ms={priority: mean for priority, (mean, _) in self._wait_ms.items()})
+            return stats
+
+    def shutdown(self, wait: bool = True, cancel_pending: bool = False):
+        """
+        Arresta l'esecutore.
+
+        Args:
+            wait: Attende che i worker terminino i task in corso (e quelli in coda)
+            cancel_pending: Cancella i task ancora in attesa
+        """
+        with self._condition:
+            if cancel_pending:
+                self._cancel_pending()
+            if wait:
+                self._condition.wait_for(lambda: not self._heap and not self._running)
+            self._shutdown = True
+            self._condition.notify_all()
+
+        if wait:
+            for worker in self._workers:
+                worker.join(timeout=2.0)
+
+        logger.info("TriangulationExecutor arrestato")
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Suddivisione dei frame in tile per la ricerca parallela delle corrispondenze.
+I tile coprono esattamente l'immagine (qualsiasi risoluzione) senza
+sovrapposizioni: ogni worker elabora l'intero stack dei pattern sul proprio
+tile e scrive direttamente nella sua porzione delle mappe di disparità e
+confidenza, che restano un'unica mappa senza ricucitura né sincronizzazione.
+
+Il frame viene diviso prima per righe, in blocchi di bande del motore di
+corrispondenza. Le colonne vengono divise solo se le righe non bastano a
+occupare tutti i worker: un tile di colonne deve rileggere ``max_disparity``
+colonne a sinistra come margine di ricerca.
+"""
+
+import math
+from dataclasses import dataclass
+from typing import List, Tuple
+
+from client.processing.correspondence import DEFAULT_BAND_HEIGHT, DEFAULT_MAX_DISPARITY
+
+# Tile per worker: più tile dei worker bilanciano il carico tra righe con più o meno pixel illuminati
+TILES_PER_WORKER = 2
+
+# Altezza minima di un tile: sotto questa soglia prevale il costo fisso per banda del motore
+MIN_TILE_ROWS = 16
+
+# Larghezza minima di un tile di colonne, in multipli del margine di ricerca (limita il lavoro ripetuto)
+MIN_TILE_WIDTH_MARGINS = 4
+
+
+@dataclass(frozen=True)
+class Tile:
+    """Regione rettangolare [y_start, y_end) x [x_start, x_end) di un frame."""
+    y_start: int
+    y_end: int
+    x_start: int
+    x_end: int
+
+    @property
+    def y_range(self) -> Tuple[int, int]:
+        return self.y_start, self.y_end
+
+    @property
+    def x_range(self) -> Tuple[int, int]:
+        return self.x_start, self.x_end
+
+    @property
+    def area(self) -> int:
+        return (self.y_end - self.y_start) * (self.x_end - self.x_start)
+
+
+def _split(start: int, end: int, parts: int) -> List[Tuple[int, int]]:
+    """Divide [start, end) in ``parts`` intervalli contigui di dimensione simile."""
+    size = math.ceil((end - start) / parts)
+    return [(s, min(end, s + size)) for s in range(start, end, size)]
+
+
+def plan_tiles(height: int, width: int, num_workers: int = 1,
+               band_height: int = DEFAULT_BAND_HEIGHT,
+               max_disparity: int = DEFAULT_MAX_DISPARITY,
+               tiles_per_worker: int = TILES_PER_WORKER) -> List[Tile]:
+    """
+    Suddivide un frame in tile per ``num_workers`` worker.
+
+    Args:
+        height, width: Dimensioni del frame
+        num_workers: Worker che elaborano i tile in parallelo
+        band_height: Righe elaborate per volta dal motore di corrispondenza
+        max_disparity: Massima disparità cercata (margine dei tile di colonne)
+        tiles_per_worker: Tile per worker per il bilanciamento del carico
+
+    Returns:
+        Lista di Tile che coprono il frame, in ordine di riga
+    """
+    if height <= 0 or width <= 0:
+        return []
+
+    # Con un solo worker l'intero frame è il tile più efficiente (il motore procede già per bande)
+    target = max(1, num_workers * tiles_per_worker) if num_workers > 1 else 1
+
+    # Tile di righe: con righe sufficienti, almeno una banda intera per tile
+    min_rows = band_height if height >= target * band_height else MIN_TILE_ROWS
+    row_tiles = max(1, min(target, height // min_rows))
+
+    # Tile di colonne solo se le righe non bastano ad occupare i worker
+    col_tiles = 1
+    if row_tiles < target:
+        max_col_tiles = max(1, width // (MIN_TILE_WIDTH_MARGINS * max_disparity))
+        col_tiles = min(math.ceil(target / row_tiles), max_col_tiles)
+
+    return [Tile(y_start, y_end, x_start, x_end)
+            for y_start, y_end in _split(0, height, row_tiles)
+            for x_start, x_end in _split(0, width, col_tiles)]
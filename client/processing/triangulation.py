@@ -14,6 +14,7 @@ import logging
 import threading
 import glob
 import json
+import functools
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple, Any, Union, Callable
 import multiprocessing
@@ -31,6 +32,25 @@ except ImportError:
     OPEN3D_AVAILABLE = False
     logging.warning("Open3D not available. Visualization features will be disabled.")
 
+from client.processing.correspondence import (
+    DEFAULT_BAND_HEIGHT, DEFAULT_MAX_DISPARITY, ScanlineCorrespondenceEngine, update_disparity_from_pattern
+)
+from client.processing.code_decoding import CodeDecoder, code_sequence_layout, match_codes_by_row
+from client.processing.phase_unwrapping import DEFAULT_FREQUENCIES, decode_phase_sequence, match_absolute_phase
+from client.processing.rectification import RECTIFICATION_CACHE_DIR, image_size_from_header, load_rectification_maps
+from client.processing.rectified_stack import RectifiedStack
+from client.processing.image_loader import PrefetchLoader, load_image_pair
+from client.processing.disparity_filter import DisparitySmoother
+from client.processing.instrumentation import PipelineInstrumentation
+from client.processing.organized_pointcloud import OrganizedPointCloud
+from client.processing.ply_writer import write_ply
+from client.processing.pyramid import (
+    PYRAMID_SCALE, coarse_max_disparity, coarse_reprojection_matrix, downsample, refinement_range
+)
+from client.processing.reprojection import reproject_sparse
+from client.processing.pointcloud_filters import statistical_outlier_removal
+from common.scan_bundle import calibration_digest, open_scan_bundle
+
 # Import client modules for network communication
 try:
     from client.network.connection_manager import ConnectionManager
@@ -82,6 +102,7 @@ class ScanProcessor:
         self.right_images = []
         self.pattern_type = PatternType.PROGRESSIVE
         self.num_patterns = 0
+        self._scan_config = {}
 
         # Camera calibration data
         self.calib_data = None
@@ -93,8 +114,33 @@ class ScanProcessor:
         self.map_y_r = None
         self.Q = None  # Reprojection matrix
 
+        # Rectified pattern planes of the current scan, filled once per image
+        self._rectified_stack = None
+
+        # Read-ahead loader for the scan images on disk
+        self._image_loader = None
+
+        # Memory-mapped scan bundle, when the scan is stored as a single file,
+        # and for each image the bundle pattern index (None for fallback files)
+        self._scan_bundle = None
+        self._bundle_sources = []
+
         # Result data
         self.pointcloud = None
+        self.organized_pointcloud = None
+
+        # Edge-preserving disparity smoothing before reprojection (off by default)
+        self.disparity_smoother = DisparitySmoother("none")
+
+        # Coarse-to-fine decoding of incremental (live) progressive scans: instant
+        # preview at 1/pyramid_scale resolution, then full-resolution refinement
+        # restricted to the disparity band found at the coarse level
+        self.pyramid_preview = True
+        self.pyramid_scale = PYRAMID_SCALE
+
+        # Per-stage timing (load, rectify, decode, match, filter, reproject, export)
+        self.instrumentation = PipelineInstrumentation()
+
         self.processing_thread = None
         self._processing_complete = threading.Event()
         self._processing_cancelled = threading.Event()
@@ -115,6 +161,27 @@ class ScanProcessor:
         self._progress_callback = progress_callback
         self._completion_callback = completion_callback
 
+    def set_disparity_filter(self, method: str, **params):
+        """
+        Select the smoothing applied to the disparity map before reprojection.
+
+        Args:
+            method: "bilateral", "median" or "none"
+            **params: kernel_size, sigma_spatial, sigma_disparity
+        """
+        self.disparity_smoother.configure(method, **params)
+        logger.info(f"Disparity filter set to {method}")
+
+    def get_performance_stats(self) -> Dict:
+        """
+        Return per-stage timing statistics of the processed scans.
+
+        Returns:
+            Dictionary with rolling histograms per stage ("stages") and the
+            stage breakdown of the last scan ("last_run")
+        """
+        return self.instrumentation.get_performance_stats()
+
     """def download_scan_data(self, scanner, scan_id) -> bool:
         "
         Scarica i dati della scansione dal server.
@@ -474,44 +541,28 @@ class ScanProcessor:
             return False
 
         try:
-            # Extract calibration parameters
-            M1 = self.calib_data['M1']
-            M2 = self.calib_data['M2']
-            d1 = self.calib_data['d1']
-            d2 = self.calib_data['d2']
-            R = self.calib_data['R']
-            t = self.calib_data['t']
-
-            # Determine image size from first image if available
-            if self.left_images and len(self.left_images) > 0:
-                img = cv2.imread(self.left_images[0])
-                img_size = (img.shape[1], img.shape[0])
-            else:
+            # Determine image size from the first image header if available
+            img_size = None
+            if self._scan_bundle is not None:
+                img_size = (self._scan_bundle.frame_shape[1], self._scan_bundle.frame_shape[0])
+            elif self.left_images and len(self.left_images) > 0:
+                img_size = image_size_from_header(self.left_images[0])
+            if img_size is None:
                 # Default size if no images are available
                 img_size = (640, 480)
 
-            # Compute rectification parameters
-            R1, R2, P1, P2, Q, roi1, roi2 = cv2.stereoRectify(
-                cameraMatrix1=M1,
-                cameraMatrix2=M2,
-                distCoeffs1=d1,
-                distCoeffs2=d2,
-                imageSize=img_size,
-                R=R,
-                T=t,
-                flags=cv2.CALIB_ZERO_DISPARITY,
-                alpha=0
-            )
-
-            # Generate rectification maps
-            self.map_x_l, self.map_y_l = cv2.initUndistortRectifyMap(
-                M1, d1, R1, P1, img_size, cv2.CV_32FC1)
+            # Fixed-point maps, cached on disk per calibration and image size
+            maps = load_rectification_maps(self.calib_data, img_size,
+                                           cache_dir=Path(self.output_dir) / RECTIFICATION_CACHE_DIR)
 
-            self.map_x_r, self.map_y_r = cv2.initUndistortRectifyMap(
-                M2, d2, R2, P2, img_size, cv2.CV_32FC1)
+            self.map_x_l, self.map_y_l = maps.map1_l, maps.map2_l
+            self.map_x_r, self.map_y_r = maps.map1_r, maps.map2_r
 
             # Store Q matrix for reprojection
-            self.Q = Q
+            self.Q = maps.Q
+
+            # Planes rectified with the previous maps are no longer valid
+            self._reset_rectified_stack()
 
             logger.info("Successfully generated rectification maps")
             return True
@@ -528,12 +579,27 @@ class ScanProcessor:
         # Reset delle liste
         self.left_images = []
         self.right_images = []
+        self._bundle_sources = []
+        if self._scan_bundle is not None:
+            self._scan_bundle.close()
+            self._scan_bundle = None
 
         # Verifica che la directory esista
         if not self.scan_dir or not os.path.isdir(self.scan_dir):
             logger.error(f"Directory di scansione non trovata: {self.scan_dir}")
             return False
 
+        # Scansione salvata come bundle unico: i frame vengono letti tramite memory mapping
+        bundle = open_scan_bundle(self.scan_dir)
+        if bundle is not None and len(bundle) > 0:
+            self._scan_bundle = bundle
+            self._merge_bundle_images(bundle)
+            self.num_patterns = len(self.left_images)
+            logger.info(f"Trovate {self.num_patterns} coppie di frame nel bundle {bundle.path}")
+
+            self._detect_pattern_type()
+            return True
+
         # Log completo del contenuto della directory per debug
         logger.info(f"Contenuto directory root: {os.listdir(self.scan_dir)}")
 
@@ -609,6 +675,47 @@ class ScanProcessor:
 
         return self.num_patterns > 0
 
+    def _merge_bundle_images(self, bundle):
+        """
+        Costruisce le liste delle immagini di una scansione salvata come bundle.
+
+        I frame che non è stato possibile scrivere nel bundle (forma diversa,
+        errore di scrittura, coppia incompleta alla chiusura) vengono salvati
+        come file in left/ e right/: le coppie di file con un indice di pattern
+        assente dal bundle vengono inserite nella sequenza al loro posto.
+
+        Args:
+            bundle: ScanBundle aperto della scansione
+        """
+        fallback = {}
+        for camera in ("left", "right"):
+            camera_dir = os.path.join(self.scan_dir, camera)
+            if not os.path.isdir(camera_dir):
+                continue
+            for ext in ('*.png', '*.jpg', '*.jpeg', '*.npy'):
+                for path in glob.glob(os.path.join(camera_dir, ext)):
+                    prefix = os.path.basename(path).split('_', 1)[0]
+                    if prefix.isdigit() and int(prefix) not in bundle:
+                        fallback.setdefault(int(prefix), {}).setdefault(camera, path)
+
+        incomplete = sorted(idx for idx, files in fallback.items() if len(files) < 2)
+        if incomplete:
+            logger.warning(f"Frame fuori dal bundle senza la camera opposta, ignorati: pattern {incomplete}")
+        files = {idx: pair for idx, pair in fallback.items() if len(pair) == 2}
+        if files:
+            logger.info(f"Aggiunte {len(files)} coppie di frame salvate fuori dal bundle: pattern {sorted(files)}")
+
+        for idx in sorted(set(bundle.pattern_indices()) | set(files)):
+            if idx in files:
+                self.left_images.append(files[idx]["left"])
+                self.right_images.append(files[idx]["right"])
+                self._bundle_sources.append(None)
+            else:
+                label = f"{idx:04d}_{bundle.pattern_name(idx)}"
+                self.left_images.append(f"{bundle.path}#left/{label}")
+                self.right_images.append(f"{bundle.path}#right/{label}")
+                self._bundle_sources.append(idx)
+
     def _find_images_in_root(self):
         """
         Cerca immagini direttamente nella directory principale della scansione.
@@ -672,6 +779,7 @@ class ScanProcessor:
         """Detect pattern type from image filenames or scan config."""
         # Default to PROGRESSIVE
         self.pattern_type = PatternType.PROGRESSIVE
+        self._scan_config = {}
 
         # Try to load from config file
         config_file = self.scan_dir / "scan_config.json"
@@ -679,6 +787,7 @@ class ScanProcessor:
             try:
                 with open(config_file, 'r') as f:
                     config = json.load(f)
+                self._scan_config = config
                 pattern_type_str = config.get('pattern_type', 'PROGRESSIVE')
                 try:
                     self.pattern_type = PatternType(pattern_type_str)
@@ -686,6 +795,12 @@ class ScanProcessor:
                     pass
             except Exception as e:
                 logger.error(f"Error loading scan config: {e}")
+        elif self._scan_bundle is not None:
+            self._scan_config = dict(self._scan_bundle.scan_config)
+            try:
+                self.pattern_type = PatternType(self._scan_config.get('pattern_type', 'PROGRESSIVE'))
+            except ValueError:
+                pass
 
         # Also check filenames for pattern type hints
         if self.left_images:
@@ -710,34 +825,39 @@ class ScanProcessor:
             True if load was successful, False otherwise
         """
         try:
-            self.scan_dir = Path(scan_dir)
-            self.scan_id = self.scan_dir.name
-
-            # Assicura che la directory principale esista
-            self.scan_dir.mkdir(parents=True, exist_ok=True)
-
-            # Crea le sottodirectory necessarie
-            left_dir = self.scan_dir / "left"
-            right_dir = self.scan_dir / "right"
-            left_dir.mkdir(exist_ok=True)
-            right_dir.mkdir(exist_ok=True)
-
-            # Find scan images
-            success = self._find_scan_images()
-            if not success:
-                logger.warning(f"No scan images found in {scan_dir}, but directories are prepared")
-
-            # Load calibration data if available
-            calib_file = self.scan_dir / "calibration.npz"
-            if not calib_file.exists():
-                calib_file = self.output_dir / "calibration.npz"
-
-            if calib_file.exists():
-                self.calib_data = np.load(calib_file)
-                self._generate_rectification_maps()
-            else:
-                logger.warning("No calibration data found, using default values")
-                self._create_default_calibration()
+            with self.instrumentation.span("load"):
+                self.scan_dir = Path(scan_dir)
+                self.scan_id = self.scan_dir.name
+
+                # Assicura che la directory principale esista
+                self.scan_dir.mkdir(parents=True, exist_ok=True)
+
+                # Crea le sottodirectory necessarie
+                left_dir = self.scan_dir / "left"
+                right_dir = self.scan_dir / "right"
+                left_dir.mkdir(exist_ok=True)
+                right_dir.mkdir(exist_ok=True)
+
+                # Find scan images
+                success = self._find_scan_images()
+                if not success:
+                    logger.warning(f"No scan images found in {scan_dir}, but directories are prepared")
+
+                # Load calibration data if available
+                calib_file = self.scan_dir / "calibration.npz"
+                if not calib_file.exists():
+                    calib_file = self.output_dir / "calibration.npz"
+
+                if calib_file.exists():
+                    self.calib_data = np.load(calib_file)
+                    self._generate_rectification_maps()
+
+                    if (self._scan_bundle is not None and self._scan_bundle.calibration_hash and
+                            self._scan_bundle.calibration_hash != calibration_digest(self.calib_data)):
+                        logger.warning("The scan bundle was captured with a different calibration")
+                else:
+                    logger.warning("No calibration data found, using default values")
+                    self._create_default_calibration()
 
             logger.info(f"Successfully loaded scan from {scan_dir}")
             return True
@@ -789,19 +909,36 @@ class ScanProcessor:
         try:
             logger.info(f"Starting scan processing for {self.scan_id}")
             start_time = time.time()
+            self.instrumentation.begin_run()
+            self._reset_rectified_stack()
 
-            # Choose processing method based on pattern type
-            if self.pattern_type == PatternType.GRAY_CODE:
-                success = self._process_gray_code()
-            elif self.pattern_type == PatternType.BINARY_CODE:
-                success = self._process_binary_code()
-            else:
-                # Default to PROGRESSIVE for other types
-                success = self._process_progressive()
+            # Images are decoded in background threads while the decoders run;
+            # bundle frames are memory-mapped and need no decoding
+            if self._scan_bundle is None:
+                self._image_loader = PrefetchLoader(
+                    functools.partial(load_image_pair, self.left_images, self.right_images),
+                    min(len(self.left_images), len(self.right_images)))
+
+            try:
+                # Choose processing method based on pattern type
+                if self.pattern_type == PatternType.GRAY_CODE:
+                    success = self._process_gray_code()
+                elif self.pattern_type == PatternType.BINARY_CODE:
+                    success = self._process_binary_code()
+                elif self.pattern_type == PatternType.PHASE_SHIFT:
+                    success = self._process_phase_shift()
+                else:
+                    # Default to PROGRESSIVE for other types
+                    success = self._process_progressive()
+            finally:
+                if self._image_loader is not None:
+                    self._image_loader.close()
+                    self._image_loader = None
 
             # Calculate total processing time
             processing_time = time.time() - start_time
             logger.info(f"Scan processing completed in {processing_time:.1f} seconds")
+            logger.info(f"Stage times: {self.instrumentation.format_breakdown()}")
 
             # Signal completion
             self._processing_complete.set()
@@ -848,25 +985,17 @@ class ScanProcessor:
             if self.map_x_l is None:
                 self._generate_rectification_maps()
 
-            # Load white and black reference images
-            white_l = cv2.imread(self.left_images[0], cv2.IMREAD_GRAYSCALE)
-            white_r = cv2.imread(self.right_images[0], cv2.IMREAD_GRAYSCALE)
-            black_l = cv2.imread(self.left_images[1], cv2.IMREAD_GRAYSCALE)
-            black_r = cv2.imread(self.right_images[1], cv2.IMREAD_GRAYSCALE)
+            # Load and rectify white and black reference images
+            white_l_rect, white_r_rect = self._rectified_pair(0, self._load_image_pair)
+            black_l_rect, black_r_rect = self._rectified_pair(1, self._load_image_pair)
 
             # Check image sizes
-            if (white_l is None or white_r is None or
-                    black_l is None or black_r is None):
+            if (white_l_rect is None or white_r_rect is None or
+                    black_l_rect is None or black_r_rect is None):
                 logger.error("Failed to load white/black reference images")
                 return False
 
-            logger.info(f"Reference image sizes: white_l={white_l.shape}, white_r={white_r.shape}")
-
-            # Rectify reference images
-            white_l_rect = cv2.remap(white_l, self.map_x_l, self.map_y_l, cv2.INTER_LINEAR)
-            white_r_rect = cv2.remap(white_r, self.map_x_r, self.map_y_r, cv2.INTER_LINEAR)
-            black_l_rect = cv2.remap(black_l, self.map_x_l, self.map_y_l, cv2.INTER_LINEAR)
-            black_r_rect = cv2.remap(black_r, self.map_x_r, self.map_y_r, cv2.INTER_LINEAR)
+            logger.info(f"Reference image sizes: white_l={white_l_rect.shape}, white_r={white_r_rect.shape}")
 
             # Compute shadow masks (areas with sufficient contrast between white and black)
             shadow_mask_l = np.zeros_like(black_l_rect)
@@ -897,6 +1026,10 @@ class ScanProcessor:
 
             logger.info(f"Processing {pattern_pairs} pattern pairs out of {pattern_images} available patterns")
 
+            # Horizontal and vertical patterns are consumed interleaved
+            self._plan_image_order(idx for i in range(pattern_pairs)
+                                   for idx in (2 + i, 2 + pattern_pairs + i))
+
             # Store incremental pointclouds
             incremental_pointclouds = []
             last_reprojection_index = -1
@@ -915,16 +1048,12 @@ class ScanProcessor:
                 # Load and rectify horizontal pattern
                 h_idx = 2 + i
                 if h_idx < len(self.left_images):
-                    h_pattern_l = cv2.imread(self.left_images[h_idx], cv2.IMREAD_GRAYSCALE)
-                    h_pattern_r = cv2.imread(self.right_images[h_idx], cv2.IMREAD_GRAYSCALE)
+                    h_pattern_l_rect, h_pattern_r_rect = self._rectified_pair(h_idx, self._load_image_pair)
 
-                    if h_pattern_l is None or h_pattern_r is None:
+                    if h_pattern_l_rect is None or h_pattern_r_rect is None:
                         logger.warning(f"Failed to load pattern images at index {h_idx}")
                         continue
 
-                    h_pattern_l_rect = cv2.remap(h_pattern_l, self.map_x_l, self.map_y_l, cv2.INTER_LINEAR)
-                    h_pattern_r_rect = cv2.remap(h_pattern_r, self.map_x_r, self.map_y_r, cv2.INTER_LINEAR)
-
                     # Process horizontal pattern
                     self._update_disparity_from_pattern(
                         h_pattern_l_rect, h_pattern_r_rect,
@@ -936,16 +1065,12 @@ class ScanProcessor:
                 # Load and rectify vertical pattern if available
                 v_idx = 2 + pattern_pairs + i
                 if v_idx < len(self.left_images):
-                    v_pattern_l = cv2.imread(self.left_images[v_idx], cv2.IMREAD_GRAYSCALE)
-                    v_pattern_r = cv2.imread(self.right_images[v_idx], cv2.IMREAD_GRAYSCALE)
+                    v_pattern_l_rect, v_pattern_r_rect = self._rectified_pair(v_idx, self._load_image_pair)
 
-                    if v_pattern_l is None or v_pattern_r is None:
+                    if v_pattern_l_rect is None or v_pattern_r_rect is None:
                         logger.warning(f"Failed to load pattern images at index {v_idx}")
                         continue
 
-                    v_pattern_l_rect = cv2.remap(v_pattern_l, self.map_x_l, self.map_y_l, cv2.INTER_LINEAR)
-                    v_pattern_r_rect = cv2.remap(v_pattern_r, self.map_x_r, self.map_y_r, cv2.INTER_LINEAR)
-
                     # Process vertical pattern
                     self._update_disparity_from_pattern(
                         v_pattern_l_rect, v_pattern_r_rect,
@@ -993,7 +1118,8 @@ class ScanProcessor:
 
             # Apply median filter to remove noise
             kernel_size = 3 if incremental_mode else 5
-            disparity_map_final = cv2.medianBlur(disparity_map_final.astype(np.float32), kernel_size)
+            with self.instrumentation.span("filter"):
+                disparity_map_final = cv2.medianBlur(disparity_map_final.astype(np.float32), kernel_size)
 
             # Salva mappe di disparità solo in modalità non incrementale
             if not incremental_mode:
@@ -1027,6 +1153,110 @@ class ScanProcessor:
             logger.error(f"Traceback: {traceback.format_exc()}")
             return False
 
+    def _process_progressive_pyramid(self, pattern_indices, load_pair, shadow_mask_l, shadow_mask_r):
+        """
+        Elabora i pattern progressivi in due livelli per le anteprime real-time.
+
+        Tutti i pattern vengono prima confrontati a 1/pyramid_scale di
+        risoluzione, con una ricerca di disparità ridotta nella stessa
+        proporzione: la nuvola di anteprima viene notificata subito con la
+        callback di completamento. Poi la piena risoluzione cerca, per ogni
+        pixel, solo nell'intervallo di disparità trovato al livello ridotto
+        invece delle DEFAULT_MAX_DISPARITY colonne fisse.
+
+        Args:
+            pattern_indices: Indici dei pattern (white e black esclusi), in ordine
+            load_pair: Funzione che restituisce la coppia (left, right) di un indice
+            shadow_mask_l, shadow_mask_r: Maschere d'ombra a piena risoluzione
+
+        Returns:
+            True se la nuvola di punti rifinita è stata generata
+        """
+        scale = self.pyramid_scale
+        height, width = shadow_mask_l.shape[:2]
+        cancel_event = self._processing_cancelled
+
+        # Stessi pesi dell'elaborazione incrementale: crescono ad ogni coppia orizzontale/verticale
+        weights = [2 ** (k // 2) for k in range(len(pattern_indices))]
+
+        # Livello ridotto: le maschere d'ombra vengono ridotte a maggioranza
+        coarse_mask_l = downsample(shadow_mask_l, scale)
+        coarse_mask_r = downsample(shadow_mask_r, scale)
+        coarse_disparity = np.zeros(coarse_mask_l.shape, dtype=np.float32)
+        coarse_confidence = np.zeros(coarse_mask_l.shape, dtype=np.float32)
+        # Bande di scale volte più righe: stessa occupazione di memoria delle bande a piena risoluzione
+        coarse_engine = ScanlineCorrespondenceEngine(max_disparity=coarse_max_disparity(DEFAULT_MAX_DISPARITY, scale),
+                                                     band_height=DEFAULT_BAND_HEIGHT * scale)
+
+        for index, weight in zip(pattern_indices, weights):
+            if cancel_event.is_set():
+                logger.info("Elaborazione annullata")
+                return False
+
+            left, right = self._rectified_pair(index, load_pair)
+            if left is None or right is None:
+                continue
+
+            with self.instrumentation.span("match"):
+                coarse_engine.update_disparity(downsample(left, scale), downsample(right, scale),
+                                               coarse_mask_l, coarse_mask_r,
+                                               coarse_disparity, coarse_confidence,
+                                               pattern_weight=weight, cancel_event=cancel_event)
+
+        valid = coarse_confidence > 0
+        np.divide(coarse_disparity, coarse_confidence, out=coarse_disparity, where=valid)
+        coarse_disparity[~valid] = 0
+        with self.instrumentation.span("filter"):
+            coarse_disparity = cv2.medianBlur(coarse_disparity, 3)
+
+        # Anteprima: riproiezione diretta del livello ridotto (un punto per pixel ridotto)
+        with self.instrumentation.span("reproject"):
+            coarse_Q = coarse_reprojection_matrix(self.Q, (height, width), coarse_disparity.shape)
+            preview, _ = reproject_sparse(coarse_disparity, coarse_Q, coarse_mask_l, max_range=500)
+
+        if len(preview) > 0:
+            self.pointcloud = preview
+            if self._completion_callback:
+                self._completion_callback(True, f"Anteprima a 1/{scale} di risoluzione "
+                                                f"({len(pattern_indices)} pattern)", preview)
+
+        # Piena risoluzione, limitata per pixel all'intervallo trovato al livello ridotto
+        search_range = refinement_range(coarse_disparity, (height, width))
+        disparity_map = np.zeros((height, width), dtype=np.float32)
+        confidence_map = np.zeros((height, width), dtype=np.float32)
+
+        for i, (index, weight) in enumerate(zip(pattern_indices, weights)):
+            if self._progress_callback:
+                self._progress_callback((i + 1) / len(pattern_indices) * 100,
+                                        f"Rifinitura pattern: {i + 1}/{len(pattern_indices)}")
+
+            if cancel_event.is_set():
+                logger.info("Elaborazione annullata")
+                return False
+
+            left, right = self._rectified_pair(index, load_pair)
+            if left is None or right is None:
+                continue
+
+            self._update_disparity_from_pattern(left, right, shadow_mask_l, shadow_mask_r,
+                                                disparity_map, confidence_map,
+                                                pattern_weight=weight, search_range=search_range)
+
+        valid = confidence_map > 0
+        np.divide(disparity_map, confidence_map, out=disparity_map, where=valid)
+        disparity_map[~valid] = 0
+        with self.instrumentation.span("filter"):
+            disparity_map = cv2.medianBlur(disparity_map, 3)
+
+        pointcloud = self._reproject_to_3d_incremental(disparity_map, shadow_mask_l)
+        if pointcloud is None:
+            return False
+
+        self.pointcloud = pointcloud
+        if self._completion_callback:
+            self._completion_callback(True, "Incremental processing complete", pointcloud)
+        return True
+
     def _reproject_to_3d_incremental(self, disparity_map, mask):
         """
         Riproietta la mappa di disparità in punti 3D per aggiornamenti incrementali.
@@ -1048,38 +1278,17 @@ class ScanProcessor:
             # Crea nuvola di punti dalla mappa di disparità
             logger.info("Riproiezione in punti 3D (incrementale)")
 
-            # Applica maschera alla mappa di disparità
-            masked_disparity = disparity_map.copy()
-            masked_disparity[mask == 0] = 0
-
-            # Riproietta in 3D
-            points_3d = cv2.reprojectImageTo3D(masked_disparity, self.Q)
-
-            # Filtra punti non validi
-            mask = (
-                    ~np.isnan(points_3d).any(axis=2) &
-                    ~np.isinf(points_3d).any(axis=2) &
-                    (mask > 0)
-            )
-
-            # Estrai punti validi
-            valid_points = points_3d[mask]
-
-            # Limita punti a un range ragionevole
+            # Riproietta solo i pixel validi, limitando i punti a un range ragionevole
             max_range = 500  # mm
-            in_range_mask = (
-                    (np.abs(valid_points[:, 0]) < max_range) &
-                    (np.abs(valid_points[:, 1]) < max_range) &
-                    (np.abs(valid_points[:, 2]) < max_range)
-            )
-
-            valid_points = valid_points[in_range_mask]
+            with self.instrumentation.span("filter"):
+                disparity_map = self.disparity_smoother(disparity_map, mask)
+            with self.instrumentation.span("reproject"):
+                valid_points, _ = reproject_sparse(disparity_map, self.Q, mask, max_range=max_range)
 
-            # Se abbiamo troppi punti, campiona casualmente per prestazioni
+            # Se abbiamo troppi punti, campiona a passo regolare per prestazioni: a differenza
+            # di un campionamento casuale, aggiornamenti successivi mostrano gli stessi pixel
             if len(valid_points) > 50000:
-                # Campionamento casuale per aggiornamenti incrementali
-                sample_indices = np.random.choice(len(valid_points), 50000, replace=False)
-                valid_points = valid_points[sample_indices]
+                valid_points = valid_points[::-(-len(valid_points) // 50000)]
             elif len(valid_points) < 10:
                 # Troppo pochi punti, potrebbe esserci un problema
                 logger.warning("Troppo pochi punti validi nella riproiezione")
@@ -1139,12 +1348,16 @@ class ScanProcessor:
         try:
             logger.info("Avvio elaborazione coppie di frame")
             start_time = time.time()
+            self.instrumentation.begin_run()
+            self._reset_rectified_stack()
 
             # Scegli il metodo di elaborazione in base al pattern
             if self.pattern_type == PatternType.GRAY_CODE:
                 success = self._process_gray_code_inmem()
             elif self.pattern_type == PatternType.BINARY_CODE:
                 success = self._process_binary_code_inmem()
+            elif self.pattern_type == PatternType.PHASE_SHIFT:
+                success = self._process_phase_shift_inmem()
             else:
                 # Default a PROGRESSIVE per altri tipi
                 success = self._process_progressive_inmem()
@@ -1152,6 +1365,7 @@ class ScanProcessor:
             # Calcola tempo totale di elaborazione
             processing_time = time.time() - start_time
             logger.info(f"Elaborazione completata in {processing_time:.1f} secondi")
+            logger.info(f"Tempi per fase: {self.instrumentation.format_breakdown()}")
 
             # Segnala completamento
             self._processing_complete.set()
@@ -1209,22 +1423,22 @@ class ScanProcessor:
                     logger.error("Frame white/black non trovati")
                     return False
 
-            white_l, white_r = white_pair[1], white_pair[2]
-            black_l, black_r = black_pair[1], black_pair[2]
+            frames = {idx: (left, right) for idx, left, right in self._frame_pairs}
+
+            def load_pair(index):
+                return frames.get(index, (None, None))
+
+            # Rettifica le immagini di riferimento
+            white_l_rect, white_r_rect = self._rectified_pair(white_pair[0], load_pair)
+            black_l_rect, black_r_rect = self._rectified_pair(black_pair[0], load_pair)
 
             # Verifica dimensioni delle immagini
-            if (white_l is None or white_r is None or
-                    black_l is None or black_r is None):
+            if (white_l_rect is None or white_r_rect is None or
+                    black_l_rect is None or black_r_rect is None):
                 logger.error("Impossibile caricare i frame white/black di riferimento")
                 return False
 
-            logger.info(f"Dimensioni immagini di riferimento: white_l={white_l.shape}, white_r={white_r.shape}")
-
-            # Rettifica le immagini di riferimento
-            white_l_rect = cv2.remap(white_l, self.map_x_l, self.map_y_l, cv2.INTER_LINEAR)
-            white_r_rect = cv2.remap(white_r, self.map_x_r, self.map_y_r, cv2.INTER_LINEAR)
-            black_l_rect = cv2.remap(black_l, self.map_x_l, self.map_y_l, cv2.INTER_LINEAR)
-            black_r_rect = cv2.remap(black_r, self.map_x_r, self.map_y_r, cv2.INTER_LINEAR)
+            logger.info(f"Dimensioni immagini di riferimento: white_l={white_l_rect.shape}, white_r={white_r_rect.shape}")
 
             # Calcola maschere d'ombra (aree con sufficiente contrasto tra bianco e nero)
             shadow_mask_l = np.zeros_like(black_l_rect)
@@ -1244,6 +1458,11 @@ class ScanProcessor:
             pattern_pairs = [p for p in self._frame_pairs if p[0] > 1]
             pattern_pairs.sort(key=lambda x: x[0])  # Ordina per indice pattern
 
+            # Anteprima coarse-to-fine: tutti i pattern, senza limite né campionamento casuale
+            if incremental_mode and self.pyramid_preview:
+                return self._process_progressive_pyramid([p[0] for p in pattern_pairs], load_pair,
+                                                         shadow_mask_l, shadow_mask_r)
+
             # In modalità incrementale, potremmo elaborare un numero inferiore di pattern
             if incremental_mode:
                 # Dividi pattern in coppie (orizzontale/verticale)
@@ -1278,11 +1497,10 @@ class ScanProcessor:
 
                 # Elabora pattern orizzontale
                 if h_idx < len(pattern_pairs):
-                    h_pattern_idx, h_left, h_right = pattern_pairs[h_idx]
+                    h_pattern_idx = pattern_pairs[h_idx][0]
 
                     # Rettifica pattern orizzontale
-                    h_left_rect = cv2.remap(h_left, self.map_x_l, self.map_y_l, cv2.INTER_LINEAR)
-                    h_right_rect = cv2.remap(h_right, self.map_x_r, self.map_y_r, cv2.INTER_LINEAR)
+                    h_left_rect, h_right_rect = self._rectified_pair(h_pattern_idx, load_pair)
 
                     # Aggiorna mappa di disparità dal pattern
                     self._update_disparity_from_pattern(
@@ -1294,11 +1512,10 @@ class ScanProcessor:
 
                 # Elabora pattern verticale
                 if v_idx < len(pattern_pairs):
-                    v_pattern_idx, v_left, v_right = pattern_pairs[v_idx]
+                    v_pattern_idx = pattern_pairs[v_idx][0]
 
                     # Rettifica pattern verticale
-                    v_left_rect = cv2.remap(v_left, self.map_x_l, self.map_y_l, cv2.INTER_LINEAR)
-                    v_right_rect = cv2.remap(v_right, self.map_x_r, self.map_y_r, cv2.INTER_LINEAR)
+                    v_left_rect, v_right_rect = self._rectified_pair(v_pattern_idx, load_pair)
 
                     # Aggiorna mappa di disparità dal pattern
                     self._update_disparity_from_pattern(
@@ -1346,7 +1563,8 @@ class ScanProcessor:
 
             # Applica filtro mediano per ridurre il rumore
             kernel_size = 3 if incremental_mode else 5
-            disparity_map_final = cv2.medianBlur(disparity_map_final.astype(np.float32), kernel_size)
+            with self.instrumentation.span("filter"):
+                disparity_map_final = cv2.medianBlur(disparity_map_final.astype(np.float32), kernel_size)
 
             # Salva mappa di disparità solo in modalità non incrementale
             if not incremental_mode and self.output_dir:
@@ -1439,11 +1657,10 @@ class ScanProcessor:
             # Rectify all images
             rect_list_l, rect_list_r = [], []
             for i in range(num_required_imgs + 2):
-                img_l = cv2.imread(self.left_images[i], cv2.IMREAD_GRAYSCALE)
-                img_r = cv2.imread(self.right_images[i], cv2.IMREAD_GRAYSCALE)
-
-                l_rect = cv2.remap(img_l, self.map_x_l, self.map_y_l, cv2.INTER_LINEAR)
-                r_rect = cv2.remap(img_r, self.map_x_r, self.map_y_r, cv2.INTER_LINEAR)
+                l_rect, r_rect = self._rectified_pair(i, self._load_image_pair)
+                if l_rect is None or r_rect is None:
+                    logger.error(f"Failed to load images at index {i}")
+                    return False
 
                 rect_list_l.append(l_rect)
                 rect_list_r.append(r_rect)
@@ -1498,187 +1715,412 @@ class ScanProcessor:
         """
         Custom implementation of Gray code processing.
         Used as fallback when OpenCV's structured light module is not available.
+
+        Each pixel's bits are packed into one projector-column code and left/right
+        pixels are matched by equal code along the rectified rows.
         """
-        # This is a simplified implementation
-        logger.warning("Using custom Gray code implementation (less accurate)")
+        logger.info("Using custom Gray code implementation")
+        return self._process_code_sequence("gray")
 
+    def _process_code_sequence(self, code_type) -> bool:
+        """
+        Decode a coded pattern scan from the scan image lists and reproject it.
+
+        Args:
+            code_type: Sequence type ("gray", "binary" or "phase")
+
+        Returns:
+            True if processing succeeded, False otherwise
+        """
         try:
-            # Load and rectify white/black reference images
-            white_l = cv2.imread(self.left_images[0], cv2.IMREAD_GRAYSCALE)
-            white_r = cv2.imread(self.right_images[0], cv2.IMREAD_GRAYSCALE)
-            black_l = cv2.imread(self.left_images[1], cv2.IMREAD_GRAYSCALE)
-            black_r = cv2.imread(self.right_images[1], cv2.IMREAD_GRAYSCALE)
-
-            white_l_rect = cv2.remap(white_l, self.map_x_l, self.map_y_l, cv2.INTER_LINEAR)
-            white_r_rect = cv2.remap(white_r, self.map_x_r, self.map_y_r, cv2.INTER_LINEAR)
-            black_l_rect = cv2.remap(black_l, self.map_x_l, self.map_y_l, cv2.INTER_LINEAR)
-            black_r_rect = cv2.remap(black_r, self.map_x_r, self.map_y_r, cv2.INTER_LINEAR)
-
-            # Create shadow masks
-            shadow_mask_l = np.zeros_like(black_l_rect)
-            shadow_mask_r = np.zeros_like(black_r_rect)
-            black_threshold = 40
-            shadow_mask_l[white_l_rect > black_l_rect + black_threshold] = 1
-            shadow_mask_r[white_r_rect > black_r_rect + black_threshold] = 1
+            disparity_map, valid_mask = self._decode_sequence(
+                self._load_image_pair, len(self.left_images), code_type)
 
-            # Get image dimensions
-            height, width = shadow_mask_l.shape[:2]
+            if disparity_map is None:
+                return False
 
-            # Process the pattern images (starting from index 2)
-            pattern_images = len(self.left_images) - 2
+            # Save disparity map for visualization
+            with self.instrumentation.span("export"):
+                disparity_colored = cv2.applyColorMap(
+                    cv2.convertScaleAbs(disparity_map,
+                                        alpha=255 / np.max(disparity_map) if np.max(disparity_map) > 0 else 0),
+                    cv2.COLORMAP_JET
+                )
+                cv2.imwrite(str(self.scan_dir / "disparity_map.png"), disparity_colored)
 
-            # Binary codes for each pixel position
-            binary_codes_l = np.zeros((height, width, pattern_images), dtype=np.uint8)
-            binary_codes_r = np.zeros((height, width, pattern_images), dtype=np.uint8)
+            # Clean up disparity map with filtering
+            with self.instrumentation.span("filter"):
+                disparity_map = cv2.medianBlur(disparity_map, 5)
 
-            for i in range(pattern_images):
-                img_idx = i + 2  # Skip white and black images
+            # Update progress
+            if self._progress_callback:
+                self._progress_callback(90, "Creating point cloud...")
 
-                # Load and rectify pattern image
-                pattern_l = cv2.imread(self.left_images[img_idx], cv2.IMREAD_GRAYSCALE)
-                pattern_r = cv2.imread(self.right_images[img_idx], cv2.IMREAD_GRAYSCALE)
+            # Reproject to 3D
+            self._reproject_to_3d(disparity_map, valid_mask)
 
-                pattern_l_rect = cv2.remap(pattern_l, self.map_x_l, self.map_y_l, cv2.INTER_LINEAR)
-                pattern_r_rect = cv2.remap(pattern_r, self.map_x_r, self.map_y_r, cv2.INTER_LINEAR)
+            return True
 
-                # Threshold to get binary code
-                binary_codes_l[:, :, i] = (pattern_l_rect > (white_l_rect + black_l_rect) / 2).astype(np.uint8)
-                binary_codes_r[:, :, i] = (pattern_r_rect > (white_r_rect + black_r_rect) / 2).astype(np.uint8)
+        except Exception as e:
+            logger.error(f"Error in {code_type} code processing: {e}")
+            return False
 
-                # Update progress
-                if self._progress_callback:
-                    progress = (i + 1) / pattern_images * 50  # First 50% is coding
-                    self._progress_callback(progress, f"Processing patterns: {i + 1}/{pattern_images}")
+    def _process_gray_code_inmem(self) -> bool:
+        """
+        Process in-memory Gray code frame pairs.
+        Uses the same code-based decoder as the file-based fallback path.
+        """
+        return self._process_code_inmem("gray")
 
-            # Decode Gray codes to get disparity map
-            disparity_map = np.zeros((height, width), dtype=np.float32)
+    def _process_binary_code_inmem(self) -> bool:
+        """
+        Process in-memory binary code frame pairs.
+        Uses the same code-based decoder as the file-based path.
+        """
+        return self._process_code_inmem("binary")
 
-            # For each pixel in the left image
-            for y in range(height):
-                for x in range(width):
-                    # Skip pixels in shadow
-                    if shadow_mask_l[y, x] == 0:
-                        continue
+    def _process_phase_shift_inmem(self) -> bool:
+        """
+        Process in-memory multi-frequency phase-shift frame pairs.
+        Uses the same temporal unwrapping and phase matching as the file-based path.
+        """
+        return self._process_code_inmem("phase")
 
-                    # Get binary code for current pixel
-                    code_l = binary_codes_l[y, x, :]
+    def _process_code_inmem(self, code_type) -> bool:
+        """
+        Decode in-memory coded frame pairs and reproject them.
 
-                    # Look for matching code in right image (along the same scanline)
-                    best_match_x = -1
-                    best_match_diff = pattern_images  # Maximum possible difference
+        Args:
+            code_type: Sequence type ("gray", "binary" or "phase")
 
-                    for x_r in range(width):
-                        # Skip pixels in shadow in right image
-                        if shadow_mask_r[y, x_r] == 0 or x_r >= x:  # Only look for matches to the left
-                            continue
+        Returns:
+            True if processing succeeded, False otherwise
+        """
+        try:
+            logger.info(f"Elaborazione pattern {code_type} code in memoria")
 
-                        # Get binary code for right image pixel
-                        code_r = binary_codes_r[y, x_r, :]
+            frames = {idx: (left, right) for idx, left, right in self._frame_pairs}
+            num_images = max(frames) + 1
 
-                        # Calculate Hamming distance (number of different bits)
-                        diff = np.sum(code_l != code_r)
+            disparity_map, valid_mask = self._decode_sequence(
+                lambda index: frames.get(index, (None, None)), num_images, code_type)
 
-                        # Update best match if this is better
-                        if diff < best_match_diff:
-                            best_match_diff = diff
-                            best_match_x = x_r
+            if disparity_map is None:
+                return False
 
-                    # If we found a match with low difference, calculate disparity
-                    if best_match_x >= 0 and best_match_diff < pattern_images / 4:  # Allow some errors
-                        disparity_map[y, x] = x - best_match_x
+            return self._finish_code_inmem(disparity_map, valid_mask)
 
-                # Update progress for each scanline
-                if self._progress_callback and y % 10 == 0:
-                    progress = 50 + (y / height) * 40  # 50-90% is matching
-                    self._progress_callback(progress, f"Matching pixels: {y}/{height}")
+        except Exception as e:
+            logger.error(f"Errore nell'elaborazione {code_type} code in memoria: {e}")
+            import traceback
+            logger.error(f"Traceback: {traceback.format_exc()}")
+            return False
 
-            # Save disparity map for visualization
-            disparity_colored = cv2.applyColorMap(
-                cv2.convertScaleAbs(disparity_map,
-                                    alpha=255 / np.max(disparity_map) if np.max(disparity_map) > 0 else 0),
-                cv2.COLORMAP_JET
-            )
-            cv2.imwrite(str(self.scan_dir / "disparity_map.png"), disparity_colored)
+    def _finish_code_inmem(self, disparity_map, valid_mask) -> bool:
+        """
+        Filter a decoded disparity map and reproject it for the in-memory paths.
 
-            # Clean up disparity map with filtering
-            disparity_map = cv2.medianBlur(disparity_map, 5)
+        Args:
+            disparity_map: Decoded disparity map
+            valid_mask: Mask of decoded pixels
 
-            # Update progress
-            if self._progress_callback:
-                self._progress_callback(90, "Creating point cloud...")
+        Returns:
+            True if the reprojection succeeded, False otherwise
+        """
+        with self.instrumentation.span("filter"):
+            disparity_map = cv2.medianBlur(disparity_map, 3 if self._incremental_mode else 5)
 
-            # Reproject to 3D
-            self._reproject_to_3d(disparity_map, shadow_mask_l)
+        if self._incremental_mode:
+            pointcloud = self._reproject_to_3d_incremental(disparity_map, valid_mask)
+            self.pointcloud = pointcloud
+            return pointcloud is not None
 
-            return True
+        if self.scan_dir is None:
+            self.scan_dir = Path(self.output_dir) / f"scan_{int(time.time())}"
+            self.scan_dir.mkdir(parents=True, exist_ok=True)
 
-        except Exception as e:
-            logger.error(f"Error in custom Gray code processing: {e}")
-            return False
+        return self._reproject_to_3d(disparity_map, valid_mask)
 
-    def _process_binary_code(self) -> bool:
+    def _load_image_pair(self, index):
         """
-        Process binary code pattern scan.
-        Similar to Gray code but with standard binary encoding.
+        Load a left/right grayscale image pair from the scan image lists.
+
+        Bundle scans return zero-copy views of the memory-mapped frames; the
+        few fallback files stored next to a bundle are read synchronously. For
+        image directories, pairs come from the read-ahead loader while a scan
+        is being processed, otherwise they are read synchronously.
+
+        Args:
+            index: Index of the pattern image
+
+        Returns:
+            Tuple (left, right); entries are None if an image cannot be loaded
+        """
+        with self.instrumentation.span("load"):
+            if self._scan_bundle is not None:
+                if index >= len(self._bundle_sources):
+                    return None, None
+                pattern_index = self._bundle_sources[index]
+                if pattern_index is not None:
+                    return self._scan_bundle.get_pair(pattern_index)
+                return load_image_pair(self.left_images, self.right_images, index)
+            if self._image_loader is not None:
+                return self._image_loader.get(index)
+            return load_image_pair(self.left_images, self.right_images, index)
+
+    def _plan_image_order(self, indices):
         """
-        # Binary code is similar to Gray code, but with standard binary encoding
-        # For now, we'll use the same implementation
-        return self._process_gray_code()
+        Tell the read-ahead loader in which order the images will be requested.
 
-    def _update_disparity_from_pattern(self, pattern_l, pattern_r, shadow_mask_l, shadow_mask_r,
-                                       disparity_map, confidence_map, pattern_weight=1.0):
+        Args:
+            indices: Image indices in access order
         """
-        Update disparity map based on a single pattern pair.
-        Used for progressive pattern processing.
+        if self._image_loader is not None:
+            self._image_loader.set_order(indices)
+
+    def _rectified_pair(self, index, load_pair):
+        """
+        Return the rectified left/right pair for an image of the sequence.
+
+        Each image is loaded and rectified only once, straight into a plane of
+        the scan's rectified stack; later requests for the same index (other
+        decoders, incremental passes) reuse that plane.
+
+        Args:
+            index: Index of the image in the sequence
+            load_pair: Function returning the raw (left, right) pair for an image index
+
+        Returns:
+            Tuple (left_rect, right_rect) of read-only views; entries are None if
+            the pair cannot be loaded
+        """
+        stack = self._rectified_stack
+        if stack is not None:
+            pair = stack.get_pair(index)
+            if pair is not None:
+                return pair
+
+        left, right = load_pair(index)
+        if left is None or right is None:
+            return None, None
+
+        height, width = left.shape[:2]
+        if stack is None or stack.shape != (height, width):
+            stack = self._rectified_stack = RectifiedStack(height, width)
+
+        with self.instrumentation.span("rectify"):
+            return stack.rectify_pair(index, left, right,
+                                      (self.map_x_l, self.map_y_l, self.map_x_r, self.map_y_r))
+
+    def _reset_rectified_stack(self):
+        """Forget the rectified planes, keeping the buffers for the next scan."""
+        if self._rectified_stack is not None:
+            self._rectified_stack.clear()
+
+    def _decode_sequence(self, load_pair, num_images, code_type):
+        """
+        Decode a pattern sequence with the decoder matching its type.
+
+        Args:
+            load_pair: Function returning the raw (left, right) pair for an image index
+            num_images: Number of images in the sequence (white and black included)
+            code_type: Sequence type ("gray", "binary" or "phase")
+
+        Returns:
+            Tuple (disparity_map, valid_mask), or (None, None) on failure
+        """
+        with self.instrumentation.span("decode"):
+            if code_type == "phase":
+                return self._decode_phase_sequence(load_pair, num_images)
+            return self._decode_code_sequence(load_pair, num_images, code_type)
+
+    def _decode_phase_sequence(self, load_pair, num_images):
+        """
+        Decode a multi-frequency phase-shift sequence into a disparity map.
+
+        Absolute phase is recovered per pixel by temporal unwrapping across the
+        fringe frequencies, then left/right pixels are matched by absolute phase
+        along the rectified rows with sub-pixel interpolation.
+
+        Args:
+            load_pair: Function returning the raw (left, right) pair for an image index
+            num_images: Number of images in the sequence (white and black included)
+
+        Returns:
+            Tuple (disparity_map, valid_mask), or (None, None) on failure
         """
-        height, width = pattern_l.shape[:2]
+        white_l_rect, white_r_rect = self._rectified_pair(0, load_pair)
+        black_l_rect, black_r_rect = self._rectified_pair(1, load_pair)
+
+        if white_l_rect is None or black_l_rect is None:
+            logger.error("Failed to load white/black reference images")
+            return None, None
 
-        # For each scanline
-        for y in range(height):
-            # Skip if processing is cancelled
+        black_threshold = 40
+        shadow_mask_l = white_l_rect.astype(np.int16) > black_l_rect.astype(np.int16) + black_threshold
+        shadow_mask_r = white_r_rect.astype(np.int16) > black_r_rect.astype(np.int16) + black_threshold
+
+        frequencies = list(self._scan_config.get("phase_frequencies", DEFAULT_FREQUENCIES))
+        num_steps = int(self._scan_config.get("phase_steps", (num_images - 2) // len(frequencies)))
+
+        if num_steps < 3 or num_images - 2 < num_steps * len(frequencies):
+            logger.error("Not enough images for phase shift processing")
+            return None, None
+
+        num_patterns = num_steps * len(frequencies)
+        images_l = []
+        images_r = []
+        for i in range(num_patterns):
             if self._processing_cancelled.is_set():
-                return
+                logger.info("Processing cancelled")
+                return None, None
 
-            # For each pixel in left image
-            for x in range(width):
-                # Skip pixels in shadow
-                if shadow_mask_l[y, x] == 0:
-                    continue
+            pattern_l, pattern_r = self._rectified_pair(2 + i, load_pair)
+            if pattern_l is None:
+                logger.error(f"Failed to load pattern images at index {2 + i}")
+                return None, None
+            images_l.append(pattern_l)
+            images_r.append(pattern_r)
 
-                # Get pixel value in left image
-                val_l = pattern_l[y, x]
+            if self._progress_callback:
+                progress = (i + 1) / num_patterns * 50  # First 50% is loading
+                self._progress_callback(progress, f"Loading phase patterns: {i + 1}/{num_patterns}")
 
-                # Search for best match in right image (along same scanline)
-                best_match_x = -1
-                best_match_diff = 255  # Maximum possible difference
+        phase_l, valid_l = decode_phase_sequence(images_l, frequencies, num_steps, shadow_mask=shadow_mask_l)
+        phase_r, valid_r = decode_phase_sequence(images_r, frequencies, num_steps, shadow_mask=shadow_mask_r)
 
-                # Search range (limit to reasonable disparity range)
-                min_x = max(0, x - 200)  # Only look for matches to the left
-                max_x = x
+        if self._progress_callback:
+            self._progress_callback(60, "Matching absolute phase...")
 
-                for x_r in range(min_x, max_x):
-                    # Skip pixels in shadow in right image
-                    if shadow_mask_r[y, x_r] == 0:
-                        continue
+        with self.instrumentation.span("match"):
+            disparity_map = match_absolute_phase(phase_l, valid_l, phase_r, valid_r)
 
-                    # Get pixel value in right image
-                    val_r = pattern_r[y, x_r]
+        valid_mask = (disparity_map > 0).astype(np.uint8)
+        logger.info(f"Decoded {len(frequencies)} fringe frequencies, {int(valid_mask.sum())} matched pixels")
+        return disparity_map, valid_mask
 
-                    # Calculate absolute difference
-                    diff = abs(val_l - val_r)
+    def _decode_code_sequence(self, load_pair, num_images, code_type):
+        """
+        Decode a coded pattern sequence into a disparity map.
 
-                    # Update best match if this is better
-                    if diff < best_match_diff:
-                        best_match_diff = diff
-                        best_match_x = x_r
+        Bit planes are thresholded and packed into per-pixel projector-column
+        codes as they are loaded, then matched by equal code per rectified row.
 
-                # If we found a good match, update disparity
-                if best_match_x >= 0 and best_match_diff < 50:  # Threshold for good match
-                    disparity = x - best_match_x
+        Args:
+            load_pair: Function returning the raw (left, right) pair for an image index
+            num_images: Number of images in the sequence (white and black included)
+            code_type: Code type understood by CodeDecoder
 
-                    # Update disparity and confidence maps with weighted contribution
-                    disparity_map[y, x] += disparity * pattern_weight
-                    confidence_map[y, x] += pattern_weight
+        Returns:
+            Tuple (disparity_map, valid_mask), or (None, None) on failure
+        """
+        layout = code_sequence_layout(num_images - 2, code_type,
+                                      include_horizontal=self._scan_config.get("horizontal_patterns", True))
+        vertical = layout["vertical"]
+        vertical_inverse = layout["vertical_inverse"]
+
+        # Each bit plane is read together with its inverse
+        order = [0, 1]
+        for bit, rel_idx in enumerate(vertical):
+            order.append(2 + rel_idx)
+            if vertical_inverse:
+                order.append(2 + vertical_inverse[bit])
+        self._plan_image_order(order)
+
+        white_l_rect, white_r_rect = self._rectified_pair(0, load_pair)
+        black_l_rect, black_r_rect = self._rectified_pair(1, load_pair)
+
+        if white_l_rect is None or black_l_rect is None:
+            logger.error("Failed to load white/black reference images")
+            return None, None
+
+        decoder_l = CodeDecoder(white_l_rect, black_l_rect, code_type=code_type)
+        decoder_r = CodeDecoder(white_r_rect, black_r_rect, code_type=code_type)
+
+        for bit, rel_idx in enumerate(vertical):
+            if self._processing_cancelled.is_set():
+                logger.info("Processing cancelled")
+                return None, None
+
+            pattern_l, pattern_r = self._rectified_pair(2 + rel_idx, load_pair)
+            if pattern_l is None:
+                logger.error(f"Failed to load pattern images at index {2 + rel_idx}")
+                return None, None
+
+            inverse_l = inverse_r = None
+            if vertical_inverse:
+                inverse_l, inverse_r = self._rectified_pair(2 + vertical_inverse[bit], load_pair)
+
+            decoder_l.add_plane(pattern_l, inverse_l)
+            decoder_r.add_plane(pattern_r, inverse_r)
+
+            if self._progress_callback:
+                progress = (bit + 1) / len(vertical) * 50  # First 50% is coding
+                self._progress_callback(progress, f"Decoding bit planes: {bit + 1}/{len(vertical)}")
+
+        if self._progress_callback:
+            self._progress_callback(60, "Matching codes...")
+
+        with self.instrumentation.span("match"):
+            disparity_map = match_codes_by_row(
+                decoder_l.codes(), decoder_l.valid_mask,
+                decoder_r.codes(), decoder_r.valid_mask,
+                decoder_l.num_bits
+            )
+
+        valid_mask = (disparity_map > 0).astype(np.uint8)
+        logger.info(f"Decoded {decoder_l.num_bits} bit planes, {int(valid_mask.sum())} matched pixels")
+        return disparity_map, valid_mask
+
+    def _process_binary_code(self) -> bool:
+        """
+        Process binary code pattern scan.
+        Uses the same bit-plane packing and per-row code matching as the Gray
+        code path, but with the natural binary code table.
+        """
+        logger.info("Processing binary code pattern scan")
+
+        # White, black and at least two pattern images
+        if len(self.left_images) < 4:
+            logger.error("Not enough images for binary code processing")
+            return False
+
+        return self._process_code_sequence("binary")
+
+    def _process_phase_shift(self) -> bool:
+        """
+        Process multi-frequency phase-shift pattern scan.
+        Fringe frequencies and steps per frequency are read from the scan
+        configuration ("phase_frequencies", "phase_steps").
+        """
+        logger.info("Processing phase shift pattern scan")
+
+        # White, black and at least three phase steps
+        if len(self.left_images) < 5:
+            logger.error("Not enough images for phase shift processing")
+            return False
+
+        return self._process_code_sequence("phase")
+
+    def _update_disparity_from_pattern(self, pattern_l, pattern_r, shadow_mask_l, shadow_mask_r,
+                                       disparity_map, confidence_map, pattern_weight=1.0, search_range=None):
+        """
+        Update disparity map based on a single pattern pair.
+        Used for progressive pattern processing.
+
+        The correspondence search is delegated to the vectorized
+        ScanlineCorrespondenceEngine, which processes whole row bands at once;
+        ``search_range`` optionally restricts it to per-pixel disparity bands.
+        """
+        with self.instrumentation.span("match"):
+            update_disparity_from_pattern(
+                pattern_l, pattern_r,
+                shadow_mask_l, shadow_mask_r,
+                disparity_map, confidence_map,
+                pattern_weight=pattern_weight,
+                cancel_event=self._processing_cancelled,
+                search_range=search_range
+            )
 
     def _reproject_to_3d(self, disparity_map, mask):
         """
@@ -1693,32 +2135,17 @@ class ScanProcessor:
             # Create point cloud from disparity map
             logger.info("Reprojecting to 3D points")
 
-            # Apply mask to disparity map
-            masked_disparity = disparity_map.copy()
-            masked_disparity[mask == 0] = 0
-
-            # Reproject to 3D
-            points_3d = cv2.reprojectImageTo3D(masked_disparity, self.Q)
-
-            # Filter invalid points
-            mask = (
-                    ~np.isnan(points_3d).any(axis=2) &
-                    ~np.isinf(points_3d).any(axis=2) &
-                    (mask > 0)
-            )
-
-            # Extract valid points
-            valid_points = points_3d[mask]
-
-            # Optional: Limit points to reasonable range (e.g., 1m cube around origin)
+            # Reproject only the valid pixels, limited to a reasonable range
+            # (e.g., 1m cube around origin)
             max_range = 500  # mm
-            in_range_mask = (
-                    (np.abs(valid_points[:, 0]) < max_range) &
-                    (np.abs(valid_points[:, 1]) < max_range) &
-                    (np.abs(valid_points[:, 2]) < max_range)
-            )
-
-            valid_points = valid_points[in_range_mask]
+            with self.instrumentation.span("filter"):
+                disparity_map = self.disparity_smoother(disparity_map, mask)
+            logger.info(f"Disparity filter '{self.disparity_smoother.method}': "
+                        f"{self.disparity_smoother.last_time_ms:.1f} ms")
+            with self.instrumentation.span("reproject"):
+                self.organized_pointcloud = OrganizedPointCloud.from_disparity(
+                    disparity_map, self.Q, mask, max_range=max_range)
+                valid_points = self.organized_pointcloud.points
 
             # Store points in result
             self.pointcloud = valid_points
@@ -1756,38 +2183,14 @@ class ScanProcessor:
             # Ensure directory exists
             os.makedirs(os.path.dirname(filename), exist_ok=True)
 
-            # Check if Open3D is available for better PLY export
-            if OPEN3D_AVAILABLE:
-                # Convert to Open3D point cloud
-                pcd = o3d.geometry.PointCloud()
-                pcd.points = o3d.utility.Vector3dVector(self.pointcloud)
+            # Remove statistical outliers before export
+            with self.instrumentation.span("filter"):
+                points = statistical_outlier_removal(self.pointcloud, nb_neighbors=20, std_ratio=2.0)
 
-                # Optional: Apply statistical outlier removal
-                try:
-                    pcd, _ = pcd.remove_statistical_outlier(nb_neighbors=20, std_ratio=2.0)
-                except Exception as e:
-                    logger.warning(f"Error applying outlier removal: {e}")
-
-                # Save to file
-                o3d.io.write_point_cloud(filename, pcd)
-                logger.info(f"Point cloud saved to {filename} using Open3D")
-            else:
-                # Manual PLY export
-                with open(filename, 'w') as f:
-                    # Write header
-                    f.write("ply\n")
-                    f.write("format ascii 1.0\n")
-                    f.write(f"element vertex {len(self.pointcloud)}\n")
-                    f.write("property float x\n")
-                    f.write("property float y\n")
-                    f.write("property float z\n")
-                    f.write("end_header\n")
-
-                    # Write vertices
-                    for point in self.pointcloud:
-                        f.write(f"{point[0]} {point[1]} {point[2]}\n")
-
-                logger.info(f"Point cloud saved to {filename} using manual export")
+            # Binary PLY, written in chunks
+            with self.instrumentation.span("export"):
+                write_ply(filename, points)
+            logger.info(f"Point cloud saved to {filename} ({len(points)} points)")
 
             return True
 
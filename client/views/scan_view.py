@@ -27,6 +27,7 @@ from PySide6.QtCore import Qt, Signal, Slot, QTimer, QMetaObject, Q_ARG
 from PySide6.QtGui import QImage, QPixmap, QStatusTipEvent
 
 from client.models.scanner_model import Scanner, ScannerStatus
+from client.processing.ply_writer import write_ply
 from client.processing.scan_frame_processor import ScanFrameProcessor
 
 # Verifica la disponibilità di Open3D per la visualizzazione 3D
@@ -344,27 +345,8 @@ class PointCloudViewerWidget(QWidget):
             # Crea directory se necessario
             os.makedirs(os.path.dirname(file_path), exist_ok=True)
 
-            # Salva la nuvola
-            if OPEN3D_AVAILABLE:
-                # Usa Open3D
-                pcd = o3d.geometry.PointCloud()
-                pcd.points = o3d.utility.Vector3dVector(self.pointcloud)
-                o3d.io.write_point_cloud(file_path, pcd)
-            else:
-                # Fallback a salvataggio manuale
-                with open(file_path, 'w') as f:
-                    # Scrivi header
-                    f.write("ply\n")
-                    f.write("format ascii 1.0\n")
-                    f.write(f"element vertex {len(self.pointcloud)}\n")
-                    f.write("property float x\n")
-                    f.write("property float y\n")
-                    f.write("property float z\n")
-                    f.write("end_header\n")
-
-                    # Scrivi vertici
-                    for point in self.pointcloud:
-                        f.write(f"{point[0]} {point[1]} {point[2]}\n")
+            # Salva la nuvola in PLY binario
+            write_ply(file_path, self.pointcloud)
 
             QMessageBox.information(
                 self,
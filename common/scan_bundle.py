@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Formato a file singolo per i frame di una scansione (scan bundle).
+
+Il file contiene un'intestazione JSON (configurazione della scansione, hash
+della calibrazione, forma dei frame e tabella dei pattern previsti) seguita da
+record di dimensione fissa, uno per coppia di frame:
+
+    [magic | lunghezza JSON | JSON | padding fino a HEADER_ALIGNMENT]
+    [pattern_index | timestamp | nome | padding | piano sinistro | piano destro]
+    ...
+
+I piani sono uint8 grezzi e contigui, quindi il file si apre con ``np.memmap``
+e i decodificatori ricevono viste senza copie. La scrittura è solo in append:
+il server può aggiungere frame durante l'acquisizione e un lettore vede sempre
+solo i record completi. Un bundle già esistente non viene mai sovrascritto: lo
+scrittore lo riapre e aggiunge i nuovi record dopo quelli presenti.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import cv2
+
+# Configurazione logging
+logger = logging.getLogger(__name__)
+
+# Nome del file del bundle nella directory della scansione
+SCAN_BUNDLE_NAME = "scan_bundle.ulb"
+
+# Firma e versione del formato
+BUNDLE_MAGIC = b"ULKSCAN\x00"
+BUNDLE_VERSION = 1
+
+# Allineamento dell'intestazione (i record iniziano su un confine di pagina)
+HEADER_ALIGNMENT = 4096
+
+# Dimensione dei metadati all'inizio di ogni record e allineamento dei record
+RECORD_META_SIZE = 64
+RECORD_ALIGNMENT = 64
+
+# Lunghezza massima del nome del pattern (byte UTF-8)
+PATTERN_NAME_SIZE = 40
+
+# Chiavi dei parametri di calibrazione incluse nell'hash
+CALIBRATION_KEYS = ("M1", "M2", "d1", "d2", "R", "t")
+
+_PREFIX = struct.Struct("<8sI")
+
+
+def _align(value: int, alignment: int) -> int:
+    """Arrotonda ``value`` al multiplo successivo di ``alignment``."""
+    return (value + alignment - 1) // alignment * alignment
+
+
+def record_dtype(frame_shape: Sequence[int], frame_dtype=np.uint8) -> np.dtype:
+    """
+    Tipo strutturato di un record del bundle.
+
+    Args:
+        frame_shape: Forma di un frame, (H, W) o (H, W, C)
+        frame_dtype: Tipo dei pixel
+
+    Returns:
+        np.dtype con i campi pattern_index, timestamp, name, left e right
+    """
+    frame_shape = tuple(int(s) for s in frame_shape)
+    frame_dtype = np.dtype(frame_dtype)
+    plane_size = int(np.prod(frame_shape)) * frame_dtype.itemsize
+
+    return np.dtype({
+        "names": ["pattern_index", "timestamp", "name", "left", "right"],
+        "formats": ["<i4", "<f8", f"S{PATTERN_NAME_SIZE}", (frame_dtype, frame_shape), (frame_dtype, frame_shape)],
+        "offsets": [0, 8, 16, RECORD_META_SIZE, RECORD_META_SIZE + plane_size],
+        "itemsize": _align(RECORD_META_SIZE + 2 * plane_size, RECORD_ALIGNMENT)
+    })
+
+
+def calibration_digest(calib_data) -> Optional[str]:
+    """
+    Hash dei parametri di calibrazione stereo, indipendente dalla risoluzione.
+
+    Args:
+        calib_data: Dati di calibrazione (NpzFile o dizionario di array)
+
+    Returns:
+        Stringa esadecimale, o None se mancano dei parametri
+    """
+    if calib_data is None:
+        return None
+
+    digest = hashlib.sha1()
+    try:
+        for key in CALIBRATION_KEYS:
+            array = np.ascontiguousarray(calib_data[key], dtype=np.float64)
+            digest.update(key.encode())
+            digest.update(str(array.shape).encode())
+            digest.update(array.tobytes())
+    except KeyError:
+        return None
+
+    return digest.hexdigest()[:16]
+
+
+def _read_header(f, path: Path) -> Tuple[Dict[str, Any], int]:
+    """
+    Legge e verifica l'intestazione di un bundle aperto in lettura.
+
+    Returns:
+        Tupla (intestazione, dimensione allineata dell'intestazione)
+    """
+    prefix = f.read(_PREFIX.size)
+    if len(prefix) < _PREFIX.size:
+        raise ValueError(f"Bundle troncato: {path}")
+    magic, header_len = _PREFIX.unpack(prefix)
+    if magic != BUNDLE_MAGIC:
+        raise ValueError(f"File non riconosciuto come scan bundle: {path}")
+    header_json = f.read(header_len)
+    if len(header_json) < header_len:
+        raise ValueError(f"Bundle troncato: {path}")
+    header = json.loads(header_json.decode("utf-8"))
+
+    if header.get("version") != BUNDLE_VERSION:
+        raise ValueError(f"Versione del bundle non supportata: {header.get('version')}")
+
+    return header, _align(_PREFIX.size + header_len, HEADER_ALIGNMENT)
+
+
+class ScanBundleWriter:
+    """
+    Scrittura in append di un bundle di scansione.
+    Ogni ``append`` aggiunge un record completo e svuota il buffer del file,
+    così i frame sono visibili ai lettori appena scritti. Se il file esiste già
+    viene riaperto in append, senza perdere i record presenti.
+    """
+
+    def __init__(self, path: Union[str, Path], frame_shape: Sequence[int], frame_dtype=np.uint8,
+                 scan_config: Optional[Dict[str, Any]] = None, calibration_hash: Optional[str] = None,
+                 patterns: Optional[List[Dict[str, Any]]] = None):
+        """
+        Crea il file e scrive l'intestazione, oppure riapre un bundle esistente.
+
+        Un bundle esistente deve avere la stessa forma e lo stesso tipo dei
+        frame; la sua intestazione resta invariata e un eventuale record
+        incompleto in coda (scrittura interrotta) viene scartato.
+
+        Args:
+            path: Percorso del file del bundle
+            frame_shape: Forma dei frame, (H, W) o (H, W, C)
+            frame_dtype: Tipo dei pixel
+            scan_config: Configurazione della scansione
+            calibration_hash: Hash della calibrazione usata (vedi calibration_digest)
+            patterns: Tabella dei pattern previsti, lista di {"index", "name"}
+
+        Raises:
+            ValueError: Se il file esistente non è un bundle compatibile
+        """
+        self.path = Path(path)
+        self.frame_shape = tuple(int(s) for s in frame_shape)
+        self.frame_dtype = np.dtype(frame_dtype)
+        self.num_frames = 0
+
+        self._dtype = record_dtype(self.frame_shape, self.frame_dtype)
+        self._meta = np.zeros(1, dtype=np.dtype({
+            "names": ["pattern_index", "timestamp", "name"],
+            "formats": ["<i4", "<f8", f"S{PATTERN_NAME_SIZE}"],
+            "offsets": [0, 8, 16],
+            "itemsize": RECORD_META_SIZE
+        }))
+        self._padding = bytes(self._dtype.itemsize - RECORD_META_SIZE -
+                              2 * int(np.prod(self.frame_shape)) * self.frame_dtype.itemsize)
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.path.exists() and self.path.stat().st_size > 0:
+            self._reopen()
+            return
+
+        self.header = {
+            "version": BUNDLE_VERSION,
+            "created": time.time(),
+            "frame_shape": list(self.frame_shape),
+            "frame_dtype": self.frame_dtype.str,
+            "record_size": self._dtype.itemsize,
+            "scan_config": scan_config or {},
+            "calibration_hash": calibration_hash,
+            "patterns": patterns or []
+        }
+        header_json = json.dumps(self.header).encode("utf-8")
+        header_size = _align(_PREFIX.size + len(header_json), HEADER_ALIGNMENT)
+
+        self._file = open(self.path, "wb")
+        self._file.write(_PREFIX.pack(BUNDLE_MAGIC, len(header_json)))
+        self._file.write(header_json)
+        self._file.write(bytes(header_size - _PREFIX.size - len(header_json)))
+        self._file.flush()
+
+    def _reopen(self):
+        """Riapre un bundle esistente posizionandosi dopo l'ultimo record completo."""
+        self._file = open(self.path, "r+b")
+        try:
+            self.header, header_size = _read_header(self._file, self.path)
+
+            frame_shape = tuple(int(s) for s in self.header.get("frame_shape", ()))
+            frame_dtype = np.dtype(self.header.get("frame_dtype", "|u1"))
+            if frame_shape != self.frame_shape or frame_dtype != self.frame_dtype:
+                raise ValueError(f"Bundle esistente {frame_shape}/{frame_dtype} non compatibile con i frame "
+                                 f"{self.frame_shape}/{self.frame_dtype}: {self.path}")
+
+            file_size = os.fstat(self._file.fileno()).st_size
+            self.num_frames = max(0, (file_size - header_size) // self._dtype.itemsize)
+            end = header_size + self.num_frames * self._dtype.itemsize
+            if file_size != end:
+                logger.warning(f"Bundle {self.path}: scartati {file_size - end} byte di un record incompleto")
+                self._file.truncate(end)
+            self._file.seek(end)
+        except Exception:
+            self._file.close()
+            self._file = None
+            raise
+
+        logger.info(f"Bundle esistente riaperto in append: {self.path} ({self.num_frames} coppie)")
+
+    def append(self, pattern_index: int, pattern_name: str, left: np.ndarray, right: np.ndarray,
+               timestamp: Optional[float] = None):
+        """
+        Aggiunge una coppia di frame al bundle.
+
+        Args:
+            pattern_index: Indice del pattern
+            pattern_name: Nome del pattern (troncato a PATTERN_NAME_SIZE byte)
+            left, right: Frame delle due camere, con la forma e il tipo del bundle
+            timestamp: Istante di acquisizione (default: ora)
+        """
+        for frame in (left, right):
+            if frame.shape != self.frame_shape or frame.dtype != self.frame_dtype:
+                raise ValueError(f"Frame {frame.shape}/{frame.dtype} non compatibile con il bundle "
+                                 f"{self.frame_shape}/{self.frame_dtype}")
+
+        with self._lock:
+            if self._file is None:
+                raise ValueError("Bundle già chiuso")
+
+            self._meta["pattern_index"] = pattern_index
+            self._meta["timestamp"] = time.time() if timestamp is None else timestamp
+            self._meta["name"] = pattern_name.encode("utf-8")[:PATTERN_NAME_SIZE]
+
+            self._file.write(self._meta.tobytes())
+            self._file.write(np.ascontiguousarray(left).data)
+            self._file.write(np.ascontiguousarray(right).data)
+            self._file.write(self._padding)
+            self._file.flush()
+            self.num_frames += 1
+
+    def close(self):
+        """Chiude il file del bundle."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class ScanBundle:
+    """
+    Lettura di un bundle di scansione tramite memory mapping.
+    I frame sono esposti come viste in sola lettura, ordinate per indice di pattern.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        """
+        Apre il bundle e mappa i record completi.
+
+        Args:
+            path: Percorso del file del bundle
+        """
+        self.path = Path(path)
+
+        with open(self.path, "rb") as f:
+            self.header, self.header_size = _read_header(f, self.path)
+
+        self.frame_shape = tuple(self.header["frame_shape"])
+        self._dtype = record_dtype(self.frame_shape, np.dtype(self.header["frame_dtype"]))
+        self.records = None
+        self._positions: Dict[int, int] = {}
+        self._indices: List[int] = []
+        self.refresh()
+
+    @property
+    def scan_config(self) -> Dict[str, Any]:
+        """Configurazione della scansione salvata nell'intestazione."""
+        return self.header.get("scan_config", {})
+
+    @property
+    def calibration_hash(self) -> Optional[str]:
+        """Hash della calibrazione salvato nell'intestazione."""
+        return self.header.get("calibration_hash")
+
+    def refresh(self):
+        """Rimappa il file per includere i record aggiunti dopo l'apertura."""
+        num_records = max(0, (os.path.getsize(self.path) - self.header_size) // self._dtype.itemsize)
+
+        if num_records > 0:
+            self.records = np.memmap(self.path, dtype=self._dtype, mode="r",
+                                     offset=self.header_size, shape=(num_records,))
+        else:
+            self.records = np.zeros(0, dtype=self._dtype)
+
+        # In caso di indici ripetuti vale l'ultimo record scritto
+        pattern_indices = np.asarray(self.records["pattern_index"])
+        self._positions = {int(idx): pos for pos, idx in enumerate(pattern_indices)}
+        self._indices = sorted(self._positions)
+
+    def __len__(self):
+        return len(self._indices)
+
+    def __contains__(self, pattern_index):
+        return pattern_index in self._positions
+
+    def pattern_indices(self) -> List[int]:
+        """Indici dei pattern presenti, in ordine crescente."""
+        return list(self._indices)
+
+    def pattern_name(self, pattern_index: int) -> str:
+        """Nome del pattern di un indice."""
+        raw = self.records["name"][self._positions[pattern_index]]
+        return bytes(raw).decode("utf-8", errors="replace")
+
+    def frame_labels(self) -> List[str]:
+        """Etichette ``NNNN_nome`` dei frame, nello stesso formato dei file PNG."""
+        return [f"{idx:04d}_{self.pattern_name(idx)}" for idx in self._indices]
+
+    def get_pair(self, pattern_index: int) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+        """
+        Restituisce i frame di un pattern come viste sul file mappato.
+
+        Returns:
+            Tupla (left, right), o (None, None) se il pattern non è presente
+        """
+        position = self._positions.get(pattern_index)
+        if position is None:
+            return None, None
+        return self.records["left"][position], self.records["right"][position]
+
+    def pair_at(self, order: int) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+        """
+        Restituisce la coppia alla posizione ``order`` nell'ordine dei pattern.
+
+        Returns:
+            Tupla (left, right), o (None, None) se la posizione non esiste
+        """
+        if order < 0 or order >= len(self._indices):
+            return None, None
+        return self.get_pair(self._indices[order])
+
+    def export_png(self, output_dir: Union[str, Path]) -> int:
+        """
+        Esporta i frame nel formato a directory ``left/`` e ``right/`` con file
+        ``NNNN_nome.png``.
+
+        Args:
+            output_dir: Directory di destinazione
+
+        Returns:
+            Numero di coppie esportate
+        """
+        output_dir = Path(output_dir)
+        left_dir = output_dir / "left"
+        right_dir = output_dir / "right"
+        left_dir.mkdir(parents=True, exist_ok=True)
+        right_dir.mkdir(parents=True, exist_ok=True)
+
+        exported = 0
+        for label, idx in zip(self.frame_labels(), self._indices):
+            left, right = self.get_pair(idx)
+            if cv2.imwrite(str(left_dir / f"{label}.png"), left) and \
+                    cv2.imwrite(str(right_dir / f"{label}.png"), right):
+                exported += 1
+            else:
+                logger.warning(f"Esportazione PNG fallita per il pattern {label}")
+
+        return exported
+
+    def close(self):
+        """Rilascia la mappatura del file."""
+        self.records = None
+        self._positions = {}
+        self._indices = []
+
+
+def open_scan_bundle(scan_dir: Union[str, Path]) -> Optional[ScanBundle]:
+    """
+    Apre il bundle di una directory di scansione, se presente.
+
+    Args:
+        scan_dir: Directory della scansione
+
+    Returns:
+        ScanBundle o None se il bundle non esiste o non è leggibile
+    """
+    path = Path(scan_dir) / SCAN_BUNDLE_NAME
+    if not path.exists():
+        return None
+
+    try:
+        return ScanBundle(path)
+    except (OSError, ValueError) as e:
+        logger.error(f"Impossibile aprire il bundle {path}: {e}")
+        return None
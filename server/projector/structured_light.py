@@ -26,6 +26,13 @@ except ImportError:
     except ImportError:
         from dlp342x import DLPC342XController, OperatingMode, Color, BorderEnable
 
+# Formato a file singolo per i frame della scansione
+try:
+    from common.scan_bundle import SCAN_BUNDLE_NAME, ScanBundleWriter
+except ImportError:
+    SCAN_BUNDLE_NAME = None
+    ScanBundleWriter = None
+
 # Configura logging
 logger = logging.getLogger(__name__)
 
@@ -67,7 +74,9 @@ class StructuredLightController:
     def __init__(self,
                  i2c_bus: int = 3,
                  i2c_address: int = 0x1b,
-                 capture_dir: str = None):
+                 capture_dir: str = None,
+                 storage_format: str = "bundle",
+                 export_png: bool = False):
         """
         Inizializza il controller di scansione a luce strutturata.
 
@@ -75,6 +84,8 @@ class StructuredLightController:
             i2c_bus: Bus I2C per il proiettore (default: 3)
             i2c_address: Indirizzo I2C del proiettore (default: 0x1b)
             capture_dir: Directory per salvare i frame acquisiti
+            storage_format: "bundle" per il file unico memory-mappable, "png" per i file separati
+            export_png: Con il formato bundle, salva anche i file PNG
         """
         # Stato della scansione
         self.state = ScanningState.IDLE
@@ -100,6 +111,17 @@ class StructuredLightController:
         self.left_dir.mkdir(exist_ok=True)
         self.right_dir.mkdir(exist_ok=True)
 
+        # Formato di salvataggio dei frame
+        if storage_format == "bundle" and ScanBundleWriter is None:
+            logger.warning("Modulo scan_bundle non disponibile, salvataggio in PNG")
+            storage_format = "png"
+        self.storage_format = storage_format
+        self.export_png = export_png
+        self._bundle_writer = None
+
+        # Hash della calibrazione stereo indicata dal client, registrato nel bundle
+        self.calibration_hash = None
+
         # Parametri di scansione
         self.pattern_type = ScanPatternType.PROGRESSIVE
         self.num_patterns = 20  # Numero totale di pattern da proiettare
@@ -236,7 +258,8 @@ class StructuredLightController:
                    pattern_type: ScanPatternType = ScanPatternType.PROGRESSIVE,
                    num_patterns: int = 20,
                    exposure_time: float = 0.5,
-                   quality: int = 3) -> bool:
+                   quality: int = 3,
+                   calibration_hash: Optional[str] = None) -> bool:
         """
         Avvia una scansione 3D in un thread separato.
 
@@ -245,6 +268,7 @@ class StructuredLightController:
             num_patterns: Numero di pattern da proiettare
             exposure_time: Tempo di esposizione per ogni pattern (secondi)
             quality: Qualità della scansione (1-5)
+            calibration_hash: Hash della calibrazione usata dal client per elaborare la scansione
 
         Returns:
             True se la scansione è stata avviata, False altrimenti
@@ -258,6 +282,7 @@ class StructuredLightController:
         self.num_patterns = num_patterns
         self.exposure_time = exposure_time
         self.quality = quality
+        self.calibration_hash = calibration_hash
 
         # Reset delle statistiche
         self.scan_stats = {
@@ -458,6 +483,7 @@ class StructuredLightController:
 
             # Crea la lista per memorizzare i frame acquisiti
             self.frame_pairs = []
+            self._close_bundle()
 
             # Seleziona il tipo di pattern da proiettare
             if pattern_type == ScanPatternType.PROGRESSIVE:
@@ -498,6 +524,9 @@ class StructuredLightController:
                 pass
 
         finally:
+            # Chiude il bundle della scansione
+            self._close_bundle()
+
             # Aggiorna il timestamp di fine
             self.scan_stats['end_time'] = time.time()
 
@@ -856,24 +885,12 @@ class StructuredLightController:
 
             # Salva i frame localmente
             try:
-                left_file = self.left_dir / f"{pattern_index:04d}_{pattern_name}.png"
-                right_file = self.right_dir / f"{pattern_index:04d}_{pattern_name}.png"
+                saved_to_bundle = False
+                if self.storage_format == "bundle":
+                    saved_to_bundle = self._append_to_bundle(pattern_index, pattern_name, frame_left, frame_right)
 
-                save_success = True
-                try:
-                    cv2.imwrite(str(left_file), frame_left)
-                except Exception as e:
-                    logger.error(f"Errore nel salvataggio del frame sinistro: {e}")
-                    save_success = False
-
-                try:
-                    cv2.imwrite(str(right_file), frame_right)
-                except Exception as e:
-                    logger.error(f"Errore nel salvataggio del frame destro: {e}")
-                    save_success = False
-
-                if not save_success:
-                    logger.warning(f"Problemi nel salvataggio di uno o entrambi i frame per pattern {pattern_name}")
+                if not saved_to_bundle or self.export_png:
+                    self._save_png_pair(pattern_index, pattern_name, frame_left, frame_right)
             except Exception as save_err:
                 logger.error(f"Errore critico nel salvataggio dei frame: {save_err}")
                 # Continuiamo comunque per tentare l'invio al client
@@ -938,6 +955,99 @@ class StructuredLightController:
             self.scan_stats['errors'] += 1
             return False
 
+    def _append_to_bundle(self, pattern_index: int, pattern_name: str,
+                          frame_left: np.ndarray, frame_right: np.ndarray) -> bool:
+        """
+        Aggiunge una coppia di frame al bundle della scansione, creandolo al primo frame.
+
+        Returns:
+            True se i frame sono stati scritti nel bundle, False se vanno salvati in PNG
+        """
+        try:
+            if self._bundle_writer is None:
+                scan_config = {
+                    'pattern_type': self.pattern_type.name,
+                    'num_patterns': self.num_patterns,
+                    'exposure_time': self.exposure_time,
+                    'quality': self.quality
+                }
+                self._bundle_writer = ScanBundleWriter(self.capture_dir / SCAN_BUNDLE_NAME,
+                                                       frame_left.shape, frame_left.dtype,
+                                                       scan_config=scan_config,
+                                                       calibration_hash=self.calibration_hash,
+                                                       patterns=self._planned_patterns(self.pattern_type,
+                                                                                       self.num_patterns))
+                logger.info(f"Bundle della scansione creato: {self._bundle_writer.path}")
+
+            self._bundle_writer.append(pattern_index, pattern_name, frame_left, frame_right)
+            return True
+
+        except ValueError as e:
+            # Frame con forma o tipo diversi dai precedenti
+            logger.warning(f"Frame del pattern {pattern_name} non scrivibile nel bundle, salvataggio in PNG: {e}")
+            return False
+        except Exception as e:
+            logger.error(f"Errore nella scrittura del bundle: {e}")
+            return False
+
+    @staticmethod
+    def _planned_patterns(pattern_type: ScanPatternType, num_patterns: int) -> List[Dict[str, Any]]:
+        """
+        Tabella dei pattern che verranno proiettati, con gli stessi indici e
+        nomi usati dalle sequenze _project_*_patterns.
+
+        Args:
+            pattern_type: Tipo di pattern della scansione
+            num_patterns: Numero di pattern (o di bit) per direzione
+
+        Returns:
+            Lista di {"index", "name"} ordinata per indice
+        """
+        if pattern_type == ScanPatternType.PROGRESSIVE:
+            groups = ["vertical", "horizontal"]
+        elif pattern_type == ScanPatternType.GRAY_CODE:
+            groups = ["gray_v", "gray_v_inv", "gray_h", "gray_h_inv"]
+        elif pattern_type == ScanPatternType.BINARY_CODE:
+            groups = ["binary_v", "binary_h"]
+        else:
+            # Sequenza non supportata dal proiettore: nessun pattern previsto
+            return []
+
+        patterns = [{"index": 0, "name": "white"}, {"index": 1, "name": "black"}]
+        for group_index, group in enumerate(groups):
+            for i in range(num_patterns):
+                patterns.append({"index": 2 + group_index * num_patterns + i, "name": f"{group}_{i}"})
+        return patterns
+
+    def _save_png_pair(self, pattern_index: int, pattern_name: str,
+                       frame_left: np.ndarray, frame_right: np.ndarray):
+        """Salva una coppia di frame come file PNG nelle directory left/ e right/."""
+        left_file = self.left_dir / f"{pattern_index:04d}_{pattern_name}.png"
+        right_file = self.right_dir / f"{pattern_index:04d}_{pattern_name}.png"
+
+        save_success = True
+        try:
+            cv2.imwrite(str(left_file), frame_left)
+        except Exception as e:
+            logger.error(f"Errore nel salvataggio del frame sinistro: {e}")
+            save_success = False
+
+        try:
+            cv2.imwrite(str(right_file), frame_right)
+        except Exception as e:
+            logger.error(f"Errore nel salvataggio del frame destro: {e}")
+            save_success = False
+
+        if not save_success:
+            logger.warning(f"Problemi nel salvataggio di uno o entrambi i frame per pattern {pattern_name}")
+
+    def _close_bundle(self):
+        """Chiude il bundle della scansione corrente, se aperto."""
+        if self._bundle_writer is not None:
+            self._bundle_writer.close()
+            logger.info(f"Bundle della scansione chiuso: {self._bundle_writer.num_frames} coppie")
+            self._bundle_writer = None
+
     def process_scan_data(self, output_file: str = None) -> bool:
         """
         Elabora i dati acquisiti durante la scansione per generare la nuvola di punti.
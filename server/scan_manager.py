@@ -315,7 +315,8 @@ class ScanManager:
                 pattern_type=pattern_type,
                 num_patterns=self._scan_config['num_patterns'],
                 exposure_time=self._scan_config['exposure_time'],
-                quality=self._scan_config['quality']
+                quality=self._scan_config['quality'],
+                calibration_hash=self._scan_config.get('calibration_hash')
             )
 
             if not success:
@@ -688,6 +689,11 @@ class ScanManager:
         if 'quality' in scan_config:
             self._scan_config['quality'] = max(1, min(5, int(scan_config['quality'])))
 
+        if 'calibration_hash' in scan_config:
+            # Hash della calibrazione del client (vedi common.scan_bundle.calibration_digest)
+            calibration_hash = scan_config['calibration_hash']
+            self._scan_config['calibration_hash'] = str(calibration_hash) if calibration_hash else None
+
         logger.info(f"Configurazione di scansione aggiornata: {self._scan_config}")
 
     def _capture_frame_callback(self, pattern_index: int) -> Tuple[np.ndarray, np.ndarray]: